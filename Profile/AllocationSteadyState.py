@@ -0,0 +1,146 @@
+# Lynette Davis
+# ldavis@ccom.unh.edu
+# Center for Coastal and Ocean Mapping
+# University of New Hampshire
+# October 2026
+
+# Description: Steady state allocation check of KongsbergDGProcess (see AllocationMonitor). Drives synthetic #MWC
+# records (see KmallReaderBenchmark.build_mwc) through process_dgm, as the sonar process does, with allocation
+# diagnostics enabled, and asserts that allocations per ping stay within given budgets after warm-up, and that
+# retained allocations do not grow with the number of pings: memory retained over the second half of measured pings
+# is bounded by a number of bytes independent of the number of pings (a leak of even a few bytes per ping exceeds it
+# over enough pings). Pie records are taken from queue_pie_object after each ping, as by Plotter, so that their grids
+# return to the pool. Settings are those of GUI/Settings/sampleSettings.json (quality of service disabled). Run as:
+#     python Profile/AllocationSteadyState.py [--pings 300] [--beams 256] [--samples 1000] [--precision float32]
+
+import argparse
+import ctypes
+import json
+import logging
+from multiprocessing import Array, Queue, Value
+import os
+import sys
+
+# Makes WaterColumnPlotter importable when run as a script from any directory
+ROOT_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIRECTORY)
+
+from Profile.KmallReaderBenchmark import build_mwc
+from WaterColumnPlotter.Kongsberg.KongsbergDGProcess import KongsbergDGProcess
+from WaterColumnPlotter.Plotter.LatencyHistogram import LatencyHistogram
+
+SETTINGS_FILE = os.path.join(ROOT_DIRECTORY, "WaterColumnPlotter", "GUI", "Settings", "sampleSettings.json")
+
+# Default budgets of mean transient allocation per ping (kB), for each precision policy, just above measured steady
+# state (256 beams x 1000 samples: about 90 kB with float32 and int32 amplitudes, about 103 kB with float64)
+MAX_TRANSIENT_KB = {'float32': 96, 'int32': 96, 'float64': 112}
+
+
+def load_settings(**advanced_settings):
+    """
+    :param advanced_settings: Advanced settings to override.
+    :return: Settings dictionary of sampleSettings.json, with quality of service disabled.
+    """
+    with open(SETTINGS_FILE, 'r') as settings_file:
+        settings = json.load(settings_file)
+    settings['advanced_settings']['qos'] = False
+    settings['advanced_settings'].update(advanced_settings)
+    return settings
+
+
+def make_process(settings):
+    """
+    Creates (but does not start) a KongsbergDGProcess, with shared values as created by WaterColumn.
+    :param settings: Settings dictionary.
+    :return: KongsbergDGProcess object; pie records are put in its queue_pie_object.
+    """
+    processing_settings = settings['processing_settings']
+    return KongsbergDGProcess(settings=settings,
+                              bin_size=Value(ctypes.c_float, processing_settings['binSize_m'], lock=True),
+                              base_bin_size=Value(ctypes.c_float, processing_settings['binSize_m'], lock=True),
+                              across_track_avg=Value(ctypes.c_float, processing_settings['acrossTrackAvg_m'],
+                                                     lock=True),
+                              depth=Value(ctypes.c_float, processing_settings['depth_m'], lock=True),
+                              depth_avg=Value(ctypes.c_float, processing_settings['depthAvg_m'], lock=True),
+                              max_heave=Value(ctypes.c_float, processing_settings['maxHeave_m'], lock=True),
+                              msr_masking=Value(ctypes.c_bool, processing_settings['msrMasking'], lock=True),
+                              max_grid_cells=Value(ctypes.c_uint16, settings['buffer_settings']['maxGridCells'],
+                                                   lock=True),
+                              settings_edited=Value(ctypes.c_bool, False, lock=True),
+                              queue_datagram=Queue(), queue_pie_object=Queue(),
+                              process_flag=Value(ctypes.c_uint8, 0, lock=True),
+                              latency_counts=Array(ctypes.c_uint64,
+                                                   LatencyHistogram.NUM_STAGES * LatencyHistogram.NUM_BUCKETS,
+                                                   lock=True),
+                              qos_level=Value(ctypes.c_uint8, 0, lock=True),
+                              qos_degraded_ping_count=Value(ctypes.c_uint32, 0, lock=True),
+                              pie_buffer_time=Value(ctypes.c_double, 0.0, lock=True))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pings", type=int, default=300, help="Number of pings, including warm-up.")
+    parser.add_argument("--warm-up", type=int, default=50, help="Number of pings ignored before measuring.")
+    parser.add_argument("--beams", type=int, default=256, help="Number of beams in #MWC datagram.")
+    parser.add_argument("--samples", type=int, default=1000, help="Number of samples per beam.")
+    parser.add_argument("--precision", default="float32", help="Precision policy ('precision' in advanced settings).")
+    parser.add_argument("--max-transient-kb", type=float, default=None,
+                        help="Largest allowed mean transient (peak) allocation per ping (kB); default depends on "
+                             "precision (see MAX_TRANSIENT_KB).")
+    parser.add_argument("--max-retained-bytes", type=float, default=32,
+                        help="Largest allowed mean retained allocation per ping (bytes).")
+    parser.add_argument("--max-retained-growth-bytes", type=float, default=2048,
+                        help="Largest allowed allocation retained over second half of measured pings (bytes).")
+    args = parser.parse_args()
+    if args.max_transient_kb is None:
+        args.max_transient_kb = MAX_TRANSIENT_KB[args.precision]
+
+    logging.basicConfig(level=logging.INFO)
+    # Warnings of samples beyond grid would be logged for every ping
+    logging.getLogger("WaterColumnPlotter.Kongsberg.KongsbergDGProcess").setLevel(logging.ERROR)
+
+    settings = load_settings(allocationDiagnostics=True, precision=args.precision)
+    dg_process = make_process(settings)
+    dg_process.allocation_monitor.warm_up_records = args.warm_up
+    datagram = build_mwc(args.beams, args.samples)
+
+    # Debugging output of process_dgm is discarded
+    with open(os.devnull, 'w') as devnull:
+        stdout = sys.stdout
+        sys.stdout = devnull
+        try:
+            # Retained allocations of a ping are measured when next ping begins (see AllocationMonitor), so that
+            # retained bytes at half_ping are those of pings before it
+            half_ping = args.warm_up + (args.pings - args.warm_up) // 2
+            first_half_retained_bytes = 0
+            dg_process.allocation_monitor.start()
+            for ping in range(args.pings):
+                dg_process.process_dgm(datagram)
+                dg_process.queue_pie_object.get()
+                if ping == half_ping:
+                    first_half_retained_bytes = dg_process.allocation_monitor.get_statistics()['retained_bytes']
+            dg_process.allocation_monitor.stop()
+        finally:
+            sys.stdout = stdout
+
+    statistics = dg_process.allocation_monitor.get_statistics()
+    print("{} pings measured after {} warm-up pings ({} beams x {} samples, {}):"
+          .format(statistics['records'], args.warm_up, args.beams, args.samples, args.precision))
+    print("    transient: mean {:.1f} kB, max {:.1f} kB per ping".format(statistics['mean_transient_bytes'] / 1e3,
+                                                                         statistics['max_transient_bytes'] / 1e3))
+    print("    retained:  mean {:.0f} bytes per ping; {:.1f} blocks per ping; {} garbage collections"
+          .format(statistics['mean_retained_bytes'], statistics['mean_blocks'], statistics['gc_collections']))
+    second_half_retained_bytes = statistics['retained_bytes'] - first_half_retained_bytes
+    print("    retained:  {} bytes over first half, {} bytes over second half of measured pings"
+          .format(first_half_retained_bytes, second_half_retained_bytes))
+
+    dg_process.allocation_monitor.assert_steady_state(max_transient_bytes=args.max_transient_kb * 1e3,
+                                                      max_retained_bytes=args.max_retained_bytes)
+    assert second_half_retained_bytes <= args.max_retained_growth_bytes, \
+        "Retained allocations grow with number of pings: {} bytes retained over second half of measured pings " \
+        "exceeds {} bytes.".format(second_half_retained_bytes, args.max_retained_growth_bytes)
+    print("Steady state: OK")
+
+
+if __name__ == '__main__':
+    main()
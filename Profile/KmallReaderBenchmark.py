@@ -0,0 +1,197 @@
+# Lynette Davis
+# ldavis@ccom.unh.edu
+# Center for Coastal and Ocean Mapping
+# University of New Hampshire
+# October 2026
+
+# Description: Micro-benchmark of KmallReaderForMDatagrams. Times parsing of header and partition info of a
+# (synthetic) partitioned #MWC datagram as done before precompiled structs (format string rebuilt and compiled on
+# every call), through read_EMdgm* (precompiled structs), and through peek_EMdgm* (precompiled structs, unpack_from
+# in place); also times parsing of a full #MWC datagram, through read_EMdgmMWC and unpack_EMdgmMWC (in place; sample
+# amplitudes as views), and through MWCView (lazy; only fields used by KongsbergDGProcess decoded). Precompiled structs
+# give no measurable speedup of header and partition info: read_EMdgm* costs about the same as format strings (within a
+# few percent; CPython caches compiled formats), as most of the cost is BytesIO and dictionary (and datetime)
+# construction. peek_EMdgm*, as used by KongsbergDGCaptureFromSonar, avoids BytesIO and datetime, but still builds a
+# (smaller) dictionary of header fields, and is only about 2x faster than read_EMdgm*. Run as:
+#     python Profile/KmallReaderBenchmark.py [--beams 256] [--samples 1000] [--number 20000]
+
+import argparse
+import datetime
+import io
+import numpy as np
+import os
+import struct
+import sys
+import timeit
+
+# Makes WaterColumnPlotter importable when run as a script from any directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from WaterColumnPlotter.Kongsberg.KmallDatagramViews import MWCView
+from WaterColumnPlotter.Kongsberg.KmallReaderForMDatagrams import KmallReaderForMDatagrams as k
+
+MAX_PARTITION_SIZE = 64000
+
+
+def build_mwc(num_beams, num_samples, dgm_version=2, seed=0, heave_m=0.0, tilt_deg=0.0, sample_freq_hz=15000.0,
+              sound_speed_m_per_sec=1500.0, beam_angle_jitter_deg=0.0):
+    """
+    Builds a synthetic #MWC datagram.
+    :param num_beams: Number of beams.
+    :param num_samples: Number of samples per beam.
+    :param dgm_version: #MWC datagram version.
+    :param seed: Seed of random amplitudes (and of beam angle jitter).
+    :param heave_m: Heave (m).
+    :param tilt_deg: Tilt angle of transmit sector (deg).
+    :param sample_freq_hz: Sample frequency (Hz).
+    :param sound_speed_m_per_sec: Sound speed (m/s).
+    :param beam_angle_jitter_deg: Largest random offset of beam angles from evenly spaced angles (deg).
+    :return: Datagram (bytes).
+    """
+    rng = np.random.default_rng(seed)
+    cmn_part_struct = k.get_struct(b'#MWC', 'cmnPart', dgm_version)
+    tx_info_struct = k.get_struct(b'#MWC', 'txInfo', dgm_version)
+    tx_sector_struct = k.get_struct(b'#MWC', 'txSectorData', dgm_version)
+    rx_info_struct = k.get_struct(b'#MWC', 'rxInfo', dgm_version)
+    beam_struct = k.get_struct(b'#MWC', 'rxBeamData', dgm_version)
+
+    body = k.get_struct(b'#MWC', 'partition', dgm_version).pack(1, 1)
+    body += cmn_part_struct.pack(cmn_part_struct.size, 1, 1, 0, 1, 0, 0, 0, 1, 0)
+    body += tx_info_struct.pack(tx_info_struct.size, 1, tx_sector_struct.size, 0, heave_m)
+    body += tx_sector_struct.pack(tilt_deg, 300000.0, 1.0, 0, 0)
+    body += rx_info_struct.pack(rx_info_struct.size, num_beams, beam_struct.size, 0, 1, -10, sample_freq_hz,
+                                sound_speed_m_per_sec)
+    beam_angles = np.linspace(-65, 65, num_beams)
+    if beam_angle_jitter_deg:
+        beam_angles += rng.uniform(-beam_angle_jitter_deg, beam_angle_jitter_deg, num_beams)
+    for angle in beam_angles:
+        beam_fields = (angle, 0, num_samples // 2, 0, num_samples) + ((float(num_samples // 2),) if dgm_version else ())
+        body += beam_struct.pack(*beam_fields)
+        body += rng.integers(-128, 127, num_samples).astype(np.int8).tobytes()
+
+    header_struct = k.get_struct(None, 'header', None)
+    num_bytes_dgm = header_struct.size + len(body) + 4
+    return header_struct.pack(num_bytes_dgm, b'#MWC', dgm_version, 0, 2040, 1000, 0) + body + \
+        struct.pack("I", num_bytes_dgm)
+
+
+def partition(datagram):
+    """
+    Splits datagram into partitions as sent by a PU (revision I+: common part repeated in every partition).
+    :param datagram: Datagram (bytes).
+    :return: List of partitions (bytes).
+    """
+    header_fields = k.peek_EMdgmHeader(datagram)
+    length_to_strip = k.get_m_header_size(header_fields[1], header_fields[2]) + \
+        k.get_struct(header_fields[1], 'cmnPart', header_fields[2]).size
+    leading = datagram[:length_to_strip]
+    payload = datagram[length_to_strip:-4]
+    chunk_size = MAX_PARTITION_SIZE - length_to_strip - 4
+    chunks = [payload[i:i + chunk_size] for i in range(0, len(payload), chunk_size)]
+
+    partitions = []
+    for dgm_num, chunk in enumerate(chunks, start=1):
+        part = bytearray(leading + chunk + struct.pack("I", len(leading) + len(chunk) + 4))
+        struct.pack_into("I", part, 0, len(part))
+        k.get_struct(header_fields[1], 'partition', header_fields[2]).pack_into(
+            part, k.get_struct(None, 'header', None).size, len(chunks), dgm_num)
+        partitions.append(bytes(part))
+    return partitions
+
+
+def parse_format_strings(data):
+    """
+    Header and partition info parsed as before precompiled structs: format strings built and compiled per call, and
+    the same dictionaries built as by read_EMdgm* (including 'dgdatetime').
+    """
+    file_io = io.BytesIO(data)
+    format_to_unpack = "1I4s2B1H2I"
+    fields = struct.unpack(format_to_unpack, file_io.read(struct.Struct(format_to_unpack).size))
+    header = {'numBytesDgm': fields[0], 'dgmType': fields[1], 'dgmVersion': fields[2], 'systemID': fields[3],
+              'echoSounderID': fields[4], 'time_sec': fields[5], 'time_nanosec': fields[6],
+              'dgTime': fields[5] + fields[6] / 1.0E9}
+    header['dgdatetime'] = datetime.datetime.utcfromtimestamp(header['dgTime'])
+    if header['dgmType'] == b'#MRZ' and header['dgmVersion'] in [0, 1, 2, 3] or \
+            header['dgmType'] == b'#MWC' and header['dgmVersion'] in [0, 1, 2]:
+        format_to_unpack = "2H"
+    fields = struct.unpack(format_to_unpack, file_io.read(struct.Struct(format_to_unpack).size))
+    partition = {'numOfDgms': fields[0], 'dgmNum': fields[1]}
+    return header, (partition['numOfDgms'], partition['dgmNum'])
+
+
+def parse_read(data):
+    """
+    Header and partition info parsed through read_EMdgm* (precompiled structs; BytesIO and dictionaries).
+    """
+    file_io = io.BytesIO(data)
+    header = k.read_EMdgmHeader(file_io)
+    partition = k.read_EMdgmMpartition(file_io, header['dgmType'], header['dgmVersion'])
+    return header, (partition['numOfDgms'], partition['dgmNum'])
+
+
+def parse_peek(data):
+    """
+    Header and partition info parsed through peek_EMdgm* (precompiled structs; unpack_from in place).
+    """
+    header_fields = k.peek_EMdgmHeader(data)
+    header = {'numBytesDgm': header_fields[0], 'dgmType': header_fields[1], 'dgmVersion': header_fields[2],
+              'dgTime': header_fields[5] + header_fields[6] / 1.0E9}
+    partition_fields = k.peek_EMdgmMpartition(data, header_fields[1], header_fields[2])
+    return header, partition_fields
+
+
+def parse_view(data):
+    """
+    Fields of full #MWC datagram used by KongsbergDGProcess, decoded through MWCView (lazy; columns of beam fields).
+    """
+    dg = MWCView(data)
+    return (dg.txInfo.heave_m, dg.rxInfo.numBeams, dg.rxInfo.TVGoffset_dB, dg.rxInfo.sampleFreq_Hz,
+            dg.rxInfo.soundVelocity_mPerSec, [sector_data.tiltAngleReTx_deg for sector_data in dg.txSectorData],
+            dg.beam_column('beamPointAngReVertical_deg'), dg.beam_column('beamTxSectorNum'),
+            dg.beam_column('detectedRangeInSamples'), dg.beam_column('numSampleData'), dg.sample_amplitudes())
+
+
+def time_per_call(function, argument, number):
+    """
+    :return: Best of 5 mean times (microseconds) per call of function(argument).
+    """
+    return min(timeit.repeat(lambda: function(argument), number=number, repeat=5)) / number * 1.0E6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--beams", type=int, default=256, help="Number of beams in #MWC datagram.")
+    parser.add_argument("--samples", type=int, default=1000, help="Number of samples per beam.")
+    parser.add_argument("--number", type=int, default=20000, help="Number of calls per timing.")
+    args = parser.parse_args()
+
+    datagram = build_mwc(args.beams, args.samples)
+    partitions = partition(datagram)
+    for function in [parse_read, parse_peek]:
+        header, partition_fields = function(partitions[-1])
+        reference_header, reference_partition_fields = parse_format_strings(partitions[-1])
+        assert (header.items() <= reference_header.items() and
+                tuple(partition_fields) == reference_partition_fields)
+
+    print("#MWC datagram: {} bytes in {} partitions.".format(len(datagram), len(partitions)))
+
+    peek_us = time_per_call(parse_peek, partitions[-1], args.number)
+    for name, function in [("format strings", parse_format_strings), ("read_EMdgm*", parse_read)]:
+        time_us = time_per_call(function, partitions[-1], args.number)
+        print("Header + partition, {:14s}: {:8.3f} us".format(name, time_us))
+    print("Header + partition, {:14s}: {:8.3f} us ({:.1f}x faster than read_EMdgm*)".format("peek_EMdgm*", peek_us,
+                                                                                           time_us / peek_us))
+
+    number = max(1, args.number // 1000)
+    read_us = time_per_call(lambda data: k.read_EMdgmMWC(io.BytesIO(data), return_numpy=True), datagram, number)
+    print("Full #MWC datagram, read_EMdgmMWC  : {:8.1f} us".format(read_us))
+    unpack_us = time_per_call(k.unpack_EMdgmMWC, datagram, number)
+    print("Full #MWC datagram, unpack_EMdgmMWC: {:8.1f} us ({:.1f}x faster than read_EMdgmMWC)".format(
+        unpack_us, read_us / unpack_us))
+    view_us = time_per_call(parse_view, datagram, number)
+    print("Full #MWC datagram, MWCView        : {:8.1f} us ({:.1f}x faster than read_EMdgmMWC)".format(
+        view_us, read_us / view_us))
+
+
+if __name__ == '__main__':
+    main()
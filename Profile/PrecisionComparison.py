@@ -0,0 +1,162 @@
+# Lynette Davis
+# ldavis@ccom.unh.edu
+# Center for Coastal and Ocean Mapping
+# University of New Hampshire
+# October 2026
+
+# Description: Precision check of binning of KongsbergDGProcess under the float32 precision policy ('precision' in
+# advanced settings), against the float64 policy. The same synthetic #MWC records (see KmallReaderBenchmark.build_mwc)
+# are binned under both policies, with and without pre-averaging and with averaging in dB and in linear intensity.
+# Records are built so that float32 rounds: heave, tilt and beam angles vary from ping to ping and are not aligned with
+# bins, sample spacing (sound speed / (2 * sample frequency)) is not a multiple or fraction of bin size, and linear
+# intensities (10 ^ (dB / 10)) of amplitudes are not exactly representable. Asserts that:
+#     - samples moved to another bin (across a bin edge, by rounding) are at most a given fraction of binned samples;
+#     - mean amplitude (dB) of bins with equal counts under both policies (rounding of accumulation only) deviates by
+#       at most a given tolerance;
+#     - rounding is exercised at all: some samples move, or some mean amplitude deviates.
+# Settings are those of GUI/Settings/sampleSettings.json (quality of service disabled). Exits with an assertion error on
+# failure. Run as:
+#     python Profile/PrecisionComparison.py [--pings 10] [--beams 256] [--samples 1000]
+
+import argparse
+import logging
+import numpy as np
+import os
+import sys
+
+# Makes WaterColumnPlotter importable when run as a script from any directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Profile.AllocationSteadyState import load_settings, make_process
+from Profile.KmallReaderBenchmark import build_mwc
+
+# Sample frequency (Hz) and sound speed (m/s) of synthetic records: sample spacing of about 0.0496 m
+SAMPLE_FREQ_HZ = 14993.7
+SOUND_SPEED_M_PER_SEC = 1487.3
+
+
+def build_pings(num_pings, num_beams, num_samples):
+    """
+    :param num_pings: Number of pings.
+    :param num_beams: Number of beams in each #MWC datagram.
+    :param num_samples: Number of samples per beam.
+    :return: List of #MWC datagrams (bytes) whose geometry falls at arbitrary positions relative to bin edges.
+    """
+    return [build_mwc(num_beams, num_samples, seed=ping, heave_m=0.3719 * np.sin(ping + 0.5),
+                      tilt_deg=1.37 * np.cos(ping), sample_freq_hz=SAMPLE_FREQ_HZ,
+                      sound_speed_m_per_sec=SOUND_SPEED_M_PER_SEC, beam_angle_jitter_deg=0.13)
+            for ping in range(num_pings)]
+
+
+def bin_pings(datagrams, precision, pre_averaging, linear_averaging):
+    """
+    :param datagrams: List of #MWC datagrams (bytes).
+    :param precision: Precision policy ('float32' or 'float64').
+    :param pre_averaging: Value of 'preAveraging' in advanced settings.
+    :param linear_averaging: Value of 'linearAveraging' in advanced settings.
+    :return: List of (amplitudes, counts) of pie chart grids (base bin size) of each datagram, as float64.
+    """
+    dg_process = make_process(load_settings(precision=precision, preAveraging=pre_averaging,
+                                            linearAveraging=linear_averaging))
+    grids = []
+    for datagram in datagrams:
+        dg_process.process_dgm(datagram)
+        pie_object = dg_process.queue_pie_object.get()
+        grids.append((pie_object.pie_chart_amplitudes.astype(np.float64),
+                      pie_object.pie_chart_counts.astype(np.float64)))
+    return grids
+
+
+def mean_db(amplitudes, counts, linear_averaging):
+    """
+    :param amplitudes: Summed amplitudes of bins (dB, or linear intensity when linear_averaging).
+    :param counts: Counts of bins (nonzero).
+    :param linear_averaging: True if amplitudes are linear intensities.
+    :return: Mean amplitude (dB) of bins.
+    """
+    if linear_averaging:
+        return 10 * np.log10(amplitudes / counts)
+    return amplitudes / counts
+
+
+def compare(grids_32, grids_64, linear_averaging):
+    """
+    :param grids_32: List of (amplitudes, counts) binned under float32 policy.
+    :param grids_64: List of (amplitudes, counts) binned under float64 policy.
+    :param linear_averaging: True if amplitudes are linear intensities.
+    :return: Number of binned samples (float64 policy); number of samples moved to another bin; maximum deviation
+    (dB) of mean amplitude of bins with equal counts.
+    """
+    total_count = 0
+    moved_count = 0
+    max_deviation_db = 0.0
+    for (amplitudes_32, counts_32), (amplitudes_64, counts_64) in zip(grids_32, grids_64):
+        total_count += np.sum(counts_64)
+        # Each moved sample (or range cell) is missing from one bin and added to another
+        moved_count += np.sum(np.abs(counts_32 - counts_64)) / 2
+
+        bins = (counts_32 > 0) & (counts_32 == counts_64)
+        if np.any(bins):
+            deviation_db = np.abs(mean_db(amplitudes_32[bins], counts_32[bins], linear_averaging) -
+                                  mean_db(amplitudes_64[bins], counts_64[bins], linear_averaging))
+            max_deviation_db = max(max_deviation_db, float(np.max(deviation_db)))
+    return total_count, moved_count, max_deviation_db
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pings", type=int, default=10, help="Number of pings.")
+    parser.add_argument("--beams", type=int, default=256, help="Number of beams in #MWC datagram.")
+    parser.add_argument("--samples", type=int, default=1000, help="Number of samples per beam.")
+    parser.add_argument("--max-moved-fraction", type=float, default=2e-5,
+                        help="Largest allowed fraction of binned samples moved to another bin.")
+    parser.add_argument("--max-deviation-db", type=float, default=1e-4,
+                        help="Largest allowed deviation (dB) of mean amplitude of bins with equal counts.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    # Warnings of samples beyond grid would be logged for every ping
+    logging.getLogger("WaterColumnPlotter.Kongsberg.KongsbergDGProcess").setLevel(logging.ERROR)
+
+    datagrams = build_pings(args.pings, args.beams, args.samples)
+
+    total_moved_count = 0
+    total_max_deviation_db = 0.0
+    for pre_averaging in [True, False]:
+        for linear_averaging in [False, True]:
+            # Debugging output of process_dgm is discarded
+            with open(os.devnull, 'w') as devnull:
+                stdout = sys.stdout
+                sys.stdout = devnull
+                try:
+                    grids_32 = bin_pings(datagrams, 'float32', pre_averaging, linear_averaging)
+                    grids_64 = bin_pings(datagrams, 'float64', pre_averaging, linear_averaging)
+                finally:
+                    sys.stdout = stdout
+
+            total_count, moved_count, max_deviation_db = compare(grids_32, grids_64, linear_averaging)
+            moved_fraction = moved_count / max(total_count, 1)
+            print("float32 vs float64 over {} pings ({} beams x {} samples, pre-averaging {}, {} averaging):"
+                  .format(args.pings, args.beams, args.samples, "on" if pre_averaging else "off",
+                          "linear" if linear_averaging else "dB"))
+            print("    binned: {:.0f}; moved to another bin: {:.0f} ({:.2e} of binned); max deviation of mean "
+                  "amplitude in bins with equal counts: {:.2e} dB"
+                  .format(total_count, moved_count, moved_fraction, max_deviation_db))
+
+            assert total_count > 0, "No samples binned."
+            assert moved_fraction <= args.max_moved_fraction, \
+                "{:.2e} of binned samples moved to another bin; more than {:.2e}." \
+                .format(moved_fraction, args.max_moved_fraction)
+            assert max_deviation_db <= args.max_deviation_db, \
+                "Mean amplitude of bins with equal counts deviates by {:.2e} dB; more than {:.2e} dB." \
+                .format(max_deviation_db, args.max_deviation_db)
+            total_moved_count += moved_count
+            total_max_deviation_db = max(total_max_deviation_db, max_deviation_db)
+
+    # Otherwise, synthetic records no longer exercise rounding, and the check above proves nothing
+    assert total_moved_count > 0 or total_max_deviation_db > 0, "float32 and float64 binning are identical."
+    print("Precision: OK")
+
+
+if __name__ == '__main__':
+    main()
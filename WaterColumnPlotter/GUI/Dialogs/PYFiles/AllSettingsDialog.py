@@ -27,6 +27,7 @@ class AllSettingsDialog(QtWidgets.QDialog):
     signalDepthAvgEdited = pyqtSignal(name="depthAvgEdited")
     signalAlongTrackAvgEdited = pyqtSignal(name="alongTrackAvgEdited")
     signalHeaveEdited = pyqtSignal(name="heaveEdited")
+    signalMsrMaskingEdited = pyqtSignal(name="msrMaskingEdited")
     signalGridCellsEdited = pyqtSignal(name="gridCellsEdited")
     signalPingBufferEdited = pyqtSignal(name="pingBufferEdited")
     signalsettingsEdited = pyqtSignal(name="settingsEdited")
@@ -104,6 +105,7 @@ class AllSettingsDialog(QtWidgets.QDialog):
         self.ui.doubleSpinBoxDepthAvg.setValue(round(self.settings['processing_settings']['depthAvg_m'], 2))
         self.ui.spinBoxAlongTrackAvg.setValue(int(self.settings['processing_settings']['alongTrackAvg_ping']))
         self.ui.doubleSpinBoxMaxHeave.setValue(round(self.settings['processing_settings']['maxHeave_m'], 2))
+        self.ui.checkBoxMsrMasking.setChecked(self.settings['processing_settings']['msrMasking'])
 
         # Buffer Settings
         self.ui.spinBoxMaxGridCells.setValue(int(self.settings['buffer_settings']['maxGridCells']))
@@ -126,6 +128,7 @@ class AllSettingsDialog(QtWidgets.QDialog):
         depthAvgEdited = False
         alongTrackAvgEdited = False
         heaveEdited = False
+        msrMaskingEdited = False
         gridCellsEdited = False
         pingBufferEdited = False
 
@@ -259,6 +262,13 @@ class AllSettingsDialog(QtWidgets.QDialog):
             self.ui.doubleSpinBoxMaxHeave.setValue(round(self.settings['processing_settings']['maxHeave_m'], 2))
             heaveEdited = True
 
+        # msrMasking (not present in settings files saved by earlier versions)
+        if 'msrMasking' in loadSettings['processing_settings'] and \
+                self.settings['processing_settings']['msrMasking'] != loadSettings['processing_settings']['msrMasking']:
+            self.settings['processing_settings']['msrMasking'] = loadSettings['processing_settings']['msrMasking']
+            self.ui.checkBoxMsrMasking.setChecked(self.settings['processing_settings']['msrMasking'])
+            msrMaskingEdited = True
+
         # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
         # Buffer Settings:
 
@@ -276,10 +286,19 @@ class AllSettingsDialog(QtWidgets.QDialog):
             self.ui.spinBoxMaxPingBuffer.setValue(int(self.settings['buffer_settings']['maxBufferSize_ping']))
             pingBufferEdited = True
 
+        # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
+        # Advanced Settings:
+        # Note: Advanced settings have no fields in settings dialog; like buffer settings,
+        # they are only applied at initialization.
+        if 'advanced_settings' in loadSettings:
+            for key in self.settings['advanced_settings']:
+                if key in loadSettings['advanced_settings']:
+                    self.settings['advanced_settings'][key] = loadSettings['advanced_settings'][key]
+
         # Only emit signals after all values in dictionary have been updated:
         self.emitSignals(systemEdited, ipEdited, portEdited, protocolEdited, socketBufferEdited, binSizeEdited,
                          acrossTrackAvgEdited, depthEdited, depthAvgEdited, alongTrackAvgEdited, heaveEdited,
-                         gridCellsEdited, pingBufferEdited)
+                         msrMaskingEdited, gridCellsEdited, pingBufferEdited)
 
     def validateAndSetValuesFromDialog(self):
         """
@@ -296,6 +315,7 @@ class AllSettingsDialog(QtWidgets.QDialog):
         depthAvgEdited = False
         alongTrackAvgEdited = False
         heaveEdited = False
+        msrMaskingEdited = False
         gridCellsEdited = False
         pingBufferEdited = False
 
@@ -404,6 +424,11 @@ class AllSettingsDialog(QtWidgets.QDialog):
             self.settings['processing_settings']['maxHeave_m'] = round(self.ui.doubleSpinBoxMaxHeave.value(), 2)
             heaveEdited = True
 
+        # msrMasking
+        if self.settings['processing_settings']['msrMasking'] != self.ui.checkBoxMsrMasking.isChecked():
+            self.settings['processing_settings']['msrMasking'] = self.ui.checkBoxMsrMasking.isChecked()
+            msrMaskingEdited = True
+
         # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # # #
         # Buffer Settings:
 
@@ -420,13 +445,13 @@ class AllSettingsDialog(QtWidgets.QDialog):
         # Only emit signals after all values in dictionary have been updated:
         self.emitSignals(systemEdited, ipEdited, portEdited, protocolEdited, socketBufferEdited, binSizeEdited,
                          acrossTrackAvgEdited, depthEdited, depthAvgEdited, alongTrackAvgEdited, heaveEdited,
-                         gridCellsEdited, pingBufferEdited)
+                         msrMaskingEdited, gridCellsEdited, pingBufferEdited)
 
         return True
 
     def emitSignals(self, systemEdited, ipEdited, portEdited, protocolEdited, socketBufferEdited, binSizeEdited,
                     acrossTrackAvgEdited, depthEdited, depthAvgEdited, alongTrackAvgEdited, heaveEdited,
-                    gridCellsEdited, pingBufferEdited):
+                    msrMaskingEdited, gridCellsEdited, pingBufferEdited):
         """
         Emits signals for all True parameters.
         :param systemEdited: Boolean indicating whether system field was edited.
@@ -439,6 +464,7 @@ class AllSettingsDialog(QtWidgets.QDialog):
         :param depthAvgEdited: Boolean indicating whether depthAvg field was edited.
         :param alongTrackAvgEdited: Boolean indicating whether alongTrackAvg field was edited.
         :param heaveEdited: Boolean indicating whether heave field was edited.
+        :param msrMaskingEdited: Boolean indicating whether msrMasking field was edited.
         :param gridCellsEdited: Boolean indicating whether gridCells field was edited.
         :param pingBufferEdited: Boolean indicating whether pingBuffer field was edited.
         """
@@ -464,6 +490,8 @@ class AllSettingsDialog(QtWidgets.QDialog):
             self.alongTrackAvgEdited.emit()
         if heaveEdited:
             self.heaveEdited.emit()
+        if msrMaskingEdited:
+            self.msrMaskingEdited.emit()
         if gridCellsEdited:
             self.gridCellsEdited.emit()
         if pingBufferEdited:
@@ -472,5 +500,5 @@ class AllSettingsDialog(QtWidgets.QDialog):
         # If any settings edited, emit settingsEdited signal
         if systemEdited or ipEdited or portEdited or protocolEdited or socketBufferEdited or \
                 binSizeEdited or acrossTrackAvgEdited or depthEdited or depthAvgEdited or \
-                alongTrackAvgEdited or heaveEdited or gridCellsEdited or pingBufferEdited:
+                alongTrackAvgEdited or heaveEdited or msrMaskingEdited or gridCellsEdited or pingBufferEdited:
             self.settingsEdited.emit()
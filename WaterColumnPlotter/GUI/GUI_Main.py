@@ -6,8 +6,10 @@
 
 # Description: Main class for Water Column Plotter. Initiates GUI and all other processes.
 
+from datetime import datetime
 import json
 import multiprocessing
+import os
 from PyQt5.QtWidgets import QApplication, QFileDialog, QMainWindow
 from PyQt5.QtCore import QTimer
 import sys
@@ -31,8 +33,17 @@ class MainWindow(QMainWindow):
                          'ip_settings': {'ip': '127.0.0.1', 'port': 6020, 'protocol': "UDP",
                                          'socketBufferMultiplier': 4},
                          'processing_settings': {'binSize_m': 0.20, 'acrossTrackAvg_m': 10, 'depth_m': 2,
-                                                 'depthAvg_m': 2, 'alongTrackAvg_ping': 5, 'maxHeave_m': 2.5},
-                         'buffer_settings': {'maxGridCells': 500, 'maxBufferSize_ping': 1000}}
+                                                 'depthAvg_m': 2, 'alongTrackAvg_ping': 5, 'maxHeave_m': 2.5,
+                                                 'msrMasking': False},
+                         'buffer_settings': {'maxGridCells': 500, 'maxBufferSize_ping': 1000},
+                         'advanced_settings': {'precision': "float32", 'slicesOnly': False,
+                                               'preAveraging': True, 'linearAveraging': False, 'qos': True,
+                                               'qosTargetLatency_sec': 1.0, 'rayTracing': False,
+                                               'svpFile': "", 'binSizeLevels': 1, 'projectionCache': True,
+                                               'additionalVerticalSlices': [], 'additionalHorizontalSlices': [],
+                                               'sampleStore': False, 'sampleStoreSize_MB': 256, 'kernelThreads': 0,
+                                               'dumpMinutes': 5,
+                                               'allocationDiagnostics': False, 'profile': False}}
 
         # Shared queue to contain pie objects:
         self.queue_pie = multiprocessing.Queue()
@@ -67,6 +78,8 @@ class MainWindow(QMainWindow):
         # Must wait for OK or Close on settings dialog to initialize shared memory and ring buffers.
         self.waterColumn.initRingBuffers(create_shmem=True)
         self.mdi.setSharedRingBufferProcessed(self.waterColumn.shared_ring_buffer_processed)
+        self.mdi.setSliceNames(self.waterColumn.get_vertical_slice_names(),
+                               self.waterColumn.get_horizontal_slice_names())
 
     def playProcesses(self):
         """
@@ -100,6 +113,13 @@ class MainWindow(QMainWindow):
         with self.waterColumn.full_ping_count.get_lock() and self.waterColumn.discard_ping_count.get_lock():
             self.status.set_ping_counts(self.waterColumn.full_ping_count.value,
                                         self.waterColumn.discard_ping_count.value)
+        with self.waterColumn.qos_level.get_lock() and self.waterColumn.qos_degraded_ping_count.get_lock():
+            self.status.set_qos(self.waterColumn.qos_level.value, self.waterColumn.qos_degraded_ping_count.value)
+        self.status.set_processing_latency(self.waterColumn.get_processing_latency(50),
+                                           self.waterColumn.get_processing_latency(99))
+        self.status.set_processed_generation(self.waterColumn.get_processed_buffer_generation(),
+                                             self.waterColumn.is_recalculating())
+        self.status.set_dump_status(self.waterColumn.get_dump_status())
 
     def updatePlot(self):
         """
@@ -122,6 +142,13 @@ class MainWindow(QMainWindow):
                 #        -(self.settings['processing_settings']['maxHeave_m'] /
                 #          self.settings['processing_settings']['binSize_m']))
 
+                # Overlay detected bottom
+                temp_bottom = self.waterColumn.get_bottom_polyline()
+                if temp_bottom is not None:
+                    self.mdi.pieWidget.setBottomPolyline(*temp_bottom)
+                else:
+                    self.mdi.pieWidget.clearBottomPolyline()
+
                 self.mdi.pieWidget.updateTimestampAndIntensity()
                 # # Plots vertical line
                 # y = [0, 50]
@@ -133,7 +160,7 @@ class MainWindow(QMainWindow):
         if self.waterColumn.get_processed_buffer_length() > 0:
 
             # UPDATE VERTICAL PLOT
-            temp_vertical = self.waterColumn.get_vertical_slice()
+            temp_vertical = self.waterColumn.get_vertical_slice(self.mdi.verticalWidget.slice_index)
             # temp_vertical, index_heave = self.waterColumn.get_vertical_slice()
             if temp_vertical is not None:
                 # if temp_vertical.any():  # For debugging
@@ -159,7 +186,7 @@ class MainWindow(QMainWindow):
                 self.mdi.verticalWidget.updateTimestampAndIntensity()
 
             # UPDATE HORIZONTAL PLOT
-            temp_horizontal = self.waterColumn.get_horizontal_slice()
+            temp_horizontal = self.waterColumn.get_horizontal_slice(self.mdi.horizontalWidget.slice_index)
             if temp_horizontal is not None:
                 # if temp_horizontal.any():  # For debugging
                 #     print("temp_horizontal.shape", temp_horizontal.shape)
@@ -246,6 +273,7 @@ class MainWindow(QMainWindow):
             self.waterColumn.bin_size.value = self.settings['processing_settings']['binSize_m']
 
         self.mdi.pieWidget.pie_plot.clear()
+        self.mdi.pieWidget.clearBottomPolyline()
         self.mdi.verticalWidget.vertical_plot.clear()
         self.mdi.horizontalWidget.horizontal_plot.clear()
 
@@ -319,6 +347,13 @@ class MainWindow(QMainWindow):
         with self.waterColumn.max_heave.get_lock():
             self.waterColumn.max_heave.value = self.settings['processing_settings']['maxHeave_m']
 
+    def msrMaskingEdited(self):
+        """
+        Updates minimum slant range masking settings.
+        """
+        with self.waterColumn.msr_masking.get_lock():
+            self.waterColumn.msr_masking.value = self.settings['processing_settings']['msrMasking']
+
     # BUFFER SETTINGS SLOTS:
     # TODO: Link to other processes
     def gridCellsEdited(self):
@@ -373,6 +408,7 @@ class MainWindow(QMainWindow):
         settingsDialog.signalAlongTrackAvgEdited.connect(self.alongTrackAvgEdited)
         print("displaySettingsDialog, after alongTrackSignal, ip: {}".format(self.waterColumn.ip_settings_edited))
         settingsDialog.signalHeaveEdited.connect(self.heaveEdited)
+        settingsDialog.signalMsrMaskingEdited.connect(self.msrMaskingEdited)
         settingsDialog.signalGridCellsEdited.connect(self.gridCellsEdited)
         settingsDialog.signalPingBufferEdited.connect(self.pingBufferEdited)
         settingsDialog.signalsettingsEdited.connect(self.settingsEdited)
@@ -404,6 +440,18 @@ class MainWindow(QMainWindow):
 
             settingsDialog.validateAndSetValuesFromFile(tempSettings)
 
+    def displayDumpBuffersDialog(self):
+        """
+        Launches file browser to enable user to select directory in which last dumpMinutes minutes of raw and
+        processed data are saved (see WaterColumn.dump_buffers); data are saved to a new subdirectory, in the
+        background.
+        """
+        directory = QFileDialog.getExistingDirectory(self, __appname__)
+
+        if directory:
+            self.waterColumn.dump_buffers(os.path.join(directory, "WaterColumnDump_" +
+                                                       datetime.now().strftime("%Y%m%d_%H%M%S")))
+
     def closeEvent(self, event):
         """
         This method is called when GUI MainWindows close (X) button is clicked. Deactivates SonarMain and PlotterMain
@@ -430,6 +478,7 @@ class MainWindow(QMainWindow):
         toolBar.signalPlay.connect(self.playProcesses)
         toolBar.signalPause.connect(self.pauseProcesses)
         toolBar.signalStop.connect(self.stopProcesses)
+        toolBar.signalSave.connect(self.displayDumpBuffersDialog)
         toolBar.signalSettings.connect(self.displaySettingsDialog)
 
         return toolBar
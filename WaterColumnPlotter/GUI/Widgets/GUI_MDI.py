@@ -50,6 +50,15 @@ class GUI_MDI(QMdiArea):
         self.pieWidget.setSharedRingBufferProcessed(self.shared_ring_buffer_processed)
         self.horizontalWidget.setSharedRingBufferProcessed(self.shared_ring_buffer_processed)
 
+    def setSliceNames(self, vertical_slice_names, horizontal_slice_names):
+        """
+        Provides vertical and horizontal widgets with names of slices to select from (see SliceRegistry).
+        :param vertical_slice_names: Names of vertical slices; index 0 is primary slice.
+        :param horizontal_slice_names: Names of horizontal slices; index 0 is primary slice.
+        """
+        self.verticalWidget.setSliceNames(vertical_slice_names)
+        self.horizontalWidget.setSliceNames(horizontal_slice_names)
+
 
     def __setupAndAddSubwindow(self, widget, width, height):
         """
@@ -5,9 +5,13 @@
 # November 2021
 
 # Description: Status Bar class for WaterColumnPlotter MainWindow;
-# initializes status bar to display number of received and lost pings.
+# initializes status bar to display number of received and lost pings, quality of service level,
+# processing time of pings and generation of processed ring buffer.
 
+import numpy as np
 from PyQt5.QtWidgets import QStatusBar, QGridLayout, QLabel, QSizePolicy, QWidget
+from WaterColumnPlotter.Kongsberg.QualityOfServiceController import QualityOfServiceController
+from WaterColumnPlotter.Plotter.LatencyHistogram import LatencyHistogram
 
 
 class GUI_StatusBar(QStatusBar):
@@ -27,6 +31,30 @@ class GUI_StatusBar(QStatusBar):
         self.addPermanentWidget(labelRxToLost)
         self.addPermanentWidget(self.labelRxToLostValues)
 
+        labelQos = QLabel("QoS Level, Degraded Pings", parent=self)
+        self.labelQosValues = QLabel("0:0", parent=self)
+
+        self.addPermanentWidget(labelQos)
+        self.addPermanentWidget(self.labelQosValues)
+
+        labelLatency = QLabel("Ping Processing (ms), p50:p99", parent=self)
+        self.labelLatencyValues = QLabel("-:-", parent=self)
+
+        self.addPermanentWidget(labelLatency)
+        self.addPermanentWidget(self.labelLatencyValues)
+
+        labelGeneration = QLabel("Slices Generation", parent=self)
+        self.labelGenerationValues = QLabel("0", parent=self)
+
+        self.addPermanentWidget(labelGeneration)
+        self.addPermanentWidget(self.labelGenerationValues)
+
+        labelDump = QLabel("Saved Data", parent=self)
+        self.labelDumpValues = QLabel("-", parent=self)
+
+        self.addPermanentWidget(labelDump)
+        self.addPermanentWidget(self.labelDumpValues)
+
     def set_ping_counts(self, full_count, discard_count):
         """
         Sets status bar labels with number of received (full_count) and lost (discard_count) pings.
@@ -35,3 +63,52 @@ class GUI_StatusBar(QStatusBar):
         (from partitioned datagrams)
         """
         self.labelRxToLostValues.setText(str(full_count) + ":" + str(discard_count))
+
+    def set_qos(self, level, degraded_count):
+        """
+        Sets status bar labels with current quality of service level and number of pings processed at reduced quality.
+        :param level: Integer indicating current quality of service level (see QualityOfServiceController).
+        :param degraded_count: Integer indicating number of pings processed at reduced quality.
+        """
+        self.labelQosValues.setText(str(level) + ":" + str(degraded_count))
+        self.labelQosValues.setToolTip(QualityOfServiceController.LEVEL_NAMES[level])
+
+    def set_processing_latency(self, median, p99):
+        """
+        Sets status bar labels with median and 99th percentile processing time of pings. Label displays
+        total processing time (LatencyHistogram.TOTAL); tooltip displays each stage.
+        :param median: Numpy array of median processing time (in milliseconds) of each stage of processing
+        (see LatencyHistogram.STAGE_NAMES); NaN for stages not yet timed.
+        :param p99: Numpy array of 99th percentile processing time (in milliseconds) of each stage of processing.
+        """
+        if np.isnan(median[LatencyHistogram.TOTAL]):
+            return
+        self.labelLatencyValues.setText("{:.3g}:{:.3g}".format(median[LatencyHistogram.TOTAL],
+                                                               p99[LatencyHistogram.TOTAL]))
+        self.labelLatencyValues.setToolTip("\n".join("{}: {:.3g}:{:.3g}".format(name, median[stage], p99[stage])
+                                                     for stage, name in enumerate(LatencyHistogram.STAGE_NAMES)))
+
+    def set_processed_generation(self, generation, recalculating):
+        """
+        Sets status bar label with generation of processed ring buffer (see SharedRingBufferProcessed).
+        :param generation: Integer indicating live generation of processed ring buffer.
+        :param recalculating: Boolean indicating whether processed ring buffer is being recalculated for new settings.
+        """
+        self.labelGenerationValues.setText(str(generation) + (" (recalculating)" if recalculating else ""))
+
+    def set_dump_status(self, status):
+        """
+        Sets status bar label with status of most recent dump of ring buffers to disk (see WaterColumn.dump_buffers).
+        :param status: None if ring buffers have not been written to disk; otherwise, fraction of pings written,
+        whether dump is still being written, and whether it failed.
+        """
+        if status is None:
+            self.labelDumpValues.setText("-")
+            return
+        progress, writing, failed = status
+        if failed:
+            self.labelDumpValues.setText("Failed")
+        elif writing:
+            self.labelDumpValues.setText("Saving ({:.0%})".format(progress))
+        else:
+            self.labelDumpValues.setText("Saved")
@@ -5,7 +5,7 @@
 # November 2021
 
 # Description: Description: Toolbar class for WaterColumnPlotter MainWindow;
-# initializes toolbar to display current IP, port, and buttons (play, pause, stop, settings).
+# initializes toolbar to display current IP, port, and buttons (play, pause, stop, save, settings).
 
 from PyQt5.QtCore import pyqtSignal
 from PyQt5.QtWidgets import QGroupBox, QLabel, QSizePolicy, QStyle, QToolBar, QToolButton, QVBoxLayout, QWidget
@@ -16,6 +16,7 @@ class GUI_Toolbar(QToolBar):
     signalPlay = pyqtSignal(name="playClicked")
     signalPause = pyqtSignal(name="pauseClicked")
     signalStop = pyqtSignal(name="stopClicked")
+    signalSave = pyqtSignal(name="saveClicked")
     signalSettings = pyqtSignal(name="settingsClicked")
 
     def __init__(self, settings, parent=None):
@@ -70,12 +71,23 @@ class GUI_Toolbar(QToolBar):
         # Connect signals / slots
         self.toolButtonStop.clicked.connect(self.stopButtonClicked)
 
+        iconSave = self.style().standardIcon(QStyle.SP_DialogSaveButton)
+        self.toolButtonSave = QToolButton(self)
+        self.toolButtonSave.setToolTip("Saves last {} minute(s) of raw and processed data to disk."
+                                       .format(settings['advanced_settings']['dumpMinutes']))
+        self.toolButtonSave.setIcon(iconSave)
+        self.toolButtonSave.setStyleSheet("QToolButton {background-color : rgb(240, 240, 240)}"
+                                          "QToolButton:pressed {background-color : rgb(158, 158, 158)}")
+        # Connect signals / slots
+        self.toolButtonSave.clicked.connect(self.saveClicked.emit)
+
         # Add widgets to toolbar:
         self.addWidget(groupBoxIPPort)
         self.addWidget(groupBoxSystem)
         self.addWidget(self.toolButtonPlay)
         self.addWidget(self.toolButtonPause)
         self.addWidget(self.toolButtonStop)
+        self.addWidget(self.toolButtonSave)
 
         # Spacer Widget:
         spacer = QWidget()
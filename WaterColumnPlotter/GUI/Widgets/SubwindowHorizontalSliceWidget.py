@@ -10,7 +10,7 @@
 import datetime
 import math
 from PyQt5.QtCore import pyqtSignal
-from PyQt5.QtWidgets import QDoubleSpinBox, QFrame, QHBoxLayout, QLabel, \
+from PyQt5.QtWidgets import QComboBox, QDoubleSpinBox, QFrame, QHBoxLayout, QLabel, \
     QPushButton, QSizePolicy, QStyle, QVBoxLayout, QWidget
 import pyqtgraph as pg
 
@@ -29,6 +29,8 @@ class SubwindowHorizontalSliceWidget(QWidget):
 
         self.settings = settings
         self.shared_ring_buffer_processed = shared_ring_buffer_processed
+        # Index of displayed slice (see SliceRegistry); 0 is primary slice
+        self.slice_index = 0
 
         # Mouse position
         self.matrix_x = None
@@ -94,6 +96,18 @@ class SubwindowHorizontalSliceWidget(QWidget):
         # TOP ROW:
         top_row_layout = QHBoxLayout()
 
+        # Slice selector: shown only when additional slices are defined (see setSliceNames)
+        self.labelSlice = QLabel("Slice:")
+        self.labelSlice.setVisible(False)
+        top_row_layout.addWidget(self.labelSlice)
+
+        self.comboBoxSlice = QComboBox()
+        self.comboBoxSlice.setToolTip("Horizontal slice to display. Additional slices are defined in advanced "
+                                      "settings.")
+        self.comboBoxSlice.setVisible(False)
+        self.comboBoxSlice.currentIndexChanged.connect(self.setSliceIndex)
+        top_row_layout.addWidget(self.comboBoxSlice)
+
         # Spacer Widget:
         spacer = QWidget()
         spacer.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Fixed)
@@ -139,6 +153,9 @@ class SubwindowHorizontalSliceWidget(QWidget):
         pushButtonCancel.clicked.connect(self.resetAll)
         top_row_layout.addWidget(pushButtonCancel)
 
+        # Settings of primary slice (see setSliceIndex)
+        self.primarySliceWidgets = [self.spinboxDepth, self.spinboxDepthAvg, pushButtonApply, pushButtonCancel]
+
         # BOTTOM ROW
         bottom_row_layout = QHBoxLayout()
 
@@ -201,6 +218,35 @@ class SubwindowHorizontalSliceWidget(QWidget):
         self.shared_ring_buffer_processed = shared_ring_buffer_processed
         self.plot.set_ring_buffer_processed_length(self.shared_ring_buffer_processed.SIZE_BUFFER)
 
+    def setSliceNames(self, slice_names):
+        """
+        Populates slice selector with names of horizontal slices (see SliceRegistry); selector is shown only when
+        additional slices are defined in advanced settings.
+        :param slice_names: Names of horizontal slices; index 0 is primary slice.
+        """
+        self.comboBoxSlice.blockSignals(True)
+        self.comboBoxSlice.clear()
+        self.comboBoxSlice.addItems(slice_names)
+        self.comboBoxSlice.blockSignals(False)
+        self.setSliceIndex(0)
+        self.labelSlice.setVisible(len(slice_names) > 1)
+        self.comboBoxSlice.setVisible(len(slice_names) > 1)
+
+    def setSliceIndex(self, slice_index):
+        """
+        Selects horizontal slice to display. Settings of this window define primary slice only, so they are enabled
+        only when primary slice is selected; additional slices are fixed by advanced settings.
+        :param slice_index: Index of horizontal slice (see SliceRegistry); 0 is primary slice.
+        """
+        slice_index = max(slice_index, 0)
+        if slice_index != self.slice_index:
+            # Previous slice is not left on screen when selected slice has no data yet
+            self.horizontal_plot.clear()
+        self.slice_index = slice_index
+        self.comboBoxSlice.setCurrentIndex(self.slice_index)
+        for widget in self.primarySliceWidgets:
+            widget.setEnabled(self.slice_index == 0)
+
     def mouseMoved(self, pos):
         """
         Function is called upon movement of mouse over plot.
@@ -246,8 +292,10 @@ class SubwindowHorizontalSliceWidget(QWidget):
         timestamp = float('nan')
         try:
             if not math.isnan(self.matrix_x):
-                temp_timestamp_buffer_elements = self.shared_ring_buffer_processed.view_buffer_elements(
-                    self.shared_ring_buffer_processed.timestamp_buffer_avg)
+                # Lock ensures that buffer of live generation is viewed (see SharedRingBufferProcessed)
+                with self.shared_ring_buffer_processed.get_lock():
+                    temp_timestamp_buffer_elements = self.shared_ring_buffer_processed.view_buffer_elements(
+                        self.shared_ring_buffer_processed.timestamp_buffer_avg)
 
                 # Ensure that index is less than length of buffer.
                 # Issues may occur here when bin_size is changed and shared_ring_buffer_processed is cleared.
@@ -290,8 +338,10 @@ class SubwindowHorizontalSliceWidget(QWidget):
                     #  instead of self.horizontal_plot...
                     # Ensure indices fall within matrix bounds
                     if 0 <= abs(round(self.plot_x)) < self.horizontal_plot.image.shape[0]:
-                        timestamp_epoch_sec = self.shared_ring_buffer_processed.view_buffer_elements(
-                            self.shared_ring_buffer_processed.timestamp_buffer_avg)[round(self.plot_x)]
+                        # Lock ensures that buffer of live generation is viewed (see SharedRingBufferProcessed)
+                        with self.shared_ring_buffer_processed.get_lock():
+                            timestamp_epoch_sec = self.shared_ring_buffer_processed.view_buffer_elements(
+                                self.shared_ring_buffer_processed.timestamp_buffer_avg)[round(self.plot_x)]
                         timestamp = datetime.datetime.utcfromtimestamp(timestamp_epoch_sec).time()
         except TypeError:  # Triggered when self.shared_ring_buffer_processed not fully initialized?
             pass
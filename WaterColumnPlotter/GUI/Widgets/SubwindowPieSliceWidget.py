@@ -65,6 +65,10 @@ class SubwindowPieSliceWidget(QWidget):
                                    self.settings['processing_settings']['binSize_m'])
         self.pie_plot.getView().addItem(self.depthIndicator)
 
+        # Polyline to indicate detected bottom; NaN values (no bottom detected) break line
+        self.bottomPolyline = pg.PlotDataItem(pen=pg.mkPen('w', width=1), connect='finite')
+        self.pie_plot.getView().addItem(self.bottomPolyline)
+
         # Omitted to decrease clutter over plot
         # # Horizontal lines to indicate width and position of horizontal slice
         # self.depthAvgIndicator1 = pg.InfiniteLine(angle=0, pen=pg.mkPen('c', width=1, style=Qt.DotLine), movable=False)
@@ -134,7 +138,8 @@ class SubwindowPieSliceWidget(QWidget):
         # Apply button
         iconApply = self.style().standardIcon(QStyle.SP_DialogApplyButton)
         pushButtonApply = QPushButton()
-        pushButtonApply.setToolTip("Apply (Note: Changes in bin size cannot be applied retroactively.)")
+        pushButtonApply.setToolTip("Apply (Note: Changes in bin size cannot be applied retroactively, "
+                                   "unless new bin size is one of the bin size levels binned in advance.)")
         pushButtonApply.setIcon(iconApply)
         pushButtonApply.clicked.connect(self.binSizeEditedFunction)
         top_row_layout.addWidget(pushButtonApply)
@@ -277,8 +282,10 @@ class SubwindowPieSliceWidget(QWidget):
         timestamp = float('nan')
         try:
             if self.intensity:  # Ensure that self.intensity is not None
-                timestamp_epoch_sec = self.shared_ring_buffer_processed.view_buffer_elements(
-                    self.shared_ring_buffer_processed.timestamp_buffer_avg)[-1]
+                # Lock ensures that buffer of live generation is viewed (see SharedRingBufferProcessed)
+                with self.shared_ring_buffer_processed.get_lock():
+                    timestamp_epoch_sec = self.shared_ring_buffer_processed.view_buffer_elements(
+                        self.shared_ring_buffer_processed.timestamp_buffer_avg)[-1]
                 timestamp = datetime.datetime.utcfromtimestamp(timestamp_epoch_sec).time()
         except TypeError:  # Triggered when self.shared_ring_buffer_processed not fully initialized?
             pass
@@ -328,6 +335,20 @@ class SubwindowPieSliceWidget(QWidget):
         self.depthAvgIndicator1.setPos(y1)
         self.depthAvgIndicator2.setPos(y2)
 
+    def setBottomPolyline(self, x, y):
+        """
+        Sets polyline to indicate detected bottom.
+        :param x: Across-track positions (by bin number) of detected bottom
+        :param y: Depths (by bin number) of detected bottom
+        """
+        self.bottomPolyline.setData(x, y)
+
+    def clearBottomPolyline(self):
+        """
+        Clears polyline indicating detected bottom.
+        """
+        self.bottomPolyline.clear()
+
     def setBinSize(self, binSize):
         """
         Sets value of bin size spinbox.
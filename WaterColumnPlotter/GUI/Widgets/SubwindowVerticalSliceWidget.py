@@ -9,7 +9,7 @@
 
 import datetime
 import math
-from PyQt5.QtWidgets import QDoubleSpinBox, QFrame, QHBoxLayout, QLabel, \
+from PyQt5.QtWidgets import QComboBox, QDoubleSpinBox, QFrame, QHBoxLayout, QLabel, \
     QPushButton, QSizePolicy, QStyle, QVBoxLayout, QWidget
 from PyQt5.QtCore import pyqtSignal, Qt
 import pyqtgraph as pg
@@ -27,6 +27,8 @@ class SubwindowVerticalSliceWidget(QWidget):
 
         self.settings = settings
         self.shared_ring_buffer_processed = shared_ring_buffer_processed
+        # Index of displayed slice (see SliceRegistry); 0 is primary slice
+        self.slice_index = 0
 
         # Mouse position
         self.matrix_x = None
@@ -117,6 +119,18 @@ class SubwindowVerticalSliceWidget(QWidget):
         # TOP ROW:
         top_row_layout = QHBoxLayout()
 
+        # Slice selector: shown only when additional slices are defined (see setSliceNames)
+        self.labelSlice = QLabel("Slice:")
+        self.labelSlice.setVisible(False)
+        top_row_layout.addWidget(self.labelSlice)
+
+        self.comboBoxSlice = QComboBox()
+        self.comboBoxSlice.setToolTip("Vertical slice to display. Additional slices are defined in advanced "
+                                      "settings.")
+        self.comboBoxSlice.setVisible(False)
+        self.comboBoxSlice.currentIndexChanged.connect(self.setSliceIndex)
+        top_row_layout.addWidget(self.comboBoxSlice)
+
         # Spacer Widget:
         spacer = QWidget()
         spacer.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Fixed)
@@ -150,6 +164,9 @@ class SubwindowVerticalSliceWidget(QWidget):
         pushButtonCancel.clicked.connect(self.resetAcrossTrackAvg)
         top_row_layout.addWidget(pushButtonCancel)
 
+        # Settings of primary slice (see setSliceIndex)
+        self.primarySliceWidgets = [self.spinboxAcrossTrackAvg, pushButtonApply, pushButtonCancel]
+
         # BOTTOM ROW
         bottom_row_layout = QHBoxLayout()
 
@@ -212,6 +229,35 @@ class SubwindowVerticalSliceWidget(QWidget):
         self.shared_ring_buffer_processed = shared_ring_buffer_processed
         self.plot.set_ring_buffer_processed_length(self.shared_ring_buffer_processed.SIZE_BUFFER)
 
+    def setSliceNames(self, slice_names):
+        """
+        Populates slice selector with names of vertical slices (see SliceRegistry); selector is shown only when
+        additional slices are defined in advanced settings.
+        :param slice_names: Names of vertical slices; index 0 is primary slice.
+        """
+        self.comboBoxSlice.blockSignals(True)
+        self.comboBoxSlice.clear()
+        self.comboBoxSlice.addItems(slice_names)
+        self.comboBoxSlice.blockSignals(False)
+        self.setSliceIndex(0)
+        self.labelSlice.setVisible(len(slice_names) > 1)
+        self.comboBoxSlice.setVisible(len(slice_names) > 1)
+
+    def setSliceIndex(self, slice_index):
+        """
+        Selects vertical slice to display. Settings of this window define primary slice only, so they are enabled
+        only when primary slice is selected; additional slices are fixed by advanced settings.
+        :param slice_index: Index of vertical slice (see SliceRegistry); 0 is primary slice.
+        """
+        slice_index = max(slice_index, 0)
+        if slice_index != self.slice_index:
+            # Previous slice is not left on screen when selected slice has no data yet
+            self.vertical_plot.clear()
+        self.slice_index = slice_index
+        self.comboBoxSlice.setCurrentIndex(self.slice_index)
+        for widget in self.primarySliceWidgets:
+            widget.setEnabled(self.slice_index == 0)
+
     # def setCoordinates(self):
     #     # https://stackoverflow.com/questions/63619065/pyqtgraph-use-arbitrary-values-for-axis-with-imageitem
     #     image_x = self.vertical_plot.image.shape[0]
@@ -299,8 +345,10 @@ class SubwindowVerticalSliceWidget(QWidget):
         timestamp = float('nan')
         try:
             if not math.isnan(self.matrix_x):
-                temp_timestamp_buffer_elements = self.shared_ring_buffer_processed.view_buffer_elements(
-                    self.shared_ring_buffer_processed.timestamp_buffer_avg)
+                # Lock ensures that buffer of live generation is viewed (see SharedRingBufferProcessed)
+                with self.shared_ring_buffer_processed.get_lock():
+                    temp_timestamp_buffer_elements = self.shared_ring_buffer_processed.view_buffer_elements(
+                        self.shared_ring_buffer_processed.timestamp_buffer_avg)
 
                 # Ensure that index is less than length of buffer.
                 # Issues may occur here when bin_size is changed and shared_ring_buffer_processed is cleared.
@@ -343,8 +391,10 @@ class SubwindowVerticalSliceWidget(QWidget):
                     #  instead of self.vertical_plot...
                     # Ensure indices fall within matrix bounds
                     if 0 <= abs(round(self.plot_x)) < self.vertical_plot.image.shape[0]:
-                        timestamp_epoch_sec = self.shared_ring_buffer_processed.view_buffer_elements(
-                            self.shared_ring_buffer_processed.timestamp_buffer_avg)[round(self.plot_x)]
+                        # Lock ensures that buffer of live generation is viewed (see SharedRingBufferProcessed)
+                        with self.shared_ring_buffer_processed.get_lock():
+                            timestamp_epoch_sec = self.shared_ring_buffer_processed.view_buffer_elements(
+                                self.shared_ring_buffer_processed.timestamp_buffer_avg)[round(self.plot_x)]
                         timestamp = datetime.datetime.utcfromtimestamp(timestamp_epoch_sec).time()
         except TypeError:  # Triggered when self.shared_ring_buffer_processed not fully initialized?
             pass
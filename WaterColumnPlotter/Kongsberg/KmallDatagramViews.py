@@ -0,0 +1,441 @@
+# Lynette Davis
+# ldavis@ccom.unh.edu
+# Center for Coastal and Ocean Mapping
+# University of New Hampshire
+# October 2026
+
+# Description: Lazy views of Kongsberg kmall datagrams (#MWC, #MRZ, #SKM, #SPO) held in a buffer (bytes, bytearray,
+# or memoryview). Offsets of sub-structs are computed once, from numBytes* fields, when a view is created; each field
+# is decoded (struct.unpack_from) only when accessed, as an attribute: e.g. MWCView(dg_bytes).rxInfo.numBeams.
+# Repeated sub-structs (beams, soundings, sensor samples) are also available as numpy columns over the buffer, and
+# sample data as numpy views, so that consumers pay only for the fields they read.
+# Field layouts follow KmallReaderForMDatagrams.STRUCT_FORMATS.
+
+import logging
+import numpy as np
+import re
+import struct
+from WaterColumnPlotter.Kongsberg.KmallReaderForMDatagrams import KmallReaderForMDatagrams as k
+
+logger = logging.getLogger(__name__)
+
+# Names of fields of each part of each sub-struct (in order of STRUCT_FORMATS), keyed by (dgmType, part).
+FIELD_NAMES = {
+    (None, 'header'): ('numBytesDgm', 'dgmType', 'dgmVersion', 'systemID', 'echoSounderID', 'time_sec',
+                       'time_nanosec'),
+    (None, 'Scommon'): ('numBytesCmnPart', 'sensorSystem', 'sensorStatus', 'padding'),
+    (b'#MRZ', 'pingInfo_a'): ('numBytesInfoData', 'padding0', 'pingRate_Hz', 'beamSpacing', 'depthMode',
+                              'subDepthMode', 'distanceBtwSwath', 'detectionMode', 'pulseForm', 'padding1',
+                              'frequencyMode_Hz', 'freqRangeLowLim_Hz', 'freqRangeHighLim_Hz',
+                              'maxTotalTxPulseLength_sec', 'maxEffTxPulseLength_sec', 'maxEffTxBandWidth_Hz',
+                              'absCoeff_dBPerkm', 'portSectorEdge_deg', 'starbSectorEdge_deg', 'portMeanCov_deg',
+                              'stbdMeanCov_deg', 'portMeanCov_m', 'starbMeanCov_m', 'modeAndStabilisation',
+                              'runtimeFilter1', 'runtimeFilter2', 'pipeTrackingStatus', 'transmitArraySizeUsed_deg',
+                              'receiveArraySizeUsed_deg', 'transmitPower_dB', 'SLrampUpTimeRemaining', 'padding2',
+                              'yawAngle_deg', 'numTxSectors', 'numBytesPerTxSector', 'headingVessel_deg',
+                              'soundSpeedAtTxDepth_mPerSec', 'txTransducerDepth_m', 'z_waterLevelReRefPoint_m',
+                              'x_kmallToall_m', 'y_kmallToall_m', 'latLongInfo', 'posSensorStatus',
+                              'attitudeSensorStatus', 'padding3'),
+    (b'#MRZ', 'pingInfo_b'): ('latitude_deg', 'longitude_deg', 'ellipsoidHeightReRefPoint_m'),
+    (b'#MRZ', 'pingInfo_c'): ('bsCorrectionOffset_dB', 'lambertsLawApplied', 'iceWindow', 'activeModes'),
+    (b'#MRZ', 'txSectorInfo_a'): ('txSectorNumb', 'txArrNumber', 'txSubArray', 'padding0', 'sectorTransmitDelay_sec',
+                                  'tiltAngleReTx_deg', 'txNominalSourceLevel_dB', 'txFocusRange_m', 'centreFreq_Hz',
+                                  'signalBandWidth_Hz', 'totalSignalLength_sec', 'pulseShading', 'signalWaveForm',
+                                  'padding1'),
+    (b'#MRZ', 'txSectorInfo_b'): ('highVoltageLeveldB', 'sectorTrackingCorr_dB', 'effectiveSignalLength'),
+    (b'#MRZ', 'rxInfo'): ('numBytesRxInfo', 'numSoundingsMaxMain', 'numSoundingsValidMain', 'numBytesPerSounding',
+                          'WCSampleRate', 'seabedImageSampleRate', 'BSnormal_dB', 'BSoblique_dB',
+                          'extraDetectionAlarmFlag', 'numExtraDetections', 'numExtraDetectionClasses',
+                          'numBytesPerClass'),
+    (b'#MRZ', 'extraDetClassInfo'): ('numExtraDetInClass', 'padding', 'alarmFlag'),
+    (b'#MRZ', 'sounding'): ('soundingIndex', 'txSectorNumb', 'detectionType', 'detectionMethod', 'rejectionInfo1',
+                            'rejectionInfo2', 'postProcessingInfo', 'detectionClass', 'detectionConfidenceLevel',
+                            'padding', 'rangeFactor', 'qualityFactor', 'detectionUncertaintyVer_m',
+                            'detectionUncertaintyHor_m', 'detectionWindowLength_sec', 'echoLength_sec', 'WCBeamNumb',
+                            'WCrange_samples', 'WCNomBeamAngleAcross_deg', 'meanAbsCoeff_dbPerkm', 'reflectivity1_dB',
+                            'reflectivity2_dB', 'receiverSensitivityApplied_dB', 'sourceLevelApplied_dB',
+                            'BScalibration_dB', 'TVG_dB', 'beamAngleReRx_deg', 'beamAngleCorrection_deg',
+                            'twoWayTravelTime_sec', 'twoWayTravelTimeCorrection_sec', 'deltaLatitude_deg',
+                            'deltaLongitude_deg', 'z_reRefPoint_m', 'y_reRefPoint_m', 'x_reRefPoint_m',
+                            'beamIncAngleAdj_deg', 'realTimeCleanInfo', 'SIstartRange_samples', 'SIcentreSample',
+                            'SInumSamples'),
+    (b'#MWC', 'txInfo'): ('numBytesTxInfo', 'numTxSectors', 'numBytesPerTxSector', 'padding', 'heave_m'),
+    (b'#MWC', 'txSectorData'): ('tiltAngleReTx_deg', 'centreFreq_Hz', 'txBeamWidthAlong_deg', 'txSectorNum',
+                                'padding'),
+    (b'#MWC', 'rxInfo'): ('numBytesRxInfo', 'numBeams', 'numBytesPerBeamEntry', 'phaseFlag', 'TVGfunctionApplied',
+                          'TVGoffset_dB', 'sampleFreq_Hz', 'soundVelocity_mPerSec'),
+    # (detectedRangeInSamplesHighResolution from dgmVersion 1)
+    (b'#MWC', 'rxBeamData'): ('beamPointAngReVertical_deg', 'startRangeSampleNum', 'detectedRangeInSamples',
+                              'beamTxSectorNum', 'numSampleData', 'detectedRangeInSamplesHighResolution'),
+    (b'#SPO', 'sensorData_a'): ('timeFromSensor_sec', 'timeFromSensor_nanosec', 'posFixQuality_m'),
+    (b'#SPO', 'sensorData_b'): ('correctedLat_deg', 'correctedLong_deg', 'speedOverGround_mPerSec',
+                                'courseOverGround_deg', 'ellipsoidHeightReRefPoint_m'),
+    (b'#SKM', 'info'): ('numBytesInfoPart', 'sensorSystem', 'sensorStatus', 'sensorInputFormat', 'numSamplesArray',
+                        'numBytesPerSample', 'sensorDataContents'),
+    # KMbinary:
+    (b'#SKM', 'sample_a'): ('dgmType', 'numBytesDgm', 'dgmVersion', 'time_sec', 'time_nanosec', 'status'),
+    (b'#SKM', 'sample_b'): ('latitude_deg', 'longitude_deg'),
+    (b'#SKM', 'sample_c'): ('ellipsoidHeight_m', 'roll_deg', 'pitch_deg', 'heading_deg', 'heave_m', 'rollRate',
+                            'pitchRate', 'yawRate', 'velNorth', 'velEast', 'velDown', 'latitudeError_m',
+                            'longitudeError_m', 'ellipsoidHeightError_m', 'rollError_deg', 'pitchError_deg',
+                            'headingError_deg', 'heaveError_m', 'northAcceleration', 'eastAcceleration',
+                            'downAcceleration'),
+    # KMdelayedHeave:
+    (b'#SKM', 'sample_d'): ('delayedHeaveTime_sec', 'delayedHeaveTime_nanosec', 'delayedHeave_m'),
+}
+for dgm_type in [b'#MRZ', b'#MWC']:
+    FIELD_NAMES[(dgm_type, 'partition')] = ('numOfDgms', 'dgmNum')
+    FIELD_NAMES[(dgm_type, 'cmnPart')] = ('numBytesCmnPart', 'pingCnt', 'rxFansPerPing', 'rxFanIndex',
+                                          'swathsPerPing', 'swathAlongPosition', 'txTransducerInd',
+                                          'rxTransducerInd', 'numRxTransducers', 'algorithmType')
+
+PART_SUFFIXES = ['', '_a', '_b', '_c', '_d']
+
+# Field tables, keyed by (dgmType, sub-struct, dgmVersion); built on first use (see get_fields)
+field_tables = {}
+
+
+def split_format(format_to_unpack):
+    """
+    Splits struct format into formats of single fields, with offset of each field (native alignment).
+    :param format_to_unpack: Struct format, e.g. "2H1f".
+    :return: List of tuples: format of field (e.g. "H", or "4s") and offset (bytes) of field.
+    """
+    fields = []
+    prefix = ""
+    for count, code in re.findall(r"(\d*)([a-zA-Z?])", format_to_unpack):
+        codes = [count + code] if code == 's' else [code] * int(count or 1)
+        for field_code in codes:
+            fields.append((field_code, struct.calcsize(prefix + field_code) - struct.calcsize(field_code)))
+            prefix += field_code
+    return fields
+
+
+def get_fields(dgm_type, sub_struct, dgm_version):
+    """
+    Gets field table of sub-struct: parts of sub-struct (e.g. pingInfo_a, pingInfo_b, pingInfo_c) are laid out one
+    after another, as read by KmallReaderForMDatagrams.
+    :param dgm_type: Byte string indicating type of datagram (e.g. b'#MWC'); None for header and S common part.
+    :param sub_struct: Name of sub-struct, without part suffix (e.g. 'pingInfo').
+    :param dgm_version: Kongsberg datagram version; None for header and S datagrams.
+    :return: Dictionary: field name -> tuple of precompiled single-field struct, offset (bytes) of field in
+    sub-struct, and numpy dtype of field.
+    """
+    key = (dgm_type, sub_struct, dgm_version)
+    fields = field_tables.get(key)
+    if fields is None:
+        fields = {}
+        part_offset = 0
+        for part in [sub_struct + suffix for suffix in PART_SUFFIXES]:
+            part_struct = k.STRUCTS.get((dgm_type, part, dgm_version))
+            if part_struct is None:
+                continue
+            for name, (field_code, field_offset) in zip(FIELD_NAMES[(dgm_type, part)],
+                                                        split_format(part_struct.format)):
+                field_dtype = np.dtype('S' + field_code[:-1] if field_code.endswith('s') else field_code)
+                fields[name] = (struct.Struct(field_code), part_offset + field_offset, field_dtype)
+            part_offset += part_struct.size
+        if not fields:
+            # Unsupported: warns and exits
+            k.get_struct(dgm_type, sub_struct, dgm_version)
+        field_tables[key] = fields
+    return fields
+
+
+class StructView:
+    """
+    Lazy view of one sub-struct in a buffer: fields are decoded only when accessed, as attributes.
+    """
+    __slots__ = ('buffer', 'offset', 'fields')
+
+    def __init__(self, buffer, offset, fields):
+        """
+        :param buffer: Buffer (bytes, bytearray, or memoryview) containing datagram.
+        :param offset: Offset (bytes) of sub-struct in buffer.
+        :param fields: Field table of sub-struct (see get_fields).
+        """
+        self.buffer = buffer
+        self.offset = offset
+        self.fields = fields
+
+    def __getattr__(self, name):
+        if name in StructView.__slots__:  # Not yet set (e.g. while unpickling)
+            raise AttributeError(name)
+        try:
+            field_struct, field_offset, field_dtype = self.fields[name]
+        except KeyError:
+            raise AttributeError("Sub-struct has no field '{}'.".format(name)) from None
+        return field_struct.unpack_from(self.buffer, self.offset + field_offset)[0]
+
+    def to_dict(self):
+        """
+        Decodes all fields. For debugging.
+        :return: Dictionary of all fields of sub-struct.
+        """
+        return {name: getattr(self, name) for name in self.fields}
+
+
+def strided_column(buffer, fields, name, offset, count, stride):
+    """
+    Column of a field of a repeated fixed-size sub-struct, as a (strided) numpy view of buffer; no data are copied.
+    :param buffer: Buffer (bytes, bytearray, or memoryview) containing datagram.
+    :param fields: Field table of sub-struct (see get_fields).
+    :param name: Name of field.
+    :param offset: Offset (bytes) of first sub-struct in buffer.
+    :param count: Number of sub-structs.
+    :param stride: Size (bytes) of each sub-struct.
+    :return: Numpy array (view of buffer; read-only if buffer is bytes).
+    """
+    field_struct, field_offset, field_dtype = fields[name]
+    return np.ndarray(shape=(count,), dtype=field_dtype, buffer=buffer, offset=offset + field_offset,
+                      strides=(stride,))
+
+
+class MWCView:
+    """
+    Lazy view of #MWC - Multibeam Water Column datagram. Beams are of varying length: offsets of beams are found
+    (once) on first access of beam data.
+    """
+    __slots__ = ('buffer', 'dgm_version', 'header', 'partition', 'cmnPart', 'txInfo', 'txSectorData', 'rxInfo',
+                 'beam_fields', 'beams_offset', 'beam_offsets', 'num_sample_data')
+
+    def __init__(self, buffer, offset=0):
+        """
+        :param buffer: Buffer (bytes, bytearray, or memoryview) containing complete (not 'empty') #MWC datagram.
+        :param offset: Offset (bytes) of datagram in buffer.
+        """
+        self.buffer = buffer
+        self.header = StructView(buffer, offset, get_fields(None, 'header', None))
+        offset += k.get_struct(None, 'header', None).size
+        dgm_type = b'#MWC'
+        self.dgm_version = dgm_version = self.header.dgmVersion
+
+        self.partition = StructView(buffer, offset, get_fields(dgm_type, 'partition', dgm_version))
+        offset += k.get_struct(dgm_type, 'partition', dgm_version).size
+        self.cmnPart = StructView(buffer, offset, get_fields(dgm_type, 'cmnPart', dgm_version))
+        offset += self.cmnPart.numBytesCmnPart
+        self.txInfo = StructView(buffer, offset, get_fields(dgm_type, 'txInfo', dgm_version))
+        offset += self.txInfo.numBytesTxInfo
+
+        num_bytes_per_tx_sector = self.txInfo.numBytesPerTxSector
+        sector_fields = get_fields(dgm_type, 'txSectorData', dgm_version)
+        self.txSectorData = [StructView(buffer, offset + sector * num_bytes_per_tx_sector, sector_fields)
+                             for sector in range(self.txInfo.numTxSectors)]
+        offset += len(self.txSectorData) * num_bytes_per_tx_sector
+
+        self.rxInfo = StructView(buffer, offset, get_fields(dgm_type, 'rxInfo', dgm_version))
+        self.beams_offset = offset + self.rxInfo.numBytesRxInfo
+        self.beam_fields = get_fields(dgm_type, 'rxBeamData', dgm_version)
+
+        # Found on first access of beam data (see find_beams)
+        self.beam_offsets = None
+        self.num_sample_data = None
+
+    def find_beams(self):
+        """
+        Finds offset of each beam (and its number of samples) by stepping over sample data of each beam.
+        :return: Numpy arrays of offset (bytes) of each beam in buffer, and number of samples in each beam.
+        """
+        if self.beam_offsets is None:
+            num_samples_struct, num_samples_offset, num_samples_dtype = self.beam_fields['numSampleData']
+            num_bytes_per_beam_entry = self.rxInfo.numBytesPerBeamEntry
+            # Bytes per sample: amplitude (int8), and phase (int8 if phaseFlag = 1; int16 if phaseFlag = 2)
+            bytes_per_sample = 1 + self.rxInfo.phaseFlag
+
+            beam_offsets = []
+            num_sample_data = []
+            offset = self.beams_offset
+            for beam in range(self.rxInfo.numBeams):
+                num_samples = num_samples_struct.unpack_from(self.buffer, offset + num_samples_offset)[0]
+                beam_offsets.append(offset)
+                num_sample_data.append(num_samples)
+                offset += num_bytes_per_beam_entry + num_samples * bytes_per_sample
+
+            self.beam_offsets = np.array(beam_offsets, dtype=np.int64)
+            self.num_sample_data = np.array(num_sample_data, dtype=np.int64)
+
+        return self.beam_offsets, self.num_sample_data
+
+    def beam(self, index):
+        """
+        :param index: Index of beam.
+        :return: StructView of EMdgmMWCrxBeamData fields of beam.
+        """
+        beam_offsets, num_sample_data = self.find_beams()
+        return StructView(self.buffer, int(beam_offsets[index]), self.beam_fields)
+
+    def beam_column(self, name):
+        """
+        Gathers a field of all beams.
+        :param name: Name of EMdgmMWCrxBeamData field, e.g. 'beamPointAngReVertical_deg'.
+        :return: Numpy array (one element per beam; dtype of field).
+        """
+        beam_offsets, num_sample_data = self.find_beams()
+        field_struct, field_offset, field_dtype = self.beam_fields[name]
+        raw_np = np.frombuffer(self.buffer, dtype=np.uint8)
+        byte_indices_np = (beam_offsets + field_offset)[:, np.newaxis] + np.arange(field_dtype.itemsize)
+        return raw_np[byte_indices_np].view(field_dtype).reshape(len(beam_offsets))
+
+    def sample_amplitudes(self):
+        """
+        :return: List of numpy (int8) views of buffer: sample amplitudes (0.5 dB resolution) of each beam.
+        """
+        beam_offsets, num_sample_data = self.find_beams()
+        # Slices of a single view of buffer (cheaper than a view per beam)
+        samples_np = np.frombuffer(self.buffer, dtype=np.int8)
+        start_np = beam_offsets + self.rxInfo.numBytesPerBeamEntry
+        return [samples_np[start:stop] for start, stop in zip(start_np.tolist(), (start_np + num_sample_data).tolist())]
+
+    def rx_beam_phases(self):
+        """
+        :return: List of numpy views of buffer: phase of each beam (int8, 180/128 degree resolution if phaseFlag = 1;
+        int16, 0.01 degree resolution if phaseFlag = 2); None if phaseFlag = 0.
+        """
+        phase_flag = self.rxInfo.phaseFlag
+        if phase_flag == 0:
+            return None
+        beam_offsets, num_sample_data = self.find_beams()
+        num_bytes_per_beam_entry = self.rxInfo.numBytesPerBeamEntry
+        phase_dtype = np.int8 if phase_flag == 1 else np.int16
+        return [np.frombuffer(self.buffer, dtype=phase_dtype, count=num_samples, offset=beam_offset +
+                              num_bytes_per_beam_entry + num_samples)
+                for beam_offset, num_samples in zip(beam_offsets.tolist(), num_sample_data.tolist())]
+
+
+class MRZView:
+    """
+    Lazy view of #MRZ - Multibeam Raw Range and Depth datagram.
+    """
+    __slots__ = ('buffer', 'dgm_version', 'header', 'partition', 'cmnPart', 'pingInfo', 'txSectorInfo', 'rxInfo',
+                 'extraDetClassInfo', 'sounding_fields', 'soundings_offset', 'num_soundings')
+
+    def __init__(self, buffer, offset=0):
+        """
+        :param buffer: Buffer (bytes, bytearray, or memoryview) containing #MRZ datagram.
+        :param offset: Offset (bytes) of datagram in buffer.
+        """
+        self.buffer = buffer
+        self.header = StructView(buffer, offset, get_fields(None, 'header', None))
+        offset += k.get_struct(None, 'header', None).size
+        dgm_type = b'#MRZ'
+        self.dgm_version = dgm_version = self.header.dgmVersion
+
+        self.partition = StructView(buffer, offset, get_fields(dgm_type, 'partition', dgm_version))
+        offset += k.get_struct(dgm_type, 'partition', dgm_version).size
+        self.cmnPart = StructView(buffer, offset, get_fields(dgm_type, 'cmnPart', dgm_version))
+        offset += self.cmnPart.numBytesCmnPart
+        self.pingInfo = StructView(buffer, offset, get_fields(dgm_type, 'pingInfo', dgm_version))
+        offset += self.pingInfo.numBytesInfoData
+
+        num_bytes_per_tx_sector = self.pingInfo.numBytesPerTxSector
+        sector_fields = get_fields(dgm_type, 'txSectorInfo', dgm_version)
+        self.txSectorInfo = [StructView(buffer, offset + sector * num_bytes_per_tx_sector, sector_fields)
+                             for sector in range(self.pingInfo.numTxSectors)]
+        offset += len(self.txSectorInfo) * num_bytes_per_tx_sector
+
+        self.rxInfo = StructView(buffer, offset, get_fields(dgm_type, 'rxInfo', dgm_version))
+        offset += self.rxInfo.numBytesRxInfo
+
+        num_bytes_per_class = self.rxInfo.numBytesPerClass
+        class_fields = get_fields(dgm_type, 'extraDetClassInfo', dgm_version)
+        self.extraDetClassInfo = [StructView(buffer, offset + detection_class * num_bytes_per_class, class_fields)
+                                  for detection_class in range(self.rxInfo.numExtraDetectionClasses)]
+        offset += len(self.extraDetClassInfo) * num_bytes_per_class
+
+        # Main soundings, followed by extra detections
+        self.soundings_offset = offset
+        self.num_soundings = self.rxInfo.numSoundingsMaxMain + self.rxInfo.numExtraDetections
+        self.sounding_fields = get_fields(dgm_type, 'sounding', dgm_version)
+
+    def sounding(self, index):
+        """
+        :param index: Index of sounding.
+        :return: StructView of EMdgmMRZ_sounding fields of sounding.
+        """
+        return StructView(self.buffer, self.soundings_offset + index * self.rxInfo.numBytesPerSounding,
+                          self.sounding_fields)
+
+    def sounding_column(self, name):
+        """
+        :param name: Name of EMdgmMRZ_sounding field, e.g. 'WCrange_samples'.
+        :return: Numpy array (strided view of buffer): field of each sounding (main soundings, then extra detections).
+        """
+        return strided_column(self.buffer, self.sounding_fields, name, self.soundings_offset, self.num_soundings,
+                              self.rxInfo.numBytesPerSounding)
+
+    def seabed_image_samples(self):
+        """
+        :return: Numpy (int16) view of buffer: seabed image samples (0.1 dB resolution) of all soundings.
+        """
+        num_samples = int(np.sum(self.sounding_column('SInumSamples'), dtype=np.int64))
+        return np.frombuffer(self.buffer, dtype=np.int16, count=num_samples,
+                             offset=self.soundings_offset + self.num_soundings * self.rxInfo.numBytesPerSounding)
+
+
+class SKMView:
+    """
+    Lazy view of #SKM - Sensor attitude and position (KMbinary) datagram.
+    """
+    __slots__ = ('buffer', 'header', 'info', 'sample_fields', 'samples_offset')
+
+    def __init__(self, buffer, offset=0):
+        """
+        :param buffer: Buffer (bytes, bytearray, or memoryview) containing #SKM datagram.
+        :param offset: Offset (bytes) of datagram in buffer.
+        """
+        self.buffer = buffer
+        self.header = StructView(buffer, offset, get_fields(None, 'header', None))
+        offset += k.get_struct(None, 'header', None).size
+        self.info = StructView(buffer, offset, get_fields(b'#SKM', 'info', None))
+        self.samples_offset = offset + self.info.numBytesInfoPart
+        self.sample_fields = get_fields(b'#SKM', 'sample', None)
+
+    def sample(self, index):
+        """
+        :param index: Index of sample.
+        :return: StructView of fields (KMbinary and KMdelayedHeave) of sample.
+        """
+        return StructView(self.buffer, self.samples_offset + index * self.info.numBytesPerSample, self.sample_fields)
+
+    def sample_column(self, name):
+        """
+        :param name: Name of KMbinary or KMdelayedHeave field, e.g. 'heave_m'.
+        :return: Numpy array (strided view of buffer): field of each sample.
+        """
+        return strided_column(self.buffer, self.sample_fields, name, self.samples_offset,
+                              self.info.numSamplesArray, self.info.numBytesPerSample)
+
+
+class SPOView:
+    """
+    Lazy view of #SPO - Sensor position datagram.
+    """
+    __slots__ = ('buffer', 'header', 'cmnPart', 'sensorData', 'pos_data_offset', 'pos_data_end')
+
+    def __init__(self, buffer, offset=0):
+        """
+        :param buffer: Buffer (bytes, bytearray, or memoryview) containing #SPO datagram.
+        :param offset: Offset (bytes) of datagram in buffer.
+        """
+        self.buffer = buffer
+        self.header = StructView(buffer, offset, get_fields(None, 'header', None))
+        # Datagram ends with a repeated (4 byte) length field
+        self.pos_data_end = offset + self.header.numBytesDgm - 4
+        offset += k.get_struct(None, 'header', None).size
+        self.cmnPart = StructView(buffer, offset, get_fields(None, 'Scommon', None))
+        offset += self.cmnPart.numBytesCmnPart
+        self.sensorData = StructView(buffer, offset, get_fields(b'#SPO', 'sensorData', None))
+        self.pos_data_offset = offset + k.get_struct(b'#SPO', 'sensorData_a', None).size + \
+            k.get_struct(b'#SPO', 'sensorData_b', None).size
+
+    def time_from_sensor(self):
+        """
+        :return: UTC time (seconds + nanoseconds remainder) from position sensor. Epoch 1970-01-01.
+        """
+        return self.sensorData.timeFromSensor_sec + self.sensorData.timeFromSensor_nanosec / 1.0E9
+
+    def pos_data_from_sensor(self):
+        """
+        :return: Position data as received from sensor (bytes), up to first line ending.
+        """
+        return bytes(self.buffer[self.pos_data_offset:max(self.pos_data_offset, self.pos_data_end)]).split(b'\r\n')[0]
@@ -8,6 +8,7 @@
 # Kongsberg kmall 'M' datagrams received directly from Kongsberg sonar system or SIS.
 
 import datetime
+import functools
 import logging
 import numpy as np
 import struct
@@ -16,11 +17,300 @@ import time
 
 logger = logging.getLogger(__name__)
 
+MRZ_VERSIONS = [0, 1, 2, 3]
+MWC_VERSIONS = [0, 1, 2]
+
+# Struct formats of fixed-size sub-structs, keyed by (dgmType, sub-struct, dgmVersion). dgmType and dgmVersion are
+# None where format is common to all datagram types or versions. A sub-struct that must be read in several steps
+# (native alignment would pad doubles) is split into parts _a, _b, _c, _d. Datagram versions absent from this table are
+# unsupported. (#SKM sample: KMbinary in parts _a - _c; KMdelayedHeave in part _d.)
+STRUCT_FORMATS = {(None, 'header', None): "1I4s2B1H2I",
+                  (None, 'Scommon', None): "4H",
+                  (b'#SPO', 'sensorData_a', None): "2I1f",
+                  (b'#SPO', 'sensorData_b', None): "2d3f",
+                  (b'#SVP', 'cmnPart_a', None): "2H4s1I",
+                  (b'#SVP', 'cmnPart_b', None): "2d",
+                  (b'#SVP', 'sensorData', None): "2f1I2f",
+                  (b'#SKM', 'info', None): "1H2B4H",
+                  (b'#SKM', 'sample_a', None): "4s2H3I",
+                  (b'#SKM', 'sample_b', None): "2d",
+                  (b'#SKM', 'sample_c', None): "21f",
+                  (b'#SKM', 'sample_d', None): "2I1f"}
+
+for version in MRZ_VERSIONS:
+    STRUCT_FORMATS.update({(b'#MRZ', 'partition', version): "2H",
+                           (b'#MRZ', 'cmnPart', version): "2H8B",
+                           (b'#MRZ', 'pingInfo_a', version): "2H1f6B1H11f2h2B1H1I3f2H1f2H6f4B",
+                           (b'#MRZ', 'pingInfo_b', version): "2d1f",
+                           (b'#MRZ', 'txSectorInfo_a', version): "4B7f2B1H",
+                           (b'#MRZ', 'rxInfo', version): "4H4f4H",
+                           (b'#MRZ', 'extraDetClassInfo', version): "1H1b1B",
+                           (b'#MRZ', 'sounding', version): "1H8B1H6f2H18f4H"})
+    if version > 0:
+        STRUCT_FORMATS.update({(b'#MRZ', 'pingInfo_c', version): "1f2B2H",
+                               (b'#MRZ', 'txSectorInfo_b', version): "3f"})
+
+for version in MWC_VERSIONS:
+    STRUCT_FORMATS.update({(b'#MWC', 'partition', version): "2H",
+                           (b'#MWC', 'cmnPart', version): "2H8B",
+                           (b'#MWC', 'txInfo', version): "3H1h1f",
+                           (b'#MWC', 'txSectorData', version): "3f1H1h",
+                           (b'#MWC', 'rxInfo', version): "2H3B1b2f",
+                           (b'#MWC', 'rxBeamData', version): "1f4H" if version == 0 else "1f4H1f"})
+
 
 class KmallReaderForMDatagrams:
+
+    # Precompiled structs (with cached sizes) for each entry of STRUCT_FORMATS; compiled once, at import.
+    STRUCTS = {key: struct.Struct(format_to_unpack) for key, format_to_unpack in STRUCT_FORMATS.items()}
+
     def __init__(self):
         pass
 
+    @staticmethod
+    def get_struct(dgm_type, sub_struct, dgm_version):
+        """
+        Gets precompiled struct for given sub-struct of given datagram type and version. Struct's format string and
+        size are available as struct.format and struct.size.
+        :param dgm_type: Byte string indicating type of datagram (e.g. b'#MWC'); None for header and S common part.
+        :param sub_struct: Name of sub-struct, e.g. 'header', 'partition', 'cmnPart', 'rxBeamData'.
+        :param dgm_version: Kongsberg datagram version; None for header and S datagrams.
+        :return: struct.Struct object.
+        """
+        try:
+            return KmallReaderForMDatagrams.STRUCTS[(dgm_type, sub_struct, dgm_version)]
+        except KeyError:
+            logger.warning("Datagram {} version {} unsupported.".format(dgm_type, dgm_version))
+            sys.exit(1)
+
+    @staticmethod
+    @functools.lru_cache(maxsize=1024)
+    def get_array_struct(count, type_code):
+        """
+        Gets precompiled struct for an array of given length and type (for example, sample amplitudes of a beam), so
+        that format strings of arrays are built and compiled once per length, rather than once per beam.
+        :param count: Number of elements in array.
+        :param type_code: Struct type code of elements, e.g. "b" (int8) or "h" (int16).
+        :return: struct.Struct object.
+        """
+        return struct.Struct(str(count) + type_code)
+
+    # ##### ----- METHODS FOR PEEKING AT M DATAGRAMS ----- ##### #
+    # Read fields in place (struct.unpack_from) from any buffer (bytes, bytearray, memoryview), without copying data
+    # or creating dictionaries. Used to buffer and reconstruct partitioned datagrams.
+
+    @staticmethod
+    def peek_EMdgmHeader(buffer, offset=0):
+        """
+        Reads general datagram header in place.
+        :param buffer: Buffer (bytes, bytearray, or memoryview) containing datagram.
+        :param offset: Offset (bytes) of datagram in buffer.
+        :return: A tuple containing EMdgmHeader ('header') fields: [0] = numBytesDgm; [1] = dgmType;
+        [2] = dgmVersion; [3] = systemID; [4] = echoSounderID; [5] = time_sec; [6] = time_nanosec.
+        """
+        return KmallReaderForMDatagrams.STRUCTS[(None, 'header', None)].unpack_from(buffer, offset)
+
+    @staticmethod
+    def peek_EMdgmMpartition(buffer, dgm_type, dgm_version, offset=0):
+        """
+        Reads multibeam (M) datagram partition info in place.
+        :param buffer: Buffer (bytes, bytearray, or memoryview) containing datagram.
+        :param dgm_type: Byte string indicating type of M datagram: b'#MRZ' or b'#MWC'
+        :param dgm_version: Kongsberg M datagram version.
+        :param offset: Offset (bytes) of datagram in buffer.
+        :return: A tuple containing EMdgmMpartition ('partition') fields: [0] = numOfDgms; [1] = dgmNum.
+        """
+        return KmallReaderForMDatagrams.get_struct(dgm_type, 'partition', dgm_version).unpack_from(
+            buffer, offset + KmallReaderForMDatagrams.STRUCTS[(None, 'header', None)].size)
+
+    @staticmethod
+    def peek_EMdgmMbody(buffer, dgm_type, dgm_version, offset=0):
+        """
+        Reads multibeam (M) datagram body part in place. Note that before Revision I, body part is only in first
+        partition of a partitioned datagram.
+        :param buffer: Buffer (bytes, bytearray, or memoryview) containing datagram.
+        :param dgm_type: Byte string indicating type of M datagram: b'#MRZ' or b'#MWC'
+        :param dgm_version: Kongsberg M datagram version.
+        :param offset: Offset (bytes) of datagram in buffer.
+        :return: A tuple containing EMdgmMbody ('cmnPart') fields (see read_EMdgmMbody); [1] = pingCnt.
+        """
+        return KmallReaderForMDatagrams.get_struct(dgm_type, 'cmnPart', dgm_version).unpack_from(
+            buffer, offset + KmallReaderForMDatagrams.get_m_header_size(dgm_type, dgm_version))
+
+    @staticmethod
+    def get_m_header_size(dgm_type, dgm_version):
+        """
+        :param dgm_type: Byte string indicating type of M datagram: b'#MRZ' or b'#MWC'
+        :param dgm_version: Kongsberg M datagram version.
+        :return: Size (bytes) of general datagram header plus partition info: offset of body part in an M datagram.
+        """
+        return KmallReaderForMDatagrams.STRUCTS[(None, 'header', None)].size + \
+            KmallReaderForMDatagrams.get_struct(dgm_type, 'partition', dgm_version).size
+
+    # ##### ----- METHODS FOR UNPACKING M DATAGRAMS FROM BUFFERS ----- ##### #
+    # Parallel to read_EMdgm* methods, but read from any buffer (bytes, bytearray, memoryview) at a given offset
+    # rather than from a File or Bytes_IO object: fields are unpacked in place (struct.unpack_from), and sample data
+    # are returned as numpy views of buffer (read-only if buffer is bytes), so that no bytes are copied while parsing.
+    # Each method returns a tuple of fields (as read_EMdgm* with return_fields=True) and offset of next sub-struct,
+    # skipping unknown fields as given by numBytes* fields.
+
+    @staticmethod
+    def unpack_EMdgmHeader(buffer, offset=0):
+        """
+        Unpacks general datagram header from buffer.
+        :param buffer: Buffer (bytes, bytearray, or memoryview) containing datagram.
+        :param offset: Offset (bytes) of header in buffer.
+        :return: A tuple containing EMdgmHeader ('header') fields (see read_EMdgmHeader), and offset of next
+        sub-struct.
+        """
+        struct_to_unpack = KmallReaderForMDatagrams.STRUCTS[(None, 'header', None)]
+        return struct_to_unpack.unpack_from(buffer, offset), offset + struct_to_unpack.size
+
+    @staticmethod
+    def unpack_EMdgmMpartition(buffer, dgm_type, dgm_version, offset):
+        """
+        Unpacks multibeam (M) datagram partition info from buffer.
+        :param buffer: Buffer (bytes, bytearray, or memoryview) containing datagram.
+        :param dgm_type: Byte string indicating type of M datagram: b'#MRZ' or b'#MWC'
+        :param dgm_version: Kongsberg M datagram version.
+        :param offset: Offset (bytes) of partition info in buffer.
+        :return: A tuple containing EMdgmMpartition ('partition') fields (see read_EMdgmMpartition), and offset of
+        next sub-struct.
+        """
+        struct_to_unpack = KmallReaderForMDatagrams.get_struct(dgm_type, 'partition', dgm_version)
+        return struct_to_unpack.unpack_from(buffer, offset), offset + struct_to_unpack.size
+
+    @staticmethod
+    def unpack_EMdgmMbody(buffer, dgm_type, dgm_version, offset):
+        """
+        Unpacks multibeam (M) datagram body part from buffer.
+        :param buffer: Buffer (bytes, bytearray, or memoryview) containing datagram.
+        :param dgm_type: Byte string indicating type of M datagram: b'#MRZ' or b'#MWC'
+        :param dgm_version: Kongsberg M datagram version.
+        :param offset: Offset (bytes) of body part in buffer.
+        :return: A tuple containing EMdgmMbody ('cmnPart') fields (see read_EMdgmMbody), and offset of next
+        sub-struct.
+        """
+        fields = KmallReaderForMDatagrams.get_struct(dgm_type, 'cmnPart', dgm_version).unpack_from(buffer, offset)
+        # [0] = numBytesCmnPart
+        return fields, offset + fields[0]
+
+    @staticmethod
+    def unpack_EMdgmMWC_txInfo(buffer, dgm_version, offset):
+        """
+        Unpacks #MWC - data block 1: transmit sectors, general info for all sectors.
+        :param buffer: Buffer (bytes, bytearray, or memoryview) containing datagram.
+        :param dgm_version: Kongsberg MWC datagram version.
+        :param offset: Offset (bytes) of sub-struct in buffer.
+        :return: A tuple containing EMdgmMWCtxInfo fields (see read_EMdgmMWC_txInfo), and offset of next sub-struct.
+        """
+        fields = KmallReaderForMDatagrams.get_struct(b'#MWC', 'txInfo', dgm_version).unpack_from(buffer, offset)
+        # [0] = numBytesTxInfo
+        return fields, offset + fields[0]
+
+    @staticmethod
+    def unpack_EMdgmMWC_txSectorData(buffer, dgm_version, offset, num_bytes_per_tx_sector=None):
+        """
+        Unpacks #MWC - data block 1: transmit sector data (one sector).
+        :param buffer: Buffer (bytes, bytearray, or memoryview) containing datagram.
+        :param dgm_version: Kongsberg MWC datagram version.
+        :param offset: Offset (bytes) of sub-struct in buffer.
+        :param num_bytes_per_tx_sector: Size (bytes) of sub-struct (numBytesPerTxSector, from txInfo); size of
+        known fields if None.
+        :return: A tuple containing EMdgmMWCtxSectorData fields (see read_EMdgmMWC_txSectorData), and offset of next
+        sub-struct.
+        """
+        struct_to_unpack = KmallReaderForMDatagrams.get_struct(b'#MWC', 'txSectorData', dgm_version)
+        if num_bytes_per_tx_sector is None:
+            num_bytes_per_tx_sector = struct_to_unpack.size
+        return struct_to_unpack.unpack_from(buffer, offset), offset + num_bytes_per_tx_sector
+
+    @staticmethod
+    def unpack_EMdgmMWC_rxInfo(buffer, dgm_version, offset):
+        """
+        Unpacks #MWC - data block 2: receiver, general info.
+        :param buffer: Buffer (bytes, bytearray, or memoryview) containing datagram.
+        :param dgm_version: Kongsberg MWC datagram version.
+        :param offset: Offset (bytes) of sub-struct in buffer.
+        :return: A tuple containing EMdgmMWCrxInfo fields (see read_EMdgmMWC_rxInfo), and offset of next sub-struct.
+        """
+        fields = KmallReaderForMDatagrams.get_struct(b'#MWC', 'rxInfo', dgm_version).unpack_from(buffer, offset)
+        # [0] = numBytesRxInfo
+        return fields, offset + fields[0]
+
+    @staticmethod
+    def unpack_EMdgmMWC_rxBeamData(buffer, dgm_version, offset, num_bytes_per_beam_entry=None, phase_flag=0):
+        """
+        Unpacks #MWC - data block 2: receiver, specific info for one beam, followed by its sample amplitudes (and
+        phase, if phase_flag > 0).
+        :param buffer: Buffer (bytes, bytearray, or memoryview) containing datagram.
+        :param dgm_version: Kongsberg MWC datagram version.
+        :param offset: Offset (bytes) of sub-struct in buffer.
+        :param num_bytes_per_beam_entry: Size (bytes) of sub-struct, excluding sample data (numBytesPerBeamEntry,
+        from rxInfo); size of known fields if None.
+        :param phase_flag: 0 = no phase; 1 = low resolution (int8) phase; 2 = high resolution (int16) phase
+        (phaseFlag, from rxInfo).
+        :return: A tuple containing EMdgmMWCrxBeamData fields (see read_EMdgmMWC_rxBeamData), where
+        sampleAmplitude05dB_p (and rxBeamPhase, if phase_flag > 0) are numpy views of buffer, and offset of next
+        sub-struct.
+        """
+        struct_to_unpack = KmallReaderForMDatagrams.get_struct(b'#MWC', 'rxBeamData', dgm_version)
+        fields = struct_to_unpack.unpack_from(buffer, offset)
+        offset += struct_to_unpack.size if num_bytes_per_beam_entry is None else num_bytes_per_beam_entry
+
+        # [4] = numSampleData
+        num_sample_data = fields[4]
+        sample_amplitude = np.frombuffer(buffer, dtype=np.int8, count=num_sample_data, offset=offset)
+        offset += num_sample_data
+
+        if phase_flag == 0:
+            return fields + (sample_amplitude,), offset
+        elif phase_flag in [1, 2]:
+            # Rx beam phase in 180/128 degree (int8) or 0.01 degree (int16) resolution.
+            phase_dtype = np.int8 if phase_flag == 1 else np.int16
+            rx_beam_phase = np.frombuffer(buffer, dtype=phase_dtype, count=num_sample_data, offset=offset)
+            return fields + (sample_amplitude, rx_beam_phase), offset + rx_beam_phase.nbytes
+        else:
+            logger.warning("Phase flag {} unsupported.".format(phase_flag))
+            sys.exit(1)
+
+    @classmethod
+    def unpack_EMdgmMWC(cls, buffer, offset=0):
+        """
+        Unpacks full #MWC - Multibeam Water Column Datagram from buffer, without copying sample data.
+        :param buffer: Buffer (bytes, bytearray, or memoryview) containing datagram.
+        :param offset: Offset (bytes) of datagram in buffer.
+        :return: A dictionary of tuples of fields: 'header', 'partition', 'cmnPart', 'txInfo', 'rxInfo'; a list of
+        tuples of fields for each sector ('sectorData') and each beam ('beamData'; sample amplitudes, and phase if
+        present, are numpy views of buffer). Also returns offset following datagram.
+        """
+        dg = {}
+        dg['header'], offset_next = cls.unpack_EMdgmHeader(buffer, offset)
+        # [0] = numBytesDgm; [1] = dgmType; [2] = dgmVersion
+        num_bytes_dgm, dgm_type, dgm_version = dg['header'][:3]
+
+        dg['partition'], offset_next = cls.unpack_EMdgmMpartition(buffer, dgm_type, dgm_version, offset_next)
+        dg['cmnPart'], offset_next = cls.unpack_EMdgmMbody(buffer, dgm_type, dgm_version, offset_next)
+        dg['txInfo'], offset_next = cls.unpack_EMdgmMWC_txInfo(buffer, dgm_version, offset_next)
+
+        # txInfo: [1] = numTxSectors; [2] = numBytesPerTxSector
+        dg['sectorData'] = []
+        for sector in range(dg['txInfo'][1]):
+            sector_data, offset_next = cls.unpack_EMdgmMWC_txSectorData(buffer, dgm_version, offset_next,
+                                                                        dg['txInfo'][2])
+            dg['sectorData'].append(sector_data)
+
+        dg['rxInfo'], offset_next = cls.unpack_EMdgmMWC_rxInfo(buffer, dgm_version, offset_next)
+
+        # rxInfo: [1] = numBeams; [2] = numBytesPerBeamEntry; [3] = phaseFlag
+        dg['beamData'] = []
+        for beam in range(dg['rxInfo'][1]):
+            beam_data, offset_next = cls.unpack_EMdgmMWC_rxBeamData(buffer, dgm_version, offset_next,
+                                                                    dg['rxInfo'][2], dg['rxInfo'][3])
+            dg['beamData'].append(beam_data)
+
+        return dg, offset + num_bytes_dgm
+
     # ##### ----- METHODS FOR READING ALL M DATAGRAMS ----- ##### #
     @staticmethod
     def read_EMdgmHeader(file_io, return_format=False, return_fields=False):
@@ -34,12 +324,12 @@ class KmallReaderForMDatagrams:
         [3] = systemID; [4] = echoSounderID; [5] = time_sec; [6] = time_nanosec.
         """
 
-        format_to_unpack = "1I4s2B1H2I"
+        struct_to_unpack = KmallReaderForMDatagrams.get_struct(None, 'header', None)
 
         if return_format:
-            return format_to_unpack
+            return struct_to_unpack.format
 
-        fields = struct.unpack(format_to_unpack, file_io.read(struct.Struct(format_to_unpack).size))
+        fields = struct_to_unpack.unpack(file_io.read(struct_to_unpack.size))
 
         if return_fields:
             return fields
@@ -92,16 +382,13 @@ class KmallReaderForMDatagrams:
 
         """
 
-        if dgm_type == b'#MRZ' and dgm_version in [0, 1, 2, 3] or dgm_type == b'#MWC' and dgm_version in [0, 1, 2]:
-            format_to_unpack = "2H"
-        else:
-            logger.warning("Datagram {} version {} unsupported.".format(dgm_type, dgm_version))
-            sys.exit(1)
+        # Supported for MRZ dgmVersion 0 - 3 and MWC dgmVersion 0 - 2 (others exit; see get_struct):
+        struct_to_unpack = KmallReaderForMDatagrams.get_struct(dgm_type, 'partition', dgm_version)
 
         if return_format:
-            return format_to_unpack
+            return struct_to_unpack.format
 
-        fields = struct.unpack(format_to_unpack, file_io.read(struct.Struct(format_to_unpack).size))
+        fields = struct_to_unpack.unpack(file_io.read(struct_to_unpack.size))
 
         if return_fields:
             return fields
@@ -139,16 +426,13 @@ class KmallReaderForMDatagrams:
                 Before Revision I, EMdgmMbody_def was only in the first partition."
         """
 
-        if dgm_type == b'#MRZ' and dgm_version in [0, 1, 2, 3] or dgm_type == b'#MWC' and dgm_version in [0, 1, 2]:
-            format_to_unpack = "2H8B"
-        else:
-            logger.warning("Datagram {} version {} unsupported.".format(dgm_type, dgm_version))
-            sys.exit(1)
+        # Supported for MRZ dgmVersion 0 - 3 and MWC dgmVersion 0 - 2 (others exit; see get_struct):
+        struct_to_unpack = KmallReaderForMDatagrams.get_struct(dgm_type, 'cmnPart', dgm_version)
 
         if return_format:
-            return format_to_unpack
+            return struct_to_unpack.format
 
-        fields = struct.unpack(format_to_unpack, file_io.read(struct.Struct(format_to_unpack).size))
+        fields = struct_to_unpack.unpack(file_io.read(struct_to_unpack.size))
 
         if return_fields:
             return fields
@@ -181,7 +465,7 @@ class KmallReaderForMDatagrams:
         dg['algorithmType'] = fields[9]
 
         # Skip unknown fields.
-        file_io.seek(dg['numBytesCmnPart'] - struct.Struct(format_to_unpack).size, 1)
+        file_io.seek(dg['numBytesCmnPart'] - struct_to_unpack.size, 1)
 
         return dg
 
@@ -204,22 +488,22 @@ class KmallReaderForMDatagrams:
         """
         if dgm_version in [0, 1, 2, 3]:
             # For some reason, reading this all in one step does not work.
-            format_to_unpack_a = "2H1f6B1H11f2h2B1H1I3f2H1f2H6f4B"
-            format_to_unpack_b = "2d1f"
+            struct_to_unpack_a = KmallReaderForMDatagrams.get_struct(b'#MRZ', 'pingInfo_a', dgm_version)
+            struct_to_unpack_b = KmallReaderForMDatagrams.get_struct(b'#MRZ', 'pingInfo_b', dgm_version)
             # Fields common to dgm_versions 0, 1, 2, 3:
-            fields_a = struct.unpack(format_to_unpack_a, file_io.read(struct.Struct(format_to_unpack_a).size))
-            fields_b = struct.unpack(format_to_unpack_b, file_io.read(struct.Struct(format_to_unpack_b).size))
+            fields_a = struct_to_unpack_a.unpack(file_io.read(struct_to_unpack_a.size))
+            fields_b = struct_to_unpack_b.unpack(file_io.read(struct_to_unpack_b.size))
 
             if dgm_version == 0:
                 if return_format:
-                    return format_to_unpack_a + format_to_unpack_b
+                    return struct_to_unpack_a.format + struct_to_unpack_b.format
                 if return_fields:
                     return fields_a + fields_b
             else:  # dgm_version in [1, 2, 3]:
-                format_to_unpack_c = "1f2B2H"
+                struct_to_unpack_c = KmallReaderForMDatagrams.get_struct(b'#MRZ', 'pingInfo_c', dgm_version)
                 if return_format:
-                    return format_to_unpack_a + format_to_unpack_b + format_to_unpack_c
-                fields_c = struct.unpack(format_to_unpack_c, file_io.read(struct.Struct(format_to_unpack_c).size))
+                    return struct_to_unpack_a.format + struct_to_unpack_b.format + struct_to_unpack_c.format
+                fields_c = struct_to_unpack_c.unpack(file_io.read(struct_to_unpack_c.size))
                 if return_fields:
                     return fields_a + fields_b + fields_c
 
@@ -378,8 +662,8 @@ class KmallReaderForMDatagrams:
 
             if dgm_version == 0:
                 # Skip unknown fields.
-                file_io.seek(dg['numBytesInfoData'] - struct.Struct(format_to_unpack_a).size -
-                             struct.Struct(format_to_unpack_b).size, 1)
+                file_io.seek(dg['numBytesInfoData'] - struct_to_unpack_a.size -
+                             struct_to_unpack_b.size, 1)
                 return dg
             else:  # dgm_version in [1, 2, 3]:
                 # Backscatter offset set in the installation menu
@@ -395,8 +679,8 @@ class KmallReaderForMDatagrams:
                 dg['activeModes'] = fields_c[3]
 
                 # Skip unknown fields.
-                file_io.seek(dg['numBytesInfoData'] - struct.Struct(format_to_unpack_a).size -
-                             struct.Struct(format_to_unpack_b).size - struct.Struct(format_to_unpack_c).size, 1)
+                file_io.seek(dg['numBytesInfoData'] - struct_to_unpack_a.size -
+                             struct_to_unpack_b.size - struct_to_unpack_c.size, 1)
                 return dg
 
         else:
@@ -419,20 +703,20 @@ class KmallReaderForMDatagrams:
             MRZ dgmVersion 3:
         """
         if dgm_version in [0, 1, 2, 3]:
-            format_to_unpack_a = "4B7f2B1H"
+            struct_to_unpack_a = KmallReaderForMDatagrams.get_struct(b'#MRZ', 'txSectorInfo_a', dgm_version)
             # Fields common to dgm_versions 0, 1, 2, 3:
-            fields_a = struct.unpack(format_to_unpack_a, file_io.read(struct.Struct(format_to_unpack_a).size))
+            fields_a = struct_to_unpack_a.unpack(file_io.read(struct_to_unpack_a.size))
 
             if dgm_version == 0:
                 if return_format:
-                    return format_to_unpack_a
+                    return struct_to_unpack_a.format
                 if return_fields:
                     return fields_a
             else:  # dgm_version in [1, 2, 3]:
-                format_to_unpack_b = "3f"
+                struct_to_unpack_b = KmallReaderForMDatagrams.get_struct(b'#MRZ', 'txSectorInfo_b', dgm_version)
                 if return_format:
-                    return format_to_unpack_a + format_to_unpack_b
-                fields_b = struct.unpack(format_to_unpack_b, file_io.read(struct.Struct(format_to_unpack_b).size))
+                    return struct_to_unpack_a.format + struct_to_unpack_b.format
+                fields_b = struct_to_unpack_b.unpack(file_io.read(struct_to_unpack_b.size))
                 if return_fields:
                     return fields_a + fields_b
 
@@ -508,12 +792,12 @@ class KmallReaderForMDatagrams:
             MRZ dgmVersion 3:
         """
         if dgm_version in [0, 1, 2, 3]:
-            format_to_unpack = "4H4f4H"
+            struct_to_unpack = KmallReaderForMDatagrams.get_struct(b'#MRZ', 'rxInfo', dgm_version)
 
             if return_format:
-                return format_to_unpack
+                return struct_to_unpack.format
 
-            fields = struct.unpack(format_to_unpack, file_io.read(struct.Struct(format_to_unpack).size))
+            fields = struct_to_unpack.unpack(file_io.read(struct_to_unpack.size))
 
             if return_fields:
                 return fields
@@ -548,7 +832,7 @@ class KmallReaderForMDatagrams:
             dg['numBytesPerClass'] = fields[11]
 
             # Skip unknown fields.
-            file_io(dg['numBytesRxInfo'] - struct.Struct(format_to_unpack).size, 1)
+            file_io.seek(dg['numBytesRxInfo'] - struct_to_unpack.size, 1)
 
             return dg
 
@@ -572,11 +856,11 @@ class KmallReaderForMDatagrams:
             MRZ dgmVersion 3:
         """
         if dgm_version in [0, 1, 2, 3]:
-            format_to_unpack = "1H1b1B"
+            struct_to_unpack = KmallReaderForMDatagrams.get_struct(b'#MRZ', 'extraDetClassInfo', dgm_version)
             if return_format:
-                return format_to_unpack
+                return struct_to_unpack.format
 
-            fields = struct.unpack(format_to_unpack, file_io.read(struct.Struct(format_to_unpack).size))
+            fields = struct_to_unpack.unpack(file_io.read(struct_to_unpack.size))
 
             if return_fields:
                 return fields
@@ -614,11 +898,11 @@ class KmallReaderForMDatagrams:
             MRZ dgmVersion 3:
         """
         if dgm_version in [0, 1, 2, 3]:
-            format_to_unpack = "1H8B1H6f2H18f4H"
+            struct_to_unpack = KmallReaderForMDatagrams.get_struct(b'#MRZ', 'sounding', dgm_version)
             if return_format:
-                return format_to_unpack
+                return struct_to_unpack.format
 
-            fields = struct.unpack(format_to_unpack, file_io.read(struct.Struct(format_to_unpack).size))
+            fields = struct_to_unpack.unpack(file_io.read(struct_to_unpack.size))
 
             if return_fields:
                 return fields
@@ -793,6 +1077,8 @@ class KmallReaderForMDatagrams:
         format_to_unpack = str(Nseabedimage_samples) + "h"
         dg['SIsample_desidB'] = struct.unpack(format_to_unpack, file_io.read(struct.Struct(format_to_unpack).size))
 
+        return dg
+
     # ##### ----- METHODS FOR READING MWC DATAGRAMS ----- ##### #
 
     @staticmethod
@@ -812,12 +1098,12 @@ class KmallReaderForMDatagrams:
         """
 
         if dgm_version in [0, 1, 2]:
-            format_to_unpack = "3H1h1f"
+            struct_to_unpack = KmallReaderForMDatagrams.get_struct(b'#MWC', 'txInfo', dgm_version)
 
             if return_format:
-                return format_to_unpack
+                return struct_to_unpack.format
 
-            fields = struct.unpack(format_to_unpack, file_io.read(struct.Struct(format_to_unpack).size))
+            fields = struct_to_unpack.unpack(file_io.read(struct_to_unpack.size))
 
             if return_fields:
                 return fields
@@ -837,7 +1123,7 @@ class KmallReaderForMDatagrams:
             dg['heave_m'] = fields[4]
 
             # Skip unknown fields.
-            file_io.seek(dg['numBytesTxInfo'] - struct.Struct(format_to_unpack).size, 1)
+            file_io.seek(dg['numBytesTxInfo'] - struct_to_unpack.size, 1)
 
             return dg
 
@@ -862,12 +1148,12 @@ class KmallReaderForMDatagrams:
         """
 
         if dgm_version in [0, 1, 2]:
-            format_to_unpack = "3f1H1h"
+            struct_to_unpack = KmallReaderForMDatagrams.get_struct(b'#MWC', 'txSectorData', dgm_version)
 
             if return_format:
-                return format_to_unpack
+                return struct_to_unpack.format
 
-            fields = struct.unpack(format_to_unpack, file_io.read(struct.Struct(format_to_unpack).size))
+            fields = struct_to_unpack.unpack(file_io.read(struct_to_unpack.size))
 
             if return_fields:
                 return fields
@@ -910,12 +1196,12 @@ class KmallReaderForMDatagrams:
         """
 
         if dgm_version in [0, 1, 2]:
-            format_to_unpack = "2H3B1b2f"
+            struct_to_unpack = KmallReaderForMDatagrams.get_struct(b'#MWC', 'rxInfo', dgm_version)
 
             if return_format:
-                return format_to_unpack
+                return struct_to_unpack.format
 
-            fields = struct.unpack(format_to_unpack, file_io.read(struct.Struct(format_to_unpack).size))
+            fields = struct_to_unpack.unpack(file_io.read(struct_to_unpack.size))
 
             if return_fields:
                 return fields
@@ -943,7 +1229,7 @@ class KmallReaderForMDatagrams:
             dg['soundVelocity_mPerSec'] = fields[7]
 
             # Skip unknown fields.
-            file_io.seek(dg['numBytesRxInfo'] - struct.Struct(format_to_unpack).size, 1)
+            file_io.seek(dg['numBytesRxInfo'] - struct_to_unpack.size, 1)
 
             return dg
 
@@ -960,6 +1246,8 @@ class KmallReaderForMDatagrams:
         :param return_format: Optional boolean parameter. When true, returns struct format string. Default is false.
         :param return_fields: Optional boolean parameter. When true, returns fields as a list;
         when false, returns fields as a dictionary. Default is false.
+        :param return_numpy: Optional boolean parameter. When true, sample amplitudes are returned as a numpy (int8)
+        array; when false, sample amplitudes are returned as a tuple. Default is false.
         :return: By default, a dictionary containing EMdgmMWCrxBeamData fields:
             MWC dgmVersion 0: [0] = beamPointAngReVertical_deg; [1] = startRangeSampleNum;
                 [2] = detectedRangeInSamples; [3] = beamTxSectorNum; [4] = numSampleData; [5] = sampleAmplitude05dB_p.
@@ -970,42 +1258,31 @@ class KmallReaderForMDatagrams:
                 (If phase_flag > 0: [7] = rxBeamPhase.)
             MWC dgmVersion 2 (REV I): (See dgmVersion 1 (REV G).)
         """
-        if dgm_version == 0:
-            format_to_unpack_a = "1f4H"
-        elif dgm_version in [1, 2]:
-            format_to_unpack_a = "1f4H1f"
-        else:
-            logger.warning("Datagram version {} unsupported.".format(dgm_version))
-            sys.exit(1)
+        # Fields preceding sample amplitudes: "1f4H" for dgmVersion 0; "1f4H1f" for dgmVersion 1, 2.
+        struct_to_unpack_a = KmallReaderForMDatagrams.get_struct(b'#MWC', 'rxBeamData', dgm_version)
 
         # if return_numpy:
         #     beamPointAngReVertical_deg_format = "1f"
         #     beamPointAngReVertical_deg = np.frombuffer(file_io.read(struct.calcsize(beamPointAngReVertical_deg_format)),
         #                                                dtype='<f4', count=1)
 
-        fields_a = struct.unpack(format_to_unpack_a, file_io.read(struct.Struct(format_to_unpack_a).size))
+        fields_a = struct_to_unpack_a.unpack(file_io.read(struct_to_unpack_a.size))
 
-        format_to_unpack_b = str(fields_a[4]) + "b"
+        struct_to_unpack_b = KmallReaderForMDatagrams.get_array_struct(fields_a[4], "b")
 
         if return_format:
-            return format_to_unpack_a + format_to_unpack_b
+            return struct_to_unpack_a.format + struct_to_unpack_b.format
 
 
-        # TODO: Numpy experiment:
-        # if return_numpy:
-        #     # Is the file_io.read here going to be inefficient?
-        #     # We basically start with binarry data from sonar, convert it to a file-like object with
-        #     # io.BytesIO(data), then convert it back to binary with read() command...
-        #     fields_b = np.frombuffer(file_io.read(struct.calcsize(format_to_unpack_b)),
-        #                                 dtype='|i1', count=fields_a[4])
-        #     print("Buffer test: ", fields_b)
-
-        # else:
         # Pointer to start of array with Water Column data. Length of array = numSampleData.
         # Sample amplitudes in 0.5 dB resolution. Size of array is numSampleData * int8_t.
         # Amplitude array is followed by phase information if phaseFlag >0.
         # Use (numSampleData * int8_t) to jump to next beam, or to start of phase info for this beam, if phase flag > 0.
-        fields_b = struct.unpack(format_to_unpack_b, file_io.read(struct.Struct(format_to_unpack_b).size))
+        if return_numpy and not return_fields:
+            # Sample amplitudes as a numpy (int8) array; avoids creating a python int for every sample.
+            fields_b = np.frombuffer(file_io.read(fields_a[4]), dtype=np.int8, count=fields_a[4])
+        else:
+            fields_b = struct_to_unpack_b.unpack(file_io.read(struct_to_unpack_b.size))
 
         if return_fields:
             return fields_a + fields_b
@@ -1051,15 +1328,15 @@ class KmallReaderForMDatagrams:
         """
 
         if dgm_version in [0, 1, 2]:
-            format_to_unpack = str(num_sample_data) + "b"
+            struct_to_unpack = KmallReaderForMDatagrams.get_array_struct(num_sample_data, "b")
         else:
             logger.warning("Datagram version {} unsupported.".format(dgm_version))
             sys.exit(1)
 
         if return_format:
-            return format_to_unpack
+            return struct_to_unpack.format
 
-        fields = struct.unpack(format_to_unpack, file_io.read(struct.Struct(format_to_unpack).size))
+        fields = struct_to_unpack.unpack(file_io.read(struct_to_unpack.size))
 
         if return_fields:
             return fields
@@ -1085,15 +1362,15 @@ class KmallReaderForMDatagrams:
         """
 
         if dgm_version in [0, 1, 2]:
-            format_to_unpack = str(num_sample_data) + "h"
+            struct_to_unpack = KmallReaderForMDatagrams.get_array_struct(num_sample_data, "h")
         else:
             logger.warning("Datagram version {} unsupported.".format(dgm_version))
             sys.exit(1)
 
         if return_format:
-            return format_to_unpack
+            return struct_to_unpack.format
 
-        fields = struct.unpack(format_to_unpack, file_io.read(struct.Struct(format_to_unpack).size))
+        fields = struct_to_unpack.unpack(file_io.read(struct_to_unpack.size))
 
         if return_fields:
             return fields
@@ -1175,6 +1452,269 @@ class KmallReaderForMDatagrams:
 
         return dg
 
+    # ##### ----- METHODS FOR READING S DATAGRAMS ----- ##### #
+
+    @staticmethod
+    def read_EMdgmScommon(file_io, return_format=False, return_fields=False):
+        """
+        Read sensor (S) output datagram - common part for all external sensors.
+        :param file_io: File or Bytes_IO object to be read.
+        :param return_format: Optional boolean parameter. When true, returns struct format string. Default is false.
+        :param return_fields: Optional boolean parameter. When true, returns fields as a list;
+        when false, returns fields as a dictionary. Default is false.
+        :return: A list containing EMdgmScommon ('cmnPart') fields: [0] = numBytesCmnPart; [1] = sensorSystem;
+        [2] = sensorStatus; [3] = padding.
+        """
+
+        struct_to_unpack = KmallReaderForMDatagrams.get_struct(None, 'Scommon', None)
+
+        if return_format:
+            return struct_to_unpack.format
+
+        fields = struct_to_unpack.unpack(file_io.read(struct_to_unpack.size))
+
+        if return_fields:
+            return fields
+
+        dg = {}
+
+        # Size in bytes of current struct. Used for denoting size of rest of
+        # datagram in cases where only one datablock is attached.
+        dg['numBytesCmnPart'] = fields[0]
+        # Sensor system number, as indicated when setting up the system in K-Controller installation menu. E.g.
+        # position system 0 refers to system POSI_1 in installation datagram #IIP.
+        dg['sensorSystem'] = fields[1]
+        # Sensor status. To indicate quality of sensor data is valid or invalid. Quality may be invalid even if sensor
+        # is active and the PU receives data. Bit code vary according to type of sensor.
+        # Bits 0 -7 common to all sensors and #MRZ sensor status:
+        '''
+                Bit:    Sensor data:
+                0       0 = Data OK; 1 = Data OK and sensor is chosen as active
+                1       0
+                2       0 = Data OK; 1 = Reduced performance
+                3       0
+                4       0 = Data OK; 1 = Invalid data
+                5       0
+                6       0 = Velocity from sensor; 1 = Velocity calculated by PU
+                7       0
+        '''
+        # For #SPO (position) and CPO (position compatibility) datagrams, bit 8 - 15:
+        '''
+                Bit:    Sensor data:
+                8       0
+                9       0 = Time from PU used (system); 1 = Time from datagram used (e.g. from GGA telegram)
+                10      0 = No motion correction; 1 = With motion correction
+                11      0 = Normal quality check; 1 = Operator quality check. Data always valid.
+                12 - 15 0
+        '''
+        dg['sensorStatus'] = fields[2]
+        # Byte alignment.
+        dg['padding'] = fields[3]
+
+        # Skip unknown fields.
+        file_io.seek(dg['numBytesCmnPart'] - struct_to_unpack.size, 1)
+
+        return dg
+
+    @staticmethod
+    def read_EMdgmSPOdataBlock(file_io, num_bytes_data_block, return_format=False, return_fields=False):
+        """
+        Read #SPO - Sensor position data block. Data from active sensor is corrected data for position system
+        installation parameters. Data is also corrected for motion (roll and pitch only) if enabled by K-Controller
+        operator. Data given both decoded and corrected (active sensors), and raw as received from sensor in text
+        string.
+        :param file_io: File or Bytes_IO object to be read.
+        :param num_bytes_data_block: Number of bytes remaining in datagram for data block, excluding the datagram's
+        trailing length field. (There is no field for the number of bytes in this record.)
+        :param return_format: Optional boolean parameter. When true, returns struct format string. Default is false.
+        :param return_fields: Optional boolean parameter. When true, returns fields as a list;
+        when false, returns fields as a dictionary. Default is false.
+        :return: A list containing EMdgmSPOdataBlock ('sensorData') fields: [0] = timeFromSensor_sec;
+        [1] = timeFromSensor_nanosec; [2] = posFixQuality_m; [3] = correctedLat_deg; [4] = correctedLong_deg;
+        [5] = speedOverGround_mPerSec; [6] = courseOverGround_deg; [7] = ellipsoidHeightReRefPoint_m;
+        [8] = posDataFromSensor.
+        """
+
+        # Reading this all in one step does not work: native alignment would pad the doubles.
+        struct_to_unpack_a = KmallReaderForMDatagrams.get_struct(b'#SPO', 'sensorData_a', None)
+        struct_to_unpack_b = KmallReaderForMDatagrams.get_struct(b'#SPO', 'sensorData_b', None)
+
+        if return_format:
+            return struct_to_unpack_a.format + struct_to_unpack_b.format
+
+        fields = struct_to_unpack_a.unpack(file_io.read(struct_to_unpack_a.size)) + \
+            struct_to_unpack_b.unpack(file_io.read(struct_to_unpack_b.size))
+
+        # Position data as received from sensor is of variable length (maximum MAX_SPO_DATALENGTH);
+        # read only what remains of the datagram.
+        pos_data_from_sensor = file_io.read(max(0, num_bytes_data_block - struct_to_unpack_a.size -
+                                                struct_to_unpack_b.size))
+        pos_data_from_sensor = pos_data_from_sensor.split(b'\r\n')[0]
+
+        if return_fields:
+            return fields + (pos_data_from_sensor,)
+
+        dg = {}
+
+        # UTC time from position sensor. Unit seconds. Epoch 1970-01-01. Nanosec part to be added for more exact time.
+        dg['timeFromSensor_sec'] = fields[0]
+        # UTC time from position sensor. Unit nano seconds remainder.
+        dg['timeFromSensor_nanosec'] = fields[1]
+        # UTC time from position sensor in seconds + Nano seconds remainder. Epoch 1970-01-01.
+        dg['timeFromSensor'] = fields[0] + fields[1] / 1.0E9
+        # Only if available as input from sensor. Calculation according to format.
+        dg['posFixQuality_m'] = fields[2]
+        # Motion corrected (if enabled in K-Controller) data as used in depth calculations. Referred to vessel
+        # reference point. Unit decimal degree. Parameter is set to define UNAVAILABLE_LATITUDE if sensor inactive.
+        dg['correctedLat_deg'] = fields[3]
+        # Motion corrected (if enabled in K-Controller) data as used in depth calculations. Referred to vessel
+        # reference point. Unit decimal degree. Parameter is set to define UNAVAILABLE_LONGITUDE if sensor inactive.
+        dg['correctedLong_deg'] = fields[4]
+        # Speed over ground. Unit m/s. Motion corrected (if enabled in K-Controller) data as used in depth calculations.
+        # If unavailable or from inactive sensor, value set to define UNAVAILABLE_SPEED.
+        dg['speedOverGround_mPerSec'] = fields[5]
+        # Course over ground. Unit degree. Motion corrected (if enabled in K-Controller) data as used in depth
+        # calculations. If unavailable or from inactive sensor, value set to define UNAVAILABLE_COURSE.
+        dg['courseOverGround_deg'] = fields[6]
+        # Height of vessel reference point above the ellipsoid. Unit meter.
+        # Motion corrected (if enabled in K-Controller) data as used in depth calculations.
+        # If unavailable or from inactive sensor, value set to define UNAVAILABLE_ELLIPSOIDHEIGHT.
+        dg['ellipsoidHeightReRefPoint_m'] = fields[7]
+        # Position data as received from sensor, i.e. uncorrected for motion etc.
+        dg['posDataFromSensor'] = pos_data_from_sensor
+
+        return dg
+
+    @classmethod
+    def read_EMdgmSPO(cls, file_io):
+        """
+        Read #SPO - Struct of position sensor datagram. Data from active sensor will be motion corrected if
+        indicated by operator. Motion correction is applied to latitude, longitude, speed, course and ellipsoidal
+        height. If the sensor is inactive, the fields will be marked as unavailable, defined by the parameters define
+        UNAVAILABLE_LATITUDE etc.
+        :param file_io: File or Bytes_IO object to be read.
+        :return: A dictionary of dictionaries, including EMdgmHeader ('header'), EMdgmScommon ('cmnPart'), and
+        EMdgmSPOdataBlock ('sensorData').
+        """
+        file_io.seek(0, 0)
+
+        dg = {}
+        dg['header'] = cls.read_EMdgmHeader(file_io)
+        dg['cmnPart'] = cls.read_EMdgmScommon(file_io)
+        # Datagram ends with a repeated (4 byte) length field:
+        dg['sensorData'] = cls.read_EMdgmSPOdataBlock(file_io, dg['header']['numBytesDgm'] - file_io.tell() - 4)
+
+        return dg
+
+    @staticmethod
+    def read_EMdgmSVPcommon(file_io, return_format=False, return_fields=False):
+        """
+        Read #SVP - Sound velocity profile common part. Data from sound velocity profile or from CTD profile.
+        :param file_io: File or Bytes_IO object to be read.
+        :param return_format: Optional boolean parameter. When true, returns struct format string. Default is false.
+        :param return_fields: Optional boolean parameter. When true, returns fields as a list;
+        when false, returns fields as a dictionary. Default is false.
+        :return: A list containing EMdgmSVP common part ('cmnPart') fields: [0] = numBytesCmnPart; [1] = numSamples;
+        [2] = sensorFormat; [3] = time_sec; [4] = latitude_deg; [5] = longitude_deg.
+        """
+
+        # Reading this all in one step does not work: native alignment would pad the doubles.
+        struct_to_unpack_a = KmallReaderForMDatagrams.get_struct(b'#SVP', 'cmnPart_a', None)
+        struct_to_unpack_b = KmallReaderForMDatagrams.get_struct(b'#SVP', 'cmnPart_b', None)
+
+        if return_format:
+            return struct_to_unpack_a.format + struct_to_unpack_b.format
+
+        fields = struct_to_unpack_a.unpack(file_io.read(struct_to_unpack_a.size)) + \
+            struct_to_unpack_b.unpack(file_io.read(struct_to_unpack_b.size))
+
+        if return_fields:
+            return fields
+
+        dg = {}
+
+        # Size in bytes of body part struct. Used for denoting size of rest of the datagram.
+        dg['numBytesCmnPart'] = fields[0]
+        # Number of sound velocity samples.
+        dg['numSamples'] = fields[1]
+        # Sound velocity profile format: 'S00' = sound velocity profile; 'S01' = CTD profile.
+        dg['sensorFormat'] = fields[2]
+        # Time extracted from the Sound Velocity Profile. Parameter is set to zero if not found.
+        dg['time_sec'] = fields[3]
+        # Latitude in degrees. Negative if southern hemisphere. Position extracted from the Sound Velocity Profile.
+        # Parameter is set to define UNAVAILABLE_LATITUDE if not available.
+        dg['latitude_deg'] = fields[4]
+        # Longitude in degrees. Negative if western hemisphere. Position extracted from the Sound Velocity Profile.
+        # Parameter is set to define UNAVAILABLE_LONGITUDE if not available.
+        dg['longitude_deg'] = fields[5]
+
+        # Skip unknown fields.
+        file_io.seek(dg['numBytesCmnPart'] - struct_to_unpack_a.size -
+                     struct_to_unpack_b.size, 1)
+
+        return dg
+
+    @staticmethod
+    def read_EMdgmSVPpoint(file_io, num_samples, return_format=False, return_fields=False):
+        """
+        Read #SVP - Sound velocity profile data points. Data from one sound velocity profile or from one CTD profile.
+        Sound velocity is measured directly or estimated, respectively.
+        :param file_io: File or Bytes_IO object to be read.
+        :param num_samples: Number of sound velocity samples (numSamples, from common part).
+        :param return_format: Optional boolean parameter. When true, returns struct format string. Default is false.
+        :param return_fields: Optional boolean parameter. When true, returns fields as a list;
+        when false, returns fields as a dictionary. Default is false.
+        :return: A list containing EMdgmSVPpoint ('sensorData') fields: [0] = depth_m; [1] = soundVelocity_mPerSec;
+        [2] = padding; [3] = temp_C; [4] = salinity. When returned as a dictionary, each field is a numpy array of
+        length num_samples.
+        """
+
+        struct_to_unpack = KmallReaderForMDatagrams.get_struct(b'#SVP', 'sensorData', None)
+
+        if return_format:
+            return struct_to_unpack.format
+
+        # Points are fixed-size and contain no doubles, so they may be read in one step:
+        fields = np.frombuffer(file_io.read(struct_to_unpack.size * num_samples),
+                               dtype=np.dtype([('depth_m', 'f4'), ('soundVelocity_mPerSec', 'f4'),
+                                               ('padding', 'u4'), ('temp_C', 'f4'), ('salinity', 'f4')]))
+
+        if return_fields:
+            return fields.tolist()
+
+        dg = {}
+
+        # Depth at which measurement is taken. Unit m. Valid range from 0.00 m to 12000 m.
+        dg['depth_m'] = fields['depth_m']
+        # Measured sound velocity from profile. Unit m/s. For a CTD profile, this will be the calculated sound velocity.
+        dg['soundVelocity_mPerSec'] = fields['soundVelocity_mPerSec']
+        # Former absorption coefficient. Voided.
+        dg['padding'] = fields['padding']
+        # Water temperature at given depth. Unit Celsius. For a Sound velocity profile (S00), this will be set to 0.00.
+        dg['temp_C'] = fields['temp_C']
+        # Salinity of water at given depth. For a Sound velocity profile (S00), this will be set to 0.00.
+        dg['salinity'] = fields['salinity']
+
+        return dg
+
+    @classmethod
+    def read_EMdgmSVP(cls, file_io):
+        """
+        Read #SVP - Sound Velocity Profile. Data from sound velocity profile or from CTD profile.
+        Sound velocity is measured directly or estimated, respectively.
+        :param file_io: File or Bytes_IO object to be read.
+        :return: A dictionary of dictionaries, including EMdgmHeader ('header'), EMdgmSVP common part ('cmnPart'),
+        and EMdgmSVPpoint ('sensorData').
+        """
+        file_io.seek(0, 0)
+
+        dg = {}
+        dg['header'] = cls.read_EMdgmHeader(file_io)
+        dg['cmnPart'] = cls.read_EMdgmSVPcommon(file_io)
+        dg['sensorData'] = cls.read_EMdgmSVPpoint(file_io, dg['cmnPart']['numSamples'])
+
+        return dg
+
     @staticmethod
     def read_format(file_io, format_to_unpack):
         """
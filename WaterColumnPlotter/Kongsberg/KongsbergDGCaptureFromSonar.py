@@ -27,6 +27,7 @@ import socket
 import struct
 import sys
 from WaterColumnPlotter.Kongsberg.KmallReaderForMDatagrams import KmallReaderForMDatagrams as k
+from WaterColumnPlotter.Plotter.AllocationMonitor import AllocationMonitor
 
 __appname__ = "Water Column Capture"
 
@@ -36,7 +37,8 @@ logger = logging.getLogger(__name__)
 class KongsbergDGCaptureFromSonar(Process):
 
     def __init__(self, ip, port, protocol, socket_buffer_multiplier, settings_edited, queue_datagram,
-                 full_ping_count=None, discard_ping_count=None, process_flag=None, out_file=None):
+                 full_ping_count=None, discard_ping_count=None, process_flag=None, out_file=None,
+                 allocation_diagnostics=False):
         super().__init__()
 
         self.ip = ip  # multiprocessing.Array
@@ -87,7 +89,7 @@ class KongsbergDGCaptureFromSonar(Process):
         self.sock_in = self._init_socket()
 
         # self.REQUIRED_DATAGRAMS = [b'#MRZ', b'#MWC', b'#SKM', b'#SPO']
-        self.REQUIRED_DATAGRAMS = [b'#MWC']
+        self.REQUIRED_DATAGRAMS = [b'#MRZ', b'#MWC', b'#SPO', b'#SVP']
 
         # The number of pings with partial data that can be accomodated in the buffer before discarding / overwriting
         # old data. Note that when this number becomes large, there are likely to be greater delays in sending
@@ -97,6 +99,16 @@ class KongsbergDGCaptureFromSonar(Process):
         # Buffer to accomodate pings with partial data prior to reconstruction
         self.buffer = self._init_buffer()
 
+        # Pool of reusable packet buffers: datagrams are received directly into a buffer from this pool (recv_into).
+        # Buffers holding partitions of datagrams awaiting reconstruction are returned to pool once datagram is
+        # reconstructed (or discarded); all others are returned as soon as datagram has been handled.
+        self.packet_pool = []
+        # Reusable buffer into which partitioned datagrams are reconstructed (grown as needed)
+        self.reconstruct_buffer = bytearray(self.MAX_DATAGRAM_SIZE)
+
+        # Allocations per received datagram (see AllocationMonitor); started in run()
+        self.allocation_monitor = AllocationMonitor("KongsbergDGCaptureFromSonar", allocation_diagnostics)
+
         # For debugging
         self.start_time = None
         self.data_counter = 0
@@ -187,6 +199,68 @@ class KongsbergDGCaptureFromSonar(Process):
 
         return buffer
 
+    def get_packet_buffer(self):
+        """
+        :return: A packet buffer (bytearray of self.MAX_DATAGRAM_SIZE bytes) from pool; allocated if pool is empty.
+        """
+        if self.packet_pool:
+            return self.packet_pool.pop()
+        return bytearray(self.MAX_DATAGRAM_SIZE)
+
+    def release_packets(self, data):
+        """
+        Returns packet buffers of buffered partitions to pool; released entries of data are set to None.
+        :param data: List of buffered partitions (memoryviews of packet buffers, or None) of a single entry of
+        self.buffer; may be None.
+        """
+        if data:
+            for i, packet_view in enumerate(data):
+                if packet_view is not None:
+                    self.packet_pool.append(packet_view.obj)
+                    data[i] = None
+
+    def peek_header(self, data):
+        """
+        Reads fields of datagram header used for buffering and reconstruction, without copying data.
+        :param data: Datagram (bytes-like object).
+        :return: Dictionary of header fields: numBytesDgm, dgmType, dgmVersion, dgTime.
+        """
+        fields = k.peek_EMdgmHeader(data)
+        return {'numBytesDgm': fields[0], 'dgmType': fields[1], 'dgmVersion': fields[2],
+                'dgTime': fields[5] + fields[6] / 1.0E9}
+
+    def peek_partition(self, data, dgm_type, dgm_version):
+        """
+        Reads partition fields of an 'M' datagram, without copying data.
+        :param data: Datagram (bytes-like object).
+        :param dgm_type: Datagram type (b'#MRZ' or b'#MWC').
+        :param dgm_version: Datagram version.
+        :return: Tuple: number of partitions (numOfDgms) and number of this partition (dgmNum).
+        """
+        return k.peek_EMdgmMpartition(data, dgm_type, dgm_version)
+
+    def peek_ping_count(self, data, dgm_type, dgm_version):
+        """
+        Reads ping count from common part of an 'M' datagram, without copying data.
+        :param data: Datagram (bytes-like object).
+        :param dgm_type: Datagram type (b'#MRZ' or b'#MWC').
+        :param dgm_version: Datagram version.
+        :return: Ping count (pingCnt).
+        """
+        return k.peek_EMdgmMbody(data, dgm_type, dgm_version)[1]
+
+    def find_buffer_index(self, dgm_type, dg_time):
+        """
+        Finds index of entry in self.buffer with given datagram type and timestamp.
+        :param dgm_type: Datagram type (for example, b'#MWC').
+        :param dg_time: Datagram timestamp.
+        :return: Index of matching entry in self.buffer; None if no entry matches.
+        """
+        for index, buffer_dg_time in enumerate(self.buffer['dgTime']):
+            if buffer_dg_time == dg_time and self.buffer['dgmType'][index] == dgm_type:
+                return index
+        return None
+
     def editIP(self, ip, append=True):
         """
         IP addresses shared between processes must be 15 characters in length when stored as a multiprocessing.Array.
@@ -272,18 +346,28 @@ class KongsbergDGCaptureFromSonar(Process):
 
                 print("Listening for data")
 
+                self.allocation_monitor.end()
+
+                # Receive directly into a pooled packet buffer; data is a view of received bytes
+                packet = self.get_packet_buffer()
                 try:
-                    data, address = self.sock_in.recvfrom(self.MAX_DATAGRAM_SIZE)
+                    num_bytes = self.sock_in.recv_into(packet)
                     # print("KongsbergDGCaptureFromSonar, data received.")
                 except BlockingIOError:
+                    self.packet_pool.append(packet)
                     continue
                 except socket.timeout:
                     logger.exception("Socket timeout exception.")
                     break
 
-                bytes_io = io.BytesIO(data)
+                self.allocation_monitor.begin()
 
-                header = k.read_EMdgmHeader(bytes_io)
+                data = memoryview(packet)[:num_bytes]
+
+                header = self.peek_header(data)
+
+                # Packet buffer is returned to pool once handled, unless it is held in self.buffer
+                packet_buffered = False
 
                 if header['dgmType'] in self.REQUIRED_DATAGRAMS:
                     if header['dgmType'] == b'#MRZ' or header['dgmType'] == b'#MWC':  # Datagrams may be partitioned
@@ -301,21 +385,22 @@ class KongsbergDGCaptureFromSonar(Process):
                                 self.data_counter = 0
                             self.data_counter += header['numBytesDgm']
 
-                        partition = k.read_EMdgmMpartition(bytes_io, header['dgmType'], header['dgmVersion'])
+                        num_of_dgms, dgm_num = self.peek_partition(data, header['dgmType'], header['dgmVersion'])
 
                         # For debugging:
-                        print("KongsbergDGCapture, number of partitions:", partition['numOfDgms'])
+                        print("KongsbergDGCapture, number of partitions:", num_of_dgms)
 
-                        if partition['numOfDgms'] == 1:  # Only one datagram; no need to reconstruct
-                            self.queue_datagram.put(data)
+                        if num_of_dgms == 1:  # Only one datagram; no need to reconstruct
+                            self.queue_datagram.put(bytes(data))
                             with self.full_ping_count.get_lock():
                                 self.full_ping_count.value += 1
 
                         else:  # Greater than one datagram; needs to be reconstructed
-                            # Check for timestamp in buffer:
-                            if header['dgTime'] in self.buffer['dgTime']:  # Timestamp in buffer
+                            # Check for datagram type and timestamp in buffer. (#MRZ and #MWC datagrams for the
+                            # same ping share a timestamp, so timestamp alone does not identify an entry.)
+                            index = self.find_buffer_index(header['dgmType'], header['dgTime'])
 
-                                index = self.buffer['dgTime'].index(header['dgTime'])
+                            if index is not None:  # Datagram type and timestamp in buffer
 
                                 # Though not strictly necessary, adding an accurate ping count to each
                                 # record can help with debugging.
@@ -329,17 +414,20 @@ class KongsbergDGCaptureFromSonar(Process):
                                 # the 'pingCnt' field of the buffer will have already been populated; if not, the
                                 # 'pingCnt' field of the buffer will be None.
                                 if self.buffer['pingCnt'][index] is None:
-                                    if header['dgmVersion'] == 2 or partition['dgmNum'] == 1:
-                                        cmnPart = k.read_EMdgmMbody(bytes_io, header['dgmType'], header['dgmVersion'])
+                                    if header['dgmVersion'] == 2 or dgm_num == 1:
+                                        self.buffer['pingCnt'][index] = self.peek_ping_count(
+                                            data, header['dgmType'], header['dgmVersion'])
 
                                 # Append new data to existing data in buffer:
                                 self.buffer['dgmsRxed'][index] += 1
-                                self.buffer['data'][index][partition['dgmNum'] - 1] = data
+                                self.release_packets([self.buffer['data'][index][dgm_num - 1]])
+                                self.buffer['data'][index][dgm_num - 1] = data
+                                packet_buffered = True
 
                                 # For debugging:
                                 # print("Inserting existing datagram {}, {} into index {}. Part {} of {}."
                                 #       .format(header['dgmType'], header['dgTime'], index,
-                                #               partition['dgmNum'], partition['numOfDgms']))
+                                #               dgm_num, num_of_dgms))
                                 # print("datagrams rxed: ", self.buffer['dgmsRxed'][index])
                                 # print("Existing: self.buffer['dgmsRxed'][index]:", self.buffer['dgmsRxed'][index])
                                 # print("Existing: self.buffer['numOfDgms'][index]:", self.buffer['numOfDgms'][index])
@@ -464,37 +552,37 @@ class KongsbergDGCaptureFromSonar(Process):
                                 # 0 - 1 of the #MWC datagram.) Revision I+ includes the 'cmnPart' field of a
                                 # partitioned datagram in all partitions. (This change is reflected in version 2+
                                 # of the #MWC datagram.)
-                                if header['dgmVersion'] == 2 or partition['dgmNum'] == 1:
-                                    cmnPart = k.read_EMdgmMbody(bytes_io, header['dgmType'], header['dgmVersion'])
+                                if header['dgmVersion'] == 2 or dgm_num == 1:
+                                    ping_count = self.peek_ping_count(data, header['dgmType'], header['dgmVersion'])
                                 else:
-                                    cmnPart = None
+                                    ping_count = None
 
                                 # For debugging:
                                 # print("Inserting new datagram {}, {} into index {}. Part {} of {}."
                                 #       .format(header['dgmType'], header['dgTime'], next_index,
-                                #               partition['dgmNum'], partition['numOfDgms']))
+                                #               dgm_num, num_of_dgms))
 
                                 self.buffer['dgmType'][next_index] = header['dgmType']
                                 self.buffer['dgmVersion'][next_index] = header['dgmVersion']
                                 self.buffer['dgTime'][next_index] = header['dgTime']
-                                if cmnPart:
-                                    self.buffer['pingCnt'][next_index] = cmnPart['pingCnt']
-                                else:
-                                    self.buffer['pingCnt'][next_index] = None
-                                self.buffer['numOfDgms'][next_index] = partition['numOfDgms']
+                                self.buffer['pingCnt'][next_index] = ping_count
+                                self.buffer['numOfDgms'][next_index] = num_of_dgms
                                 self.buffer['dgmsRxed'][next_index] = 1
                                 self.buffer['complete'][next_index] = False
-                                # Initialize a data array at this position with length equal to numOfDgms
-                                self.buffer['data'][next_index] = [None] * partition['numOfDgms']
+                                # Return packet buffers of data still held at this position to pool, and
+                                # initialize a data array at this position with length equal to numOfDgms
+                                self.release_packets(self.buffer['data'][next_index])
+                                self.buffer['data'][next_index] = [None] * num_of_dgms
                                 # Insert data at appropriate position
-                                self.buffer['data'][next_index][partition['dgmNum'] - 1] = data
+                                self.buffer['data'][next_index][dgm_num - 1] = data
+                                packet_buffered = True
 
                                 # For debugging:
                                 # print("dgmVersion:", header['dgmVersion'])
                                 # print("numBytesCmnPart:", cmnPart['numBytesCmnPart'])
                                 # print("Inserting new datagram {}, {} into index {}. Part {} of {}."
                                 #       .format(header['dgmType'], header['dgTime'], next_index,
-                                #               partition['dgmNum'], partition['numOfDgms']))
+                                #               dgm_num, num_of_dgms))
                                 # print("New: self.buffer['dgmsRxed'][index]:", self.buffer['dgmsRxed'][next_index])
                                 # print("New: self.buffer['numOfDgms'][index]:", self.buffer['numOfDgms'][next_index])
 
@@ -514,6 +602,12 @@ class KongsbergDGCaptureFromSonar(Process):
                                 else:
                                     next_index = timestamp_index
 
+                    else:  # Sensor (S) datagrams are not partitioned; no need to reconstruct
+                        self.queue_datagram.put(bytes(data))
+
+                if not packet_buffered:
+                    self.packet_pool.append(packet)
+
             elif local_process_flag_value == 2:  # Pause pressed
                 # print("Local process flag is 2. Flushing buffer.")  # For debugging
                 # Flush completed datagrams in buffer into queue_datagram
@@ -632,12 +726,10 @@ class KongsbergDGCaptureFromSonar(Process):
         temp_buffer = []
         numBytesDgm = 0
 
-        header_struct_format = k.read_EMdgmHeader(None, return_format=True)
-        partition_struct_format = k.read_EMdgmMpartition(None, dgmType, dgmVersion, return_format=True)
-        # cmnPart_struct_format = k.read_EMdgmMbody(data, dgmType, dgmVersion, return_format=True)
+        header_struct = k.get_struct(None, 'header', None)
+        partition_struct = k.get_struct(dgmType, 'partition', dgmVersion)
 
-        length_to_strip = struct.calcsize(header_struct_format) + \
-                          struct.calcsize(partition_struct_format)
+        length_to_strip = header_struct.size + partition_struct.size
 
         index = 0
         temp_datagram = data[index]
@@ -660,13 +752,14 @@ class KongsbergDGCaptureFromSonar(Process):
 
         # Adjust partition values
         partition_packed = struct.pack("2H", 1, 1)  # Returns type <class 'bytes'>
-        temp_buffer[0][struct.calcsize(header_struct_format):
-                       (struct.calcsize(header_struct_format) +
-                        struct.calcsize(partition_struct_format))] = partition_packed
+        temp_buffer[0][header_struct.size:(header_struct.size + partition_struct.size)] = partition_packed
 
         # Flatten buffer
         flat_buffer = self.flatten_buffer(temp_buffer)
 
+        # Partitions are no longer needed
+        self.release_packets(data)
+
         return flat_buffer, numBytesDgm
 
     def reconstruct_data(self, dgmType, dgmVersion, data):
@@ -678,49 +771,53 @@ class KongsbergDGCaptureFromSonar(Process):
         Example: [<ping 1 - datagram 1 of 3>, <ping 1 - datagram 2 of 3>, <ping 1 - datagram 3 of 3>].
         :return: A single reconstructed (non-partitioned) #MWC record, and the number of bytes contained in it.
         """
-        temp_buffer = []
-        numBytesDgm = 0
-
-        header_struct_format = k.read_EMdgmHeader(None, return_format=True)
-        partition_struct_format = k.read_EMdgmMpartition(None, dgmType, dgmVersion, return_format=True)
-        cmnPart_struct_format = k.read_EMdgmMbody(None, dgmType, dgmVersion, return_format=True)
+        # Precompiled structs; sizes are cached (see KmallReaderForMDatagrams.STRUCTS)
+        header_struct = k.get_struct(None, 'header', None)
+        partition_struct = k.get_struct(dgmType, 'partition', dgmVersion)
 
         # Length to strip for Kongsberg *.kmall datagram format revisions A - H.
-        length_to_strip = struct.calcsize(header_struct_format) + struct.calcsize(partition_struct_format)
+        length_to_strip = header_struct.size + partition_struct.size
 
         # Determine Kongsberg *.kmall datagram format revision version.
         # Revision A - H contain cmnPart only in partition 1; revisions I+ contain cmnPart in all partitions.
         # Revision I updated #MRZ datagram to version 3 and #MWC datagram to version 2.
         if (dgmType == b'#MRZ' and dgmVersion >= 3) or (dgmType == b'#MWC' and dgmVersion >= 2):
             # Length to strip for Kongsberg *.kmall datagram format revisions I+.
-            length_to_strip += struct.calcsize(cmnPart_struct_format)
+            length_to_strip += k.get_struct(dgmType, 'cmnPart', dgmVersion).size
+
+        # First dgm must have last 4 bytes removed; final dgm(s) must have leading fields and last 4 bytes removed.
+        # Add 4 to numBytesDgm to account for 4-byte size field to be appended to end of datagram.
+        numBytesDgm = len(data[0]) - 4 + sum(len(datagram) - length_to_strip - 4 for datagram in data[1:]) + 4
 
+        # Parts are copied once, directly into reusable self.reconstruct_buffer
+        if len(self.reconstruct_buffer) < numBytesDgm:
+            self.reconstruct_buffer = bytearray(2 * numBytesDgm)
+        reconstruct_view = memoryview(self.reconstruct_buffer)
+
+        offset = 0
         for i in range(len(data)):
             if i == 0:  # First dgm must have last 4 bytes removed
-                temp_buffer.append(bytearray(data[i][:-4]))
-                numBytesDgm += len(data[i][:-4])
+                part = data[i][:-4]
             else:  # Final dgm(s) must have leading fields and last 4 bytes removed
-                temp_buffer.append(bytearray(data[i][length_to_strip:-4]))
-                numBytesDgm += len(data[i][length_to_strip:-4])
-
-        # Add 4 to numBytesDgm to account for 4-byte size field to be appended to end of datagram
-        numBytesDgm += 4
+                part = data[i][length_to_strip:-4]
+            reconstruct_view[offset:offset + len(part)] = part
+            offset += len(part)
 
         # Adjust header values
-        numBytesDgm_packed = struct.pack("I", numBytesDgm)  # Returns type <class 'bytes'>
-        temp_buffer[0][:struct.calcsize("I")] = numBytesDgm_packed
+        struct.pack_into("I", self.reconstruct_buffer, 0, numBytesDgm)
 
         # Adjust partition values
-        partition_packed = struct.pack("2H", 1, 1)  # Returns type <class 'bytes'>
-        temp_buffer[0][struct.calcsize(header_struct_format):
-                       (struct.calcsize(header_struct_format) +
-                        struct.calcsize(partition_struct_format))] = partition_packed
-
-        # Flatten buffer
-        flat_buffer = self.flatten_buffer(temp_buffer)
+        partition_struct.pack_into(self.reconstruct_buffer, header_struct.size, 1, 1)
 
         # Add final 4-byte size field:
-        flat_buffer += struct.pack("I", numBytesDgm)
+        struct.pack_into("I", self.reconstruct_buffer, offset, numBytesDgm)
+
+        # (A copy is placed in queue: queue pickles data some time after put().)
+        flat_buffer = bytes(reconstruct_view[:numBytesDgm])
+        reconstruct_view.release()
+
+        # Partitions are no longer needed
+        self.release_packets(data)
 
         return flat_buffer, numBytesDgm
 
@@ -731,10 +828,7 @@ class KongsbergDGCaptureFromSonar(Process):
         :param buffer: Data buffered as discrete entries in a list.
         :return: A contiguous bytes string of data representing a single #MWC record.
         """
-        flat_buffer = b''
-        for item in buffer:
-            flat_buffer += item
-        return flat_buffer
+        return b''.join(buffer)
 
     def run(self):
         """
@@ -742,9 +836,11 @@ class KongsbergDGCaptureFromSonar(Process):
         otherwise, writes raw binary data to file.
         """
         if self.queue_datagram:
+            self.allocation_monitor.start()
             # Profiler for performance testing:
             cProfile.runctx('self.receive_dg_and_queue()', globals(), locals(), '../../Profile/profile-Capture.txt')
             # self.receive_dg_and_queue()
+            self.allocation_monitor.stop()
         else:
             self.receive_dg_and_write_raw()
 
@@ -16,8 +16,10 @@ logger = logging.getLogger(__name__)
 
 
 class KongsbergDGMain:
-    def __init__(self, settings, ip, port, protocol, socket_buffer_multiplier, bin_size, max_heave,
-                 max_grid_cells, queue_datagram, queue_pie_object, full_ping_count, discard_ping_count):
+    def __init__(self, settings, ip, port, protocol, socket_buffer_multiplier, bin_size, base_bin_size,
+                 across_track_avg, depth, depth_avg, max_heave, msr_masking, max_grid_cells, queue_datagram,
+                 queue_pie_object, full_ping_count, discard_ping_count, latency_counts, qos_level,
+                 qos_degraded_ping_count, pie_buffer_time):
 
         self.settings = settings
 
@@ -26,7 +28,12 @@ class KongsbergDGMain:
         self.protocol = protocol  # multiprocessing.Value
         self.socket_buffer_multiplier = socket_buffer_multiplier  # multiprocessing.Value
         self.bin_size = bin_size  # multiprocessing.Value
+        self.base_bin_size = base_bin_size  # multiprocessing.Value
+        self.across_track_avg = across_track_avg  # multiprocessing.Value
+        self.depth = depth  # multiprocessing.Value
+        self.depth_avg = depth_avg  # multiprocessing.Value
         self.max_heave = max_heave  # multiprocessing.Value
+        self.msr_masking = msr_masking  # multiprocessing.Value
         self.max_grid_cells = max_grid_cells  # multiprocessing.Value
 
         # Boolean flags to indicate to processes when settings have changed in main
@@ -41,6 +48,14 @@ class KongsbergDGMain:
         self.full_ping_count = full_ping_count  # multiprocessing.Value
         # A count to track the number of #MWC records (pings) that could not be reconstructed
         self.discard_ping_count = discard_ping_count  # multiprocessing.Value
+        # Histograms of per-stage processing time of #MWC records (pings) (see LatencyHistogram)
+        self.latency_counts = latency_counts  # multiprocessing.Array
+        # Current quality of service level and number of pings processed at reduced quality
+        # (see QualityOfServiceController)
+        self.qos_level = qos_level  # multiprocessing.Value
+        self.qos_degraded_ping_count = qos_degraded_ping_count  # multiprocessing.Value
+        # Moving average of time (in seconds) of Plotter to buffer a pie record (see QualityOfServiceController)
+        self.pie_buffer_time = pie_buffer_time  # multiprocessing.Value
 
         # 0 = initialization; 1 = play; 2 = pause; 3 = stop
         self.capture_process_flag = Value(ctypes.c_uint8, 0, lock=True)
@@ -148,15 +163,27 @@ class KongsbergDGMain:
                                                       queue_datagram=self.queue_datagram,
                                                       full_ping_count=self.full_ping_count,
                                                       discard_ping_count=self.discard_ping_count,
-                                                      process_flag=self.capture_process_flag)
-
-        self.dg_process = KongsbergDGProcess(bin_size=self.bin_size,
+                                                      process_flag=self.capture_process_flag,
+                                                      allocation_diagnostics=self.settings['advanced_settings']
+                                                      ['allocationDiagnostics'])
+
+        self.dg_process = KongsbergDGProcess(settings=self.settings,
+                                             bin_size=self.bin_size,
+                                             base_bin_size=self.base_bin_size,
+                                             across_track_avg=self.across_track_avg,
+                                             depth=self.depth,
+                                             depth_avg=self.depth_avg,
                                              max_heave=self.max_heave,
+                                             msr_masking=self.msr_masking,
                                              max_grid_cells=self.max_grid_cells,
                                              settings_edited=self.process_settings_edited,
                                              queue_datagram=self.queue_datagram,
                                              queue_pie_object=self.queue_pie_object,
-                                             process_flag=self.process_process_flag)
+                                             process_flag=self.process_process_flag,
+                                             latency_counts=self.latency_counts,
+                                             qos_level=self.qos_level,
+                                             qos_degraded_ping_count=self.qos_degraded_ping_count,
+                                             pie_buffer_time=self.pie_buffer_time)
 
         self.dg_capture.daemon = True
         self.dg_process.daemon = True
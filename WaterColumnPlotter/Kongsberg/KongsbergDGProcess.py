@@ -7,20 +7,34 @@
 # Description: Receives reconstructed #MWC records from KongsbergDGCaptureFromSonar via a shared multiprocessing Queue.
 # Reads data from #MWC records, bins water column data, creates standard format pie records,
 # and adds this record to a shared multiprocessing.Queue for use by the next process.
+# Position (#SPO) records received via the same queue are buffered and used to position-tag pie records;
+# bottom detections from #MRZ records are used to cap water column samples at the seafloor; sound velocity profiles
+# from #SVP records are used (optionally) to ray trace samples.
 
 import cProfile
-import datetime
 import io
 import logging
+import math
 from multiprocessing import Process, Value
 from numba import jit
 from numba.typed import List
 import numpy as np
 import struct
+import threading
 import time
 import queue
+from WaterColumnPlotter.Kongsberg.KmallDatagramViews import MRZView, MWCView, SPOView
 from WaterColumnPlotter.Kongsberg.KmallReaderForMDatagrams import KmallReaderForMDatagrams as k
+from WaterColumnPlotter.Kongsberg.PositionRingBuffer import PositionRingBuffer
+from WaterColumnPlotter.Kongsberg.QualityOfServiceController import QualityOfServiceController
+from WaterColumnPlotter.Kongsberg.RayTraceTable import RayTraceTable
+from WaterColumnPlotter.Plotter.AllocationMonitor import AllocationMonitor
+from WaterColumnPlotter.Plotter.GridPool import GridPool
+from WaterColumnPlotter.Plotter.LatencyHistogram import LatencyHistogram
 from WaterColumnPlotter.Plotter.PieStandardFormat import PieStandardFormat
+from WaterColumnPlotter.Plotter.ScratchArrays import ScratchArrays
+from WaterColumnPlotter.Plotter.SharedSampleStore import SharedSampleStore
+from WaterColumnPlotter.Plotter.SliceRegistry import SliceRegistry
 
 __appname__ = "Water Column Process"
 
@@ -28,13 +42,87 @@ logger = logging.getLogger(__name__)
 
 
 class KongsbergDGProcess(Process):
-    def __init__(self, bin_size, max_heave, max_grid_cells, settings_edited,
-                 queue_datagram, queue_pie_object, process_flag):
+    def __init__(self, settings, bin_size, base_bin_size, across_track_avg, depth, depth_avg, max_heave, msr_masking,
+                 max_grid_cells, settings_edited, queue_datagram, queue_pie_object, process_flag, latency_counts,
+                 qos_level, qos_degraded_ping_count, pie_buffer_time):
         super(KongsbergDGProcess, self).__init__()
 
+        self.settings = settings
+
+        # Precision policy: floating point dtype used throughout processing chain. Amplitudes and counts are
+        # accumulated directly in the dtypes of SharedRingBufferRaw's buffers (float32 / uint16) when 'float32';
+        # 'float64' is retained as a reference. When 'int32', amplitudes are accumulated as exact integer sums
+        # in units of 0.5 dB (as delivered by sonar) and are only converted to dB when read from SharedRingBufferRaw.
+        self.FLOAT_DTYPE, self.AMPLITUDE_DTYPE = self.precision_dtypes(self.settings['advanced_settings']['precision'])
+        self.COUNT_DTYPE = np.uint16
+
+        # Number of bin sizes (levels) at which each ping is binned: base bin size (see WaterColumn) and
+        # successive doublings of it. Plotter keeps a raw ring buffer per level, so that a change of bin size
+        # to any level applies to buffered pings.
+        self.num_bin_size_levels = self.settings['advanced_settings']['binSizeLevels']
+
+        # When True, only samples contributing to vertical and horizontal slices are binned
+        self.slices_only = self.settings['advanced_settings']['slicesOnly']
+        if self.slices_only and self.num_bin_size_levels > 1:
+            logger.warning("Slices-only binning is not available with multiple bin size levels; binning all samples.")
+            self.slices_only = False
+
+        # When True, amplitudes are accumulated as linear intensities (rather than in dB) and are converted back to dB
+        # only when displayed (see WaterColumn)
+        self.linear_averaging = self.settings['advanced_settings']['linearAveraging']
+        if self.linear_averaging and np.issubdtype(self.AMPLITUDE_DTYPE, np.integer):
+            logger.warning("Linear averaging is not available with integer amplitudes; averaging in dB.")
+            self.linear_averaging = False
+        # Lookup tables of amplitude (dB or linear intensity) of each raw (int8) amplitude, by TVG offset
+        self.amplitude_tables = {}
+        self.MAX_NUM_AMPLITUDE_TABLES = 16
+
+        # When True, beam geometry and raw samples of each ping are packed into a record carried with its pie record,
+        # so that Plotter can keep them (see SharedSampleStore) and buffered pings can be re-binned when settings change
+        self.sample_store = self.settings['advanced_settings']['sampleStore']
+        if self.sample_store and not SharedSampleStore.enabled(self.settings):
+            logger.warning("Sample store is not available with ray tracing; samples are not stored.")
+            self.sample_store = False
+        # Record of pings with no samples to bin (see process_MWC)
+        self.empty_sample_record = None
+        if self.sample_store:
+            self.empty_sample_record = SharedSampleStore.pack(0, 0, 0, [], [], [], [], np.zeros(0, dtype=np.int32))
+
+        # When True, consecutive samples of each beam are summed into range cells no longer than bin size and
+        # geometry is computed once per cell (rather than once per sample)
+        self.pre_averaging = self.settings['advanced_settings']['preAveraging']
+
+        # When True, across-track position and depth of samples are found by ray tracing through sound velocity
+        # profile (from #SVP datagrams or, initially, from svpFile); otherwise, sound velocity is taken as constant.
+        self.ray_tracing = self.settings['advanced_settings']['rayTracing']
+        self.svp_file = self.settings['advanced_settings']['svpFile']
+        self.RAY_TRACE_TABLE_PARAMETERS = {'max_angle_deg': 80.0, 'angle_step_deg': 0.5,
+                                           'time_step_sec': 2.0e-4, 'max_time_sec': 1.0}
+        # Ray tracing tables, by sound velocity profile and table parameters (see RayTraceTable.profile_key)
+        self.ray_trace_tables = {}
+        self.MAX_NUM_RAY_TRACE_TABLES = 4
+        # Table in use (None until first table is built) and keys of table in use and of table being built
+        self.ray_trace_table = None
+        self.ray_trace_table_key = None
+        self.ray_trace_table_pending_key = None
+        # Most recent sound velocity profile (depths relative to surface), from which tables are built
+        self.sound_velocity_profile = None
+        # Depth (m) of transducer below surface (txTransducerDepth_m of #MRZ records; zero until first is received),
+        # rounded to multiples of RAY_TRACE_TRANSDUCER_DEPTH_STEP_M, so that tables are not rebuilt for every ping
+        self.RAY_TRACE_TRANSDUCER_DEPTH_STEP_M = 0.5
+        self.transducer_depth = 0.0
+
+        # When True, process is run under cProfile (see run())
+        self.profile = self.settings['advanced_settings']['profile']
+
         # multiprocessing.Values (shared between processes)
         self.bin_size = bin_size  # multiprocessing.Value
+        self.base_bin_size = base_bin_size  # multiprocessing.Value
+        self.across_track_avg = across_track_avg  # multiprocessing.Value
+        self.depth = depth  # multiprocessing.Value
+        self.depth_avg = depth_avg  # multiprocessing.Value
         self.max_heave = max_heave  # multiprocessing.Value
+        self.msr_masking = msr_masking  # multiprocessing.Value
         self.max_grid_cells = max_grid_cells  # multiprocessing.Value
 
         # A boolean flag to indicate when settings have been edited
@@ -42,9 +130,20 @@ class KongsbergDGProcess(Process):
 
         # Local copies of above multiprocessing.Values (to avoid frequent accessing of locks)
         self.bin_size_local = None
+        self.base_bin_size_local = None
+        self.across_track_avg_local = None
+        self.depth_local = None
+        self.depth_avg_local = None
         self.max_heave_local = None
+        self.msr_masking_local = None
         self.max_grid_cells_local = None
-        # Initialize above local copies
+
+        # Grid index windows [start, end) of vertical and horizontal slices (see Plotter and SliceRegistry)
+        self.slice_registry = SliceRegistry(self.settings)
+        self.vertical_slice_windows = None
+        self.horizontal_slice_windows = None
+
+        # Initialize above local copies and indices
         self.update_local_settings()
 
         # Queue shared between DGCapture and DGProcess ('get' data from this queue)
@@ -56,29 +155,101 @@ class KongsbergDGProcess(Process):
         # A flag to indicate status of process. # 0 = initialization; 1 = play; 2 = pause; 3 = stop
         self.process_flag = process_flag  # multiprocessing.Value
 
+        # Per-stage processing time of each #MWC record (ping); counts are shared through latency_counts
+        self.latency_histogram = LatencyHistogram(latency_counts)  # latency_counts: multiprocessing.Array
+
+        # Reusable temporaries of process_MWC (see ScratchArrays) and pool of pie chart grids (see get_pie_grids)
+        self.scratch = ScratchArrays()
+        self.MAX_PIE_GRID_POOL_SIZE = 8
+        self.pie_grid_pool = GridPool(self.MAX_PIE_GRID_POOL_SIZE)
+        # Allocations per ping (see AllocationMonitor); started in run()
+        self.allocation_monitor = AllocationMonitor("KongsbergDGProcess",
+                                                    self.settings['advanced_settings']['allocationDiagnostics'])
+
+        # Quality of service: when enabled, pings are processed at reduced quality (see QualityOfServiceController)
+        # while estimated latency of data waiting in queues exceeds target
+        self.qos = self.settings['advanced_settings']['qos']
+        self.qos_controller = QualityOfServiceController(self.settings['advanced_settings']['qosTargetLatency_sec'],
+                                                         qos_level, qos_degraded_ping_count)
+        self.qos_level_local = QualityOfServiceController.NORMAL
+        # Moving average of time (in seconds) of Plotter to buffer a pie record; cost of each item of queue_pie_object
+        self.pie_buffer_time = pie_buffer_time  # multiprocessing.Value
+        # Alternates between 0 and 1 from ping to ping; selects beams and pings affected by degradation
+        self.qos_ping_parity = 0
+
         # self.mrz = None
         # self.mwc = None
         # self.skm = None
 
         self.QUEUE_DATAGRAM_TIMEOUT = 60  # Seconds
 
+        # Latitude / longitude of values above this indicate position is unavailable (UNAVAILABLE_LATITUDE, etc.)
+        self.UNAVAILABLE_POSITION = 200.0
+
+        # Buffer of recent position fixes (from #SPO datagrams) used to interpolate position at time of each ping
+        self.position_buffer = PositionRingBuffer()
+
+        # Index of recent bottom detections (from #MRZ datagrams): {(pingCnt, rxFanIndex): (dgTime, beams, ranges)};
+        # used to cap water column samples of matching #MWC records at the seafloor.
+        self.bottom_detections = {}
+        self.MAX_NUM_BOTTOM_DETECTIONS = 20
+        self.BOTTOM_DETECTION_TIME_TOLERANCE_SEC = 1.0
+
         self.dg_counter = 0  # For debugging
         self.mwc_counter = 0  # For debugging
 
+    @staticmethod
+    def precision_dtypes(precision):
+        """
+        :param precision: Precision policy ('precision' in advanced settings).
+        :return: Floating point dtype used throughout processing chain, and dtype in which amplitudes are accumulated.
+        """
+        if precision == "float64":
+            return np.float64, np.float64
+        elif precision == "int32":
+            return np.float32, np.int32
+        return np.float32, np.float32
+
     def update_local_settings(self):
         """
-        At object initialization, this method initializes local copies of shared variables;
-        after initialization, this method updates local copies of shared variables when settings are changed.
+        At object initialization, this method initializes local copies of shared variables and slice indices;
+        after initialization, this method updates local copies of shared variables and slice indices
+        when settings are changed.
         """
         # Outer lock to ensure atomicity of updates; this lock must be held when updating settings.
         with self.settings_edited.get_lock():
             with self.bin_size.get_lock():
                 self.bin_size_local = self.bin_size.value
+            with self.base_bin_size.get_lock():
+                self.base_bin_size_local = self.base_bin_size.value
+            with self.across_track_avg.get_lock():
+                self.across_track_avg_local = self.across_track_avg.value
+            with self.depth.get_lock():
+                self.depth_local = self.depth.value
+            with self.depth_avg.get_lock():
+                self.depth_avg_local = self.depth_avg.value
             with self.max_heave.get_lock():
                 self.max_heave_local = self.max_heave.value
+            with self.msr_masking.get_lock():
+                self.msr_masking_local = self.msr_masking.value
             with self.max_grid_cells.get_lock():
                 self.max_grid_cells_local = self.max_grid_cells.value
 
+            self.set_slice_indices()
+
+    def set_slice_indices(self):
+        """
+        Sets grid index windows of vertical and horizontal slices (see SliceRegistry) based on user settings.
+        Windows match those used by Plotter to slice pie records.
+        """
+        self.vertical_slice_windows = self.slice_registry.vertical_windows(self.max_grid_cells_local,
+                                                                           self.bin_size_local,
+                                                                           self.across_track_avg_local)
+        self.horizontal_slice_windows = self.slice_registry.horizontal_windows(self.max_grid_cells_local,
+                                                                               self.bin_size_local,
+                                                                               self.max_heave_local,
+                                                                               self.depth_local, self.depth_avg_local)
+
     def get_and_process_dg(self):
         """
         Receives datagrams from shared multiprocessing queue and processes data according to datagram type.
@@ -103,7 +274,9 @@ class KongsbergDGProcess(Process):
                                 self.update_local_settings()
                                 self.settings_edited.value = False
                         # Process data pulled from queue
+                        start_time = time.perf_counter()
                         self.process_dgm(dg_bytes)
+                        self.qos_controller.record_processing_time(time.perf_counter() - start_time)
                     elif local_process_flag_value == 3:  # Stop pressed
                         # Do not process datagram. Instead, only empty queue.
                         pass
@@ -125,58 +298,146 @@ class KongsbergDGProcess(Process):
         Reads header of datagram and initiates processing of datagram based on datagram type.
         :param dg_bytes: Datagram as pulled from shared multiprocessing.Queue (bytes).
         """
+        # Header decode (and quality of service update) of #MWC records is timed as part of decode stage
+        self.latency_histogram.start()
+
         bytes_io = io.BytesIO(dg_bytes)
         header = k.read_EMdgmHeader(bytes_io)
 
         if header['dgmType'] == b'#MRZ':
             # self.mrz = dg_bytes
-            self.process_MRZ(header, bytes_io)
+            self.process_MRZ(header, dg_bytes)
 
         elif header['dgmType'] == b'#MWC':
             # self.mwc = dg_bytes
 
-            # For debugging:
-            print("dgmVersion:", header['dgmVersion'])
-            print("dgm_timestamp: ", header['dgdatetime'])
+            # For debugging (logged, rather than printed, so that nothing is formatted for each ping otherwise):
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("dgmVersion: {}; dgm_timestamp: {}".format(header['dgmVersion'], header['dgdatetime']))
 
-            # For debugging:
-            start = datetime.datetime.now()
+            if self.qos:
+                with self.pie_buffer_time.get_lock():
+                    pie_buffer_time_sec = self.pie_buffer_time.value
+                self.qos_level_local = self.qos_controller.update(*self.get_queue_depths(), pie_buffer_time_sec)
+                self.qos_ping_parity ^= 1
+
+            self.allocation_monitor.begin()
 
-            pie_object = self.process_MWC(header, bytes_io)
+            pie_object = self.process_MWC(header, dg_bytes)
             self.queue_pie_object.put(pie_object)
 
-            end = datetime.datetime.now()
-            print("Time to process one MWC: ", (end - start))
+            self.latency_histogram.mark(LatencyHistogram.QUEUE)
+            self.latency_histogram.stop()
+            self.latency_histogram.flush()
+            self.allocation_monitor.end()
 
         elif header['dgmType'] == b'#SKM':
             # self.skm = dg_bytes
             self.process_SKM(header, bytes_io)
 
-    def process_MRZ(self, header, bytes_io):
+        elif header['dgmType'] == b'#SPO':
+            self.process_SPO(header, dg_bytes)
+
+        elif header['dgmType'] == b'#SVP':
+            self.process_SVP(header, bytes_io)
+
+    def get_queue_depths(self):
+        """
+        Counts items waiting in shared multiprocessing.Queues.
+        :return: Number of datagrams waiting in queue_datagram and number of pie records waiting in queue_pie_object;
+        zeros where queue size is not available on platform.
+        """
+        try:
+            return self.queue_datagram.qsize(), self.queue_pie_object.qsize()
+        except NotImplementedError:  # multiprocessing.Queue.qsize() is not implemented on macOS
+            return 0, 0
+
+    def process_MRZ(self, header, dg_bytes):
         """
-        Process #MRZ datagram; not currently implemented.
+        Process #MRZ datagram. Adds valid bottom detections (main soundings only) to index of recent bottom
+        detections, from which they are matched with #MWC records of the same ping.
         :param header: Header field of #MRZ datagram.
-        :param bytes_io: #MRZ datagram as BytesIO object.
+        :param dg_bytes: #MRZ datagram (bytes, or any buffer); only fields used are decoded (see MRZView).
         :return: None
         """
-        pass
+        # If #MRZ record is 'empty' (did not receive all partitions; see KongsbergDGCaptureFromSonar), it holds only
+        # header and partition: there are no detections to index. Matching #MWC record falls back on its own
+        # detected ranges.
+        if header['numBytesDgm'] == k.get_m_header_size(header['dgmType'], header['dgmVersion']):
+            return
+
+        dg = MRZView(dg_bytes)
+
+        # Extra detections (soundings in water column) follow main soundings; exclude them.
+        num_soundings = dg.rxInfo.numSoundingsMaxMain
+        if num_soundings == 0:
+            return
+
+        # Sounding columns are strided views of dg_bytes; copied (astype) before dg_bytes is released
+        wc_beam_np = dg.sounding_column('WCBeamNumb')[:num_soundings].astype(np.int32)
+        wc_range_np = dg.sounding_column('WCrange_samples')[:num_soundings].astype(self.FLOAT_DTYPE)
+
+        # Detection type 0 = normal detection (1 = extra detection; 2 = rejected detection);
+        # detection method 0 = no valid detection
+        valid_mask = np.logical_and(dg.sounding_column('detectionType')[:num_soundings] == 0,
+                                    dg.sounding_column('detectionMethod')[:num_soundings] > 0)
 
-    def process_MWC(self, header, bytes_io):
+        # Discard oldest entry (#MRZ record never matched with #MWC record) when index is full
+        if len(self.bottom_detections) >= self.MAX_NUM_BOTTOM_DETECTIONS:
+            del self.bottom_detections[next(iter(self.bottom_detections))]
+
+        self.bottom_detections[(dg.cmnPart.pingCnt, dg.cmnPart.rxFanIndex)] = \
+            (header['dgTime'], wc_beam_np[valid_mask], wc_range_np[valid_mask])
+
+        if self.ray_tracing:
+            self.update_transducer_depth(dg.pingInfo.txTransducerDepth_m)
+
+    def get_bottom_detection(self, header, ping_count, rx_fan_index, num_beams):
+        """
+        Finds and removes bottom detections matching given #MWC record from index of recent bottom detections.
+        Records are matched by ping count and rx fan index; timestamps must also agree (ping count wraps).
+        :param header: Header field of #MWC datagram.
+        :param ping_count: Ping count (pingCnt) of #MWC datagram.
+        :param rx_fan_index: Rx fan index (rxFanIndex) of #MWC datagram.
+        :param num_beams: Number of water column beams in #MWC datagram.
+        :return: Numpy array containing detected range (in samples) of each water column beam (zero where bottom
+        not detected); None if no matching #MRZ record was received.
+        """
+        bottom_detection = self.bottom_detections.pop((ping_count, rx_fan_index), None)
+
+        if bottom_detection is None or \
+                abs(bottom_detection[0] - header['dgTime']) > self.BOTTOM_DETECTION_TIME_TOLERANCE_SEC:
+            return None
+
+        timestamp, wc_beam_np, wc_range_np = bottom_detection
+        beam_mask = wc_beam_np < num_beams
+
+        # Where several soundings share a water column beam, use nearest
+        detected_range_np = np.full(num_beams, np.inf, dtype=self.FLOAT_DTYPE)
+        np.minimum.at(detected_range_np, wc_beam_np[beam_mask], wc_range_np[beam_mask])
+        detected_range_np[np.isinf(detected_range_np)] = 0
+
+        return detected_range_np
+
+    def process_MWC(self, header, dg_bytes):
         """
         Process #MWC datagram. Bins water column data, creates standard format pie records.
+        Samples of each beam are capped at the detected bottom (from matching #MRZ record when available) and
+        samples beyond the bottom are never transformed or binned; the bottom is published with the pie record.
+        All floating point arithmetic is done with self.FLOAT_DTYPE (see 'precision' in advanced settings);
+        amplitudes and counts are accumulated directly into arrays of the dtypes used by SharedRingBufferRaw.
         :param header: Header field of #MWC datagram.
-        :param bytes_io: #MWC datagram as BytesIO object.
+        :param dg_bytes: #MWC datagram (bytes, or any buffer); only fields used are decoded (see MWCView).
         :return: #MWC data as a PieStandardFormat object.
         """
-        header_struct_format = k.read_EMdgmHeader(None, return_format=True)
-        partition_struct_format = k.read_EMdgmMpartition(None, header['dgmType'],
-                                                         header['dgmVersion'], return_format=True)
+        length_to_strip = k.get_m_header_size(header['dgmType'], header['dgmVersion'])
 
-        length_to_strip = struct.calcsize(header_struct_format) + \
-                          struct.calcsize(partition_struct_format)
+        # Position at time of ping, interpolated from buffered #SPO position fixes
+        latitude, longitude = self.position_buffer.interpolate(header['dgTime'])
 
-        pie_chart_amplitudes = np.zeros(shape=(self.max_grid_cells_local, self.max_grid_cells_local))
-        pie_chart_counts = np.zeros(shape=(self.max_grid_cells_local, self.max_grid_cells_local))
+        # Pie chart grids of each bin size level (level 0 at base bin size; see num_bin_size_levels), and depth
+        # (in rows of pie chart grid) of detected bottom in each across-track column (NaN where unavailable)
+        pie_chart_amplitudes, pie_chart_counts, bottom_depths = self.get_pie_grids()
 
         # If #MWC record is 'empty' (did not receive all partitions):
         if header['numBytesDgm'] == length_to_strip:
@@ -184,219 +445,719 @@ class KongsbergDGProcess(Process):
             print("Processing empty datagram.")
 
             # Create an 'empty' PieStandardFormat record
-            pie_object = PieStandardFormat(self.bin_size_local, self.max_heave_local,
-                                           pie_chart_amplitudes, pie_chart_counts, header['dgTime'])
+            pie_object = self.create_pie(pie_chart_amplitudes, pie_chart_counts, header['dgTime'],
+                                         latitude, longitude, bottom_depths, sample_record=self.empty_sample_record)
+            # Not processed through geometry and binning stages: not timed
+            self.latency_histogram.discard()
 
             return pie_object
 
         # Full datagram (all partitions received):
         else:
-            dg = k.read_EMdgmMWC(bytes_io, return_numpy=True)
-
-            # TxInfo fields:
-            heave = dg['txInfo']['heave_m']
+            # Fields are decoded on access; sample amplitudes are numpy (int8) views of dg_bytes (no copies)
+            dg = MWCView(dg_bytes)
 
-            # SectorData fields:
-            tilt_angle_re_tx_deg_3_sectors = dg['sectorData']['tiltAngleReTx_deg']
+            heave = self.FLOAT_DTYPE(dg.txInfo.heave_m)
 
-            # RxInfo fields:
-            num_beams = dg['rxInfo']['numBeams']
-            tvg_offset_db = dg['rxInfo']['TVGoffset_dB']
-            sample_freq = dg['rxInfo']['sampleFreq_Hz']
-            sound_speed = dg['rxInfo']['soundVelocity_mPerSec']
+            num_beams = dg.rxInfo.numBeams
+            tvg_offset_db = dg.rxInfo.TVGoffset_dB
+            sample_freq = dg.rxInfo.sampleFreq_Hz
+            sound_speed = dg.rxInfo.soundVelocity_mPerSec
 
-            print("Sample Frequency (Hz):", sample_freq)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Sample Frequency (Hz): {}".format(sample_freq))
 
-            # BeamData fields:
             # Across-track beam angle array:
-            # beam_point_angle_re_vertical_np = np.array(dg['beamData']['beamPointAngReVertical_deg'])
-            # This way of converting lists to python arrays is faster!
-            beam_point_angle_re_vertical_np = np.empty(shape=len(dg['beamData']['beamPointAngReVertical_deg']),
-                                                       dtype=np.float32)
-            beam_point_angle_re_vertical_np[:] = dg['beamData']['beamPointAngReVertical_deg']
+            beam_point_angle_re_vertical_np = dg.beam_column('beamPointAngReVertical_deg').astype(self.FLOAT_DTYPE)
 
-
-            # TODO: Calculate sin / cos first, then extend array?
             # Along-track beam angle array:
-            sector_tilt_angle_re_tx_deg_np = np.array([tilt_angle_re_tx_deg_3_sectors[i] for i
-                                                       in dg['beamData']['beamTxSectorNum']])
+            sector_tilt_angle_re_tx_deg_np = np.empty(shape=len(dg.txSectorData), dtype=self.FLOAT_DTYPE)
+            sector_tilt_angle_re_tx_deg_np[:] = [sector_data.tiltAngleReTx_deg for sector_data in dg.txSectorData]
+            sector_tilt_angle_re_tx_deg_np = sector_tilt_angle_re_tx_deg_np[dg.beam_column('beamTxSectorNum')]
 
             # TODO: With access to #SKM datagrams, interpolate pitch to find tilt_angle_re_vertical_deg:
             # tilt_angle_re_vertical_deg = sector_tilt_angle_re_tx_deg + interpolated_pitch
             # TODO: For now, use sector_tilt_angle_re_tx_deg_np as an approximation for tilt_angle_re_vertical_deg.
             tilt_angle_re_vertical_deg = sector_tilt_angle_re_tx_deg_np
 
-            # Detected range indicates bottom-detect point (zero bottom not detected)
-            # detected_range_np = np.array(dg['beamData']['detectedRangeInSamples'])
-            # This way of converting lists to python arrays is faster!
-            detected_range_np = np.empty(shape=len(dg['beamData']['detectedRangeInSamples']), dtype=np.uint16)
-            detected_range_np[:] = dg['beamData']['detectedRangeInSamples']
+            # Bottom detections: use valid soundings from matching #MRZ record when available; otherwise, use
+            # detected range from #MWC record (zero bottom not detected)
+            detected_range_np = self.get_bottom_detection(header, dg.cmnPart.pingCnt, dg.cmnPart.rxFanIndex,
+                                                          num_beams)
+            if detected_range_np is None:
+                detected_range_np = dg.beam_column('detectedRangeInSamples').astype(self.FLOAT_DTYPE)
+
+            num_sample_data_np = dg.beam_column('numSampleData').astype(np.int32)
 
-            sample_amplitude = dg['beamData']['sampleAmplitude05dB_p']
+            # List of numpy (int8) views, one per beam
+            sample_amplitude = dg.sample_amplitudes()
+
+            self.latency_histogram.mark(LatencyHistogram.DECODE)
 
             # For debugging:
-            print("detected_range_np.shape: ", detected_range_np.shape)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("detected_range_np.shape: {}".format(detected_range_np.shape))
 
             if not np.any(detected_range_np):
                 # All #MWC data is present, but there were no bottom detects for this ping
                 # (Bottom detect values are all zero.)
 
                 # Create an 'empty' PieStandardFormat record
-                pie_object = PieStandardFormat(self.bin_size_local, self.max_heave_local,
-                                               pie_chart_amplitudes, pie_chart_counts, header['dgTime'])
+                pie_object = self.create_pie(pie_chart_amplitudes, pie_chart_counts, header['dgTime'],
+                                             latitude, longitude, bottom_depths,
+                                             sample_record=self.empty_sample_record)
+                # Not processed through geometry and binning stages: not timed
+                self.latency_histogram.discard()
                 return pie_object
 
-            # Compute average for non-zero values:
-            average_detected_range_for_swath = np.average(detected_range_np[detected_range_np > 0])
-            # Replace zero values (no bottom detect) with average value:
-            detected_range_np[detected_range_np == 0] = average_detected_range_for_swath
+            beam_point_angle_re_vertical_rad = np.radians(beam_point_angle_re_vertical_np)
+            sin_beam_np = np.sin(beam_point_angle_re_vertical_rad)
+            cos_beam_np = np.cos(beam_point_angle_re_vertical_rad)
+            cos_tilt_np = np.cos(np.radians(tilt_angle_re_vertical_deg))
+            cos_beam_tilt_np = cos_tilt_np * cos_beam_np
+
+            # Fill gaps (no bottom detect) by interpolating vertical range to bottom across neighbouring beams
+            detected_mask = detected_range_np > 0
+            if not np.all(detected_mask):
+                beam_indices_np = np.arange(num_beams)
+                vertical_range_np = detected_range_np * cos_beam_np
+                vertical_range_np[~detected_mask] = np.interp(beam_indices_np[~detected_mask],
+                                                              beam_indices_np[detected_mask],
+                                                              vertical_range_np[detected_mask])
+                detected_range_np = vertical_range_np / cos_beam_np
+
+            # Cap samples of each beam at detected bottom (or at number of recorded samples): samples beyond
+            # bottom_sample_np are never transformed or binned.
+            bottom_sample_np = np.minimum(detected_range_np.astype(np.int32) + 1, num_sample_data_np)
+
+            if self.msr_masking_local:
+                # Minimum slant range (MSR): range of nearest bottom detection across swath. Beyond MSR, samples of
+                # all beams are dominated by sidelobe returns of bottom, so samples of each beam are further capped
+                # at MSR. Note that bottom polyline is not affected.
+                msr_sample = int(np.min(detected_range_np[detected_mask])) + 1
+                bottom_sample_np = np.minimum(bottom_sample_np, msr_sample)
+
+            range_scale = self.FLOAT_DTYPE(sound_speed / (sample_freq * 2))
+
+            # Beam geometry and samples above bottom, from which ping can be re-binned (see SharedSampleStore)
+            sample_record = None
+            if self.sample_store:
+                sample_record = SharedSampleStore.pack(heave, range_scale, tvg_offset_db, sin_beam_np,
+                                                       cos_beam_tilt_np, detected_range_np, sample_amplitude,
+                                                       bottom_sample_np)
+
+            # Number of consecutive samples of each beam summed into a range cell: a cell is no longer than
+            # (base) bin size, so that samples of a cell fall into (at most) two adjacent bins in each dimension.
+            # When degraded (quality of service), a cell is no longer than twice bin size.
+            if self.qos_level_local >= QualityOfServiceController.COARSE_CELLS:
+                samples_per_cell = max(1, int(2 * round(self.base_bin_size_local, 2) / range_scale))
+            elif self.pre_averaging:
+                samples_per_cell = max(1, int(round(self.base_bin_size_local, 2) / range_scale))
+            else:
+                samples_per_cell = 1
+
+            # Note: For y, we need "(self.max_grid_cells_local / 2)" to 'normalize position'--otherwise, negative
+            # indices insert values at the end of the array (think negative indexing into array).
+            # Note: For z, (self.max_heave / self.bin_size) results in number of bins allowable above '0' (neutral sea
+            # surface). For example, for a negative (upward) heave that results in a bin index of -20, if self.max_heave
+            # is 1 and self.bin_size is 0.05, we will add 20 to the bin index. -20 (bin_index) + 20 (adjustment) = 0
+            # (*new* bin_index).
+            # Note: We will approximate a swath as a 2-dimensional y, z plane rotated about the z axis.
+            # Bin size of level k is base bin size * 2 ** k; bins of level 0 are the finest.
+            inverse_bin_size, level_scale_np, index_offset_y_np, index_offset_z_np = self.grid_geometry(
+                self.base_bin_size_local, self.max_heave_local, self.max_grid_cells_local, self.num_bin_size_levels,
+                self.FLOAT_DTYPE)
+
+            # Grid of coarsest level covers greatest extent: samples outside of it are not binned at any level.
+            coarsest_inverse_bin_size = inverse_bin_size * level_scale_np[-1]
+            index_offset_y = index_offset_y_np[-1]
+            index_offset_z = index_offset_z_np[-1]
+
+            # Ray tracing table (see update_sound_velocity_profile); may be swapped by background thread at any time,
+            # so take a single reference for this ping.
+            ray_trace_table = self.ray_trace_table
+            if ray_trace_table is not None:
+                # Beams are steered with sound velocity at transducer; find ray of table each beam follows
+                launch_angle_deg_np = ray_trace_table.launch_angles(beam_point_angle_re_vertical_np, sound_speed)
+
+            if ray_trace_table is not None:
+                # With ray tracing, bin indices are not linear in range; every sample above bottom is visited and
+                # samples beyond grid are counted by bin_beam_samples_ray_traced. (Slices-only binning is not
+                # applied.)
+                sample_intervals = [(np.zeros(num_beams, dtype=np.int32), bottom_sample_np)]
+                num_lost_y = 0
+                num_lost_z = 0
+            else:
+                # Across-track (y) and depth (z) bin index of a sample are linear in range; work out samples of each
+                # beam that fall inside grid analytically, rather than transforming every sample and masking afterward.
+                y_slope_np = sin_beam_np * coarsest_inverse_bin_size
+                y_intercept = index_offset_y
+                z_slope_np = cos_beam_tilt_np * coarsest_inverse_bin_size
+                z_intercept = heave * coarsest_inverse_bin_size + index_offset_z
+
+                y_start_np, y_stop_np = self.sample_interval(y_slope_np, y_intercept,
+                                                             0, self.max_grid_cells_local, range_scale)
+                z_start_np, z_stop_np = self.sample_interval(z_slope_np, z_intercept,
+                                                             0, self.max_grid_cells_local, range_scale)
+
+                grid_start_np = np.maximum(y_start_np, z_start_np)
+                grid_stop_np = np.minimum(np.minimum(y_stop_np, z_stop_np), bottom_sample_np)
+
+                # Samples (above bottom) beyond across-track and depth bounds of grid; the few samples at edges of
+                # intervals (and, with several levels, samples beyond grid of finest level) are counted by
+                # bin_beam_samples.
+                num_in_y_np = np.maximum(np.minimum(y_stop_np, bottom_sample_np) - y_start_np, 0)
+                num_in_grid_np = np.maximum(grid_stop_np - grid_start_np, 0)
+                num_lost_y = int(np.sum(bottom_sample_np - num_in_y_np))
+                num_lost_z = int(np.sum(num_in_y_np - num_in_grid_np))
+
+                if self.slices_only or (self.qos_level_local >= QualityOfServiceController.SLICES_ONLY_PINGS and
+                                        self.qos_ping_parity and self.num_bin_size_levels == 1):
+                    # Only samples contributing to vertical slices (columns about their across-track offsets) and
+                    # horizontal slices (rows about their depths) are binned. Note that across-track index is
+                    # flipped in bin_beam_samples; vertical slice columns are converted to unflipped indices here.
+                    slice_intervals = []
+                    for start_index, end_index in self.vertical_slice_windows:
+                        slice_intervals.append(self.sample_interval(
+                            y_slope_np, y_intercept, self.max_grid_cells_local - end_index,
+                            self.max_grid_cells_local - start_index, range_scale))
+                    for start_index, end_index in self.horizontal_slice_windows:
+                        slice_intervals.append(self.sample_interval(z_slope_np, z_intercept, start_index,
+                                                                    end_index, range_scale))
+
+                    # Sample intervals (start, stop) to bin; samples common to several slices are binned only once.
+                    sample_intervals = self.disjoint_intervals(
+                        [(np.maximum(start_np, grid_start_np), np.minimum(stop_np, grid_stop_np))
+                         for start_np, stop_np in slice_intervals])
+                else:
+                    sample_intervals = [(grid_start_np, grid_stop_np)]
+
+            # Skip beams with no samples to bin
+            num_samples_to_bin_np = np.zeros(num_beams, dtype=np.int32)
+            for start_sample_np, stop_sample_np in sample_intervals:
+                num_samples_to_bin_np += np.maximum(stop_sample_np - start_sample_np, 0)
+            active_beams_np = np.flatnonzero(num_samples_to_bin_np)
+
+            if self.qos_level_local >= QualityOfServiceController.DECIMATE_BEAMS:
+                # Bin every other beam, alternating between pings
+                active_beams_np = active_beams_np[active_beams_np % 2 == self.qos_ping_parity]
+
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Beams to bin: {} of {}; samples to bin: {}."
+                             .format(len(active_beams_np), num_beams, int(np.sum(num_samples_to_bin_np))))
+
+            self.latency_histogram.mark(LatencyHistogram.GEOMETRY)
+
+            if len(active_beams_np) > 0:
+                max_stop_sample = max(int(np.max(stop_sample_np[active_beams_np]))
+                                      for start_sample_np, stop_sample_np in sample_intervals)
+
+                # Calculate range (distance) to every sample from 0 to last sample to bin:
+                range_to_wc_data_point_np = np.multiply(self.get_sample_indices(max_stop_sample), range_scale,
+                                                        out=self.scratch.get('range', max_stop_sample,
+                                                                             self.FLOAT_DTYPE))
+
+                # Amplitudes of beams to bin, concatenated; samples of i-th beam start at beam_offset_np[i]
+                beam_offset_np = np.zeros(len(active_beams_np), dtype=np.int64)
+                np.cumsum(num_sample_data_np[active_beams_np][:-1], out=beam_offset_np[1:])
+                sample_amplitude_np = np.concatenate(
+                    [sample_amplitude[beam] for beam in active_beams_np],
+                    out=self.scratch.get('amplitude', int(np.sum(num_sample_data_np[active_beams_np])),
+                                         np.int8)).view(np.uint8)
+
+                if self.qos_level_local >= QualityOfServiceController.COARSE_GRID:
+                    # Bin into grids of twice bin size of each level, aligned with pie chart grids; expanded below
+                    grid_amplitudes = self.scratch.zeros('grid_amplitudes',
+                                                         (self.num_bin_size_levels,
+                                                          (self.max_grid_cells_local + 3) // 2,
+                                                          (self.max_grid_cells_local + 3) // 2),
+                                                         self.AMPLITUDE_DTYPE)
+                    grid_counts = self.scratch.zeros('grid_counts', grid_amplitudes.shape, self.COUNT_DTYPE)
+                    grid_inverse_bin_size = inverse_bin_size * self.FLOAT_DTYPE(0.5)
+                    grid_index_offset_y_np = index_offset_y_np // 2
+                    grid_index_offset_z_np = index_offset_z_np // 2
+                else:
+                    grid_amplitudes = pie_chart_amplitudes
+                    grid_counts = pie_chart_counts
+                    grid_inverse_bin_size = inverse_bin_size
+                    grid_index_offset_y_np = index_offset_y_np
+                    grid_index_offset_z_np = index_offset_z_np
+
+                # Pie chart will be approximated as a 2-dimensional y, z grid.
+                # Across-track index is flipped in bin_beam_samples (rather than flipping pie) to avoid mirror-image
+                # pie display.
+                for start_sample_np, stop_sample_np in sample_intervals:
+                    if ray_trace_table is not None:
+                        num_lost_edge_y, num_lost_edge_z = self.bin_beam_samples_ray_traced(
+                            sample_amplitude_np, beam_offset_np,
+                            start_sample_np[active_beams_np], stop_sample_np[active_beams_np],
+                            launch_angle_deg_np[active_beams_np], cos_tilt_np[active_beams_np],
+                            ray_trace_table.across_track_np, ray_trace_table.depth_np,
+                            ray_trace_table.angle_step_deg,
+                            1 / (2 * sample_freq * ray_trace_table.time_step_sec),
+                            heave, grid_inverse_bin_size, level_scale_np, grid_index_offset_y_np,
+                            grid_index_offset_z_np, self.get_amplitude_table(tvg_offset_db), samples_per_cell,
+                            grid_amplitudes, grid_counts)
+                    else:
+                        num_lost_edge_y, num_lost_edge_z = self.bin_beam_samples(
+                            sample_amplitude_np, beam_offset_np,
+                            start_sample_np[active_beams_np], stop_sample_np[active_beams_np],
+                            range_to_wc_data_point_np, sin_beam_np[active_beams_np], cos_beam_tilt_np[active_beams_np],
+                            heave, grid_inverse_bin_size, level_scale_np, grid_index_offset_y_np,
+                            grid_index_offset_z_np, self.get_amplitude_table(tvg_offset_db), samples_per_cell,
+                            grid_amplitudes, grid_counts)
+                    num_lost_y += num_lost_edge_y
+                    num_lost_z += num_lost_edge_z
+
+                if self.qos_level_local >= QualityOfServiceController.COARSE_GRID:
+                    for level in range(self.num_bin_size_levels):
+                        self.expand_coarse_grid(grid_amplitudes[level], grid_counts[level],
+                                                index_offset_y_np[level] % 2, index_offset_z_np[level] % 2,
+                                                np.issubdtype(self.AMPLITUDE_DTYPE, np.integer),
+                                                pie_chart_amplitudes[level], pie_chart_counts[level])
+
+            self.latency_histogram.mark(LatencyHistogram.BINNING)
+
+            # Error checking and warning if data was lost:
+            if num_lost_y > 0:
+                logger.warning("Across-track width exceed maximum grid bounds. "
+                               "{} data points beyond bounds will be lost. Consider increasing bin size."
+                               .format(num_lost_y))
 
-            print("KongsbergDGProcess, max(detected_range_np):", max(detected_range_np))
+            if num_lost_z > 0:
+                logger.warning("Heave ({:.5f}) exceeds maximum heave ({}) by {:.5f} meters. {} data points "
+                               "beyond maximum heave will be lost. Consider increasing maximum heave."
+                               .format(heave, round(self.max_heave_local, 2),
+                                       (heave + round(self.max_heave_local, 2)), num_lost_z))
+
+            # Bottom polyline: depth (in fractional rows of pie chart grid) of detected bottom at centre of each
+            # (flipped) across-track column, interpolated between beams; NaN outside of swath.
+            if ray_trace_table is not None:
+                bottom_across_track_np, bottom_depth_np = ray_trace_table.positions(
+                    launch_angle_deg_np, detected_range_np / (2 * sample_freq))
+                bottom_depth_np *= cos_tilt_np
+                valid_mask = np.isfinite(bottom_across_track_np)
+                bottom_across_track_np = bottom_across_track_np[valid_mask]
+                bottom_depth_np = bottom_depth_np[valid_mask]
+            else:
+                bottom_range_np = detected_range_np * range_scale
+                bottom_across_track_np = bottom_range_np * sin_beam_np
+                bottom_depth_np = bottom_range_np * cos_beam_tilt_np
+            self.interpolate_bottom_depths(bottom_across_track_np, bottom_depth_np, heave, inverse_bin_size,
+                                           level_scale_np, index_offset_y_np, index_offset_z_np, bottom_depths)
+
+            pie_object = self.create_pie(pie_chart_amplitudes, pie_chart_counts, header['dgTime'],
+                                         latitude, longitude, bottom_depths, sample_record=sample_record)
+            self.latency_histogram.mark(LatencyHistogram.PIE)
 
-            # Create an array from 0 to max(detected_range_np), with a step size of 1
-            # Tile above array num_beams number of times
-            range_indices_np = np.tile(np.arange(0, (np.max(detected_range_np) + 1), 1), (num_beams, 1))
+        return pie_object
 
-            # For debugging:
-            print("range_indices_np.shape, before: ", range_indices_np.shape)
+    def get_pie_grids(self):
+        """
+        Gets pie chart amplitude and count grids (zeroed) and bottom depths (NaN) for a new pie record from pool of
+        grids (see GridPool). Grids are lent to pie record by create_pie, and are reused once pie record is no longer
+        referenced. Note that records placed in queue_pie_object are pickled (by queue's feeder thread) some time
+        after put(); until then, the queue holds a reference to the record, and its grids are not reused.
+        :return: Numpy arrays of amplitudes and counts (levels by grid cells by grid cells) and of bottom depths
+        (levels by grid cells).
+        """
+        shape = (self.num_bin_size_levels, self.max_grid_cells_local, self.max_grid_cells_local)
 
-            # Mask values beyond actual reported detected range for any given beam
-            # Based on: https://stackoverflow.com/questions/67978532/
-            # how-to-mask-rows-of-a-2d-numpy-matrix-by-values-in-1d-list
-            # And: https://stackoverflow.com/questions/29046162/numpy-array-loss-of-dimension-when-masking
-            range_indices_np = np.where(range_indices_np <= detected_range_np[:, None], range_indices_np, np.nan)
+        # Grids of previous grid size are dropped from pool when grids of a new size are allocated
+        grids = self.pie_grid_pool.acquire(shape, lambda: (np.empty(shape, dtype=self.AMPLITUDE_DTYPE),
+                                                           np.empty(shape, dtype=self.COUNT_DTYPE),
+                                                           np.empty(shape[:2], dtype=np.float32)))
 
-            # For debugging:
-            print("range_indices_np.shape, after: ", range_indices_np.shape)
+        grids[0].fill(0)
+        grids[1].fill(0)
+        grids[2].fill(np.nan)
+        return grids
 
-            # Calculate range (distance) to every point from 0 to detected range:
-            range_to_wc_data_point_np = (sound_speed * range_indices_np) / (sample_freq * 2)
+    def get_sample_indices(self, num_samples):
+        """
+        :param num_samples: Number of samples.
+        :return: Numpy array (self.FLOAT_DTYPE) of sample indices 0, 1, ..., num_samples - 1 (view of scratch array,
+        extended only when longer than any previous request).
+        """
+        sample_indices_np = self.scratch.arrays.get('sample_indices')
+        if sample_indices_np is None or len(sample_indices_np) < num_samples:
+            self.scratch.arrays['sample_indices'] = sample_indices_np = \
+                np.arange(max(num_samples, 2 * (0 if sample_indices_np is None else len(sample_indices_np))),
+                          dtype=self.FLOAT_DTYPE)
+        return sample_indices_np[:num_samples]
 
-            # For debugging:
-            print("tilt_angle_re_vertical_deg.shape:", tilt_angle_re_vertical_deg.shape)
-            # print(tilt_angle_re_vertical_deg)
-            print("beam_point_angle_re_vertical_np.shape:", beam_point_angle_re_vertical_np.shape)
-            # print(beam_point_angle_re_vertical_np)
-
-            # Convert from spherical to cartesian coordinates
-            kongs_x_np = range_to_wc_data_point_np * \
-                         (np.sin(np.radians(tilt_angle_re_vertical_deg)))[:, np.newaxis]
-            kongs_y_np = range_to_wc_data_point_np * \
-                         (np.sin(np.radians(beam_point_angle_re_vertical_np)))[:, np.newaxis]
-            kongs_z_np = range_to_wc_data_point_np * \
-                         (np.cos(np.radians(tilt_angle_re_vertical_deg)))[:, np.newaxis] * \
-                         (np.cos(np.radians(beam_point_angle_re_vertical_np)))[:, np.newaxis] + heave
+    @staticmethod
+    def grid_geometry(base_bin_size, max_heave, max_grid_cells, num_levels, float_dtype):
+        """
+        Geometry of pie chart grids of each bin size level; bin size of level k is base bin size * 2 ** k.
+        :param base_bin_size: Bin size (m) of level 0.
+        :param max_heave: Max heave (m).
+        :param max_grid_cells: Number of grid cells along each side of pie chart grid.
+        :param num_levels: Number of bin size levels.
+        :param float_dtype: Floating point dtype of inverse bin size and level scales.
+        :return: Inverse of bin size (1 / m) of finest level; ratio of bin size of finest level to bin size of each
+        level; number of columns to port of sonar, for each level; number of rows allotted to heave, for each level.
+        """
+        inverse_bin_size = float_dtype(1 / round(base_bin_size, 2))
+        level_scale_np = (0.5 ** np.arange(num_levels)).astype(float_dtype)
+        index_offset_y_np = np.full(num_levels, int(max_grid_cells / 2), dtype=np.int64)
+        index_offset_z_np = np.array([int(round(max_heave, 2) / round(round(base_bin_size, 2) * 2 ** level, 2))
+                                      for level in range(num_levels)], dtype=np.int64)
+        return inverse_bin_size, level_scale_np, index_offset_y_np, index_offset_z_np
 
-            # For debugging:
-            print("kongs_x_np.shape:", kongs_x_np.shape)
-            print("kongs_y_np.shape:", kongs_z_np.shape)
-            print("kongs_y_np.shape:", kongs_z_np.shape)
+    @staticmethod
+    def interpolate_bottom_depths(bottom_across_track_np, bottom_depth_np, heave, inverse_bin_size, level_scale_np,
+                                  index_offset_y_np, index_offset_z_np, bottom_depths):
+        """
+        Bottom polyline: depth (in fractional rows of pie chart grid) of detected bottom at centre of each (flipped)
+        across-track column, interpolated between beams; NaN outside of swath.
+        :param bottom_across_track_np: Across-track position (m) of detected bottom of each beam.
+        :param bottom_depth_np: Depth (m; without heave) of detected bottom of each beam.
+        :param heave: Heave (m).
+        :param inverse_bin_size: Inverse of bin size (1 / m) of finest level (see grid_geometry).
+        :param level_scale_np: Ratio of bin size of finest level to bin size of each level.
+        :param index_offset_y_np: Number of columns to port of sonar, for each level.
+        :param index_offset_z_np: Number of rows allotted to heave, for each level.
+        :param bottom_depths: Numpy array (levels x grid cells) of bottom depths; modified in place.
+        """
+        max_grid_cells = bottom_depths.shape[1]
+        for level in range(bottom_depths.shape[0]):
+            level_inverse_bin_size = inverse_bin_size * level_scale_np[level]
+            bottom_column_np = max_grid_cells - \
+                               (bottom_across_track_np * level_inverse_bin_size + int(index_offset_y_np[level]))
+            bottom_row_np = (bottom_depth_np + heave) * level_inverse_bin_size + int(index_offset_z_np[level])
+            sort_indices = np.argsort(bottom_column_np)
+            bottom_depths[level] = np.interp(np.arange(max_grid_cells) + 0.5,
+                                             bottom_column_np[sort_indices], bottom_row_np[sort_indices],
+                                             left=np.nan, right=np.nan)
+
+    def create_pie(self, pie_chart_amplitudes, pie_chart_counts, timestamp, latitude, longitude, bottom_depths,
+                   sample_record=None):
+        """
+        Creates standard format pie record from grids of each bin size level.
+        :param pie_chart_amplitudes: Grids of amplitude sums, by level.
+        :param pie_chart_counts: Grids of counts, by level.
+        :param timestamp: Time of ping.
+        :param latitude: Latitude at time of ping (or None).
+        :param longitude: Longitude at time of ping (or None).
+        :param bottom_depths: Depths (in rows of pie chart grid) of detected bottom, by level.
+        :param sample_record: Optional record of beam geometry and samples of ping (see SharedSampleStore.pack).
+        :return: PieStandardFormat object; bin size of record is base bin size (level 0), with grids of coarser
+        levels attached. Grids (see get_pie_grids) are lent to record.
+        """
+        pie_object = PieStandardFormat(self.base_bin_size_local, self.max_heave_local,
+                                       pie_chart_amplitudes[0], pie_chart_counts[0], timestamp,
+                                       latitude=latitude, longitude=longitude, bottom_depths=bottom_depths[0],
+                                       level_amplitudes=pie_chart_amplitudes[1:], level_counts=pie_chart_counts[1:],
+                                       level_bottom_depths=bottom_depths[1:], sample_record=sample_record)
+        self.pie_grid_pool.lend((pie_chart_amplitudes, pie_chart_counts, bottom_depths), pie_object)
+        return pie_object
 
-            # Note: For x and y, we need "(self.max_grid_cells_local / 2)" to 'normalize position'--otherwise, negative
-            # indices insert values at the end of the array (think negative indexing into array).
-            # Note: For z, (self.max_heave / self.bin_size) results in number of bins allowable above '0' (neutral sea
-            # surface). For example, for a negative (upward) heave that results in a bin index of -20, if self.max_heave
-            # is 1 and self.bin_size is 0.05, we will add 20 to the bin index. -20 (bin_index) + 20 (adjustment) = 0
-            # (*new* bin_index).
-            # Note: We will approximate a swath as a 2-dimensional y, z plane rotated about the z axis.
+    def get_amplitude_table(self, tvg_offset_db):
+        """
+        Gets (or builds and caches) 256-entry lookup table of amplitude of each raw amplitude for given TVG offset.
+        Raw amplitudes are int8 in 0.5 dB steps; table is indexed by raw amplitude viewed as uint8.
+        :param tvg_offset_db: TVG offset (dB) of ping.
+        :return: Numpy array (self.FLOAT_DTYPE) of amplitude in dB (raw * 0.5 - tvg_offset_db), or of linear intensity
+        (10 ^ (dB / 10)) when self.linear_averaging, of each raw amplitude; with integer amplitudes (see precision
+        policy), numpy array (self.AMPLITUDE_DTYPE) of amplitude in units of 0.5 dB (raw - 2 * tvg_offset_db).
+        """
+        amplitude_table = self.amplitude_tables.get(tvg_offset_db)
 
-            # We only need x bin index for bottom strike points (the last value in the np array).
-            # (Though, I'm not sure we need the x bin index at all, given that we have actual positions (kongs_x_np).)
+        if amplitude_table is None:
+            if len(self.amplitude_tables) >= self.MAX_NUM_AMPLITUDE_TABLES:
+                self.amplitude_tables.clear()
 
-            # Convert from cartesian coordinates to bin index
+            amplitude_table = self.build_amplitude_table(tvg_offset_db, self.FLOAT_DTYPE, self.AMPLITUDE_DTYPE,
+                                                         self.linear_averaging)
+            self.amplitude_tables[tvg_offset_db] = amplitude_table
 
-            # Use only final index (-1) for x-dimension bottom strike point
-            bin_index_x_np = np.floor(kongs_x_np[-1] / round(self.bin_size_local, 2)) + \
-                             int(self.max_grid_cells_local / 2)
-            bin_index_y_np = np.floor(kongs_y_np / round(self.bin_size_local, 2)) + \
-                             int(self.max_grid_cells_local / 2)
-            bin_index_z_np = np.floor(kongs_z_np / self.bin_size_local) + \
-                             int(round(self.max_heave_local, 2) / round(self.bin_size_local, 2))
+        return amplitude_table
 
-            # For debugging:
-            # print("bin_index_x_np.shape:", bin_index_x_np.shape)
-            # print("bin_index_y_np.shape:", bin_index_y_np.shape)
-            # print(bin_index_y_np)
-            # print("bin_index_z_np.shape:", bin_index_z_np.shape)
-            # print(bin_index_z_np)
+    @staticmethod
+    def build_amplitude_table(tvg_offset_db, float_dtype, amplitude_dtype, linear_averaging):
+        """
+        Builds 256-entry lookup table of amplitude of each raw amplitude for given TVG offset (see
+        get_amplitude_table).
+        :param tvg_offset_db: TVG offset (dB) of ping.
+        :param float_dtype: Floating point dtype (see precision_dtypes).
+        :param amplitude_dtype: Dtype in which amplitudes are accumulated (see precision_dtypes).
+        :param linear_averaging: True if amplitudes are averaged as linear intensities.
+        :return: Numpy array of amplitude of each raw amplitude.
+        """
+        raw_amplitude_np = np.arange(256, dtype=np.uint8).view(np.int8)
+        if np.issubdtype(amplitude_dtype, np.integer):
+            # TVG offset is an integer number of dB (int8 in #MWC record)
+            return raw_amplitude_np.astype(amplitude_dtype) - int(round(2 * tvg_offset_db))
 
-            # Mask indices that fall outside of accepted values: 0 to (MAX_NUM_GRID_CELLS - 1)
-            # Mask will read False for values outside of range, True for values inside range
-            mask_index_y = np.ma.masked_inside(bin_index_y_np, 0, (self.max_grid_cells_local - 1))
-            mask_index_z = np.ma.masked_inside(bin_index_z_np, 0, (self.max_grid_cells_local - 1))
+        amplitude_table = raw_amplitude_np * float_dtype(0.5) - float_dtype(tvg_offset_db)
+        if linear_averaging:
+            amplitude_table = np.power(10, amplitude_table.astype(np.float64) / 10)
+        return amplitude_table.astype(float_dtype)
 
-            # For debugging:
-            # print("mask_index_y.shape:", mask_index_y.shape)
-            # print("mask_index_y number nonzero values:", np.count_nonzero(mask_index_y) - len(np.isnan(mask_index_y)))
-            # print(mask_index_y)
-            # print("mask_index_z.shape:", mask_index_z.shape)
-            # print("mask_index_z number nonzero values:", np.count_nonzero(mask_index_z) - len(np.isnan(mask_index_z)))
-            # print(mask_index_z)
-
-            # Error checking and warning if data will be lost:
-            # if len(bin_index_y_np[~mask_index_y.mask]) > 0:  # This doesn't work because NaNs are masked.
-            # np.count_nonzero(np.isnan(bin_index_y_np[~mask_index_y.mask])) will count the number of nans that have been
-            # masked; only if length of masked array is greater than this are real values being masked.
-            if len(bin_index_y_np[~mask_index_y.mask]) > np.count_nonzero(np.isnan(bin_index_y_np[~mask_index_y.mask])):
-                print("Masked y values: ", bin_index_y_np[~mask_index_y.mask])
-                logger.warning("Across-track width exceed maximum grid bounds. "
-                               "{} data points beyond bounds will be lost. Consider increasing bin size."
-                               .format(len(bin_index_y_np[~mask_index_y.mask]) -
-                                       np.count_nonzero(np.isnan(bin_index_y_np[~mask_index_y.mask]))))
-
-            # if len(bin_index_z_np[~mask_index_z.mask]) > 0:  # This doesn't work because NaNs are masked.
-            # np.count_nonzero(np.isnan(bin_index_z_np[~mask_index_z.mask])) will count the number of nans that have
-            # been masked; only if length of masked array is greater than this are real values being masked.
-            # TODO: Something might be wrong here.
-            #  Occasional warning like: "Heave (-0.2) exceeds maximum heave (1) by 1.2 meters.
-            if len(bin_index_z_np[~mask_index_z.mask]) > np.count_nonzero(np.isnan(bin_index_z_np[~mask_index_z.mask])):
-                logger.warning("Heave ({:.5f}) exceeds maximum heave ({}) by {:.5f} meters. {} data points "
-                               "beyond maximum heave will be lost. Consider increasing maximum heave."
-                               .format(heave, round(self.max_heave_local, 2),
-                                       (heave + round(self.max_heave_local, 2)),
-                                       len(bin_index_z_np[~mask_index_z.mask])))
+    @staticmethod
+    @jit(nopython=True)
+    def expand_coarse_grid(grid_amplitudes, grid_counts, parity_y, parity_z, integer_amplitudes,
+                           pie_chart_amplitudes, pie_chart_counts):
+        """
+        Expands grid of twice bin size (as binned by bin_beam_samples with half of inverse bin size and half of index
+        offsets) to pie chart grid. Each coarse bin covers two by two bins of pie chart grid, shifted by parity
+        of index offsets. Each of these is assigned mean amplitude of coarse bin, with a quarter of its count
+        (at least one), so that ping is weighted approximately as if binned at full resolution.
+        :param grid_amplitudes: Coarse grid of amplitude sums (across-track index flipped).
+        :param grid_counts: Coarse grid of counts (across-track index flipped).
+        :param parity_y: Parity of across-track index offset of pie chart grid.
+        :param parity_z: Parity of depth index offset of pie chart grid.
+        :param integer_amplitudes: True if amplitude grids are integer; amplitudes are then rounded.
+        :param pie_chart_amplitudes: Grid of amplitude sums; modified in place.
+        :param pie_chart_counts: Grid of counts; modified in place.
+        """
+        max_grid_cells = pie_chart_amplitudes.shape[0]
+        num_grid_cells = grid_amplitudes.shape[0]
+        for grid_z in range(num_grid_cells):
+            for grid_column in range(num_grid_cells):
+                if grid_counts[grid_z, grid_column] == 0:
+                    continue
+                count = max(1, int(np.rint(grid_counts[grid_z, grid_column] / 4)))
+                amplitude = grid_amplitudes[grid_z, grid_column] / grid_counts[grid_z, grid_column] * count
+                if integer_amplitudes:
+                    amplitude = np.rint(amplitude)
+                # Unflip across-track index of coarse bin, then flip across-track index of pie chart bins
+                grid_y = (num_grid_cells - 1) - grid_column
+                for index_z in range(2 * grid_z + parity_z, min(2 * grid_z + parity_z + 2, max_grid_cells)):
+                    for index_y in range(2 * grid_y + parity_y, min(2 * grid_y + parity_y + 2, max_grid_cells)):
+                        pie_chart_amplitudes[index_z, (max_grid_cells - 1) - index_y] += amplitude
+                        pie_chart_counts[index_z, (max_grid_cells - 1) - index_y] += count
 
-            # Combine y, z masks:
-            mask_index_y_z = np.logical_and(mask_index_y.mask, mask_index_z.mask)
+    @staticmethod
+    def sample_interval(slope_np, intercept, lower, upper, range_scale):
+        """
+        Finds, for each beam, interval of sample numbers for which a quantity linear in range
+        (slope * range + intercept; for example, a bin index) lies in [lower, upper). Intervals are widened by one
+        sample at each end to allow for rounding; bin_beam_samples checks bounds of every sample it visits.
+        :param slope_np: Slope of quantity with respect to range (per meter), for each beam.
+        :param intercept: Value of quantity at zero range.
+        :param lower: Lower bound (inclusive) of quantity.
+        :param upper: Upper bound (exclusive) of quantity.
+        :param range_scale: Range (m) per sample.
+        :return: Numpy arrays of first sample (inclusive) and last sample (exclusive) of interval for each beam;
+        last sample is less than or equal to first sample where interval is empty.
+        """
+        max_sample = np.iinfo(np.int32).max
 
-            # Pie chart will be approximated as a 2-dimensional y, z grid.
-            # Combine y, z indices, convert from float to int:
-            y_z_indices = np.vstack((bin_index_z_np[mask_index_y_z], bin_index_y_np[mask_index_y_z])).astype(int)
+        sample_slope_np = slope_np.astype(np.float64) * range_scale
+        with np.errstate(divide='ignore', invalid='ignore'):
+            bound_lower_np = (lower - intercept) / sample_slope_np
+            bound_upper_np = (upper - intercept) / sample_slope_np
 
-            # For debugging:
-            if len(y_z_indices.shape) == 3:
-                print("hi")
-
-            # amplitude_np = (np.array(dg['beamData']['sampleAmplitude05dB_p']) * 0.5) - tvg_offset_db
-            # NOTE: This method results in two errors:
-            # Creating an ndarray from ragged nested sequences (which is a list-or-tuple of lists-or-tuples-or ndarrays
-            # with different lengths or shapes) is deprecated. If you meant to do this, you must specify 'dtype=object'
-            # when creating the ndarray.
-            # TypeError: can't multiply sequence by non-int of type 'float'
-            # NOTE: Fixed based on: https://stackoverflow.com/questions/10346336/list-of-lists-into-numpy-array
-            # First, make all sub-lists (nested lists) the same length:
-            max_len = max(map(len, (dg['beamData']['sampleAmplitude05dB_p'])))
-            amplitude_np = (np.array([list(sub_list) + [np.nan] * (max_len - len(sub_list))
-                                      for sub_list in dg['beamData']['sampleAmplitude05dB_p']]) * 0.5) - tvg_offset_db
-
-            # Trim amplitude_np to only include values of interest (up to np.max(detected_range_np) + 1)
-            amplitude_np = amplitude_np[:, :(np.max(detected_range_np) + 1)]
-
-            # Mask amplitude_np with same combination of y, z masks
-            amplitude_np = amplitude_np[mask_index_y_z]
-
-            # This method of indexing based on:
-            # https://stackoverflow.com/questions/47015578/numpy-assigning-values-to-2d-array-with-list-of-indices
-            pie_chart_amplitudes[tuple(y_z_indices)] += amplitude_np
-            pie_chart_counts[tuple(y_z_indices)] += 1
-
-            # This results in mirror-image pie display. Use flip!
-            # pie_object = PieStandardFormat(pie_chart_amplitudes, pie_chart_counts, dg['header']['dgTime'])
-            pie_object = PieStandardFormat(self.bin_size_local, self.max_heave_local,
-                                           np.flip(pie_chart_amplitudes, axis=1),
-                                           np.flip(pie_chart_counts, axis=1), dg['header']['dgTime'])
+        start_np = np.where(sample_slope_np > 0, bound_lower_np, bound_upper_np)
+        stop_np = np.where(sample_slope_np > 0, bound_upper_np, bound_lower_np)
 
-        return pie_object
+        # Where slope is zero, quantity is constant along beam:
+        zero_slope_mask = sample_slope_np == 0
+        start_np[zero_slope_mask] = 0
+        stop_np[zero_slope_mask] = max_sample if lower <= intercept < upper else 0
+
+        start_np = np.clip(np.floor(start_np) - 1, 0, max_sample).astype(np.int32)
+        stop_np = np.clip(np.floor(stop_np) + 2, 0, max_sample).astype(np.int32)
+
+        return start_np, stop_np
+
+    @staticmethod
+    def disjoint_intervals(intervals):
+        """
+        Converts intervals of sample numbers of each beam, which may overlap, to disjoint intervals covering the same
+        samples, so that no sample is binned twice.
+        :param intervals: List of (start, stop) numpy arrays of first sample (inclusive) and last sample (exclusive)
+        of interval for each beam.
+        :return: List of (start, stop) numpy arrays of disjoint intervals; last sample is less than or equal to first
+        sample where interval is empty.
+        """
+        start_np = np.array([start for start, stop in intervals])
+        stop_np = np.array([stop for start, stop in intervals])
+        # Empty intervals must not extend coverage
+        empty_mask = stop_np <= start_np
+        start_np[empty_mask] = 0
+        stop_np[empty_mask] = 0
+
+        # In order of first sample, trim start of each interval to end of samples covered by preceding intervals
+        order_np = np.argsort(start_np, axis=0, kind='stable')
+        start_np = np.take_along_axis(start_np, order_np, axis=0)
+        stop_np = np.take_along_axis(stop_np, order_np, axis=0)
+        covered_np = np.zeros_like(start_np[0])
+        disjoint = []
+        for start, stop in zip(start_np, stop_np):
+            start = np.maximum(start, covered_np)
+            covered_np = np.maximum(covered_np, stop)
+            disjoint.append((start, stop))
+        return disjoint
+
+    @staticmethod
+    @jit(nopython=True, nogil=True)
+    def bin_beam_samples(sample_amplitude_np, beam_offset_np, start_sample_np, stop_sample_np, range_np,
+                         sin_beam_np, cos_beam_tilt_np, heave, inverse_bin_size, level_scale_np, index_offset_y_np,
+                         index_offset_z_np, amplitude_table, samples_per_cell, pie_chart_amplitudes, pie_chart_counts):
+        """
+        Transforms samples of each beam (from start_sample_np[beam] up to, but not including,
+        stop_sample_np[beam]) from range / beam angle to bin indices and accumulates amplitudes and counts
+        into pie chart grids. Samples outside of these limits are never visited. Unlike fancy-indexed addition,
+        every sample is accumulated when several samples fall into the same bin.
+        Consecutive samples of each beam are grouped into range cells of samples_per_cell samples: amplitudes
+        of a cell are summed and the cell is transformed once, at its centre range, contributing its sum and
+        number of samples to a single bin of each grid. With samples_per_cell of 1, every sample is transformed.
+        Grids of several bin sizes (levels) are filled in the same pass: position of a cell is computed once, in
+        bins of finest level, and scaled to each level. The GIL is released, so that several pings can be binned
+        concurrently (see KongsbergSampleRebinner).
+        :param sample_amplitude_np: Raw amplitudes of all beams, concatenated, viewed as uint8.
+        :param beam_offset_np: Index of first sample of each beam in sample_amplitude_np.
+        :param start_sample_np: First sample to bin for each beam.
+        :param stop_sample_np: Sample at which to stop binning for each beam (exclusive).
+        :param range_np: Range (m) to each sample number.
+        :param sin_beam_np: Sine of across-track beam angle of each beam.
+        :param cos_beam_tilt_np: Product of cosines of across-track beam angle and along-track tilt of each beam.
+        :param heave: Heave (m).
+        :param inverse_bin_size: Inverse of bin size (1 / m) of finest level.
+        :param level_scale_np: Ratio of bin size of finest level to bin size of each level.
+        :param index_offset_y_np: Number of columns to port of sonar, for each level.
+        :param index_offset_z_np: Number of rows allotted to heave, for each level.
+        :param amplitude_table: Amplitude of each raw amplitude (see get_amplitude_table).
+        :param samples_per_cell: Number of consecutive samples of each beam in a range cell.
+        :param pie_chart_amplitudes: Grids of amplitude sums, by level; modified in place.
+        :param pie_chart_counts: Grids of counts, by level; modified in place.
+        :return: Number of samples lost beyond across-track and depth bounds of grid of finest level.
+        """
+        num_levels = pie_chart_amplitudes.shape[0]
+        max_grid_cells = pie_chart_amplitudes.shape[1]
+        num_lost_y = 0
+        num_lost_z = 0
+        for beam in range(stop_sample_np.shape[0]):
+            for cell_start in range(start_sample_np[beam], stop_sample_np[beam], samples_per_cell):
+                cell_stop = min(cell_start + samples_per_cell, stop_sample_np[beam])
+                num_samples = cell_stop - cell_start
+                cell_range = (range_np[cell_start] + range_np[cell_stop - 1]) * 0.5
+
+                # Position of cell in bins of finest level
+                bins_y = cell_range * sin_beam_np[beam] * inverse_bin_size
+                bins_z = (cell_range * cos_beam_tilt_np[beam] + heave) * inverse_bin_size
+
+                amplitude_sum = amplitude_table[0] * 0  # Accumulate in (widened) dtype of amplitude_table
+                summed = False
+                for level in range(num_levels):
+                    index_y = int(np.floor(bins_y * level_scale_np[level])) + index_offset_y_np[level]
+                    if index_y < 0 or index_y >= max_grid_cells:
+                        if level == 0:
+                            num_lost_y += num_samples
+                        continue
+                    index_z = int(np.floor(bins_z * level_scale_np[level])) + index_offset_z_np[level]
+                    if index_z < 0 or index_z >= max_grid_cells:
+                        if level == 0:
+                            num_lost_z += num_samples
+                        continue
+
+                    if not summed:
+                        for sample in range(beam_offset_np[beam] + cell_start, beam_offset_np[beam] + cell_stop):
+                            amplitude_sum += amplitude_table[sample_amplitude_np[sample]]
+                        summed = True
+
+                    pie_chart_amplitudes[level, index_z, (max_grid_cells - 1) - index_y] += amplitude_sum
+                    pie_chart_counts[level, index_z, (max_grid_cells - 1) - index_y] += num_samples
+        return num_lost_y, num_lost_z
+
+    @staticmethod
+    @jit(nopython=True)
+    def bin_beam_samples_ray_traced(sample_amplitude_np, beam_offset_np, start_sample_np, stop_sample_np,
+                                    beam_angle_deg_np, cos_tilt_np, across_track_table, depth_table, angle_step_deg,
+                                    table_steps_per_sample, heave, inverse_bin_size, level_scale_np,
+                                    index_offset_y_np, index_offset_z_np, amplitude_table, samples_per_cell,
+                                    pie_chart_amplitudes, pie_chart_counts):
+        """
+        As bin_beam_samples, but across-track position and depth of each range cell are interpolated (bilinearly,
+        in launch angle and one-way travel time) from ray tracing tables (see RayTraceTable) rather than computed
+        along a straight line.
+        :param sample_amplitude_np: Raw amplitudes of all beams, concatenated, viewed as uint8.
+        :param beam_offset_np: Index of first sample of each beam in sample_amplitude_np.
+        :param start_sample_np: First sample to bin for each beam.
+        :param stop_sample_np: Sample at which to stop binning for each beam (exclusive).
+        :param beam_angle_deg_np: Across-track beam angle (launch angle re vertical, in degrees) of each beam.
+        :param cos_tilt_np: Cosine of along-track tilt of each beam.
+        :param across_track_table: Across-track position (m) by launch angle and one-way travel time.
+        :param depth_table: Depth (m) by launch angle and one-way travel time.
+        :param angle_step_deg: Spacing (degrees) of launch angles in tables.
+        :param table_steps_per_sample: Number of travel time steps of tables per sample.
+        :param heave: Heave (m).
+        :param inverse_bin_size: Inverse of bin size (1 / m) of finest level.
+        :param level_scale_np: Ratio of bin size of finest level to bin size of each level.
+        :param index_offset_y_np: Number of columns to port of sonar, for each level.
+        :param index_offset_z_np: Number of rows allotted to heave, for each level.
+        :param amplitude_table: Amplitude of each raw amplitude (see get_amplitude_table).
+        :param samples_per_cell: Number of consecutive samples of each beam in a range cell.
+        :param pie_chart_amplitudes: Grids of amplitude sums, by level; modified in place.
+        :param pie_chart_counts: Grids of counts, by level; modified in place.
+        :return: Number of samples lost beyond across-track and depth bounds of grid of finest level
+        (or beyond tables).
+        """
+        num_levels = pie_chart_amplitudes.shape[0]
+        max_grid_cells = pie_chart_amplitudes.shape[1]
+        num_angles = across_track_table.shape[0]
+        num_times = across_track_table.shape[1]
+        num_lost_y = 0
+        num_lost_z = 0
+        for beam in range(stop_sample_np.shape[0]):
+            angle_index = abs(beam_angle_deg_np[beam]) / angle_step_deg
+            angle_lower = int(angle_index)
+            if angle_lower >= num_angles - 1:
+                num_lost_y += max(stop_sample_np[beam] - start_sample_np[beam], 0)
+                continue
+            angle_weight = angle_index - angle_lower
+            side = 1.0 if beam_angle_deg_np[beam] >= 0 else -1.0
+
+            for cell_start in range(start_sample_np[beam], stop_sample_np[beam], samples_per_cell):
+                cell_stop = min(cell_start + samples_per_cell, stop_sample_np[beam])
+                num_samples = cell_stop - cell_start
+
+                time_index = (cell_start + cell_stop - 1) * 0.5 * table_steps_per_sample
+                time_lower = int(time_index)
+                if time_lower >= num_times - 1:
+                    num_lost_z += num_samples
+                    continue
+                time_weight = time_index - time_lower
+
+                across_track = \
+                    ((across_track_table[angle_lower, time_lower] * (1 - time_weight) +
+                      across_track_table[angle_lower, time_lower + 1] * time_weight) * (1 - angle_weight) +
+                     (across_track_table[angle_lower + 1, time_lower] * (1 - time_weight) +
+                      across_track_table[angle_lower + 1, time_lower + 1] * time_weight) * angle_weight)
+                depth = ((depth_table[angle_lower, time_lower] * (1 - time_weight) +
+                          depth_table[angle_lower, time_lower + 1] * time_weight) * (1 - angle_weight) +
+                         (depth_table[angle_lower + 1, time_lower] * (1 - time_weight) +
+                          depth_table[angle_lower + 1, time_lower + 1] * time_weight) * angle_weight)
+
+                # Position of cell in bins of finest level
+                bins_y = side * across_track * inverse_bin_size
+                bins_z = (depth * cos_tilt_np[beam] + heave) * inverse_bin_size
+
+                amplitude_sum = amplitude_table[0] * 0  # Accumulate in (widened) dtype of amplitude_table
+                summed = False
+                for level in range(num_levels):
+                    index_y = int(np.floor(bins_y * level_scale_np[level])) + index_offset_y_np[level]
+                    if index_y < 0 or index_y >= max_grid_cells:
+                        if level == 0:
+                            num_lost_y += num_samples
+                        continue
+                    index_z = int(np.floor(bins_z * level_scale_np[level])) + index_offset_z_np[level]
+                    if index_z < 0 or index_z >= max_grid_cells:
+                        if level == 0:
+                            num_lost_z += num_samples
+                        continue
+
+                    if not summed:
+                        for sample in range(beam_offset_np[beam] + cell_start, beam_offset_np[beam] + cell_stop):
+                            amplitude_sum += amplitude_table[sample_amplitude_np[sample]]
+                        summed = True
+
+                    pie_chart_amplitudes[level, index_z, (max_grid_cells - 1) - index_y] += amplitude_sum
+                    pie_chart_counts[level, index_z, (max_grid_cells - 1) - index_y] += num_samples
+        return num_lost_y, num_lost_z
 
     # def process_MWC(self, header, bytes_io):
     #     """
@@ -798,6 +1559,120 @@ class KongsbergDGProcess(Process):
     #
     #     return kongs_x_np, kongs_y_np, kongs_z_np
 
+    def process_SPO(self, header, dg_bytes):
+        """
+        Process #SPO datagram. Adds position fix from active position sensor to position buffer.
+        :param header: Header field of #SPO datagram.
+        :param dg_bytes: #SPO datagram (bytes, or any buffer); only fields used are decoded (see SPOView).
+        :return: None
+        """
+        dg = SPOView(dg_bytes)
+
+        sensor_status = dg.cmnPart.sensorStatus
+        # Use only valid data (bit 4 clear) from active sensor (bit 0 set):
+        if not (sensor_status & 0x0001) or (sensor_status & 0x0010):
+            return
+
+        latitude = dg.sensorData.correctedLat_deg
+        longitude = dg.sensorData.correctedLong_deg
+        if abs(latitude) >= self.UNAVAILABLE_POSITION or abs(longitude) >= self.UNAVAILABLE_POSITION:
+            return
+
+        # Use sensor time when available; otherwise, use time of datagram
+        timestamp = dg.time_from_sensor()
+        if timestamp == 0:
+            timestamp = header['dgTime']
+
+        self.position_buffer.append(timestamp, latitude, longitude)
+
+    def process_SVP(self, header, bytes_io):
+        """
+        Process #SVP datagram. When ray tracing is enabled, (re)builds ray tracing table for new sound velocity profile.
+        :param header: Header field of #SVP datagram.
+        :param bytes_io: #SVP datagram as BytesIO object.
+        :return: None
+        """
+        if not self.ray_tracing:
+            return
+
+        dg = k.read_EMdgmSVP(bytes_io)
+
+        if dg['cmnPart']['numSamples'] < 1:
+            logger.warning("Received #SVP datagram with no samples; ignoring.")
+            return
+
+        self.update_sound_velocity_profile(dg['sensorData']['depth_m'], dg['sensorData']['soundVelocity_mPerSec'])
+
+    def update_transducer_depth(self, transducer_depth):
+        """
+        Updates depth of transducer, from which rays of ray tracing table start; selects table for new depth when
+        rounded depth changes.
+        :param transducer_depth: Depth (m) of transducer below surface.
+        """
+        transducer_depth = round(transducer_depth / self.RAY_TRACE_TRANSDUCER_DEPTH_STEP_M) * \
+            self.RAY_TRACE_TRANSDUCER_DEPTH_STEP_M
+        if transducer_depth == self.transducer_depth:
+            return
+        self.transducer_depth = transducer_depth
+        if self.sound_velocity_profile is not None:
+            self.update_sound_velocity_profile(*self.sound_velocity_profile)
+
+    def update_sound_velocity_profile(self, depth_np, sound_speed_np):
+        """
+        Selects ray tracing table for given sound velocity profile (and current transducer depth). A cached table is
+        used immediately; otherwise, table is built in a background thread and swapped in when complete (until then,
+        pings are binned using previous table, or using straight-line geometry if there is none).
+        :param depth_np: Depth (m, relative to surface) of each point of sound velocity profile.
+        :param sound_speed_np: Sound velocity (m/s) at each point of sound velocity profile.
+        """
+        self.sound_velocity_profile = (depth_np, sound_speed_np)
+        table_parameters = dict(self.RAY_TRACE_TABLE_PARAMETERS, transducer_depth_m=self.transducer_depth)
+        key = RayTraceTable.profile_key(depth_np, sound_speed_np, **table_parameters)
+
+        if key == self.ray_trace_table_key or key == self.ray_trace_table_pending_key:
+            return
+
+        ray_trace_table = self.ray_trace_tables.get(key)
+        if ray_trace_table is not None:
+            self.ray_trace_table_key = key
+            self.ray_trace_table = ray_trace_table
+            return
+
+        self.ray_trace_table_pending_key = key
+        threading.Thread(target=self.build_ray_trace_table,
+                         args=(key, np.array(depth_np), np.array(sound_speed_np), table_parameters),
+                         daemon=True).start()
+
+    def build_ray_trace_table(self, key, depth_np, sound_speed_np, table_parameters):
+        """
+        Builds and caches ray tracing table; run in a background thread (see update_sound_velocity_profile).
+        Table is swapped in by a single assignment, so that binning of a ping always uses one complete table.
+        :param key: Key by which table is cached (see RayTraceTable.profile_key).
+        :param depth_np: Depth (m, relative to surface) of each point of sound velocity profile.
+        :param sound_speed_np: Sound velocity (m/s) at each point of sound velocity profile.
+        :param table_parameters: Table parameters (including transducer depth), as passed to RayTraceTable.
+        """
+        try:
+            start = time.perf_counter()
+            ray_trace_table = RayTraceTable(depth_np, sound_speed_np, **table_parameters)
+            logger.info("Built ray tracing table ({} points in profile; transducer at {} m; {:.1f} MB) in {:.3f} s."
+                        .format(len(depth_np), table_parameters['transducer_depth_m'],
+                                ray_trace_table.nbytes() / 1e6, time.perf_counter() - start))
+        except Exception:
+            # Thread would otherwise end silently; pings are binned with previous table (or straight-line geometry)
+            logger.exception("Unable to build ray tracing table.")
+            return
+        finally:
+            if self.ray_trace_table_pending_key == key:
+                self.ray_trace_table_pending_key = None
+
+        if len(self.ray_trace_tables) >= self.MAX_NUM_RAY_TRACE_TABLES:
+            self.ray_trace_tables.clear()
+        self.ray_trace_tables[key] = ray_trace_table
+
+        self.ray_trace_table_key = key
+        self.ray_trace_table = ray_trace_table
+
     def process_SKM(self, header, bytes_io):
         """
         Process #SKM datagram; not currently implemented.
@@ -807,40 +1682,23 @@ class KongsbergDGProcess(Process):
         """
         pass
 
-    def print_MWC(self, bytes_io):
+    def print_MWC(self, dg_bytes):
         """
-        Prints full #MWC record as dictionary. For debugging.
-        :param bytes_io: #MWC datagram as BytesIO object.
+        Prints full #MWC record as tuples of fields. For debugging.
+        :param dg_bytes: #MWC datagram (bytes, or any buffer); parsed in place (see unpack_EMdgmMWC).
         """
         print("Printing #MWC record:")
-        bytes_io.seek(0, 0)
-        header = k.read_EMdgmHeader(bytes_io, return_fields=True)
+        header, offset = k.unpack_EMdgmHeader(dg_bytes)
         print("Header: ", header)
         if header[1] == b'#MWC':
-            print("Header: ", header)
-            # print("At position {} of length {}".format(bytes_io.tell(), len(bytes)))
-            partition = k.read_EMdgmMpartition(bytes_io, header[1], header[2], return_fields=True)
-            print("Partition: ", partition)
-            # print("At position {} of length {}".format(bytes_io.tell(), len(bytes)))
-            cmn_part = k.read_EMdgmMbody(bytes_io, header[1], header[2], return_fields=True)
-            print("CmnPart: ", cmn_part)
-            # print("At position {} of length {}".format(bytes_io.tell(), len(bytes)))
-            tx_info = k.read_EMdgmMWC_txInfo(bytes_io, header[2], return_fields=True)
-            print("TxInfo: ", tx_info)
-            # print("At position {} of length {}".format(bytes_io.tell(), len(bytes)))
-            sectorData = []
-            for i in range(tx_info[1]):
-                sectorData.append(k.read_EMdgmMWC_txSectorData(bytes_io, header[2], return_fields=True))
-            print("SectorData: ", sectorData)
-            # print("At position {} of length {}".format(bytes_io.tell(), len(bytes)))
-            rx_info = k.read_EMdgmMWC_rxInfo(bytes_io, header[2], return_fields=True)
-            print("Rx Info: ", rx_info)
-            # print("At position {} of length {}".format(bytes_io.tell(), len(bytes)))
-            beamData = []
-            for i in range(rx_info[1]):
-                print("In DGProcess. i: ", i)
-                beamData.append(k.read_EMdgmMWC_rxBeamData(bytes_io, header[2], rx_info[3], return_fields=True))
-            print("Beam Data: ", beamData)
+            dg, offset = k.unpack_EMdgmMWC(dg_bytes)
+            print("Partition: ", dg['partition'])
+            print("CmnPart: ", dg['cmnPart'])
+            print("TxInfo: ", dg['txInfo'])
+            print("SectorData: ", dg['sectorData'])
+            print("Rx Info: ", dg['rxInfo'])
+            print("Beam Data: ", dg['beamData'])
+            print("At position {} of length {}".format(offset, len(dg_bytes)))
 
     def run(self):
         """
@@ -848,6 +1706,20 @@ class KongsbergDGProcess(Process):
         bins water column data, creates standard format pie records, adds this record to shared
         multiprocessing.Queue for use by next process.
         """
-        # Profiler for performance testing:
-        cProfile.runctx('self.get_and_process_dg()', globals(), locals(), '../../Profile/profile-Process.txt')
-        # self.get_and_process_dg()
+        if self.ray_tracing and self.svp_file:
+            # Sound velocity profile loaded from file: two columns, depth (m) and sound velocity (m/s)
+            try:
+                svp_np = np.loadtxt(self.svp_file, usecols=(0, 1), ndmin=2)
+                self.update_sound_velocity_profile(svp_np[:, 0], svp_np[:, 1])
+            except (OSError, ValueError):
+                logger.exception("Unable to load sound velocity profile from file: {}".format(self.svp_file))
+
+        self.allocation_monitor.start()
+
+        if self.profile:
+            # Profiler for performance testing:
+            cProfile.runctx('self.get_and_process_dg()', globals(), locals(), '../../Profile/profile-Process.txt')
+        else:
+            self.get_and_process_dg()
+
+        self.allocation_monitor.stop()
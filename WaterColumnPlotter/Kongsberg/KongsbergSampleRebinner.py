@@ -0,0 +1,154 @@
+# Lynette Davis
+# ldavis@ccom.unh.edu
+# Center for Coastal and Ocean Mapping
+# University of New Hampshire
+# October 2026
+
+# Description: Re-bins pings from records of beam geometry and raw samples (see SharedSampleStore) at a new bin size
+# or max heave, so that pings buffered in the raw ring buffer are kept when these settings are changed (see
+# ProcessedBufferWorker). Pings are binned as by KongsbergDGProcess (at every bin size level, at full quality; quality
+# of service and slices-only binning are not applied), with the same kernels. Pings of a batch are binned
+# concurrently on a pool of threads; the binning kernel releases the GIL.
+
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import numpy as np
+import os
+from WaterColumnPlotter.Kongsberg.KongsbergDGProcess import KongsbergDGProcess
+from WaterColumnPlotter.Plotter.SharedSampleStore import SharedSampleStore
+
+logger = logging.getLogger(__name__)
+
+
+class KongsbergSampleRebinner:
+
+    def __init__(self, settings, max_workers=None):
+        """
+        :param settings: Settings dictionary; precision policy, averaging and buffer settings must match those of
+        KongsbergDGProcess.
+        :param max_workers: Number of threads binning pings concurrently; default is number of CPUs.
+        """
+        self.settings = settings
+
+        self.FLOAT_DTYPE, self.AMPLITUDE_DTYPE = \
+            KongsbergDGProcess.precision_dtypes(self.settings['advanced_settings']['precision'])
+        self.COUNT_DTYPE = np.uint16
+        self.linear_averaging = self.settings['advanced_settings']['linearAveraging'] and \
+            not np.issubdtype(self.AMPLITUDE_DTYPE, np.integer)
+        self.pre_averaging = self.settings['advanced_settings']['preAveraging']
+        self.num_bin_size_levels = self.settings['advanced_settings']['binSizeLevels']
+        self.max_grid_cells = self.settings['buffer_settings']['maxGridCells']
+
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.executor = None  # Created on first use
+
+        # Lookup tables of amplitude of each raw amplitude, by TVG offset (see KongsbergDGProcess.get_amplitude_table)
+        self.amplitude_tables = {}
+        self.MAX_NUM_AMPLITUDE_TABLES = 16
+
+    def rebin(self, records, base_bin_size, max_heave):
+        """
+        Re-bins pings at every bin size level, concurrently.
+        :param records: List of records (see SharedSampleStore.pack) of pings; None where a ping has no record (grids
+        of ping are then empty).
+        :param base_bin_size: Bin size (m) of level 0.
+        :param max_heave: Max heave (m).
+        :return: Numpy arrays of amplitudes and counts (pings x levels x grid cells x grid cells) and of bottom depths
+        (pings x levels x grid cells), as in pie records (see KongsbergDGProcess.get_pie_grids).
+        """
+        shape = (len(records), self.num_bin_size_levels, self.max_grid_cells, self.max_grid_cells)
+        amplitudes = np.zeros(shape, dtype=self.AMPLITUDE_DTYPE)
+        counts = np.zeros(shape, dtype=self.COUNT_DTYPE)
+        bottom_depths = np.full(shape[:3], np.nan, dtype=np.float32)
+
+        geometry = KongsbergDGProcess.grid_geometry(base_bin_size, max_heave, self.max_grid_cells,
+                                                    self.num_bin_size_levels, self.FLOAT_DTYPE)
+
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        futures = [self.executor.submit(self.rebin_ping, record, base_bin_size, geometry,
+                                        amplitudes[ping], counts[ping], bottom_depths[ping])
+                   for ping, record in enumerate(records) if record is not None]
+        for future in futures:
+            future.result()
+
+        return amplitudes, counts, bottom_depths
+
+    def rebin_ping(self, record, base_bin_size, geometry, amplitudes, counts, bottom_depths):
+        """
+        Bins a single ping (see KongsbergDGProcess.process_MWC).
+        :param record: Record of ping (see SharedSampleStore.pack).
+        :param base_bin_size: Bin size (m) of level 0.
+        :param geometry: Geometry of grids (see KongsbergDGProcess.grid_geometry).
+        :param amplitudes: Zeroed grids of amplitude sums (levels x grid cells x grid cells); modified in place.
+        :param counts: Zeroed grids of counts; modified in place.
+        :param bottom_depths: Bottom depths (levels x grid cells); modified in place.
+        """
+        header, beams, sample_amplitude_np = SharedSampleStore.unpack(record)
+        num_beams = int(header['num_beams'])
+        if num_beams == 0:
+            return
+
+        inverse_bin_size, level_scale_np, index_offset_y_np, index_offset_z_np = geometry
+        heave = self.FLOAT_DTYPE(header['heave'])
+        range_scale = self.FLOAT_DTYPE(header['range_scale'])
+        sin_beam_np = beams['sin_beam'].astype(self.FLOAT_DTYPE)
+        cos_beam_tilt_np = beams['cos_beam_tilt'].astype(self.FLOAT_DTYPE)
+        num_samples_np = beams['num_samples'].astype(np.int32)
+
+        beam_offset_np = np.zeros(num_beams, dtype=np.int64)
+        np.cumsum(num_samples_np[:-1], out=beam_offset_np[1:])
+
+        # Samples of each beam that fall inside grid of coarsest level (see KongsbergDGProcess.process_MWC)
+        coarsest_inverse_bin_size = inverse_bin_size * level_scale_np[-1]
+        y_start_np, y_stop_np = KongsbergDGProcess.sample_interval(sin_beam_np * coarsest_inverse_bin_size,
+                                                                   index_offset_y_np[-1], 0, self.max_grid_cells,
+                                                                   range_scale)
+        z_start_np, z_stop_np = KongsbergDGProcess.sample_interval(cos_beam_tilt_np * coarsest_inverse_bin_size,
+                                                                   heave * coarsest_inverse_bin_size +
+                                                                   index_offset_z_np[-1], 0, self.max_grid_cells,
+                                                                   range_scale)
+        start_sample_np = np.maximum(y_start_np, z_start_np)
+        stop_sample_np = np.minimum(np.minimum(y_stop_np, z_stop_np), num_samples_np)
+
+        if self.pre_averaging:
+            samples_per_cell = max(1, int(round(base_bin_size, 2) / range_scale))
+        else:
+            samples_per_cell = 1
+
+        max_stop_sample = max(int(np.max(stop_sample_np)), 1)
+        range_np = np.arange(max_stop_sample, dtype=self.FLOAT_DTYPE) * range_scale
+
+        KongsbergDGProcess.bin_beam_samples(sample_amplitude_np, beam_offset_np, start_sample_np, stop_sample_np,
+                                            range_np, sin_beam_np, cos_beam_tilt_np, heave, inverse_bin_size,
+                                            level_scale_np, index_offset_y_np, index_offset_z_np,
+                                            self.get_amplitude_table(float(header['tvg_offset_db'])),
+                                            samples_per_cell, amplitudes, counts)
+
+        bottom_range_np = beams['detected_range'].astype(self.FLOAT_DTYPE) * range_scale
+        KongsbergDGProcess.interpolate_bottom_depths(bottom_range_np * sin_beam_np, bottom_range_np * cos_beam_tilt_np,
+                                                     heave, inverse_bin_size, level_scale_np, index_offset_y_np,
+                                                     index_offset_z_np, bottom_depths)
+
+    def get_amplitude_table(self, tvg_offset_db):
+        """
+        Gets (or builds and caches) lookup table of amplitude of each raw amplitude for given TVG offset.
+        :param tvg_offset_db: TVG offset (dB) of ping.
+        :return: Numpy array of amplitude of each raw amplitude (see KongsbergDGProcess.build_amplitude_table).
+        """
+        amplitude_table = self.amplitude_tables.get(tvg_offset_db)
+        if amplitude_table is None:
+            if len(self.amplitude_tables) >= self.MAX_NUM_AMPLITUDE_TABLES:
+                self.amplitude_tables.clear()
+            amplitude_table = KongsbergDGProcess.build_amplitude_table(tvg_offset_db, self.FLOAT_DTYPE,
+                                                                       self.AMPLITUDE_DTYPE, self.linear_averaging)
+            self.amplitude_tables[tvg_offset_db] = amplitude_table
+        return amplitude_table
+
+    def close(self):
+        """
+        Stops threads binning pings.
+        """
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
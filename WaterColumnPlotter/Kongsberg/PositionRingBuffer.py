@@ -0,0 +1,131 @@
+# Lynette Davis
+# ldavis@ccom.unh.edu
+# Center for Coastal and Ocean Mapping
+# University of New Hampshire
+# October 2026
+
+# Description: A compact, process-local ring buffer of timestamped positions (as decoded from #SPO datagrams);
+# allows vectorized interpolation of latitude / longitude at arbitrary (ping) times.
+
+# Adapted from: https://github.com/eric-wieser/numpy_ringbuffer (see also SharedRingBufferRaw)
+
+import numpy as np
+
+
+class PositionRingBuffer:
+    def __init__(self, size_buffer=1024, max_extrapolation_sec=1.0):
+
+        self.SIZE_BUFFER = size_buffer
+        self.FULL_SIZE_BUFFER = self.SIZE_BUFFER * 2
+
+        # Positions are only held (extrapolated) this far beyond the first / last fix in buffer; beyond this,
+        # interpolated positions are NaN.
+        self.MAX_EXTRAPOLATION_SEC = max_extrapolation_sec
+
+        self.counter = 0
+        self.full_flag = False
+
+        self.timestamp_buffer = np.zeros(self.FULL_SIZE_BUFFER, dtype=np.float64)
+        # Longitudes are stored 'unwrapped' (continuous across the antimeridian) so they may be interpolated linearly.
+        self.lat_lon_buffer = np.zeros((self.FULL_SIZE_BUFFER, 2), dtype=np.float64)
+
+    def clear(self):
+        """
+        Resets counter to zero to effectively empty buffer.
+        """
+        self.counter = 0
+        self.full_flag = False
+
+    def append(self, timestamp, latitude, longitude):
+        """
+        Appends a single position fix to ring buffer. Fixes must arrive in chronological order;
+        out-of-order or duplicate fixes are ignored.
+        :param timestamp: UTC time of position fix in seconds. Epoch 1970-01-01.
+        :param latitude: Latitude of position fix in decimal degrees.
+        :param longitude: Longitude of position fix in decimal degrees.
+        :return: True if fix was appended; False if fix was ignored.
+        """
+        num_elements = self.get_num_elements_in_buffer()
+
+        if num_elements > 0:
+            last_index = self.counter + self.SIZE_BUFFER - 1
+            if timestamp <= self.timestamp_buffer[last_index]:
+                return False
+            # Unwrap longitude relative to previous fix:
+            longitude += 360.0 * np.round((self.lat_lon_buffer[last_index, 1] - longitude) / 360.0)
+
+        if self.counter == self.SIZE_BUFFER:
+            self.compact()
+
+        self.timestamp_buffer[self.counter + self.SIZE_BUFFER] = timestamp
+        self.lat_lon_buffer[self.counter + self.SIZE_BUFFER, 0] = latitude
+        self.lat_lon_buffer[self.counter + self.SIZE_BUFFER, 1] = longitude
+
+        self.counter += 1
+
+        return True
+
+    def view_buffer_elements(self, buffer):
+        """
+        Returns all elements of a given buffer, minus the empty elements. This is always an O(1) operation.
+        :param buffer: The buffer from which to return a view.
+        """
+        if self.full_flag:
+            return buffer[self.counter:][:self.SIZE_BUFFER]
+        else:
+            return buffer[self.counter:][:self.SIZE_BUFFER][-self.counter:]
+
+    def interpolate(self, timestamps):
+        """
+        Linearly interpolates latitude and longitude at given times. Lookups are vectorized: timestamps may be a
+        scalar or an array (for example, the timestamps of a batch of pings).
+        :param timestamps: UTC time(s) in seconds at which to interpolate position. Epoch 1970-01-01.
+        :return: Interpolated latitude(s) and longitude(s) in decimal degrees; NaN where no position is available
+        within MAX_EXTRAPOLATION_SEC of the requested time.
+        """
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+
+        if self.get_num_elements_in_buffer() == 0:
+            latitude = np.full(timestamps.shape, np.nan)
+            longitude = np.full(timestamps.shape, np.nan)
+        else:
+            temp_timestamp = self.view_buffer_elements(self.timestamp_buffer)
+            temp_lat_lon = self.view_buffer_elements(self.lat_lon_buffer)
+
+            # np.interp holds end values beyond range of temp_timestamp
+            latitude = np.interp(timestamps, temp_timestamp, temp_lat_lon[:, 0])
+            longitude = np.interp(timestamps, temp_timestamp, temp_lat_lon[:, 1])
+            # Re-wrap longitude to [-180, 180)
+            longitude = ((longitude + 180.0) % 360.0) - 180.0
+
+            out_of_range = np.logical_or(timestamps < (temp_timestamp[0] - self.MAX_EXTRAPOLATION_SEC),
+                                         timestamps > (temp_timestamp[-1] + self.MAX_EXTRAPOLATION_SEC))
+            latitude = np.where(out_of_range, np.nan, latitude)
+            longitude = np.where(out_of_range, np.nan, longitude)
+
+        if timestamps.ndim == 0:
+            return float(latitude), float(longitude)
+
+        return latitude, longitude
+
+    def compact(self):
+        """
+        Called when buffer is full. Shifts all data in buffer to accommodate new, incoming data.
+        Note that only when this function is called, is an O(size) performance hit incurred,
+        and this cost is amortized over the whole padding space.
+        """
+        self.full_flag = True
+        self.timestamp_buffer[:self.SIZE_BUFFER] = self.timestamp_buffer[self.counter:][:self.SIZE_BUFFER]
+        self.lat_lon_buffer[:self.SIZE_BUFFER] = self.lat_lon_buffer[self.counter:][:self.SIZE_BUFFER]
+
+        self.counter = 0
+
+    def get_num_elements_in_buffer(self):
+        """
+        Calculates number of elements in ring buffer.
+        :return: Number of elements in ring buffer.
+        """
+        if self.full_flag:
+            return self.SIZE_BUFFER
+        else:
+            return self.counter
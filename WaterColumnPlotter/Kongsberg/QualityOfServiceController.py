@@ -0,0 +1,107 @@
+# Lynette Davis
+# ldavis@ccom.unh.edu
+# Center for Coastal and Ocean Mapping
+# University of New Hampshire
+# October 2026
+
+# Description: Load-adaptive quality of service controller for KongsbergDGProcess. Estimates latency of data
+# waiting in shared multiprocessing.Queues and steps through degradation levels to hold estimated latency below a
+# target; steps back up when load falls. Items of each queue are costed by the stage that consumes them: datagrams
+# waiting in queue_datagram by measured time of KongsbergDGProcess to process a datagram, and pie records waiting in
+# queue_pie_object by measured time of Plotter to buffer a pie record (shared by Plotter; see
+# Plotter.record_pie_buffer_time).
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class QualityOfServiceController:
+
+    # Degradation levels; each level includes degradations of all lower levels.
+    NORMAL = 0  # Bin all beams, range cells no longer than bin size
+    DECIMATE_BEAMS = 1  # Bin every other beam (alternating between pings)
+    COARSE_CELLS = 2  # Range cells no longer than twice bin size
+    SLICES_ONLY_PINGS = 3  # Bin only samples contributing to vertical and horizontal slices for every other ping
+    COARSE_GRID = 4  # Bin into grid of twice bin size, expanded to pie chart grid
+    LEVEL_NAMES = ["normal", "decimate beams", "coarse cells", "slices-only pings", "coarse grid"]
+    MAX_LEVEL = len(LEVEL_NAMES) - 1
+
+    def __init__(self, target_latency_sec, level, degraded_ping_count, smoothing=0.1,
+                 step_down_hold_pings=10, step_up_hold_pings=50):
+        """
+        :param target_latency_sec: Target latency (in seconds) of data waiting in queues.
+        :param level: multiprocessing.Value in which current level is shared.
+        :param degraded_ping_count: multiprocessing.Value in which number of pings processed at a level
+        other than NORMAL is shared.
+        :param smoothing: Weight of newest measurement in exponential moving average of processing time.
+        :param step_down_hold_pings: Minimum number of pings between successive steps down (degradation).
+        :param step_up_hold_pings: Number of consecutive pings with estimated latency well below target
+        required before stepping up.
+        """
+        self.TARGET_LATENCY_SEC = target_latency_sec
+        self.SMOOTHING = smoothing
+        self.STEP_DOWN_HOLD_PINGS = step_down_hold_pings
+        self.STEP_UP_HOLD_PINGS = step_up_hold_pings
+        # Estimated latency must fall below this fraction of target before stepping up
+        self.STEP_UP_FRACTION = 0.25
+
+        self.level = level  # multiprocessing.Value
+        self.degraded_ping_count = degraded_ping_count  # multiprocessing.Value
+
+        self.level_local = self.NORMAL
+        # Moving average of time of KongsbergDGProcess to process a datagram (of any type)
+        self.mean_processing_time_sec = 0.0
+        self.estimated_latency_sec = 0.0
+        self.pings_since_step_down = self.STEP_DOWN_HOLD_PINGS
+        self.pings_below_target = 0
+
+    def record_processing_time(self, processing_time_sec):
+        """
+        Updates moving average of time to process a single datagram (of any type).
+        :param processing_time_sec: Time (in seconds) taken to process a datagram.
+        """
+        self.mean_processing_time_sec += self.SMOOTHING * (processing_time_sec - self.mean_processing_time_sec)
+
+    def update(self, datagram_queue_depth, pie_queue_depth, pie_buffer_time_sec):
+        """
+        Called once per ping (#MWC record). Estimates latency of data waiting in queues and updates level.
+        :param datagram_queue_depth: Number of datagrams waiting in queue_datagram.
+        :param pie_queue_depth: Number of pie records waiting in queue_pie_object.
+        :param pie_buffer_time_sec: Moving average of time (in seconds) of Plotter to buffer a pie record.
+        :return: Level at which to process ping.
+        """
+        self.estimated_latency_sec = datagram_queue_depth * self.mean_processing_time_sec + \
+            pie_queue_depth * pie_buffer_time_sec
+        self.pings_since_step_down += 1
+
+        if self.estimated_latency_sec > self.TARGET_LATENCY_SEC:
+            self.pings_below_target = 0
+            if self.level_local < self.MAX_LEVEL and self.pings_since_step_down >= self.STEP_DOWN_HOLD_PINGS:
+                self._set_level(self.level_local + 1)
+                self.pings_since_step_down = 0
+        elif self.estimated_latency_sec < self.TARGET_LATENCY_SEC * self.STEP_UP_FRACTION:
+            self.pings_below_target += 1
+            if self.level_local > self.NORMAL and self.pings_below_target >= self.STEP_UP_HOLD_PINGS:
+                self._set_level(self.level_local - 1)
+                self.pings_below_target = 0
+        else:
+            self.pings_below_target = 0
+
+        if self.level_local > self.NORMAL:
+            with self.degraded_ping_count.get_lock():
+                self.degraded_ping_count.value += 1
+
+        return self.level_local
+
+    def _set_level(self, level):
+        """
+        Sets current level and shares it with other processes.
+        :param level: New level.
+        """
+        logger.warning("Quality of service level changed from {} ({}) to {} ({}); estimated latency: {:.3f} s."
+                       .format(self.level_local, self.LEVEL_NAMES[self.level_local],
+                               level, self.LEVEL_NAMES[level], self.estimated_latency_sec))
+        self.level_local = level
+        with self.level.get_lock():
+            self.level.value = level
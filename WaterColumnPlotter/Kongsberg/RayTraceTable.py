@@ -0,0 +1,228 @@
+# Lynette Davis
+# ldavis@ccom.unh.edu
+# Center for Coastal and Ocean Mapping
+# University of New Hampshire
+# October 2026
+
+# Description: Ray tracing lookup table for a sound velocity profile. Rays are traced (Snell's law; constant
+# gradient of sound velocity within each layer) once per profile for a grid of launch angles, and across-track
+# position and depth along each ray are tabulated on a uniform grid of one-way travel time. Position of any sample
+# is then found by bilinear interpolation in (launch angle, travel time), at a cost close to that of straight-line
+# (constant sound velocity) geometry. Rays start at the transducer: profile depths (relative to the surface, as in
+# #SVP records) are offset by transducer depth. Beam angles of a ping, steered with the sound velocity measured at the
+# transducer, are converted to launch angles of the table with the same ray parameter (see launch_angles).
+
+import hashlib
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class RayTraceTable:
+
+    # Across-track position given to points beyond turning point of a ray (ray is refracted back toward surface);
+    # such points fall outside of any grid.
+    UNREACHABLE_M = 1.0e6
+
+    # Launch angle given to beams whose rays cannot leave transducer (beyond any table)
+    UNREACHABLE_DEG = 90.0
+
+    def __init__(self, depth_np, sound_speed_np, transducer_depth_m=0.0, max_angle_deg=80.0, angle_step_deg=0.5,
+                 time_step_sec=2.0e-4, max_time_sec=1.0, layer_thickness_m=1.0):
+        """
+        :param depth_np: Depth (m, relative to surface) of each point of sound velocity profile.
+        :param sound_speed_np: Sound velocity (m/s) at each point of sound velocity profile.
+        :param transducer_depth_m: Depth (m, relative to surface) of transducer. Depths of table are relative to
+        transducer.
+        :param max_angle_deg: Largest launch angle (re vertical, in degrees) in table.
+        :param angle_step_deg: Spacing (degrees) of launch angles in table.
+        :param time_step_sec: Spacing (seconds) of one-way travel times in table.
+        :param max_time_sec: Largest one-way travel time (seconds) in table.
+        :param layer_thickness_m: Profile is resampled (linearly) into layers no thicker than this before tracing,
+        so that position may be interpolated linearly in time between layer boundaries.
+        """
+        depth_np, sound_speed_np = self.clean_profile(depth_np, sound_speed_np)
+        depth_np, sound_speed_np = self.offset_profile(depth_np, sound_speed_np, transducer_depth_m)
+
+        self.angle_step_deg = angle_step_deg
+        self.time_step_sec = time_step_sec
+        # Sound velocity of profile at transducer, with which launch angles of table are defined
+        self.transducer_sound_speed = float(sound_speed_np[0])
+
+        self.angles_deg = np.arange(0, max_angle_deg + angle_step_deg / 2, angle_step_deg)
+        self.times_sec = np.arange(0, max_time_sec + time_step_sec / 2, time_step_sec)
+
+        # Resample profile into thin layers, no deeper than any ray can travel in max_time_sec
+        max_depth = max_time_sec * float(np.max(sound_speed_np)) + layer_thickness_m
+        layer_depth_np = np.arange(0, max_depth + layer_thickness_m, layer_thickness_m)
+        layer_sound_speed_np = np.interp(layer_depth_np, depth_np, sound_speed_np)
+
+        boundary_time_np, boundary_across_track_np = self.trace(np.radians(self.angles_deg),
+                                                                layer_depth_np, layer_sound_speed_np)
+
+        # Tabulate across-track position and depth of each ray on uniform grid of one-way travel time
+        self.across_track_np = np.empty((len(self.angles_deg), len(self.times_sec)), dtype=np.float32)
+        self.depth_np = np.empty((len(self.angles_deg), len(self.times_sec)), dtype=np.float32)
+        for angle in range(len(self.angles_deg)):
+            num_valid = np.count_nonzero(np.isfinite(boundary_time_np[angle]))
+            self.across_track_np[angle] = np.interp(self.times_sec, boundary_time_np[angle, :num_valid],
+                                                    boundary_across_track_np[angle, :num_valid],
+                                                    right=self.UNREACHABLE_M)
+            self.depth_np[angle] = np.interp(self.times_sec, boundary_time_np[angle, :num_valid],
+                                             layer_depth_np[:num_valid], right=self.UNREACHABLE_M)
+
+    @staticmethod
+    def clean_profile(depth_np, sound_speed_np):
+        """
+        Sorts sound velocity profile by depth, discards invalid and repeated points, and extends profile to zero depth
+        (with sound velocity of shallowest point) when necessary.
+        :param depth_np: Depth (m) of each point of sound velocity profile.
+        :param sound_speed_np: Sound velocity (m/s) at each point of sound velocity profile.
+        :return: Numpy arrays (float64) of depth and sound velocity.
+        """
+        depth_np = np.asarray(depth_np, dtype=np.float64)
+        sound_speed_np = np.asarray(sound_speed_np, dtype=np.float64)
+
+        valid_mask = np.isfinite(depth_np) & np.isfinite(sound_speed_np) & (depth_np >= 0) & (sound_speed_np > 0)
+        depth_np, unique_indices = np.unique(depth_np[valid_mask], return_index=True)
+        sound_speed_np = sound_speed_np[valid_mask][unique_indices]
+
+        if len(depth_np) == 0:
+            raise ValueError("Sound velocity profile contains no valid points.")
+
+        if depth_np[0] > 0:
+            depth_np = np.insert(depth_np, 0, 0.0)
+            sound_speed_np = np.insert(sound_speed_np, 0, sound_speed_np[0])
+
+        return depth_np, sound_speed_np
+
+    @staticmethod
+    def offset_profile(depth_np, sound_speed_np, transducer_depth_m):
+        """
+        Cuts sound velocity profile at transducer depth; depths of remaining points are made relative to transducer.
+        :param depth_np: Depth (m, relative to surface) of each point of (clean) sound velocity profile.
+        :param sound_speed_np: Sound velocity (m/s) at each point of sound velocity profile.
+        :param transducer_depth_m: Depth (m, relative to surface) of transducer.
+        :return: Numpy arrays (float64) of depth (relative to transducer, starting at zero) and sound velocity.
+        """
+        # Profile is extended with sound velocity of deepest point when transducer is below it
+        transducer_sound_speed = np.interp(transducer_depth_m, depth_np, sound_speed_np)
+        below_mask = depth_np > transducer_depth_m
+        return (np.concatenate(([0.0], depth_np[below_mask] - transducer_depth_m)),
+                np.concatenate(([transducer_sound_speed], sound_speed_np[below_mask])))
+
+    @staticmethod
+    def trace(launch_angle_rad_np, layer_depth_np, layer_sound_speed_np):
+        """
+        Traces rays through layers of constant sound velocity gradient.
+        :param launch_angle_rad_np: Launch angle (re vertical, in radians, non-negative) of each ray.
+        :param layer_depth_np: Depth (m) of each layer boundary, starting at zero.
+        :param layer_sound_speed_np: Sound velocity (m/s) at each layer boundary.
+        :return: Numpy matrices (launch angles by layer boundaries) of one-way travel time (seconds) and across-track
+        position (m) at which each ray reaches each layer boundary; times are infinite beyond turning point of a ray.
+        """
+        # Snell's law: ray parameter is constant along each ray
+        ray_parameter_np = (np.sin(launch_angle_rad_np) / layer_sound_speed_np[0])[:, np.newaxis]
+
+        sin_np = ray_parameter_np * layer_sound_speed_np
+        # Ray turns within first layer at which sine reaches one; boundaries from there on are never reached
+        reached_mask = np.cumprod(sin_np < 1, axis=1).astype(bool)
+        cos_np = np.sqrt(np.maximum(1 - sin_np * sin_np, 0))
+
+        thickness_np = np.diff(layer_depth_np)
+        gradient_np = np.diff(layer_sound_speed_np) / thickness_np
+        sound_speed_upper_np = layer_sound_speed_np[:-1]
+        sin_upper_np, sin_lower_np = sin_np[:, :-1], sin_np[:, 1:]
+        cos_upper_np, cos_lower_np = cos_np[:, :-1], cos_np[:, 1:]
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # Constant gradient: ray is an arc of a circle
+            time_arc_np = np.log((layer_sound_speed_np[1:] / sound_speed_upper_np) *
+                                 (1 + cos_upper_np) / (1 + cos_lower_np)) / gradient_np
+            across_track_arc_np = (cos_upper_np - cos_lower_np) / (ray_parameter_np * gradient_np)
+            # Zero gradient: ray is a straight line
+            time_line_np = thickness_np / (sound_speed_upper_np * cos_upper_np)
+            across_track_line_np = thickness_np * sin_upper_np / cos_upper_np
+
+        straight_mask = np.abs(gradient_np) < 1e-6
+        layer_time_np = np.where(straight_mask, time_line_np, time_arc_np)
+        layer_across_track_np = np.where(straight_mask | (ray_parameter_np == 0),
+                                         np.where(ray_parameter_np == 0, 0.0, across_track_line_np),
+                                         across_track_arc_np)
+
+        boundary_time_np = np.zeros(sin_np.shape)
+        boundary_across_track_np = np.zeros(sin_np.shape)
+        np.cumsum(layer_time_np, axis=1, out=boundary_time_np[:, 1:])
+        np.cumsum(layer_across_track_np, axis=1, out=boundary_across_track_np[:, 1:])
+        boundary_time_np[~reached_mask] = np.inf
+
+        return boundary_time_np, boundary_across_track_np
+
+    @staticmethod
+    def profile_key(depth_np, sound_speed_np, **kwargs):
+        """
+        Key by which tables may be cached: identifies sound velocity profile and table parameters.
+        :param depth_np: Depth (m) of each point of sound velocity profile.
+        :param sound_speed_np: Sound velocity (m/s) at each point of sound velocity profile.
+        :param kwargs: Table parameters, as passed to RayTraceTable.
+        :return: Hashable key.
+        """
+        digest = hashlib.sha1(np.asarray(depth_np, dtype=np.float64).tobytes() +
+                              np.asarray(sound_speed_np, dtype=np.float64).tobytes()).hexdigest()
+        return (digest,) + tuple(sorted(kwargs.items()))
+
+    def launch_angles(self, beam_angle_deg_np, sound_speed):
+        """
+        Converts beam angles, steered with given sound velocity at transducer, to launch angles of table: by Snell's
+        law, a beam follows the ray of the table with the same ray parameter, sin(angle) / sound velocity.
+        :param beam_angle_deg_np: Beam angle (re vertical, in degrees; negative to port) of each beam.
+        :param sound_speed: Sound velocity (m/s) at transducer with which beams are steered (for example,
+        soundVelocity_mPerSec of #MWC records).
+        :return: Numpy array of launch angle (re vertical, in degrees; signed as beam angle) of each beam in table;
+        UNREACHABLE_DEG (signed) for beams with no such ray.
+        """
+        sin_np = np.sin(np.radians(beam_angle_deg_np)) * (self.transducer_sound_speed / sound_speed)
+        with np.errstate(invalid='ignore'):
+            launch_angle_deg_np = np.degrees(np.arcsin(sin_np))
+        launch_angle_deg_np = np.where(np.abs(sin_np) < 1, launch_angle_deg_np,
+                                       np.copysign(self.UNREACHABLE_DEG, beam_angle_deg_np))
+        return launch_angle_deg_np.astype(np.asarray(beam_angle_deg_np).dtype)
+
+    def positions(self, angle_deg_np, time_np):
+        """
+        Interpolates across-track position and depth of points given launch angle and one-way travel time.
+        :param angle_deg_np: Launch angle (re vertical, in degrees; negative to port) of each point.
+        :param time_np: One-way travel time (seconds) to each point.
+        :return: Numpy arrays of across-track position (m; signed as launch angle) and depth (m) of each point;
+        NaN for points beyond table.
+        """
+        angle_index_np = np.abs(angle_deg_np) / self.angle_step_deg
+        time_index_np = np.asarray(time_np) / self.time_step_sec
+
+        outside_mask = (angle_index_np >= len(self.angles_deg) - 1) | (time_index_np >= len(self.times_sec) - 1) | \
+                       (time_index_np < 0)
+        angle_index_np = np.where(outside_mask, 0, angle_index_np)
+        time_index_np = np.where(outside_mask, 0, time_index_np)
+
+        angle_lower_np = angle_index_np.astype(np.int64)
+        time_lower_np = time_index_np.astype(np.int64)
+        angle_weight_np = angle_index_np - angle_lower_np
+        time_weight_np = time_index_np - time_lower_np
+
+        def interpolate(table_np):
+            return (table_np[angle_lower_np, time_lower_np] * (1 - angle_weight_np) * (1 - time_weight_np) +
+                    table_np[angle_lower_np + 1, time_lower_np] * angle_weight_np * (1 - time_weight_np) +
+                    table_np[angle_lower_np, time_lower_np + 1] * (1 - angle_weight_np) * time_weight_np +
+                    table_np[angle_lower_np + 1, time_lower_np + 1] * angle_weight_np * time_weight_np)
+
+        across_track_np = np.where(outside_mask, np.nan, np.sign(angle_deg_np) * interpolate(self.across_track_np))
+        depth_np = np.where(outside_mask, np.nan, interpolate(self.depth_np))
+
+        return across_track_np, depth_np
+
+    def nbytes(self):
+        """
+        :return: Size (bytes) of tables.
+        """
+        return self.across_track_np.nbytes + self.depth_np.nbytes
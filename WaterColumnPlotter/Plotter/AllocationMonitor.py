@@ -0,0 +1,180 @@
+# Lynette Davis
+# ldavis@ccom.unh.edu
+# Center for Coastal and Ocean Mapping
+# University of New Hampshire
+# October 2026
+
+# Description: Diagnostic mode ('allocationDiagnostics' in advanced settings) measuring memory allocated while
+# handling each record (for example, each ping). With tracemalloc, transient (peak) and retained bytes are measured
+# per record; allocated blocks and garbage collections are counted alongside. Transient bytes are measured from begin()
+# to end(); retained bytes and blocks from begin() to next begin() (or to stop()), so that memory freed after a record
+# is handled (for example, by the feeder thread of a multiprocessing.Queue, once a record put in the queue is sent)
+# is not counted as retained, and retained bytes over consecutive records add up to growth of traced memory. After a
+# warm-up period, retained allocations per record should stay near zero (no growth from ping to ping); transient
+# allocations do not (for example, about 90 kB per ping of 256 beams x 1000 samples in KongsbergDGProcess, for
+# temporaries of binning). Both are checked against budgets with assert_steady_state(); see
+# Profile/AllocationSteadyState.py.
+# Tracing is expensive: leave disabled outside of diagnostics.
+
+import gc
+import logging
+import sys
+import tracemalloc
+
+logger = logging.getLogger(__name__)
+
+
+class AllocationMonitor:
+
+    WARM_UP_RECORDS = 50
+    REPORT_INTERVAL_RECORDS = 100
+
+    def __init__(self, name, enabled=False, warm_up_records=WARM_UP_RECORDS,
+                 report_interval_records=REPORT_INTERVAL_RECORDS):
+        """
+        :param name: Name of stage being monitored (for example, "KongsbergDGProcess"); used in reports.
+        :param enabled: When false, all methods return immediately.
+        :param warm_up_records: Number of records ignored before measuring (scratch arrays, pools, and caches
+        reach their steady state sizes during warm-up).
+        :param report_interval_records: Number of records between reports (logged at INFO level).
+        """
+        self.name = name
+        self.enabled = enabled
+        self.warm_up_records = warm_up_records
+        self.report_interval_records = report_interval_records
+
+        self.num_records = 0
+        self.in_record = False
+        # True from end() of a measured record until its retained allocations are measured (see _measure_retained)
+        self.retained_pending = False
+        self.num_gc_collections = 0
+        self.start_gc_collections = 0
+        self.start_traced_bytes = 0
+        self.start_blocks = 0
+
+        # Steady state (after warm-up) totals and maxima
+        self.num_measured_records = 0
+        self.total_transient_bytes = 0
+        self.max_transient_bytes = 0
+        self.total_retained_bytes = 0
+        self.total_blocks = 0
+        self.num_retained_records = 0
+        self.measured_gc_collections = 0
+
+    def start(self):
+        """
+        Starts tracing allocations (in this process).
+        """
+        if not self.enabled:
+            return
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        gc.callbacks.append(self._gc_callback)
+
+    def stop(self):
+        """
+        Stops tracing allocations and logs final report.
+        """
+        if not self.enabled:
+            return
+        self._measure_retained()
+        self.report()
+        if self._gc_callback in gc.callbacks:
+            gc.callbacks.remove(self._gc_callback)
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def _gc_callback(self, phase, info):
+        if phase == "start":
+            self.num_gc_collections += 1
+
+    def begin(self):
+        """
+        Marks start of handling a record.
+        """
+        if not self.enabled:
+            return
+        self._measure_retained()
+        self.start_traced_bytes = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        self.start_blocks = sys.getallocatedblocks()
+        self.start_gc_collections = self.num_gc_collections
+        self.in_record = True
+
+    def end(self):
+        """
+        Marks end of handling a record; measures allocations made since begin(). Does nothing if no record is being
+        handled, so that end() may be called unconditionally (for example, at top of a loop).
+        """
+        if not self.enabled or not self.in_record:
+            return
+        self.in_record = False
+        peak_traced_bytes = tracemalloc.get_traced_memory()[1]
+
+        self.num_records += 1
+        if self.num_records <= self.warm_up_records:
+            return
+
+        transient_bytes = peak_traced_bytes - self.start_traced_bytes
+        self.num_measured_records += 1
+        self.total_transient_bytes += transient_bytes
+        self.max_transient_bytes = max(self.max_transient_bytes, transient_bytes)
+        self.measured_gc_collections += self.num_gc_collections - self.start_gc_collections
+        self.retained_pending = True
+
+        if self.num_measured_records % self.report_interval_records == 0:
+            self.report()
+
+    def _measure_retained(self):
+        """
+        Measures retained allocations (and blocks) of last measured record, from its begin() until now; called by
+        begin() of next record and by stop().
+        """
+        if not self.retained_pending or not tracemalloc.is_tracing():
+            return
+        self.retained_pending = False
+        self.num_retained_records += 1
+        self.total_retained_bytes += tracemalloc.get_traced_memory()[0] - self.start_traced_bytes
+        self.total_blocks += sys.getallocatedblocks() - self.start_blocks
+
+    def get_statistics(self):
+        """
+        :return: Dictionary of steady state (after warm-up) allocation statistics per record.
+        """
+        num_records = max(self.num_measured_records, 1)
+        num_retained_records = max(self.num_retained_records, 1)
+        return {'records': self.num_measured_records,
+                'mean_transient_bytes': self.total_transient_bytes / num_records,
+                'max_transient_bytes': self.max_transient_bytes,
+                'retained_bytes': self.total_retained_bytes,
+                'mean_retained_bytes': self.total_retained_bytes / num_retained_records,
+                'mean_blocks': self.total_blocks / num_retained_records,
+                'gc_collections': self.measured_gc_collections}
+
+    def report(self):
+        """
+        Logs steady state allocation statistics.
+        """
+        if not self.enabled or self.num_measured_records == 0:
+            return
+        statistics = self.get_statistics()
+        logger.info("{}: allocations per record over {} records: transient {:.0f} bytes (max {}), "
+                    "retained {:.0f} bytes, {:.1f} blocks; {} garbage collections."
+                    .format(self.name, statistics['records'], statistics['mean_transient_bytes'],
+                            statistics['max_transient_bytes'], statistics['mean_retained_bytes'],
+                            statistics['mean_blocks'], statistics['gc_collections']))
+
+    def assert_steady_state(self, max_transient_bytes, max_retained_bytes=64):
+        """
+        Checks that allocations per record stayed within budgets after warm-up.
+        :param max_transient_bytes: Largest allowed mean transient (peak) allocation per record.
+        :param max_retained_bytes: Largest allowed mean retained allocation per record (growth of traced memory).
+        """
+        statistics = self.get_statistics()
+        assert statistics['records'] > 0, "{}: no records measured after warm-up.".format(self.name)
+        assert statistics['mean_transient_bytes'] <= max_transient_bytes, \
+            "{}: mean transient allocation per record {:.0f} bytes exceeds {} bytes." \
+            .format(self.name, statistics['mean_transient_bytes'], max_transient_bytes)
+        assert statistics['mean_retained_bytes'] <= max_retained_bytes, \
+            "{}: mean retained allocation per record {:.0f} bytes exceeds {} bytes." \
+            .format(self.name, statistics['mean_retained_bytes'], max_retained_bytes)
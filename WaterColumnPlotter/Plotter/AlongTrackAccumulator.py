@@ -0,0 +1,318 @@
+# Lynette Davis
+# ldavis@ccom.unh.edu
+# Center for Coastal and Ocean Mapping
+# University of New Hampshire
+# October 2026
+
+# Description: Incremental along-track averaging for Plotter. As each ping is added to the raw ring buffer, its
+# vertical slice (amplitudes and counts summed across the across-track slice, per depth row) and horizontal slice
+# (summed across the depth slice, per across-track column) are projected once and added to running sums of the
+# current group; timestamp and latitude / longitude are summed alongside. When a group of along_track_avg pings is
+# complete, its averages are emitted in O(grid cells), without copying or re-reading the pings of the group.
+# Per-ping projections are kept in a small ring, so that a change to along_track_avg is handled by re-grouping from
+# stored projections; pings are re-projected from the raw ring buffer only when slice geometry changes.
+# Every slice of the slice registry (see SliceRegistry) is projected; when the prefix sums of a ping are held in the
+# projection cache (see SharedProjectionCache), each slice is projected from them and from grid cells at its ends
+# only, without another pass over the grid of the ping; otherwise, slices of ping are summed by a parallel kernel (see
+# window_sums), which is also used by Plotter to recalculate whole along-track groups. Rows of each ping are offset for max heave as they are
+# read (see SharedRingBufferRaw.get_row_offsets); projections are stored as offset.
+
+import logging
+from numba import jit, prange
+import numpy as np
+from WaterColumnPlotter.Plotter.KernelThreads import KernelThreads
+from WaterColumnPlotter.Plotter.SharedProjectionCache import SharedProjectionCache
+
+logger = logging.getLogger(__name__)
+
+
+class AlongTrackAccumulator:
+
+    def __init__(self, num_grid_cells, max_num_pings, amplitude_scale=1.0, num_vertical_slices=1,
+                 num_horizontal_slices=1):
+        """
+        :param num_grid_cells: Number of grid cells along each side of pie chart grid (see maxGridCells).
+        :param max_num_pings: Number of per-ping projections kept for re-grouping (see maxBufferSize_ping).
+        :param amplitude_scale: Scale of stored amplitude sums (see SharedRingBufferRaw.AMPLITUDE_SCALE).
+        :param num_vertical_slices: Number of vertical slices (see SliceRegistry).
+        :param num_horizontal_slices: Number of horizontal slices (see SliceRegistry).
+        """
+        self.num_grid_cells = num_grid_cells
+        self.max_num_pings = max_num_pings
+        self.amplitude_scale = amplitude_scale
+
+        # Slice geometry of stored projections: (bin size level, max heave, vertical slice windows, horizontal slice
+        # windows); projections are invalid when geometry changes
+        self.geometry = None
+        self.vertical_windows = None
+        self.horizontal_windows = None
+
+        # Per-ping projections (ring of max_num_pings entries) of each slice: [0] = amplitudes; [1] = counts
+        self.vertical_projections = np.zeros((max_num_pings, 2, num_vertical_slices, num_grid_cells),
+                                             dtype=np.float64)
+        self.horizontal_projections = np.zeros((max_num_pings, 2, num_horizontal_slices, num_grid_cells),
+                                               dtype=np.float64)
+        self.timestamps = np.zeros(max_num_pings, dtype=np.float64)
+        self.lat_lons = np.zeros((max_num_pings, 2), dtype=np.float64)
+        self.next_index = 0  # Index of ring at which next ping is stored
+        self.num_stored = 0  # Number of valid (most recent) projections in ring
+
+        # Sums of current (pending) group
+        self.vertical_sum = np.zeros((2, num_vertical_slices, num_grid_cells), dtype=np.float64)
+        self.horizontal_sum = np.zeros((2, num_horizontal_slices, num_grid_cells), dtype=np.float64)
+        self.timestamp_sum = 0.0
+        self.lat_lon_sum = np.zeros(2, dtype=np.float64)
+        self.num_pending = 0
+
+    def reset(self):
+        """
+        Discards current group and all stored projections (for example, when raw ring buffers are cleared).
+        """
+        self.next_index = 0
+        self.num_stored = 0
+        self.clear_group()
+
+    def clear_group(self):
+        """
+        Discards sums of current group.
+        """
+        self.vertical_sum.fill(0)
+        self.horizontal_sum.fill(0)
+        self.timestamp_sum = 0.0
+        self.lat_lon_sum.fill(0)
+        self.num_pending = 0
+
+    def set_geometry(self, level, max_heave, vertical_windows, horizontal_windows):
+        """
+        Sets slice geometry used to project pings. Stored projections are discarded when geometry changes.
+        :param level: Bin size level of raw ring buffers from which pings are read.
+        :param max_heave: Maximum heave (m); position of zero depth in grid depends on it.
+        :param vertical_windows: Start and end indices (across-track columns) of each vertical slice.
+        :param horizontal_windows: Start and end indices (depth rows) of each horizontal slice.
+        :return: True if geometry changed (and stored projections were discarded); otherwise, False.
+        """
+        geometry = (level, round(max_heave, 2), tuple(map(tuple, np.asarray(vertical_windows).tolist())),
+                    tuple(map(tuple, np.asarray(horizontal_windows).tolist())))
+        if geometry == self.geometry:
+            return False
+        self.geometry = geometry
+        self.vertical_windows = geometry[2]
+        self.horizontal_windows = geometry[3]
+        self.next_index = 0
+        self.num_stored = 0
+        return True
+
+    def project(self, amplitudes, counts, timestamp, lat_lon, projection_cache=None, slot=None, row_offset=0):
+        """
+        Projects a single ping onto vertical and horizontal slices; stores projections in ring.
+        :param amplitudes: Numpy matrix of binned amplitude sums of ping (depth rows x across-track columns).
+        :param counts: Numpy matrix of binned counts of ping.
+        :param timestamp: Timestamp of ping.
+        :param lat_lon: Latitude and longitude of ping.
+        :param projection_cache: Optional reference to projection cache holding valid prefix sums of ping (see
+        SharedProjectionCache); if given, slices are projected from prefix sums rather than from grid of ping.
+        :param slot: Slot of ping in projection cache.
+        :param row_offset: Row offset of ping (see SharedRingBufferRaw.get_row_offsets).
+        :return: Index of ring at which projections are stored.
+        """
+        index = self.next_index
+        row_offsets = np.array([row_offset], dtype=np.int64)
+
+        if projection_cache is not None:
+            # All slices from prefix sums of ping: two lookups, and grid cells at ends of slice, per depth row (or
+            # across-track column) per slice
+            amplitude_sums, count_sums = projection_cache.vertical_sums([slot], self.vertical_windows,
+                                                                        amplitudes[np.newaxis], counts[np.newaxis],
+                                                                        row_offsets)
+            self.vertical_projections[index, 0] = amplitude_sums[0]
+            self.vertical_projections[index, 1] = count_sums[0]
+            amplitude_sums, count_sums = projection_cache.horizontal_sums([slot], self.horizontal_windows,
+                                                                          amplitudes[np.newaxis], counts[np.newaxis],
+                                                                          row_offsets)
+            self.horizontal_projections[index, 0] = amplitude_sums[0]
+            self.horizontal_projections[index, 1] = count_sums[0]
+        else:
+            # VERTICAL SLICES: sum columns of each slice, per depth row; HORIZONTAL SLICES: sum rows of each slice, per
+            # across-track column
+            vertical_sums, horizontal_sums = self.sum_windows(amplitudes[np.newaxis], counts[np.newaxis], 1,
+                                                              self.vertical_windows, self.horizontal_windows,
+                                                              row_offsets)
+            self.vertical_projections[index] = vertical_sums[0]
+            self.horizontal_projections[index] = horizontal_sums[0]
+        self.timestamps[index] = timestamp
+        self.lat_lons[index] = lat_lon
+
+        self.next_index = (index + 1) % self.max_num_pings
+        self.num_stored = min(self.num_stored + 1, self.max_num_pings)
+        return index
+
+    @classmethod
+    def sum_windows(cls, amplitude_pings, count_pings, group_size, vertical_windows, horizontal_windows,
+                    row_offsets=None):
+        """
+        Sums vertical and horizontal slice windows of groups of pings (see window_sums).
+        :param amplitude_pings: Numpy array of amplitude matrices of pings (pings x depth rows x across-track columns).
+        :param count_pings: Numpy array of count matrices of pings.
+        :param group_size: Number of consecutive pings summed into each group.
+        :param vertical_windows: Start and end indices (across-track columns) of each vertical slice.
+        :param horizontal_windows: Start and end indices (depth rows) of each horizontal slice.
+        :param row_offsets: Optional row offset of each ping (see SharedRingBufferRaw.get_row_offsets); depth row r of
+        sums is row r - offset of ping as binned.
+        :return: Numpy arrays (float64) of sums of vertical slices (groups x 2 x vertical slices x depth rows) and of
+        horizontal slices (groups x 2 x horizontal slices x across-track columns); [:, 0] = amplitudes; [:, 1] =
+        counts.
+        """
+        num_rows, num_columns = amplitude_pings.shape[1:]
+        vertical_starts, vertical_ends = SharedProjectionCache.resolve_windows(vertical_windows, num_columns)
+        horizontal_starts, horizontal_ends = SharedProjectionCache.resolve_windows(horizontal_windows, num_rows)
+        if row_offsets is None:
+            row_offsets = np.zeros(len(amplitude_pings), dtype=np.int64)
+        with KernelThreads.launch():
+            return cls.window_sums(amplitude_pings, count_pings, group_size, vertical_starts, vertical_ends,
+                                   horizontal_starts, horizontal_ends, np.asarray(row_offsets, dtype=np.int64))
+
+    @staticmethod
+    @jit(nopython=True, nogil=True, parallel=True)
+    def window_sums(amplitude_pings, count_pings, group_size, vertical_starts, vertical_ends, horizontal_starts,
+                    horizontal_ends, row_offsets):
+        """
+        Sums slice windows of groups of pings, in parallel over groups and depth rows (vertical slices) and over groups
+        and blocks of across-track columns (horizontal slices); see KernelThreads. Sums are accumulated in float64.
+        Windows must lie within grid (see sum_windows); rows of each ping are offset by its row offset.
+        """
+        num_pings, num_rows, num_columns = amplitude_pings.shape
+        num_groups = (num_pings + group_size - 1) // group_size
+        num_vertical_slices = len(vertical_starts)
+        num_horizontal_slices = len(horizontal_starts)
+        vertical_sums = np.zeros((num_groups, 2, num_vertical_slices, num_rows), dtype=np.float64)
+        horizontal_sums = np.zeros((num_groups, 2, num_horizontal_slices, num_columns), dtype=np.float64)
+
+        # VERTICAL SLICES: each depth row of each group is summed independently
+        for index in prange(num_groups * num_rows):
+            group = index // num_rows
+            row = index % num_rows
+            for ping in range(group * group_size, min((group + 1) * group_size, num_pings)):
+                source_row = row - row_offsets[ping]
+                if source_row < 0 or source_row >= num_rows:
+                    continue
+                for vertical_slice in range(num_vertical_slices):
+                    amplitude_sum = 0.0
+                    count_sum = 0.0
+                    for column in range(vertical_starts[vertical_slice], vertical_ends[vertical_slice]):
+                        amplitude_sum += amplitude_pings[ping, source_row, column]
+                        count_sum += count_pings[ping, source_row, column]
+                    vertical_sums[group, 0, vertical_slice, row] += amplitude_sum
+                    vertical_sums[group, 1, vertical_slice, row] += count_sum
+
+        # HORIZONTAL SLICES: each block of across-track columns of each group is summed independently (blocks, so that
+        # rows of pings are read contiguously)
+        block_size = 64
+        num_blocks = (num_columns + block_size - 1) // block_size
+        for index in prange(num_groups * num_blocks):
+            group = index // num_blocks
+            start = (index % num_blocks) * block_size
+            stop = min(start + block_size, num_columns)
+            for ping in range(group * group_size, min((group + 1) * group_size, num_pings)):
+                for horizontal_slice in range(num_horizontal_slices):
+                    # Window in rows of ping as binned, clipped to grid
+                    start_row = max(horizontal_starts[horizontal_slice] - row_offsets[ping], 0)
+                    stop_row = min(horizontal_ends[horizontal_slice] - row_offsets[ping], num_rows)
+                    for row in range(start_row, stop_row):
+                        for column in range(start, stop):
+                            horizontal_sums[group, 0, horizontal_slice, column] += amplitude_pings[ping, row, column]
+                            horizontal_sums[group, 1, horizontal_slice, column] += count_pings[ping, row, column]
+
+        return vertical_sums, horizontal_sums
+
+    def add(self, amplitudes, counts, timestamp, lat_lon, along_track_avg, projection_cache=None, slot=None,
+            row_offset=0):
+        """
+        Projects a single ping and adds it to current group.
+        :param amplitudes: Numpy matrix of binned amplitude sums of ping (depth rows x across-track columns).
+        :param counts: Numpy matrix of binned counts of ping.
+        :param timestamp: Timestamp of ping.
+        :param lat_lon: Latitude and longitude of ping.
+        :param along_track_avg: Number of pings per group.
+        :param projection_cache: Optional reference to projection cache holding valid prefix sums of ping (see
+        project).
+        :param slot: Slot of ping in projection cache.
+        :param row_offset: Row offset of ping (see SharedRingBufferRaw.get_row_offsets).
+        :return: Averages of group (see emit) if group is complete; otherwise, None.
+        """
+        index = self.project(amplitudes, counts, timestamp, lat_lon, projection_cache, slot, row_offset)
+        self.add_stored(index)
+        if self.num_pending >= along_track_avg:
+            return self.emit(along_track_avg)
+        return None
+
+    def add_stored(self, index):
+        """
+        Adds stored projections of a ping to sums of current group.
+        :param index: Index of ring at which projections are stored.
+        """
+        self.vertical_sum += self.vertical_projections[index]
+        self.horizontal_sum += self.horizontal_projections[index]
+        self.timestamp_sum += self.timestamps[index]
+        self.lat_lon_sum += self.lat_lons[index]
+        self.num_pending += 1
+
+    def regroup(self, num_pending):
+        """
+        Rebuilds current group from the given number of most recent stored projections (for example, when
+        along_track_avg changes and the most recent num_pending pings are not yet included in processed ring buffer).
+        :param num_pending: Number of most recent pings belonging to current group.
+        :return: True if enough projections are stored; otherwise, False (current group is cleared, and pings must be
+        re-projected; see rebuild).
+        """
+        self.clear_group()
+        if num_pending > self.num_stored:
+            return False
+        for age in range(num_pending, 0, -1):
+            self.add_stored((self.next_index - age) % self.max_num_pings)
+        return True
+
+    def rebuild(self, amplitude_pings, count_pings, timestamp_pings, lat_lon_pings, row_offsets=None):
+        """
+        Re-projects pings of current group (for example, read from raw ring buffers after slice geometry changes).
+        :param amplitude_pings: Numpy array of amplitude matrices of pings of current group (oldest first).
+        :param count_pings: Numpy array of count matrices of pings of current group.
+        :param timestamp_pings: Numpy array of timestamps of pings of current group.
+        :param lat_lon_pings: Numpy array of latitudes and longitudes of pings of current group.
+        :param row_offsets: Optional row offset of each ping (see SharedRingBufferRaw.get_row_offsets).
+        """
+        self.clear_group()
+        for ping in range(len(amplitude_pings)):
+            self.add_stored(self.project(amplitude_pings[ping], count_pings[ping],
+                                         timestamp_pings[ping], lat_lon_pings[ping],
+                                         row_offset=0 if row_offsets is None else row_offsets[ping]))
+
+    def emit(self, along_track_avg):
+        """
+        Averages sums of current group and starts a new group.
+        :param along_track_avg: Number of pings per group.
+        :return: Averages of vertical slices (slices x depth rows), averages of horizontal slices (slices x
+        across-track columns), average timestamp and average latitude / longitude of group. Slices are NaN where no
+        samples were binned.
+        """
+        # Ignore divide by zero warnings. Division by zero results in NaN, which is what we want.
+        with np.errstate(divide='ignore', invalid='ignore'):
+            vertical_average = self.vertical_sum[0] * self.amplitude_scale / self.vertical_sum[1]
+            horizontal_average = self.horizontal_sum[0] * self.amplitude_scale / self.horizontal_sum[1]
+
+        if not self.vertical_sum[1].any() and not self.horizontal_sum[1].any():
+            logger.warning("Water column data matrix buffers are empty.")
+
+        if self.timestamp_sum != 0:
+            timestamp_average = self.timestamp_sum / along_track_avg
+        else:
+            logger.warning("Water column timestamp matrix buffer is empty.")
+            timestamp_average = np.nan
+
+        if self.lat_lon_sum.any():
+            lat_lon_average = self.lat_lon_sum / along_track_avg
+        else:
+            logger.warning("Nothing to plot; water column latitude / longitude matrix buffer is empty.")
+            lat_lon_average = np.full(2, np.nan)
+
+        self.clear_group()
+        return vertical_average, horizontal_average, timestamp_average, lat_lon_average
@@ -0,0 +1,83 @@
+# Lynette Davis
+# ldavis@ccom.unh.edu
+# Center for Coastal and Ocean Mapping
+# University of New Hampshire
+# October 2026
+
+# Description: Pool of sets of grids lent to records (for example, pie records; see KongsbergDGProcess.get_pie_grids),
+# so that grids of records are reused once records are released rather than allocated for every ping. Ownership is
+# explicit: a set of grids is acquired, then lent to the record that holds it (or released, if no record is made),
+# and the pool keeps only a weak reference to that record. Invariant: a set of grids is never acquired again while
+# the record to which it was lent is alive. A record put into a multiprocessing.Queue stays alive (referenced by the
+# queue) until the queue's feeder thread has pickled it, so its grids are not overwritten before they are sent.
+
+import weakref
+
+
+class GridPool:
+
+    # Owner of grids that are acquired but not yet lent to a record
+    ACQUIRED = object()
+
+    def __init__(self, max_size):
+        """
+        :param max_size: Largest number of sets of grids kept in pool; when full, oldest set is dropped from pool
+        (grids of a dropped set stay valid for as long as they are referenced).
+        """
+        self.max_size = max_size
+        # Entries: [key, grids, owner]; owner is None (free), ACQUIRED, or weak reference to record holding grids
+        self.entries = []
+
+    @classmethod
+    def is_free(cls, entry):
+        owner = entry[2]
+        return owner is None or (owner is not cls.ACQUIRED and owner() is None)
+
+    def acquire(self, key, allocate):
+        """
+        Acquires a free set of grids with given key, or allocates a new set.
+        :param key: Key identifying layout of grids (for example, shape); sets of grids with another key are dropped
+        from pool when a new set is allocated.
+        :param allocate: Function of no arguments returning a new set of grids.
+        :return: Set of grids (contents undefined); must be lent to a record (see lend) or released (see release).
+        """
+        for entry in self.entries:
+            if entry[0] == key and self.is_free(entry):
+                entry[2] = self.ACQUIRED
+                return entry[1]
+
+        self.entries = [entry for entry in self.entries if entry[0] == key]
+        if len(self.entries) >= self.max_size:
+            self.entries.pop(0)
+        grids = allocate()
+        self.entries.append([key, grids, self.ACQUIRED])
+        return grids
+
+    def find(self, grids):
+        """
+        :param grids: Set of grids (sequence of arrays), identified by its first grid.
+        :return: Entry of pool holding set of grids, or None if set has been dropped from pool.
+        """
+        for entry in self.entries:
+            if entry[1][0] is grids[0]:
+                return entry
+        return None
+
+    def lend(self, grids, record):
+        """
+        Lends acquired grids to record: grids are free again once record is no longer referenced.
+        :param grids: Set of grids, as returned by acquire (or any sequence with same first grid).
+        :param record: Record holding grids.
+        """
+        entry = self.find(grids)
+        if entry is not None:
+            entry[2] = weakref.ref(record)
+
+    def release(self, grids):
+        """
+        Releases acquired grids that were not lent to a record.
+        :param grids: Set of grids, as returned by acquire (or any sequence with same first grid).
+        """
+        entry = self.find(grids)
+        if entry is not None:
+            entry[2] = None
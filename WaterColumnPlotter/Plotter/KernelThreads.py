@@ -0,0 +1,54 @@
+# Lynette Davis
+# ldavis@ccom.unh.edu
+# Center for Coastal and Ocean Mapping
+# University of New Hampshire
+# October 2026
+
+# Description: Threads of parallel numba kernels (kernels compiled with parallel=True, nogil=True; see
+# SharedRingBufferRaw.sum, SharedProjectionCache.prefix_sums and AlongTrackAccumulator.window_sums). Kernels release
+# the GIL, so that they may run on a background thread (see ProcessedBufferWorker) without blocking the GUI thread.
+# Number of threads is set by 'kernelThreads' in advanced settings (0 = number of CPUs); numba's setting is local to
+# each thread, so it is applied by each thread that launches kernels (see configure).
+
+from contextlib import nullcontext
+import logging
+import numba
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class KernelThreads:
+
+    # Serializes launches of parallel kernels from threads of a process when threading layer is not thread-safe
+    LAUNCH_LOCK = threading.Lock()
+    # Threading layers that support concurrent launches from several threads
+    THREAD_SAFE_LAYERS = ("tbb", "omp")
+
+    @staticmethod
+    def configure(settings):
+        """
+        Sets number of threads of parallel kernels launched by calling thread.
+        :param settings: Settings dictionary.
+        :return: Number of threads.
+        """
+        max_num_threads = numba.config.NUMBA_NUM_THREADS
+        num_threads = settings['advanced_settings']['kernelThreads']
+        num_threads = max_num_threads if num_threads <= 0 else min(num_threads, max_num_threads)
+        numba.set_num_threads(num_threads)
+        return num_threads
+
+    @classmethod
+    def launch(cls):
+        """
+        Context in which a parallel kernel is launched. Numba's 'workqueue' threading layer (used when neither TBB nor
+        OpenMP is available) does not support concurrent launches from several threads; launches are then serialized.
+        :return: Context manager.
+        """
+        try:
+            layer = numba.threading_layer()
+        except ValueError:  # No parallel kernel has been launched yet
+            layer = None
+        if layer in cls.THREAD_SAFE_LAYERS:
+            return nullcontext()
+        return cls.LAUNCH_LOCK
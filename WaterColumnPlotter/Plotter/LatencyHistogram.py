@@ -0,0 +1,146 @@
+# Lynette Davis
+# ldavis@ccom.unh.edu
+# Center for Coastal and Ocean Mapping
+# University of New Hampshire
+# October 2026
+
+# Description: Lightweight per-stage latency histograms. Elapsed times (time.perf_counter_ns) are accumulated into
+# fixed, log2-spaced buckets in a process-local array and flushed once per ping into a multiprocessing.Array,
+# from which they may be read by any other process (for example, for display in the GUI). Total elapsed time of each
+# ping is recorded as a stage of its own, since percentiles of the total are not sums of percentiles of the stages.
+
+import numpy as np
+import time
+
+
+class LatencyHistogram:
+
+    # Stages of processing a single #MWC record (ping)
+    DECODE = 0
+    GEOMETRY = 1
+    BINNING = 2
+    PIE = 3
+    QUEUE = 4
+    TOTAL = 5  # From start() to stop()
+    STAGE_NAMES = ["decode", "geometry", "binning", "pie", "queue", "total"]
+    NUM_STAGES = len(STAGE_NAMES)
+
+    # Bucket 0 counts elapsed times under 2 ** BUCKET_SHIFT ns (~1 us); bucket k counts elapsed times in
+    # [2 ** (k - 1), 2 ** k) * 2 ** BUCKET_SHIFT ns. Last bucket also counts all longer elapsed times (~4 s and up).
+    BUCKET_SHIFT = 10
+    NUM_BUCKETS = 24
+
+    def __init__(self, shared_counts):
+        """
+        :param shared_counts: multiprocessing.Array (ctypes.c_uint64) of length NUM_STAGES * NUM_BUCKETS
+        in which counts are accumulated.
+        """
+        self.shared_counts = shared_counts
+
+        self.local_counts = np.zeros((self.NUM_STAGES, self.NUM_BUCKETS), dtype=np.uint64)
+        self.start_time_ns = 0
+        self.ping_start_time_ns = 0
+        # True from discard() until next start(): nothing is recorded
+        self.discarded = False
+
+    @classmethod
+    def bucket_upper_edges_ms(cls):
+        """
+        :return: Numpy array of upper edge (in milliseconds) of each bucket.
+        """
+        return (2.0 ** (np.arange(cls.NUM_BUCKETS) + cls.BUCKET_SHIFT)) / 1e6
+
+    def start(self):
+        """
+        Starts timing first stage, and total.
+        """
+        self.discarded = False
+        self.start_time_ns = self.ping_start_time_ns = time.perf_counter_ns()
+
+    def discard(self):
+        """
+        Discards current ping: stages recorded since start() are dropped, and nothing is recorded until next start(),
+        so that pings not processed through every stage (for example, empty records) do not skew histograms.
+        """
+        self.discarded = True
+        self.local_counts[:] = 0
+
+    def mark(self, stage):
+        """
+        Records time elapsed since start() or previous mark() against given stage, and starts timing next stage.
+        :param stage: Index of stage (for example, LatencyHistogram.DECODE).
+        """
+        if self.discarded:
+            return
+        now_ns = time.perf_counter_ns()
+        self.record(stage, now_ns - self.start_time_ns)
+        self.start_time_ns = now_ns
+
+    def stop(self):
+        """
+        Records time elapsed since start() against TOTAL.
+        """
+        if self.discarded:
+            return
+        self.record(self.TOTAL, time.perf_counter_ns() - self.ping_start_time_ns)
+
+    def record(self, stage, elapsed_ns):
+        """
+        Counts elapsed time in bucket of given stage.
+        :param stage: Index of stage.
+        :param elapsed_ns: Elapsed time (nanoseconds).
+        """
+        bucket = (elapsed_ns >> self.BUCKET_SHIFT).bit_length()
+        self.local_counts[stage, min(bucket, self.NUM_BUCKETS - 1)] += 1
+
+    def flush(self):
+        """
+        Adds local counts to shared counts and resets local counts. Intended to be called once per ping.
+        """
+        with self.shared_counts.get_lock():
+            shared_counts_np = np.frombuffer(self.shared_counts.get_obj(), dtype=np.uint64)
+            shared_counts_np += self.local_counts.ravel()
+        self.local_counts[:] = 0
+
+    def get_counts(self):
+        """
+        :return: Copy of shared counts as numpy matrix of shape (NUM_STAGES, NUM_BUCKETS).
+        """
+        with self.shared_counts.get_lock():
+            return np.frombuffer(self.shared_counts.get_obj(),
+                                 dtype=np.uint64).reshape(self.NUM_STAGES, self.NUM_BUCKETS).copy()
+
+    def clear(self):
+        """
+        Resets shared and local counts to zero.
+        """
+        with self.shared_counts.get_lock():
+            np.frombuffer(self.shared_counts.get_obj(), dtype=np.uint64)[:] = 0
+        self.local_counts[:] = 0
+
+    def get_percentiles(self, percentile):
+        """
+        Estimates given percentile of elapsed time of each stage as the upper edge of the bucket in which it falls.
+        :param percentile: Percentile (0 - 100).
+        :return: Numpy array of estimated percentile (in milliseconds) of each stage; NaN for stages with no counts.
+        """
+        counts = self.get_counts()
+        cumulative_counts = np.cumsum(counts, axis=1)
+        totals = cumulative_counts[:, -1]
+
+        percentiles = np.full(self.NUM_STAGES, np.nan)
+        upper_edges_ms = self.bucket_upper_edges_ms()
+        for stage in range(self.NUM_STAGES):
+            if totals[stage] > 0:
+                bucket = np.searchsorted(cumulative_counts[stage], totals[stage] * (percentile / 100))
+                percentiles[stage] = upper_edges_ms[min(bucket, self.NUM_BUCKETS - 1)]
+        return percentiles
+
+    def summary(self):
+        """
+        :return: String summarizing median / 99th percentile elapsed time (in milliseconds) of each stage.
+        """
+        median = self.get_percentiles(50)
+        p99 = self.get_percentiles(99)
+        return "  ".join("{} {:.2g}/{:.2g}".format(name, median[stage], p99[stage])
+                         for stage, name in enumerate(self.STAGE_NAMES))
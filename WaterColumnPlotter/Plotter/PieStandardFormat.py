@@ -9,7 +9,8 @@
 
 class PieStandardFormat:
     def __init__(self, bin_size, max_heave, pie_chart_amplitudes,
-                 pie_chart_counts, timestamp, latitude=None, longitude=None):
+                 pie_chart_counts, timestamp, latitude=None, longitude=None, bottom_depths=None,
+                 level_amplitudes=None, level_counts=None, level_bottom_depths=None, sample_record=None):
 
         self.bin_size = bin_size
         self.max_heave = max_heave
@@ -19,3 +20,17 @@ class PieStandardFormat:
         self.timestamp = timestamp
         self.latitude = latitude
         self.longitude = longitude
+        # Numpy array containing depth (in fractional bins) of detected bottom in each across-track bin;
+        # NaN where bottom is not detected
+        self.bottom_depths = bottom_depths
+
+        # Optional: data binned at coarser bin sizes (levels); level k (k >= 1) has bin size of bin_size * 2 ** k.
+        # Numpy arrays with one entry per level, each entry as for pie_chart_amplitudes, pie_chart_counts and
+        # bottom_depths.
+        self.level_amplitudes = level_amplitudes
+        self.level_counts = level_counts
+        self.level_bottom_depths = level_bottom_depths
+
+        # Optional: compact record of beam geometry and raw samples of ping, from which ping can be re-binned at other
+        # bin sizes or max heave (see SharedSampleStore)
+        self.sample_record = sample_record
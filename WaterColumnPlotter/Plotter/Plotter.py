@@ -13,16 +13,23 @@ import math
 from multiprocessing import Process
 import numpy as np
 import queue
+import time
+from WaterColumnPlotter.Plotter.AllocationMonitor import AllocationMonitor
+from WaterColumnPlotter.Plotter.AlongTrackAccumulator import AlongTrackAccumulator
+from WaterColumnPlotter.Plotter.KernelThreads import KernelThreads
+from WaterColumnPlotter.Plotter.SharedProjectionCache import SharedProjectionCache
 from WaterColumnPlotter.Plotter.SharedRingBufferProcessed import SharedRingBufferProcessed
 from WaterColumnPlotter.Plotter.SharedRingBufferRaw import SharedRingBufferRaw
+from WaterColumnPlotter.Plotter.SharedSampleStore import SharedSampleStore
+from WaterColumnPlotter.Plotter.SliceRegistry import SliceRegistry
 
 logger = logging.getLogger(__name__)
 
 
 class Plotter(Process):
-    def __init__(self, settings, bin_size, across_track_avg, depth, depth_avg, along_track_avg, max_heave,
-                 settings_edited, queue_pie_object, raw_buffer_count, processed_buffer_count,
-                 raw_buffer_full_flag, processed_buffer_full_flag, process_flag):
+    def __init__(self, settings, bin_size, base_bin_size, across_track_avg, depth, depth_avg, along_track_avg,
+                 max_heave, settings_edited, queue_pie_object, raw_buffer_count, processed_buffer_count,
+                 raw_buffer_full_flag, processed_buffer_full_flag, process_flag, pie_buffer_time):
         super().__init__()
 
         print("Initializing Plotter.")
@@ -31,6 +38,7 @@ class Plotter(Process):
 
         # multiprocessing.Values (shared between processes)
         self.bin_size = bin_size
+        self.base_bin_size = base_bin_size
         self.across_track_avg = across_track_avg
         self.depth = depth
         self.depth_avg = depth_avg
@@ -43,13 +51,12 @@ class Plotter(Process):
         self.bin_size_edited = False
         self.max_heave_edited = False
         self.along_track_avg_edited = False
-        # Need to maintain record of 'old' max_heave when updated
-        self.outdated_heave = None
         # Need to maintain record of 'old' along_track_avg when updated
         self.outdated_along_track_avg = None
 
         # Local copies of above multiprocessing.Values (to avoid frequent accessing of locks)
         self.bin_size_local = None
+        self.base_bin_size_local = None
         self.across_track_avg_local = None
         self.depth_local = None
         self.depth_avg_local = None
@@ -63,16 +70,40 @@ class Plotter(Process):
         self.raw_buffer_full_flag = raw_buffer_full_flag  # multiprocessing.Value
         self.processed_buffer_full_flag = processed_buffer_full_flag  # multiprocessing.Value
         self.process_flag = process_flag  # multiprocessing.Value
+        # Moving average of time (in seconds) to buffer a pie record; read by quality of service controller of
+        # KongsbergDGProcess to cost pie records waiting in queue_pie_object (see QualityOfServiceController)
+        self.pie_buffer_time = pie_buffer_time  # multiprocessing.Value
+        self.pie_buffer_time_local = 0.0
+        self.PIE_BUFFER_TIME_SMOOTHING = 0.1  # Weight of newest batch in moving average
 
         # multiprocessing.shared_memory implementation based on:
         # https://medium.com/@sampsa.riikonen/doing-python-multiprocessing-the-right-way-a54c1880e300
         # https://github.com/elsampsa/medium/blob/main/multiprocess/example2.py
         self.shared_ring_buffer_raw = None  # Protected with self.raw_buffer_count lock
         self.shared_ring_buffer_processed = None  # Protected with self.processed_buffer_count lock
+        # Per-ping prefix sums of raw ring buffer (see SharedProjectionCache); None if 'projectionCache' is disabled
+        self.shared_projection_cache = None  # Protected with self.raw_buffer_count lock
+        # Records of samples of pings of raw ring buffer (see SharedSampleStore); None if 'sampleStore' is disabled
+        self.shared_sample_store = None  # Protected with self.raw_buffer_count lock
 
         # TODO: Make this a multiprocessing Value?
         self.MAX_NUM_GRID_CELLS = self.settings['buffer_settings']['maxGridCells']
+        # Number of bin sizes (levels) at which pings are binned and buffered (see KongsbergDGProcess); level of
+        # current bin size (None if current bin size is not binned at any level)
+        self.NUM_BIN_SIZE_LEVELS = self.settings['advanced_settings']['binSizeLevels']
+        self.bin_size_level_local = 0
         self.QUEUE_RX_TIMEOUT = 60  # Seconds
+        # Maximum number of pie objects received from queue and buffered together (see get_pie_batch)
+        self.MAX_BATCH_SIZE_PINGS = min(32, self.settings['buffer_settings']['maxBufferSize_ping'])
+
+        # Running sums of vertical and horizontal slices of pings of current along-track group (see
+        # AlongTrackAccumulator); created in run(), when amplitude scale of raw ring buffers is known
+        self.along_track_accumulator = None
+        # To be set to True when settings are edited; current along-track group must then be rebuilt
+        self.along_track_group_outdated = False
+        # Allocations per pie record (see AllocationMonitor); started in run()
+        self.allocation_monitor = AllocationMonitor("Plotter",
+                                                    self.settings['advanced_settings']['allocationDiagnostics'])
 
         # VERTICAL SLICE:
         # Trim arrays to omit values outside of self.vertical_slice_width_m
@@ -94,6 +125,12 @@ class Plotter(Process):
         self.horizontal_slice_start_index = None
         self.horizontal_slice_end_index = None
 
+        # Above indices are those of primary slices; all vertical and horizontal slices (see SliceRegistry) are
+        # calculated in one pass over each ping, from windows of indices [start, end) of each slice
+        self.slice_registry = SliceRegistry(self.settings)
+        self.vertical_slice_windows = None
+        self.horizontal_slice_windows = None
+
         # Initialize local copies and vertical and horizontal indices
         self.update_local_settings()
 
@@ -107,11 +144,23 @@ class Plotter(Process):
         # Outer lock to ensure atomicity of updates; this lock must be held when updating settings.
         with self.settings_edited.get_lock():
             with self.bin_size.get_lock():
-                if self.bin_size_local and round(self.bin_size_local, 2) != round(self.bin_size.value, 2):
-                    # Bin size edits cannot be applied retroactively; when this value changes,
-                    # set bin_size_edited flag to true to indicate that ring buffers must be cleared
-                    self.bin_size_edited = True
                 self.bin_size_local = self.bin_size.value
+            with self.base_bin_size.get_lock():
+                if self.base_bin_size_local and round(self.base_bin_size_local, 2) != \
+                        round(self.base_bin_size.value, 2):
+                    # Pings are binned at new bin size levels; ring buffers have been cleared or, with sample store,
+                    # are being re-binned (see WaterColumn)
+                    self.bin_size_edited = True
+                self.base_bin_size_local = self.base_bin_size.value
+            # Bin size edits can be applied retroactively only when new bin size is binned at one of bin size levels;
+            # otherwise, set bin_size_edited flag to true to indicate that ring buffers must be cleared
+            self.bin_size_level_local = SharedRingBufferRaw.bin_size_level(self.bin_size_local,
+                                                                           self.base_bin_size_local,
+                                                                           self.NUM_BIN_SIZE_LEVELS)
+            if self.bin_size_level_local is None:
+                self.bin_size_edited = True
+            elif self.shared_ring_buffer_raw:
+                self.shared_ring_buffer_raw.select_level(self.bin_size_level_local)
             with self.across_track_avg.get_lock():
                 self.across_track_avg_local = self.across_track_avg.value
             with self.depth.get_lock():
@@ -126,84 +175,23 @@ class Plotter(Process):
             with self.max_heave.get_lock():
                 if self.max_heave_local and self.max_heave_local != self.max_heave.value:
                     # Max heave edits can be applied retroactively; when this value changes, set max_heave_edited
-                    # flag to true to indicate that further adjustments must be made and save outdated heave value
+                    # flag to true to indicate that further adjustments must be made
                     self.max_heave_edited = True
-                    self.outdated_heave = self.max_heave_local
                 self.max_heave_local = self.max_heave.value
 
             # Set vertical and horizontal indices for matrix slicing
             self.set_vertical_indices()
             self.set_horizontal_indices()
 
-    def shift_heave(self, amplitude_buffer, count_buffer, old_heave, new_heave):
-        """
-        Shifts values in numpy amplitude_buffer and numpy count_buffer to accommodate changes in maximum heave settings.
-        :param amplitude_buffer: Numpy matrix containing binned water column amplitude values for a single ping
-        :param count_buffer: Numpy matrix containing binned water column counts for a single ping
-        :param old_heave: Old heave value to be replaced
-        :param new_heave: New heave value to be applied
-        """
-        # NOTE: This method will only be called if self.bin_size_local has not changed. When self.bin_size_local
-        # changes, both raw and processed buffers will be cleared; no need to recalculate heave.
-        num_bins_old_heave = int(round(old_heave, 2) / round(self.bin_size_local, 2))
-        num_bins_new_heave = int(round(new_heave, 2) / round(self.bin_size_local, 2))
-        # Negative indicates reducing heave allotment;
-        # positive indicates increasing heave allotment
-        num_bins_adjustment = num_bins_new_heave - num_bins_old_heave
-
-        # Adjustment method based on (shift5):
-        # https://stackoverflow.com/questions/30399534/shift-elements-in-a-numpy-array
-
-        if num_bins_adjustment > 0:  # Increase heave allotment
-            if len(amplitude_buffer.shape) == 2:
-                # Shift data downward to accommodate extra heave cells at top of matrix
-                amplitude_buffer[num_bins_adjustment:] = amplitude_buffer[:-num_bins_adjustment]
-                count_buffer[num_bins_adjustment:] = count_buffer[:-num_bins_adjustment]
-                # Fill extra heave cells at top of matrix with zero
-                amplitude_buffer[:num_bins_adjustment] = 0
-                count_buffer[:num_bins_adjustment] = 0
-
-            elif len(amplitude_buffer.shape) == 3:
-                # Shift data downward to accommodate extra heave cells at top of matrix
-                amplitude_buffer[:, num_bins_adjustment:, :] = amplitude_buffer[:, :-num_bins_adjustment, :]
-                count_buffer[:, num_bins_adjustment:, :] = count_buffer[:, :-num_bins_adjustment, :]
-                # Fill extra heave cells at top of matrix with zero
-                amplitude_buffer[:, :num_bins_adjustment, :] = 0
-                count_buffer[:, :num_bins_adjustment, :] = 0
-            else:
-                logger.warning("Error in Plotter.py, shift_heave() method. Invalid buffer shape: {}."
-                               .format(amplitude_buffer.shape))
-
-        elif num_bins_adjustment < 0:  # Decrease heave allotment
-            if len(amplitude_buffer.shape) == 2:
-                # Shift data upward to accommodate fewer heave cells at top of matrix
-                amplitude_buffer[:num_bins_adjustment] = amplitude_buffer[-num_bins_adjustment:]
-                count_buffer[:num_bins_adjustment] = count_buffer[-num_bins_adjustment:]
-                # Fill extra cells at bottom of matrix with zero
-                amplitude_buffer[num_bins_adjustment:] = 0
-                count_buffer[num_bins_adjustment:] = 0
-
-            elif len(amplitude_buffer.shape) == 3:
-                # Shift data upward to accommodate fewer heave cells at top of matrix
-                amplitude_buffer[:, :num_bins_adjustment, :] = amplitude_buffer[:, -num_bins_adjustment:, :]
-                count_buffer[:, :num_bins_adjustment, :] = count_buffer[:, -num_bins_adjustment:, :]
-                # Fill extra cells at bottom of matrix with zero
-                amplitude_buffer[:, num_bins_adjustment:, :] = 0
-                count_buffer[:, num_bins_adjustment:, :] = 0
-            else:
-                logger.warning("Error in Plotter.py, shift_heave() method. Invalid buffer shape: {}."
-                               .format(amplitude_buffer.shape))
-
     def set_vertical_indices(self):
         """
         Sets starting and ending indices for vertical slices based on user settings.
         """
-        self.vertical_slice_start_index = math.floor((self.MAX_NUM_GRID_CELLS / 2) -
-                                                     ((self.across_track_avg_local / 2) /
-                                                      self.bin_size_local))
-        self.vertical_slice_end_index = math.ceil((self.MAX_NUM_GRID_CELLS / 2) +
-                                                  ((self.across_track_avg_local / 2) /
-                                                   self.bin_size_local))
+        self.vertical_slice_windows = self.slice_registry.vertical_windows(self.MAX_NUM_GRID_CELLS,
+                                                                           self.bin_size_local,
+                                                                           self.across_track_avg_local)
+        self.vertical_slice_start_index, self.vertical_slice_end_index = \
+            (int(index) for index in self.vertical_slice_windows[0])
 
     def set_horizontal_indices(self):
         """
@@ -214,12 +202,13 @@ class Plotter(Process):
         # Add the above two values to get true index of desired depth.
         # Then, find number of bins that must be included to achieve horizontal_slice_width_m above / below index of
         # desired depth: this is found by dividing horizontal_slice_width_m by 2 and dividing again by bin_size.
-        self.horizontal_slice_start_index = math.ceil(self.max_heave_local / self.bin_size_local) + \
-                                            math.floor(self.depth_local / self.bin_size_local) - \
-                                            math.ceil((self.depth_avg_local / 2) / self.bin_size_local)
-        self.horizontal_slice_end_index = math.ceil(self.max_heave_local / self.bin_size_local) + \
-                                          math.floor(self.depth_local / self.bin_size_local) + \
-                                          math.ceil((self.depth_avg_local / 2) / self.bin_size_local)
+        # (See SliceRegistry.)
+        self.horizontal_slice_windows = self.slice_registry.horizontal_windows(self.MAX_NUM_GRID_CELLS,
+                                                                               self.bin_size_local,
+                                                                               self.max_heave_local,
+                                                                               self.depth_local, self.depth_avg_local)
+        self.horizontal_slice_start_index, self.horizontal_slice_end_index = \
+            (int(index) for index in self.horizontal_slice_windows[0])
 
     def get_and_buffer_pie(self):
         """
@@ -227,133 +216,52 @@ class Plotter(Process):
         method is blocking, but does have a timeout.) Appends raw data to raw ring buffers in shared memory; slices and
         averages data according to user settings, and appends this data to processed ring buffers in shared memory.
         """
-        # Counter to track number of records processed; triggers additional processing
-        # when number of records processed reaches the number of pings to average along track
-        # (as defined by user settings); counter is reset to zero after these additional actions are triggered.
-        count_temp = 0
-
-        # Temporarily stores copies of data for additional processing.
-        temp_pie_amplitudes = []
-        temp_pie_counts = []
-        temp_timestamp = []
-        temp_lat_lon = []
-
+        # Pings are projected onto vertical and horizontal slices as they arrive; when the number of pings in the
+        # current group reaches the number of pings to average along track (as defined by user settings), averages
+        # of group are appended to processed ring buffer (see AlongTrackAccumulator).
+        # Every pie object already waiting in queue is received with each pie object (see get_pie_batch), and pie
+        # objects of a batch are buffered together, holding locks once (see buffer_pies).
         while True:
             # Check for signal to play / pause / stop:
             with self.process_flag.get_lock():
                 local_process_flag_value = self.process_flag.value
 
             try:
-                print("plotter, getting pie object: count_temp: {}, self.along-track-avg-local: {}".format(count_temp, self.along_track_avg_local))
+                print("plotter, getting pie object: num_pending: {}, self.along-track-avg-local: {}"
+                      .format(self.along_track_accumulator.num_pending, self.along_track_avg_local))
+                # Allocations are measured from receipt of one batch of pie records to receipt of the next (excluding
+                # unpickling of records by queue)
+                self.allocation_monitor.end()
                 pie_object = self.queue_pie_object.get(block=True, timeout=self.QUEUE_RX_TIMEOUT)
-                print("plotter, got pie object")
 
                 if pie_object:  # pie_object will be of type DGPie if valid record, or type None if poison pill
+                    pie_objects, poison_pill = self.get_pie_batch(pie_object)
+                    self.allocation_monitor.begin()
+                    print("plotter, got {} pie object(s)".format(len(pie_objects)))
+
                     if local_process_flag_value == 1 or local_process_flag_value == 2:  # Play pressed or pause pressed
 
+                        start_time = time.perf_counter()
                         with self.shared_ring_buffer_raw.get_lock():
                             with self.settings_edited.get_lock():
                                 if self.settings_edited.value:  # If settings are edited...
                                     self.update_local_settings()
                                     self.settings_edited.value = False
+                                    self.along_track_group_outdated = True
+
+                            pie_objects = [pie_object for pie_object in pie_objects if self.check_pie(pie_object)]
+
+                            if pie_objects:
+                                # Processed ring buffer will have already been recalculated from raw ring buffer
+                                # according to new settings (see WaterColumn.update_buffers). Rebuild current
+                                # along-track group accordingly.
+                                if self.along_track_group_outdated:
+                                    self.update_along_track_group()
 
-                            # If self.bin_size_edited is True, raw and processed ring buffers will have already
-                            # been cleared. We only need to empty queue_pie_object of outdated pie_objects.
-                            # We DO NOT need to call self.recalculate_processed_buffer, as buffers are empty.
-                            if self.bin_size_edited:
-                                if round(pie_object.bin_size, 2) != round(self.bin_size_local, 2):
-                                    # If the current pie_object contains a record processed with the 'old' bin_size,
-                                    # do not process it--discard it and get another from the queue
-                                    continue  # Return to start of while loop
-                                else:
-                                    # If the current pie_object contains a record processed with the 'new' bin_size...
-                                    count_temp = 0  # ...Reset count...
-                                    self.bin_size_edited = False  # ...Reset self.bin_size_edited...
-                                    # ...And continue to process pie_object as usual.
-
-                            # If self.max_heave_edited is True, raw and processed ring buffers will have already
-                            # been adjusted. We only need to monitor queue_pie_object for outdated pie_objects
-                            # and adjust them accordingly.
-                            if self.max_heave_edited:
-                                print("####################In plotter, max_heave_edited is True.")
-                                if round(pie_object.max_heave, 2) != round(self.max_heave_local, 2):
-                                    self.shift_heave(pie_object.pie_chart_amplitudes, pie_object.pie_chart_counts,
-                                                     pie_object.max_heave, self.max_heave_local)
-                                else:
-                                    print("####################In plotter, max_heave_edited is False.")
-                                    self.max_heave_edited = False
-
-                            # If self.along_track_avg_edited is True, processed ring buffer will have already been
-                            # adjusted. We need to know the 'remainder' of items in the raw ring buffer than were not
-                            # included in calculations for the revised processed ring buffer.
-                            print("self.along_track_avg_edited: ", self.along_track_avg_edited)
-                            if self.along_track_avg_edited:
-                                print("self.shared_ring_buffer_raw.get_num_elements_in_buffer(): ", self.shared_ring_buffer_raw.get_num_elements_in_buffer())
-                                print("self.shared_ring_buffer_processed.get_num_elements_in_buffer(): ",
-                                      self.shared_ring_buffer_processed.get_num_elements_in_buffer())
-                                print("count temp before change: ", count_temp)
-                                # Note: Lock for this buffer is already held
-                                count_temp = self.shared_ring_buffer_raw.get_num_elements_in_buffer() % \
-                                             self.along_track_avg_local
-                                print("count temp after change: ", count_temp)
-
-                            # with self.raw_buffer_count.get_lock():
-                            # Add raw data to raw ring buffer in shared memory
-                            self.shared_ring_buffer_raw.append_all([pie_object.pie_chart_amplitudes],
-                                                                   [pie_object.pie_chart_counts],
-                                                                   [pie_object.timestamp],
-                                                                   [(pie_object.latitude, pie_object.longitude)])
-                            # Increment count_temp
-                            count_temp += 1
-
-                            if count_temp == self.along_track_avg_local:
-                                # Make temporary copies of last along_track_avg_local
-                                # number of pings for further processing:
-                                temp_pie_amplitudes = np.copy(self.shared_ring_buffer_raw.view_recent_pings(
-                                    self.shared_ring_buffer_raw.amplitude_buffer, self.along_track_avg_local))
-                                temp_pie_counts = np.copy(self.shared_ring_buffer_raw.view_recent_pings(
-                                    self.shared_ring_buffer_raw.count_buffer, self.along_track_avg_local))
-                                temp_timestamp = np.copy(self.shared_ring_buffer_raw.view_recent_pings(
-                                    self.shared_ring_buffer_raw.timestamp_buffer, self.along_track_avg_local))
-                                temp_lat_lon = np.copy(self.shared_ring_buffer_raw.view_recent_pings(
-                                    self.shared_ring_buffer_raw.lat_lon_buffer, self.along_track_avg_local))
-
-                            # if count_temp == self.along_track_avg_local:
-                                # Note: Attempt at multithreading here does not seem to affect performance.
-                                # threading.Thread(target=self.collapse_and_buffer_pings,
-                                #                  args=(temp_pie_amplitudes, temp_pie_counts,
-                                #                        temp_timestamp, temp_lat_lon)).start()
-                                self.collapse_and_buffer_pings(temp_pie_amplitudes, temp_pie_counts,
-                                                               temp_timestamp, temp_lat_lon)
-                                # Reset counter
-                                count_temp = 0
-
-                            elif self.along_track_avg_edited:
-                                if count_temp < self.along_track_avg_local:
-                                    # Ready to use new, local value for processing
-                                    self.along_track_avg_edited = False
-                                elif count_temp > self.along_track_avg_local:
-                                    # Not ready to use new, local value for processing
-                                    # Make temporary copies of most recent count_temp number of pings
-                                    temp_pie_amplitudes = np.copy(self.shared_ring_buffer_raw.view_recent_pings(
-                                        self.shared_ring_buffer_raw.amplitude_buffer, count_temp))
-                                    temp_pie_counts = np.copy(self.shared_ring_buffer_raw.view_recent_pings(
-                                        self.shared_ring_buffer_raw.count_buffer, count_temp))
-                                    temp_timestamp = np.copy(self.shared_ring_buffer_raw.view_recent_pings(
-                                        self.shared_ring_buffer_raw.timestamp_buffer, count_temp))
-                                    temp_lat_lon = np.copy(self.shared_ring_buffer_raw.view_recent_pings(
-                                        self.shared_ring_buffer_raw.lat_lon_buffer, count_temp))
-
-                                    print("count_temp before recursive call: {}".format(count_temp))
-                                    count_temp = self.adjust_along_track_avg(temp_pie_amplitudes, temp_pie_counts,
-                                                                             temp_timestamp, temp_lat_lon, count_temp)
-                                    print("count_temp after recursive call: {}".format(count_temp))
-                                    if count_temp < self.along_track_avg_local:
-                                        # This should always be true at this point!
-                                        print("Resetting along_track_avg_edited to False")
-                                        self.along_track_avg_edited = False
-                                    else:
-                                        logger.error("Recursive method for recalculating along-track average failed.")
+                                self.buffer_pies(pie_objects)
+
+                        if pie_objects:
+                            self.record_pie_buffer_time(time.perf_counter() - start_time, len(pie_objects))
 
                     elif local_process_flag_value == 3:  # Stop pressed
                         # Do not process pie. Instead, only empty queue.
@@ -364,6 +272,9 @@ class Plotter(Process):
                                      .format(local_process_flag_value))
                         break  # Exit loop
 
+                    if poison_pill:
+                        break
+
                 else:  # Break out of loop because pie_object is None (poison pill)
                     break
 
@@ -374,320 +285,341 @@ class Plotter(Process):
         # When process is stopped or queue's get method times out, close shared memory and allow process to terminate
         self.closeSharedMemory()
 
-    def adjust_along_track_avg(self, temp_pie_amplitudes, temp_pie_counts, temp_timestamp, temp_lat_lon, count_temp):
-        """
-        Recursive method called when along_track_avg setting has been changed and count_temp exceeds
-        self.along_track_avg_local. Slices entries from the start of input arrays to pass to collapse_and_buffer_pings
-        method until count_temp is less than self.along_track_avg_local.
-        :param temp_pie_amplitudes: Temporary copy of raw amplitude matrices from standard format pie objects.
-        Number of entries equal to count_temp.
-        :param temp_pie_counts: Temporary copy of raw count matrices from standard format pie objects.
-        Number of entries equal to count_temp.
-        :param temp_timestamp: Temporary copy of raw timestamp values from standard format pie objects.
-        Number of entries equal to count_temp.
-        :param temp_lat_lon: Temporary copy of raw latitude, longitude values from standard format pie objects.
-        Number of entries equal to count_temp.
-        :param count_temp: Temporary count of number of entries added to raw ring buffer since
-        last call to collapse_and_buffer_pings. (Note, this should be equal to length of input matrices.)
-        """
-        print("start of recursive call")
-        print("count_temp: {}, self.along_trav_avg_local: {}".format(count_temp, self.along_track_avg_local))
-        print("len(arrays): ", len(temp_pie_amplitudes), ", ", len(temp_pie_counts), ", ", len(temp_timestamp), ", ", len(temp_lat_lon))
-        print("len(arrays[:self.along_track_avg_local]): ", len(temp_pie_amplitudes[:self.along_track_avg_local]), ", ",
-              len(temp_pie_counts[:self.along_track_avg_local]), ", ",  len(temp_timestamp[:self.along_track_avg_local]), ", ", len(temp_lat_lon[:self.along_track_avg_local]))
-
-        if count_temp < self.along_track_avg_local:  # Terminating case
-            self.outdated_along_track_avg = None
-            return count_temp
-        else:
-            # Collapse and buffer self.along_track_avg_local number of pings from start of array:
-            self.collapse_and_buffer_pings(temp_pie_amplitudes[:self.along_track_avg_local],
-                                           temp_pie_counts[:self.along_track_avg_local],
-                                           temp_timestamp[:self.along_track_avg_local],
-                                           temp_lat_lon[:self.along_track_avg_local])
-            # Decrement count_temp
-            count_temp -= self.along_track_avg_local
-            # Recursively call self.adjust_along_track_avg with shortened matrices
-            count_temp = self.adjust_along_track_avg(temp_pie_amplitudes[self.along_track_avg_local:],
-                                                     temp_pie_counts[self.along_track_avg_local:],
-                                                     temp_timestamp[self.along_track_avg_local:],
-                                                     temp_lat_lon[self.along_track_avg_local:], count_temp)
-        return count_temp
-
-    def collapse_and_buffer_pings(self, temp_pie_amplitudes, temp_pie_counts, temp_timestamp, temp_lat_lon):
-        """
-        Slices and averages amplitude, count, timestamp, and latitude / longitude entries according to user settings.
-        Appends these "collapsed" matrices / values to processed ring buffer in shared memory.
-        :param temp_pie_amplitudes: Temporary copy of raw amplitude matrices from standard format pie objects.
-        Number of entries equal to along_track_avg.
-        :param temp_pie_counts: Temporary copy of raw count matrices from standard format pie objects.
-        Number of entries equal to along_track_avg.
-        :param temp_timestamp: Temporary copy of raw timestamp values from standard format pie objects.
-        Number of entries equal to along_track_avg.
-        :param temp_lat_lon: Temporary copy of raw latitude, longitude values from standard format pie objects.
-        Number of entries equal to along_track_avg.
-        """
-        print("plotter, collapsing and buffering pings")
-
-        if np.any(temp_pie_amplitudes) and np.any(temp_pie_counts):
-            print("plotter: len(amplitudes): {}".format(len(temp_pie_amplitudes)))
-
-            # VERTICAL SLICE:
-            # Trim arrays to omit values outside of self.vertical_slice_width_m
-            # start_index       end_index
-            #          |X|_|_|_|X|
-            #          |X|_|_|_|X|
-            #          |X|_|_|_|X|
-            #          |X|_|_|_|X|
-            pie_values_vertical = temp_pie_amplitudes[:, :, self.vertical_slice_start_index:
-                                                            self.vertical_slice_end_index]
-            pie_count_vertical = temp_pie_counts[:, :, self.vertical_slice_start_index:
-                                                       self.vertical_slice_end_index]
-
-            # "Collapse" arrays by adding every self.num_pings_to_average so that
-            # len(_collapsed_array_) = len(_array_) / self.num_pings_to_average = 1
-            pie_values_vertical = np.sum(pie_values_vertical, axis=0)
-            pie_count_vertical = np.sum(pie_count_vertical, axis=0)
-
-            # Sum rows of matrices:
-            pie_values_vertical = np.sum(pie_values_vertical, axis=1)
-            pie_count_vertical = np.sum(pie_count_vertical, axis=1)
-
-            # Ignore divide by zero warnings. Division by zero results in NaN, which is what we want.
-            with np.errstate(divide='ignore', invalid='ignore'):
-                pie_values_vertical_average = pie_values_vertical / pie_count_vertical
-
-            # HORIZONTAL SLICE:
-            # Trim arrays to omit values outside of self.horizontal_slice_width_m
-            # |X|X|X|X|X| start_index
-            # |_|_|_|_|_|
-            # |_|_|_|_|_|
-            # |X|X|X|X|X| end_index
-
-            pie_values_horizontal = temp_pie_amplitudes[:, self.horizontal_slice_start_index:
-                                                           self.horizontal_slice_end_index, :]
-            pie_count_horizontal = temp_pie_counts[:, self.horizontal_slice_start_index:
-                                                      self.horizontal_slice_end_index, :]
-
-            # "Collapse" arrays by adding every self.num_pings_to_average so that
-            # len(_collapsed_array_) = len(_array_) / self.num_pings_to_average = 1
-            pie_values_horizontal = np.sum(pie_values_horizontal, axis=0)
-            pie_count_horizontal = np.sum(pie_count_horizontal, axis=0)
-
-            # Sum columns of matrices:
-            pie_values_horizontal = np.sum(pie_values_horizontal, axis=0)
-            pie_count_horizontal = np.sum(pie_count_horizontal, axis=0)
-
-            # Ignore divide by zero warnings. Division by zero results in NaN, which is what we want.
-            with np.errstate(divide='ignore', invalid='ignore'):
-                pie_values_horizontal_average = pie_values_horizontal / pie_count_horizontal
-        else:
-            logger.warning("Water column data matrix buffers are empty.")
-            pie_values_vertical_average = pie_values_horizontal_average = np.empty((self.MAX_NUM_GRID_CELLS))
-            pie_values_vertical_average[:] = np.nan
+    def record_pie_buffer_time(self, elapsed_sec, num_pie_objects):
+        """
+        Updates moving average of time to buffer a pie record, shared through self.pie_buffer_time.
+        :param elapsed_sec: Time (in seconds) taken to buffer a batch of pie records.
+        :param num_pie_objects: Number of pie records in batch.
+        """
+        self.pie_buffer_time_local += self.PIE_BUFFER_TIME_SMOOTHING * \
+            (elapsed_sec / num_pie_objects - self.pie_buffer_time_local)
+        with self.pie_buffer_time.get_lock():
+            self.pie_buffer_time.value = self.pie_buffer_time_local
 
-        # TIMESTAMP:
-        if np.any(temp_timestamp):
-            # "Collapse" arrays by adding every self.num_pings_to_average so that
-            # len(_collapsed_array_) = len(_array_) / self.num_pings_to_average
-            pie_timestamp = np.sum(temp_timestamp)
-            # Ignore divide by zero warnings. Division by zero results in NaN, which is what we want.
-            with np.errstate(divide='ignore', invalid='ignore'):
-                # pie_timestamp_average = pie_timestamp / self.settings["processing_settings"]["alongTrackAvg_ping"]
-                pie_timestamp_average = pie_timestamp / self.along_track_avg_local
-        else:
-            logger.warning("Water column timestamp matrix buffer is empty.")
-            pie_timestamp_average = np.empty(1)
-            pie_timestamp_average[:] = np.nan
+    def get_pie_batch(self, pie_object):
+        """
+        Receives, without blocking, pie objects already waiting in queue_pie_object (up to MAX_BATCH_SIZE_PINGS pie
+        objects in all), so that pings arriving in bursts are buffered together.
+        :param pie_object: Pie object just received.
+        :return: List of pie objects (oldest first, beginning with pie_object), and True if poison pill was received
+        (after pie objects of list).
+        """
+        pie_objects = [pie_object]
+        while len(pie_objects) < self.MAX_BATCH_SIZE_PINGS:
+            try:
+                pie_object = self.queue_pie_object.get_nowait()
+            except queue.Empty:
+                break
+            if not pie_object:  # Poison pill
+                return pie_objects, True
+            pie_objects.append(pie_object)
+        return pie_objects, False
 
-        # LAT LON:
-        if np.any(temp_lat_lon):
-            # "Collapse" arrays by adding every self.num_pings_to_average so that
-            # len(_collapsed_array_) = len(_array_) / self.num_pings_to_average
-            pie_lat_lon = np.sum(temp_lat_lon, axis=0)
-            # Ignore divide by zero warnings. Division by zero results in NaN, which is what we want.
-            with np.errstate(divide='ignore', invalid='ignore'):
-                # pie_lat_lon_average = pie_lat_lon / self.settings["processing_settings"]["alongTrackAvg_ping"]
-                pie_lat_lon_average = pie_lat_lon / self.along_track_avg_local
+    def check_pie(self, pie_object):
+        """
+        Checks pie object against current settings. (Lock on raw ring buffer must be held.)
+        :param pie_object: Pie object.
+        :return: True if pie object is to be buffered; False if it is outdated and is to be discarded.
+        """
+        # If self.bin_size_edited is True, raw and processed ring buffers will have already
+        # been cleared (or, with sample store, pings of raw ring buffer are being re-binned; see
+        # ProcessedBufferWorker). We only need to empty queue_pie_object of outdated pie_objects.
+        if self.bin_size_edited:
+            if round(pie_object.bin_size, 2) != round(self.base_bin_size_local, 2):
+                # If the current pie_object contains a record processed with the 'old' bin_size,
+                # do not process it--discard it
+                return False
+            else:
+                # If the current pie_object contains a record processed with the 'new' bin_size...
+                self.along_track_accumulator.reset()  # ...Reset along-track group...
+                self.bin_size_edited = False  # ...Reset self.bin_size_edited...
+                # ...And continue to process pie_object as usual.
+
+        # If self.max_heave_edited is True, queue_pie_object may hold pie_objects binned with the 'old' max_heave.
+        # These are buffered as they are: each ping of raw ring buffer records rows allotted to max heave with which
+        # it was binned, and readers offset its rows accordingly (see SharedRingBufferRaw.get_row_offsets).
+        if self.max_heave_edited:
+            print("####################In plotter, max_heave_edited is True.")
+            if round(pie_object.max_heave, 2) == round(self.max_heave_local, 2):
+                print("####################In plotter, max_heave_edited is False.")
+                self.max_heave_edited = False
+
+        return True
+
+    def buffer_pies(self, pie_objects):
+        """
+        Appends raw data of pie objects to raw ring buffers in shared memory, as one block; adds pings to sample store
+        and projection cache (if any) and to along-track groups, and appends averages of every along-track group
+        completed to processed ring buffers, as one block. (Lock on raw ring buffer must be held.)
+        :param pie_objects: List of pie objects (oldest first).
+        """
+        # Add raw data to raw ring buffer in shared memory
+        # (Pie records hold data of level 0 and, optionally, of coarser bin size levels.)
+        if pie_objects[0].level_amplitudes is not None:
+            num_levels = len(pie_objects[0].level_amplitudes)
+            level_amplitudes = [[pie_object.level_amplitudes[level] for pie_object in pie_objects]
+                                for level in range(num_levels)]
+            level_counts = [[pie_object.level_counts[level] for pie_object in pie_objects]
+                            for level in range(num_levels)]
+            level_bottom_depths = [[pie_object.level_bottom_depths[level] for pie_object in pie_objects]
+                                   for level in range(num_levels)]
         else:
-            logger.warning("Nothing to plot; water column latitude / longitude matrix buffer is empty.")
-            pie_lat_lon_average = np.empty(2)
-            pie_lat_lon_average[:] = np.nan
-
-        with self.processed_buffer_count.get_lock():
-            self.shared_ring_buffer_processed.append_all([pie_values_vertical_average], [pie_values_horizontal_average],
-                                                         [pie_timestamp_average], [pie_lat_lon_average])
-
-    def recalculate_processed_buffer(self, ring_buffer_raw, ring_buffer_processed):
+            level_amplitudes = level_counts = level_bottom_depths = []
+        self.shared_ring_buffer_raw.append_all([pie_object.pie_chart_amplitudes for pie_object in pie_objects],
+                                               [pie_object.pie_chart_counts for pie_object in pie_objects],
+                                               [pie_object.timestamp for pie_object in pie_objects],
+                                               [(pie_object.latitude, pie_object.longitude)
+                                                for pie_object in pie_objects],
+                                               [pie_object.bottom_depths for pie_object in pie_objects],
+                                               level_amplitude_data=level_amplitudes,
+                                               level_count_data=level_counts,
+                                               level_bottom_data=level_bottom_depths,
+                                               heave_row_data=[SharedRingBufferRaw.heave_rows(
+                                                   pie_object.max_heave, pie_object.bin_size,
+                                                   self.shared_ring_buffer_raw.NUM_LEVELS)
+                                                   for pie_object in pie_objects])
+
+        group_averages = []
+        first_element = self.shared_ring_buffer_raw.get_num_elements_in_buffer() - len(pie_objects)
+        for element, pie_object in enumerate(pie_objects, start=first_element):
+            # Slot and grids of ping in raw ring buffer, found once and shared by sample store, projection cache and
+            # along-track group
+            slot = self.shared_ring_buffer_raw.get_slot(element)
+            amplitudes = self.shared_ring_buffer_raw.view_element(self.shared_ring_buffer_raw.amplitude_buffer, element)
+            counts = self.shared_ring_buffer_raw.view_element(self.shared_ring_buffer_raw.count_buffer, element)
+            self.add_to_sample_store(element, slot, pie_object.sample_record)
+            self.add_to_projection_cache(slot, amplitudes, counts)
+            # Add projections of ping (as stored in raw ring buffer) to current along-track group
+            averages = self.add_to_along_track_group(element, slot, amplitudes, counts)
+            if averages is not None:
+                group_averages.append(averages)
+
+        if group_averages:
+            print("plotter, buffering {} along-track group(s)".format(len(group_averages)))
+            vertical_averages, horizontal_averages, timestamp_averages, lat_lon_averages = zip(*group_averages)
+            with self.processed_buffer_count.get_lock():
+                self.shared_ring_buffer_processed.append_all(list(vertical_averages), list(horizontal_averages),
+                                                             list(timestamp_averages), list(lat_lon_averages))
+
+    def set_along_track_geometry(self):
         """
-        Called when settings are changed.
-        Recalculates matrices in ring_buffer_processed from matrices in ring_buffer_raw according to new settings.
-        :param ring_buffer_raw: Reference to raw ring buffer in shared memory.
-        :param ring_buffer_processed: Reference to processed ring buffer in shared memory.
+        Sets slice geometry (current bin size level, max heave, and vertical and horizontal slice windows) of
+        along-track accumulator.
+        :return: True if geometry changed (and projections stored by along-track accumulator were discarded).
         """
-        print("in recalculate_processed_buffer. self.along_track_avg_local: ", self.along_track_avg_local)
-        with ring_buffer_raw.counter.get_lock():
-            temp_amplitude_buffer = ring_buffer_raw.view_buffer_elements(ring_buffer_raw.amplitude_buffer)
-            temp_count_buffer = ring_buffer_raw.view_buffer_elements(ring_buffer_raw.count_buffer)
-            temp_timestamp_buffer = ring_buffer_raw.view_buffer_elements(ring_buffer_raw.timestamp_buffer)
-            temp_lat_lon_buffer = ring_buffer_raw.view_buffer_elements(ring_buffer_raw.lat_lon_buffer)
+        return self.along_track_accumulator.set_geometry(self.shared_ring_buffer_raw.level, self.max_heave_local,
+                                                         self.vertical_slice_windows, self.horizontal_slice_windows)
 
-            assert len(temp_amplitude_buffer) == len(temp_count_buffer) \
-                   == len(temp_timestamp_buffer) == len(temp_lat_lon_buffer)  # All buffers should be of equal length
+    def update_along_track_group(self):
+        """
+        Called when settings are changed; processed ring buffer is recalculated from raw ring buffer (see
+        ProcessedBufferWorker) from whole along-track groups, beginning with oldest ping. Rebuilds current along-track
+        group to hold the remainder of pings in raw ring buffer that are not included in recalculated processed ring
+        buffer, so that recalculated groups and groups appended by Plotter meet without gap or overlap. Group is
+        re-grouped from projections stored by along-track accumulator when slice geometry is unchanged; otherwise,
+        pings of group are re-projected from raw ring buffer. (Lock on raw ring buffer must be held.)
+        """
+        self.along_track_group_outdated = False
 
-            # Ensure that buffer can be divided evenly by along_track_avg_ping;
-            # if not, discard remainder from end of buffer for following calculations
-            indices_to_trim = len(temp_amplitude_buffer) % self.along_track_avg_local
+        num_pending = self.shared_ring_buffer_raw.get_num_elements_in_buffer() % self.along_track_avg_local
+        if self.along_track_avg_edited:
+            self.along_track_avg_edited = False
+            self.outdated_along_track_avg = None
 
-            # For debugging:
-            # print("Shape before trim, temp_amplitude_buffer: {}; temp_count_buffer: {}; "
-            #       "temp_timestamp_buffer: {}; temp_lat_lon_buffer: {}"
-            #       .format(temp_amplitude_buffer.shape, temp_count_buffer.shape,
-            #               temp_timestamp_buffer.shape, temp_lat_lon_buffer.shape))
+        geometry_changed = self.set_along_track_geometry()
+        if geometry_changed or not self.along_track_accumulator.regroup(num_pending):
+            if num_pending > 0:
+                self.along_track_accumulator.rebuild(
+                    self.shared_ring_buffer_raw.view_recent_pings(self.shared_ring_buffer_raw.amplitude_buffer,
+                                                                  num_pending),
+                    self.shared_ring_buffer_raw.view_recent_pings(self.shared_ring_buffer_raw.count_buffer,
+                                                                  num_pending),
+                    self.shared_ring_buffer_raw.view_recent_pings(self.shared_ring_buffer_raw.timestamp_buffer,
+                                                                  num_pending),
+                    self.shared_ring_buffer_raw.view_recent_pings(self.shared_ring_buffer_raw.lat_lon_buffer,
+                                                                  num_pending),
+                    row_offsets=self.shared_ring_buffer_raw.get_row_offsets(-num_pending))
+            else:
+                self.along_track_accumulator.clear_group()
 
-            if indices_to_trim > 0:
-                temp_amplitude_buffer = temp_amplitude_buffer[:-indices_to_trim]
-                temp_count_buffer = temp_count_buffer[:-indices_to_trim]
-                temp_timestamp_buffer = temp_timestamp_buffer[:-indices_to_trim]
-                temp_lat_lon_buffer = temp_lat_lon_buffer[:-indices_to_trim]
+    def add_to_along_track_group(self, element, slot, amplitudes, counts):
+        """
+        Adds a ping of raw ring buffer to current along-track group. (Lock on raw ring buffer must be held, and ping
+        must have been added to projection cache, if any; see add_to_projection_cache.)
+        :param element: Index of ping in raw ring buffer (oldest element is 0).
+        :param slot: Slot of ping (see SharedRingBufferRaw.get_slot).
+        :param amplitudes: Amplitude grid of ping in raw ring buffer (see SharedRingBufferRaw.view_element).
+        :param counts: Count grid of ping in raw ring buffer.
+        :return: Averages (vertical slices, horizontal slices, timestamp, and latitude / longitude) of group if group
+        is complete (to be appended to processed ring buffer; see buffer_pies); otherwise, None.
+        """
+        return self.along_track_accumulator.add(
+            amplitudes, counts,
+            self.shared_ring_buffer_raw.view_element(self.shared_ring_buffer_raw.timestamp_buffer, element),
+            self.shared_ring_buffer_raw.view_element(self.shared_ring_buffer_raw.lat_lon_buffer, element),
+            self.along_track_avg_local, projection_cache=self.shared_projection_cache, slot=slot,
+            row_offset=self.shared_ring_buffer_raw.get_row_offset(element))
+
+    def add_to_sample_store(self, element, slot, sample_record):
+        """
+        Adds record of samples of a ping of raw ring buffer to sample store in shared memory (see SharedSampleStore),
+        so that ping can be re-binned when settings change. (Lock on raw ring buffer must be held.)
+        :param element: Index of ping in raw ring buffer (oldest element is 0).
+        :param slot: Slot of ping (see SharedRingBufferRaw.get_slot).
+        :param sample_record: Record of samples of ping (see SharedSampleStore.pack), or None.
+        """
+        if self.shared_sample_store is not None:
+            num_elements = self.shared_ring_buffer_raw.get_num_elements_in_buffer()
+            self.shared_sample_store.append(slot, self.shared_ring_buffer_raw.num_appended - num_elements + element,
+                                            sample_record)
 
-            # For debugging:
-            # print("Shape after trim, temp_amplitude_buffer: {}; temp_count_buffer: {}; "
-            #       "temp_timestamp_buffer: {}; temp_lat_lon_buffer: {}"
-            #       .format(temp_amplitude_buffer.shape, temp_count_buffer.shape,
-            #               temp_timestamp_buffer.shape, temp_lat_lon_buffer.shape))
+    def add_to_projection_cache(self, slot, amplitudes, counts):
+        """
+        Adds prefix sums of a ping of raw ring buffer to projection cache in shared memory (see
+        SharedProjectionCache). (Lock on raw ring buffer must be held.)
+        :param slot: Slot of ping (see SharedRingBufferRaw.get_slot).
+        :param amplitudes: Amplitude grid of ping in raw ring buffer (see SharedRingBufferRaw.view_element).
+        :param counts: Count grid of ping in raw ring buffer.
+        """
+        if self.shared_projection_cache is not None:
+            self.shared_projection_cache.append(slot, amplitudes, counts, self.shared_ring_buffer_raw.level)
 
-            # VERTICAL SLICE:
-            # Trim arrays to omit values outside of self.vertical_slice_width_m
+    def recalculate_slices_from_cache(self, ring_buffer_raw, projection_cache, start, num_pings):
+        """
+        Called by calculate_group_averages. Calculates vertical and horizontal slice averages (of each slice; see
+        SliceRegistry) of each along-track group of num_pings pings of raw ring buffer, beginning with element start,
+        from prefix sums in projection cache.
+        (Lock on raw ring buffer must be held, and cache must hold valid entries for these pings.)
+        :param ring_buffer_raw: Reference to raw ring buffer in shared memory.
+        :param projection_cache: Reference to projection cache in shared memory.
+        :param start: Index of first ping in raw ring buffer (oldest element is 0).
+        :param num_pings: Number of pings (a multiple of along_track_avg) from which to calculate averages.
+        :return: Vertical slice averages (groups x vertical slices x depth rows) and horizontal slice averages
+        (groups x horizontal slices x across-track columns).
+        """
+        slots = ring_buffer_raw.get_slot_indices()[start:start + num_pings]
+        row_offsets = ring_buffer_raw.get_row_offsets(start, start + num_pings)
+        # Grid cells at ends of slices (between stored prefix sums) are read from raw ring buffer
+        amplitude_pings = \
+            ring_buffer_raw.view_buffer_elements(ring_buffer_raw.amplitude_buffer)[start:start + num_pings]
+        count_pings = ring_buffer_raw.view_buffer_elements(ring_buffer_raw.count_buffer)[start:start + num_pings]
+        group_indices = np.arange(0, num_pings, self.along_track_avg_local)
+
+        # VERTICAL SLICES: two lookups, and grid cells at ends of slice, per depth row of each slice of each ping, then
+        # sum pings of each along-track group
+        amplitude_vertical, count_vertical = projection_cache.vertical_sums(slots, self.vertical_slice_windows,
+                                                                              amplitude_pings, count_pings,
+                                                                              row_offsets)
+        amplitude_vertical = np.add.reduceat(amplitude_vertical, group_indices)
+        count_vertical = np.add.reduceat(count_vertical, group_indices)
+
+        # HORIZONTAL SLICES: two lookups, and grid cells at ends of slice, per across-track column of each slice of
+        # each ping, then sum pings of each group
+        amplitude_horizontal, count_horizontal = projection_cache.horizontal_sums(slots,
+                                                                                  self.horizontal_slice_windows,
+                                                                                  amplitude_pings, count_pings,
+                                                                                  row_offsets)
+        amplitude_horizontal = np.add.reduceat(amplitude_horizontal, group_indices)
+        count_horizontal = np.add.reduceat(count_horizontal, group_indices)
+
+        # Ignore divide by zero warnings. Division by zero results in NaN, which is what we want.
+        with np.errstate(divide='ignore', invalid='ignore'):
+            vertical_average = amplitude_vertical * ring_buffer_raw.AMPLITUDE_SCALE / count_vertical
+            horizontal_average = amplitude_horizontal * ring_buffer_raw.AMPLITUDE_SCALE / count_horizontal
+
+        return vertical_average, horizontal_average
+
+    def calculate_group_averages(self, ring_buffer_raw, start, num_pings, projection_cache=None):
+        """
+        Calculates averages of along-track groups of num_pings pings of raw ring buffer according to current settings,
+        beginning with element start. (Lock on raw ring buffer must be held.)
+        :param ring_buffer_raw: Reference to raw ring buffer in shared memory.
+        :param start: Index of first ping in raw ring buffer (oldest element is 0).
+        :param num_pings: Number of pings (a multiple of along_track_avg).
+        :param projection_cache: Optional reference to projection cache in shared memory (see SharedProjectionCache);
+        if given, and if it holds valid entries for these pings, vertical and horizontal slices are calculated from
+        cached prefix sums rather than from every grid cell of every ping.
+        :return: Vertical slice averages (groups x vertical slices x depth rows), horizontal slice averages (groups x
+        horizontal slices x across-track columns), timestamp averages and latitude / longitude averages of each group.
+        """
+        if num_pings == 0:
+            return (np.empty((0, self.slice_registry.num_vertical_slices, self.MAX_NUM_GRID_CELLS)),
+                    np.empty((0, self.slice_registry.num_horizontal_slices, self.MAX_NUM_GRID_CELLS)), np.empty(0),
+                    np.empty((0, 2)))
+
+        temp_amplitude_buffer = ring_buffer_raw.view_buffer_elements(ring_buffer_raw.amplitude_buffer)[
+                                start:start + num_pings]
+        temp_count_buffer = ring_buffer_raw.view_buffer_elements(ring_buffer_raw.count_buffer)[start:start + num_pings]
+        temp_timestamp_buffer = ring_buffer_raw.view_buffer_elements(ring_buffer_raw.timestamp_buffer)[
+                                start:start + num_pings]
+        temp_lat_lon_buffer = ring_buffer_raw.view_buffer_elements(ring_buffer_raw.lat_lon_buffer)[
+                              start:start + num_pings]
+
+        assert len(temp_amplitude_buffer) == len(temp_count_buffer) \
+               == len(temp_timestamp_buffer) == len(temp_lat_lon_buffer)  # All buffers should be of equal length
+
+        num_elements = ring_buffer_raw.get_num_elements_in_buffer()
+        if projection_cache is not None and \
+                projection_cache.get_num_valid(ring_buffer_raw.level, num_elements) >= num_elements - start:
+            vertical_average, horizontal_average = self.recalculate_slices_from_cache(
+                ring_buffer_raw, projection_cache, start, num_pings)
+        else:
+            # Without projection cache, each slice is summed over its own window of grid cells of each ping, and pings
+            # of each along-track group are summed, in one pass by a parallel kernel (see
+            # AlongTrackAccumulator.window_sums):
+            # VERTICAL SLICES:                  HORIZONTAL SLICES:
             # start_index       end_index
-            #          |X|_|_|_|X|
-            #          |X|_|_|_|X|
-            #          |X|_|_|_|X|
-            #          |X|_|_|_|X|
-            # This creates view of array
-            temp_amplitude_vertical = temp_amplitude_buffer[:, :, self.vertical_slice_start_index:
-                                                                  self.vertical_slice_end_index]
-            temp_count_vertical = temp_count_buffer[:, :, self.vertical_slice_start_index:
-                                                          self.vertical_slice_end_index]
-
-            # For debugging:
-            # print("Shape temp_amplitude_vertical: {}; temp_count_vertical: {}"
-            #       .format(temp_count_vertical.shape, temp_count_vertical.shape))
-
-            # "Collapse" arrays by adding every self.num_pings_to_average so that
-            # len(_collapsed_array_) = len(_array_) / self.num_pings_to_average = 1
-            # Note that this creates copy of array
-            temp_amplitude_vertical_collapsed = np.add.reduceat(temp_amplitude_vertical,
-                                                                np.arange(0, len(temp_amplitude_vertical),
-                                                                          self.along_track_avg_local))
-
-            temp_count_vertical_collapsed = np.add.reduceat(temp_count_vertical,
-                                                           np.arange(0, len(temp_count_vertical),
-                                                                     self.along_track_avg_local))
+            #          |X|_|_|_|X|              |X|X|X|X|X| start_index
+            #          |X|_|_|_|X|              |_|_|_|_|_|
+            #          |X|_|_|_|X|              |_|_|_|_|_|
+            #          |X|_|_|_|X|              |X|X|X|X|X| end_index
+            vertical_sums, horizontal_sums = AlongTrackAccumulator.sum_windows(temp_amplitude_buffer,
+                                                                               temp_count_buffer,
+                                                                               self.along_track_avg_local,
+                                                                               self.vertical_slice_windows,
+                                                                               self.horizontal_slice_windows,
+                                                                               ring_buffer_raw.get_row_offsets(
+                                                                                   start, start + num_pings))
 
             # For debugging:
-            print("Shape temp_amplitude_vertical_collapsed: {}; temp_count_vertical_collapsed: {}"
-                  .format(temp_count_vertical_collapsed.shape, temp_count_vertical_collapsed.shape))
-
-            # Sum rows of matrices:
-            # Note that this creates copy of array
-            amplitude_vertical = np.sum(temp_amplitude_vertical_collapsed, axis=2)
-            count_vertical = np.sum(temp_count_vertical_collapsed, axis=2)
-
-            # For debugging:
-            # print("Shape amplitude_vertical: {}; count_vertical: {}"
-            #       .format(amplitude_vertical.shape, count_vertical.shape))
+            print("Shape vertical_sums: {}; horizontal_sums: {}".format(vertical_sums.shape, horizontal_sums.shape))
 
             # Ignore divide by zero warnings. Division by zero results in NaN, which is what we want.
             with np.errstate(divide='ignore', invalid='ignore'):
-                vertical_average = amplitude_vertical / count_vertical
-
-            # For debugging:
-            # print("Shape vertical average: {}".format(vertical_average.shape))
-
-            # HORIZONTAL SLICE:
-            # Trim arrays to omit values outside of self.horizontal_slice_width_m
-            # |X|X|X|X|X| start_index
-            # |_|_|_|_|_|
-            # |_|_|_|_|_|
-            # |X|X|X|X|X| end_index
-            # This creates view of array
-            temp_amplitude_horizontal = temp_amplitude_buffer[:, self.horizontal_slice_start_index:
-                                                       self.horizontal_slice_end_index, :]
-            temp_count_horizontal = temp_count_buffer[:, self.horizontal_slice_start_index:
-                                                     self.horizontal_slice_end_index, :]
-
-            # For debugging:
-            # print("Shape temp_amplitude_horizontal: {}; temp_count_horizontal: {}"
-            #       .format(temp_count_horizontal.shape, temp_count_horizontal.shape))
-
-            # "Collapse" arrays by adding every self.num_pings_to_average so that
-            # len(_collapsed_array_) = len(_array_) / self.num_pings_to_average = 1
-            # Note that this creates copy of array
-            temp_amplitude_horizontal_collapsed = np.add.reduceat(temp_amplitude_horizontal,
-                                                                  np.arange(0, len(temp_amplitude_horizontal),
-                                                                            self.along_track_avg_local))
-
-            temp_count_horizontal_collapsed = np.add.reduceat(temp_count_horizontal,
-                                                              np.arange(0, len(temp_count_horizontal),
-                                                                        self.along_track_avg_local))
-
-            # For debugging:
-            print("Shape temp_amplitude_horizontal_collapsed: {}; temp_count_horizontal_collapsed: {}"
-                  .format(temp_count_horizontal_collapsed.shape, temp_count_horizontal_collapsed.shape))
-
-            # Sum columns of matrices:
-            # Note that this creates copy of array
-            amplitude_horizontal = np.sum(temp_amplitude_horizontal_collapsed, axis=1)
-            count_horizontal = np.sum(temp_count_horizontal_collapsed, axis=1)
+                vertical_average = vertical_sums[:, 0] * ring_buffer_raw.AMPLITUDE_SCALE / vertical_sums[:, 1]
+                horizontal_average = horizontal_sums[:, 0] * ring_buffer_raw.AMPLITUDE_SCALE / horizontal_sums[:, 1]
 
-            # For debugging:
-            # print("Shape amplitude_horizontal: {}; count_horizontal: {}"
-            #       .format(amplitude_horizontal.shape, count_horizontal.shape))
-
-            # Ignore divide by zero warnings. Division by zero results in NaN, which is what we want.
-            with np.errstate(divide='ignore', invalid='ignore'):
-                horizontal_average = amplitude_horizontal / count_horizontal
+        # TIMESTAMP:
+        # Note that this creates copy of array
+        timestamp_collapsed = np.add.reduceat(temp_timestamp_buffer,
+                                              np.arange(0, len(temp_timestamp_buffer), self.along_track_avg_local))
 
-            # For debugging
-            # print("Shape horizontal average: {}".format(horizontal_average.shape))
+        # For debugging:
+        # print("Shape timestamp_collapsed: {}".format(timestamp_collapsed.shape))
 
-            # TIMESTAMP:
-            # Note that this creates copy of array
-            timestamp_collapsed = np.add.reduceat(temp_timestamp_buffer,
-                                                  np.arange(0, len(temp_timestamp_buffer), self.along_track_avg_local))
+        # Ignore divide by zero warnings. Division by zero results in NaN, which is what we want.
+        with np.errstate(divide='ignore', invalid='ignore'):
+            timestamp_average = timestamp_collapsed / self.along_track_avg_local
 
-            # For debugging:
-            # print("Shape timestamp_collapsed: {}".format(timestamp_collapsed.shape))
+        # For debugging:
+        # print("Shape timestamp average: {}".format(timestamp_average.shape))
 
-            # Ignore divide by zero warnings. Division by zero results in NaN, which is what we want.
-            with np.errstate(divide='ignore', invalid='ignore'):
-                timestamp_average = timestamp_collapsed / self.along_track_avg_local
+        # LAT LON:
+        # Note that this creates copy of array
+        lat_lon_collapsed = np.add.reduceat(temp_lat_lon_buffer,
+                                            np.arange(0, len(temp_lat_lon_buffer), self.along_track_avg_local))
 
-            # For debugging:
-            # print("Shape timestamp average: {}".format(timestamp_average.shape))
+        # For debugging:
+        # print("Shape lat_lon_collapsed: {}".format(lat_lon_collapsed.shape))
 
-            # LAT LON:
-            # Note that this creates copy of array
-            lat_lon_collapsed = np.add.reduceat(temp_lat_lon_buffer,
-                                                np.arange(0, len(temp_lat_lon_buffer), self.along_track_avg_local))
+        # Ignore divide by zero warnings. Division by zero results in NaN, which is what we want.
+        with np.errstate(divide='ignore', invalid='ignore'):
+            lat_lon_average = lat_lon_collapsed / self.along_track_avg_local
 
-            # For debugging:
-            # print("Shape lat_lon_collapsed: {}".format(lat_lon_collapsed.shape))
+        # For debugging:
+        # print("Shape lat_lon average: {}".format(lat_lon_average.shape))
 
-            # Ignore divide by zero warnings. Division by zero results in NaN, which is what we want.
-            with np.errstate(divide='ignore', invalid='ignore'):
-                lat_lon_average = lat_lon_collapsed / self.along_track_avg_local
-
-            # For debugging:
-            # print("Shape lat_lon average: {}".format(lat_lon_average.shape))
-
-        # Release raw buffer lock
-
-        # Append newly processed water column date to processed ring buffer in shared memory, overwriting old data.
-        with ring_buffer_processed.counter.get_lock():
-            ring_buffer_processed.clear_and_append_all(vertical_average, horizontal_average,
-                                                       timestamp_average, lat_lon_average)
+        return vertical_average, horizontal_average, timestamp_average, lat_lon_average
 
     def closeSharedMemory(self):
         """
@@ -695,6 +627,10 @@ class Plotter(Process):
         """
         self.shared_ring_buffer_raw.close_shmem()
         self.shared_ring_buffer_processed.close_shmem()
+        if self.shared_projection_cache is not None:
+            self.shared_projection_cache.close_shmem()
+        if self.shared_sample_store is not None:
+            self.shared_sample_store.close_shmem()
 
     def unlinkSharedMemory(self):
         """
@@ -702,12 +638,18 @@ class Plotter(Process):
         """
         self.shared_ring_buffer_raw.unlink_shmem()
         self.shared_ring_buffer_processed.unlink_shmem()
+        if self.shared_projection_cache is not None:
+            self.shared_projection_cache.unlink_shmem()
+        if self.shared_sample_store is not None:
+            self.shared_sample_store.unlink_shmem()
 
     def run(self):
         """
         Initializes raw and processed ring buffers in shared memory and runs process. Process pulls standard format pie
         objects from a shared queue, adds raw data to raw ring buffers, add processed data to processed ring buffers.
         """
+        logger.info("Plotter: {} kernel thread(s).".format(KernelThreads.configure(self.settings)))
+
         # Protected with self.raw_buffer_count lock:
         self.shared_ring_buffer_raw = SharedRingBufferRaw(self.settings, self.raw_buffer_count,
                                              self.raw_buffer_full_flag, create_shmem=False)
@@ -716,6 +658,30 @@ class Plotter(Process):
         self.shared_ring_buffer_processed = SharedRingBufferProcessed(self.settings, self.processed_buffer_count,
                                                          self.processed_buffer_full_flag, create_shmem=False)
 
-        # Profiler for performance testing:
-        cProfile.runctx('self.get_and_buffer_pie()', globals(), locals(), '../../Profile/profile-Plotter.txt')
-        # self.get_and_buffer_pie()
+        # Protected with self.raw_buffer_count lock:
+        if self.settings['advanced_settings']['projectionCache']:
+            self.shared_projection_cache = SharedProjectionCache(self.settings, create_shmem=False)
+
+        # Protected with self.raw_buffer_count lock:
+        if SharedSampleStore.enabled(self.settings):
+            self.shared_sample_store = SharedSampleStore(self.settings, create_shmem=False)
+
+        if self.bin_size_level_local is not None:
+            self.shared_ring_buffer_raw.select_level(self.bin_size_level_local)
+
+        self.along_track_accumulator = AlongTrackAccumulator(self.MAX_NUM_GRID_CELLS,
+                                                             self.shared_ring_buffer_raw.SIZE_BUFFER,
+                                                             self.shared_ring_buffer_raw.AMPLITUDE_SCALE,
+                                                             self.slice_registry.num_vertical_slices,
+                                                             self.slice_registry.num_horizontal_slices)
+        self.set_along_track_geometry()
+
+        self.allocation_monitor.start()
+
+        if self.settings['advanced_settings']['profile']:
+            # Profiler for performance testing:
+            cProfile.runctx('self.get_and_buffer_pie()', globals(), locals(), '../../Profile/profile-Plotter.txt')
+        else:
+            self.get_and_buffer_pie()
+
+        self.allocation_monitor.stop()
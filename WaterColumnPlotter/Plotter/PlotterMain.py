@@ -15,15 +15,16 @@ logger = logging.getLogger(__name__)
 
 
 class PlotterMain:
-    def __init__(self, settings, bin_size, across_track_avg, depth, depth_avg, along_track_avg, max_heave,
-                 queue_pie_object, raw_buffer_count, processed_buffer_count, raw_buffer_full_flag,
-                 processed_buffer_full_flag):
+    def __init__(self, settings, bin_size, base_bin_size, across_track_avg, depth, depth_avg, along_track_avg,
+                 max_heave, queue_pie_object, raw_buffer_count, processed_buffer_count, raw_buffer_full_flag,
+                 processed_buffer_full_flag, pie_buffer_time):
 
         print("Initializing PlotterMain.")
 
         self.settings = settings
 
         self.bin_size = bin_size  # multiprocessing.Value
+        self.base_bin_size = base_bin_size  # multiprocessing.Value
         self.across_track_avg = across_track_avg  # multiprocessing.Value
         self.depth = depth  # multiprocessing.Value
         self.depth_avg = depth_avg  # multiprocessing.Value
@@ -42,6 +43,9 @@ class PlotterMain:
         self.raw_buffer_full_flag = raw_buffer_full_flag
         self.processed_buffer_full_flag = processed_buffer_full_flag
 
+        # Moving average of time (in seconds) to buffer a pie record (see QualityOfServiceController)
+        self.pie_buffer_time = pie_buffer_time  # multiprocessing.Value
+
         # A flag to indicate status of process. # 0 = initialization; 1 = play; 2 = pause; 3 = stop
         self.plotter_process_flag = Value(ctypes.c_uint8, 0, lock=True)
 
@@ -101,11 +105,11 @@ class PlotterMain:
         # https://stackoverflow.com/questions/25391025/what-exactly-is-python-multiprocessing-modules-join-method-doing
         # https://stonesoupprogramming.com/2017/09/11/python-multiprocessing-producer-consumer-pattern/comment-page-1/
 
-        self.plotter = Plotter(self.settings, self.bin_size, self.across_track_avg, self.depth, self.depth_avg,
-                               self.along_track_avg, self.max_heave, self.plotter_settings_edited,
+        self.plotter = Plotter(self.settings, self.bin_size, self.base_bin_size, self.across_track_avg, self.depth,
+                               self.depth_avg, self.along_track_avg, self.max_heave, self.plotter_settings_edited,
                                self.queue_pie_object, self.raw_buffer_count, self.processed_buffer_count,
                                self.raw_buffer_full_flag, self.processed_buffer_full_flag,
-                               self.plotter_process_flag)
+                               self.plotter_process_flag, self.pie_buffer_time)
 
         self.plotter.daemon = True
         self.plotter.start()
@@ -0,0 +1,216 @@
+# Lynette Davis
+# ldavis@ccom.unh.edu
+# Center for Coastal and Ocean Mapping
+# University of New Hampshire
+# October 2026
+
+# Description: Recalculates processed ring buffer in the background when settings are changed (see
+# WaterColumn.update_buffers). The back generation of processed ring buffers (see SharedRingBufferProcessed) is rebuilt
+# from raw ring buffer in chunks of pings; lock on raw ring buffer is held for one chunk at a time, so that Plotter
+# keeps appending pings to raw ring buffer, and along-track groups (calculated with new settings) to the live
+# generation of processed ring buffers, while GUI keeps plotting the live generation. When all whole along-track
+# groups present in raw ring buffer when settings were changed have been rebuilt, groups that Plotter appended to the
+# live generation in the meantime are copied to the back generation, and generations are swapped.
+#
+# Pings are identified by ping number (see SharedRingBufferRaw.num_appended), so that pings that are discarded from
+# raw ring buffer while the back generation is rebuilt are skipped (in whole along-track groups).
+#
+# When bin size is changed and records of samples of pings are kept (see SharedSampleStore), pings of raw
+# ring buffer are first re-binned in place for new settings, in batches (see KongsbergSampleRebinner); lock on raw
+# ring buffer is held only while records of a batch are copied and while re-binned pings are written back.
+
+import logging
+import math
+from threading import Event, Thread
+from WaterColumnPlotter.Plotter.KernelThreads import KernelThreads
+
+logger = logging.getLogger(__name__)
+
+
+class ProcessedBufferWorker(Thread):
+
+    # Maximum number of pings processed per hold of lock on raw ring buffer
+    CHUNK_SIZE_PINGS = 50
+    # Maximum number of pings re-binned per batch (see rebin_pings)
+    REBIN_CHUNK_SIZE_PINGS = 16
+
+    def __init__(self, plotter, ring_buffer_raw, ring_buffer_processed, projection_cache=None, sample_store=None,
+                 sample_rebinner=None):
+        """
+        Must be called while lock on raw ring buffer is held, after settings have been updated (and raw ring buffers
+        adjusted for them), and before Plotter is signalled that settings have been changed.
+        :param plotter: Plotter object holding new settings (see Plotter.update_local_settings); settings must not
+        change while worker runs (see cancel).
+        :param ring_buffer_raw: Reference to raw ring buffer in shared memory.
+        :param ring_buffer_processed: Reference to processed ring buffer in shared memory.
+        :param projection_cache: Optional reference to projection cache in shared memory (see SharedProjectionCache).
+        :param sample_store: Optional reference to sample store in shared memory (see SharedSampleStore); if given (with
+        sample_rebinner), pings of raw ring buffer are re-binned for new settings before processed ring buffers are
+        rebuilt.
+        :param sample_rebinner: Optional object re-binning pings from records of sample store (see
+        KongsbergSampleRebinner).
+        """
+        super().__init__(daemon=True)
+
+        self.plotter = plotter
+        self.ring_buffer_raw = ring_buffer_raw
+        self.ring_buffer_processed = ring_buffer_processed
+        self.projection_cache = projection_cache
+        self.sample_store = sample_store
+        self.sample_rebinner = sample_rebinner
+
+        self.cancelled = Event()
+
+        along_track_avg = self.plotter.along_track_avg_local
+        # Whole along-track groups, beginning with oldest ping, are rebuilt; remainder of pings is Plotter's current
+        # along-track group (see Plotter.update_along_track_group)
+        num_elements = self.ring_buffer_raw.get_num_elements_in_buffer()
+        self.end_ping = self.ring_buffer_raw.num_appended - num_elements % along_track_avg
+        self.next_ping = self.ring_buffer_raw.num_appended - num_elements
+        self.chunk_size = max(1, self.CHUNK_SIZE_PINGS // along_track_avg) * along_track_avg
+        # Groups appended to live generation from now on are calculated by Plotter with new settings
+        with self.ring_buffer_processed.get_lock():
+            self.first_plotter_group = self.ring_buffer_processed.num_appended
+
+        # True until every ping appended before settings were changed has been re-binned (pings appended from now on
+        # are binned with new settings)
+        self.rebinning = self.sample_store is not None and self.sample_rebinner is not None
+        if self.rebinning:
+            self.rebin_next_ping = self.next_ping
+            self.rebin_end_ping = self.end_ping
+            # Pings of Plotter's current along-track group are re-binned now, before Plotter rebuilds group from them
+            self.rebin_pings(self.end_ping, self.ring_buffer_raw.num_appended - self.end_ping)
+
+    def cancel(self):
+        """
+        Signals worker to stop (for example, when settings are changed again); back generation is abandoned.
+        Lock on raw ring buffer must not be held while joining worker.
+        """
+        self.cancelled.set()
+
+    def rebin_pings(self, first_ping, num_pings):
+        """
+        Re-bins pings of raw ring buffer from their records in sample store, at bin size and max heave of Plotter's
+        settings; pings of which sample store holds no record are emptied.
+        :param first_ping: Ping number (see SharedRingBufferRaw.num_appended) of first ping to re-bin.
+        :param num_pings: Number of pings to re-bin.
+        :return: Number of pings emptied.
+        """
+        with self.ring_buffer_raw.get_lock():
+            first_element = self.ring_buffer_raw.num_appended - self.ring_buffer_raw.get_num_elements_in_buffer()
+            first_ping = max(first_ping, first_element)
+            slots = self.ring_buffer_raw.get_slot_indices()
+            records = [self.sample_store.get(slots[ping - first_element], ping)
+                       for ping in range(first_ping, first_ping + num_pings)]
+        if len(records) == 0:
+            return 0
+
+        amplitudes, counts, bottom_depths = self.sample_rebinner.rebin(records, self.plotter.base_bin_size_local,
+                                                                       self.plotter.max_heave_local)
+
+        with self.ring_buffer_raw.get_lock():
+            # Skip pings discarded from raw ring buffer in the meantime
+            first_element = self.ring_buffer_raw.num_appended - self.ring_buffer_raw.get_num_elements_in_buffer()
+            num_discarded = max(0, first_element - first_ping)
+            if num_discarded < len(records):
+                self.ring_buffer_raw.replace_elements(first_ping + num_discarded - first_element,
+                                                      amplitudes[num_discarded:], counts[num_discarded:],
+                                                      bottom_depths[num_discarded:],
+                                                      self.ring_buffer_raw.heave_rows(
+                                                          self.plotter.max_heave_local,
+                                                          self.plotter.base_bin_size_local,
+                                                          self.ring_buffer_raw.NUM_LEVELS))
+        return sum(record is None for record in records)
+
+    def rebin_buffered_pings(self):
+        """
+        Re-bins pings appended to raw ring buffer before settings were changed, one batch at a time.
+        :return: False if cancelled; otherwise, True.
+        """
+        num_emptied = 0
+        while self.rebin_next_ping < self.rebin_end_ping:
+            if self.cancelled.is_set():
+                return False
+            num_pings = min(self.REBIN_CHUNK_SIZE_PINGS, self.rebin_end_ping - self.rebin_next_ping)
+            num_emptied += self.rebin_pings(self.rebin_next_ping, num_pings)
+            self.rebin_next_ping += num_pings
+        self.rebinning = False
+        if num_emptied > 0:
+            logger.warning("Raw ring buffer re-binned; {} ping(s) with no record in sample store are empty. Consider "
+                           "increasing sampleStoreSize_MB.".format(num_emptied))
+        else:
+            logger.info("Raw ring buffer re-binned.")
+        return True
+
+    def update_projection_cache(self):
+        """
+        Computes missing entries of projection cache, one chunk of pings per hold of lock on raw ring buffer.
+        :return: False if cancelled; otherwise, True.
+        """
+        complete = False
+        while not complete:
+            with self.ring_buffer_raw.get_lock():
+                if self.cancelled.is_set():
+                    return False
+                if self.ring_buffer_raw.get_num_elements_in_buffer() == 0:
+                    return True
+                complete = self.projection_cache.update(
+                    self.ring_buffer_raw.get_slot_indices(),
+                    self.ring_buffer_raw.view_buffer_elements(self.ring_buffer_raw.amplitude_buffer),
+                    self.ring_buffer_raw.view_buffer_elements(self.ring_buffer_raw.count_buffer),
+                    self.ring_buffer_raw.level, max_entries=self.chunk_size)
+        return True
+
+    def calculate_next_chunk(self):
+        """
+        Calculates along-track groups of next chunk of pings. (Lock on raw ring buffer must be held.)
+        :return: Vertical slice averages, horizontal slice averages (of each slice; see SliceRegistry), timestamp
+        averages and latitude / longitude averages of each group of chunk.
+        """
+        along_track_avg = self.plotter.along_track_avg_local
+        first_ping = self.ring_buffer_raw.num_appended - self.ring_buffer_raw.get_num_elements_in_buffer()
+        if self.next_ping < first_ping:
+            # Skip groups of which pings have been discarded from raw ring buffer
+            self.next_ping += math.ceil((first_ping - self.next_ping) / along_track_avg) * along_track_avg
+        num_pings = max(0, min(self.chunk_size, self.end_ping - self.next_ping))
+
+        averages = self.plotter.calculate_group_averages(self.ring_buffer_raw, self.next_ping - first_ping, num_pings,
+                                                         self.projection_cache)
+        self.next_ping += num_pings
+        return averages
+
+    def run(self):
+        """
+        Re-bins pings of raw ring buffer (if required); rebuilds back generation of processed ring buffers; swaps
+        generations when complete.
+        """
+        # Number of threads of parallel kernels is local to each thread
+        KernelThreads.configure(self.plotter.settings)
+
+        if self.rebinning and not self.rebin_buffered_pings():
+            return
+
+        if self.projection_cache is not None and not self.update_projection_cache():
+            return
+
+        self.ring_buffer_processed.clear_back()
+        while True:
+            with self.ring_buffer_raw.get_lock():
+                if self.cancelled.is_set():
+                    return
+                averages = self.calculate_next_chunk()
+                if self.next_ping >= self.end_ping:
+                    # Last chunk: reconcile with groups appended by Plotter while back generation was rebuilt, and
+                    # swap generations. Plotter appends groups while holding lock on raw ring buffer, so none can be
+                    # appended in between.
+                    with self.ring_buffer_processed.get_lock():
+                        self.ring_buffer_processed.append_to_back(*averages)
+                        num_plotter_groups = min(self.ring_buffer_processed.num_appended - self.first_plotter_group,
+                                                 self.ring_buffer_processed.get_num_elements_in_buffer())
+                        self.ring_buffer_processed.append_recent_to_back(num_plotter_groups)
+                        self.ring_buffer_processed.swap_generations()
+                    logger.info("Processed ring buffer recalculated; {} group(s) appended during recalculation."
+                                .format(num_plotter_groups))
+                    return
+            # Back generation is only accessed by this thread
+            self.ring_buffer_processed.append_to_back(*averages)
@@ -0,0 +1,258 @@
+# Lynette Davis
+# ldavis@ccom.unh.edu
+# Center for Coastal and Ocean Mapping
+# University of New Hampshire
+# October 2026
+
+# Description: Saves the last N minutes ('dumpMinutes' in advanced settings) of the raw and processed ring buffers to
+# disk, so that what is on screen can be kept before it is overwritten (see WaterColumn.dump_buffers). Dump is written
+# on a background thread. Each ring buffer is written to its own .npy file straight from its view of shared memory
+# (ndarray.tofile), in chunks of pings, without copying ring buffers in memory; lock on raw ring buffer is held for one
+# chunk at a time, so that Plotter keeps appending pings while the dump is written (as with ProcessedBufferWorker).
+# Raw ring buffers are written at the selected bin size level.
+#
+# Pings are identified by ping number (see SharedRingBufferRaw.num_appended); pings that are discarded from raw ring
+# buffer before they are written are left empty (zeros) and counted in metadata. Metadata (settings, ping numbers, bin
+# size level, bin sizes of that level and of level 0, rows allotted to max heave, slice names and file names) is written
+# last, to metadata.json, so that a dump without metadata is incomplete. Dumps are memory-mapped back with load.
+
+import copy
+from datetime import datetime, timezone
+import json
+import logging
+import numpy as np
+import os
+from threading import Event, Thread
+
+logger = logging.getLogger(__name__)
+
+
+class RingBufferDump(Thread):
+
+    # Maximum number of pings written per hold of lock on raw ring buffer
+    CHUNK_SIZE_PINGS = 8
+    FORMAT_VERSION = 1
+    METADATA_FILE_NAME = "metadata.json"
+
+    def __init__(self, settings, base_bin_size, ring_buffer_raw, ring_buffer_processed, directory, minutes=None):
+        """
+        :param settings: Settings dictionary (copied; recorded in metadata).
+        :param base_bin_size: Bin size (m) of level 0 of raw ring buffers; bin size of level k is base bin size * 2 ** k
+        (see SharedRingBufferRaw.bin_size_level). Bin size of settings is that of the selected level at the time
+        settings were last edited, so it is not recorded as bin size of dump.
+        :param ring_buffer_raw: Reference to raw ring buffer in shared memory.
+        :param ring_buffer_processed: Reference to processed ring buffer in shared memory.
+        :param directory: Directory to which dump is written (created if it does not exist).
+        :param minutes: Pings (and along-track groups) with timestamps within this many minutes of the most recent one
+        are written; if None, all pings in ring buffers are written.
+        """
+        super(RingBufferDump, self).__init__(daemon=True)
+
+        self.settings = copy.deepcopy(settings)
+        self.base_bin_size = round(base_bin_size, 2)
+        self.ring_buffer_raw = ring_buffer_raw
+        self.ring_buffer_processed = ring_buffer_processed
+        self.directory = directory
+        self.minutes = minutes
+
+        self.cancelled = Event()
+        self.progress = 0.0  # Fraction of pings of raw ring buffers written
+        self.error = None  # Exception raised while writing, if any
+
+        self.num_pings = 0
+        self.num_lost_pings = 0
+        self.num_groups = 0
+
+    def cancel(self):
+        """
+        Requests that dump stop; checked between chunks. Dump is then left without metadata.
+        """
+        self.cancelled.set()
+
+    def run(self):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            metadata = {'formatVersion': self.FORMAT_VERSION,
+                        'created': datetime.now(timezone.utc).isoformat(),
+                        'minutes': self.minutes,
+                        'settings': self.settings,
+                        'files': {}}
+            if not self.dump_raw(metadata) or not self.dump_processed(metadata):
+                logger.info("Ring buffer dump to {} cancelled.".format(self.directory))
+                return
+            self.write_metadata(metadata)
+        except Exception as error:
+            # Any failure (not only of file system) is recorded, so that it is reported (see
+            # WaterColumn.get_dump_status) rather than lost with thread
+            self.error = error
+            logger.exception("Ring buffer dump to {} failed: {}".format(self.directory, error))
+            return
+
+        if self.num_lost_pings > 0:
+            logger.warning("Ring buffers dumped to {}; {} of {} ping(s) were discarded from raw ring buffer before "
+                           "they were written and are empty.".format(self.directory, self.num_lost_pings,
+                                                                     self.num_pings))
+        else:
+            logger.info("Ring buffers dumped to {}: {} ping(s), {} along-track group(s)."
+                        .format(self.directory, self.num_pings, self.num_groups))
+
+    def select_recent(self, timestamps):
+        """
+        Finds first element with timestamp within self.minutes of most recent timestamp.
+        :param timestamps: Numpy array of timestamps (seconds) of elements of ring buffer, oldest first.
+        :return: Index of first element to be written.
+        """
+        if self.minutes is None or len(timestamps) == 0 or np.all(np.isnan(timestamps)):
+            return 0
+        cutoff = np.nanmax(timestamps) - self.minutes * 60
+        return int(np.argmax(timestamps >= cutoff))
+
+    def open_array(self, name, buffer, length, metadata):
+        """
+        Creates .npy file for elements of a ring buffer; header is written for given number of elements.
+        :param name: Name of array (file name without extension).
+        :param buffer: Ring buffer.
+        :param length: Number of elements to be written.
+        :param metadata: Metadata dictionary, to which file name is added.
+        :return: File, positioned at start of data, and size (bytes) of file when all elements are written.
+        """
+        file_name = name + ".npy"
+        metadata['files'][name] = file_name
+        array_file = open(os.path.join(self.directory, file_name), 'wb')
+        np.lib.format.write_array_header_1_0(array_file, {'descr': np.lib.format.dtype_to_descr(buffer.dtype),
+                                                          'fortran_order': False,
+                                                          'shape': (length,) + buffer.shape[1:]})
+        return array_file, array_file.tell() + length * buffer[0].nbytes
+
+    def dump_raw(self, metadata):
+        """
+        Writes recent pings of raw ring buffers (amplitudes, counts and bottom depths at selected level; timestamps,
+        latitudes / longitudes and rows allotted to max heave), one chunk of pings per hold of lock.
+        :param metadata: Metadata dictionary, to which raw ring buffer metadata is added.
+        :return: False if cancelled; otherwise, True.
+        """
+        with self.ring_buffer_raw.get_lock():
+            level = self.ring_buffer_raw.level
+            # Buffers of level selected when dump starts, even if another level is selected in the meantime
+            buffers = {'raw_amplitude': self.ring_buffer_raw.level_amplitude_buffers[level],
+                       'raw_count': self.ring_buffer_raw.level_count_buffers[level],
+                       'raw_bottom': self.ring_buffer_raw.level_bottom_buffers[level],
+                       'raw_timestamp': self.ring_buffer_raw.timestamp_buffer,
+                       'raw_lat_lon': self.ring_buffer_raw.lat_lon_buffer,
+                       'raw_heave_rows': self.ring_buffer_raw.heave_rows_buffer}
+            num_elements = self.ring_buffer_raw.get_num_elements_in_buffer()
+            first_ping = self.ring_buffer_raw.num_appended - num_elements + self.select_recent(
+                self.ring_buffer_raw.view_buffer_elements(self.ring_buffer_raw.timestamp_buffer))
+            end_ping = self.ring_buffer_raw.num_appended
+            heave_rows = self.ring_buffer_raw.get_heave_rows()
+
+        self.num_pings = end_ping - first_ping
+        metadata['raw'] = {'firstPing': first_ping, 'numPings': self.num_pings, 'level': level,
+                           'binSize_m': round(self.base_bin_size * 2 ** level, 2),
+                           'baseBinSize_m': self.base_bin_size,
+                           'amplitudeScale': self.ring_buffer_raw.AMPLITUDE_SCALE,
+                           'heaveRows': heave_rows.tolist()}
+
+        files = {name: self.open_array(name, buffer, self.num_pings, metadata) for name, buffer in buffers.items()}
+        try:
+            next_ping = first_ping
+            while next_ping < end_ping:
+                if self.cancelled.is_set():
+                    return False
+                num_pings = min(self.CHUNK_SIZE_PINGS, end_ping - next_ping)
+                with self.ring_buffer_raw.get_lock():
+                    first_element = self.ring_buffer_raw.num_appended - \
+                                    self.ring_buffer_raw.get_num_elements_in_buffer()
+                    # Pings discarded from raw ring buffer in the meantime are skipped (left as zeros)
+                    num_lost = min(max(0, first_element - next_ping), num_pings)
+                    start = next_ping + num_lost - first_element
+                    for name, buffer in buffers.items():
+                        array_file = files[name][0]
+                        if num_lost > 0:
+                            array_file.seek(num_lost * buffer[0].nbytes, os.SEEK_CUR)
+                        self.ring_buffer_raw.view_buffer_elements(buffer)[start:start + num_pings - num_lost] \
+                            .tofile(array_file)
+                self.num_lost_pings += num_lost
+                next_ping += num_pings
+                self.progress = (next_ping - first_ping) / self.num_pings
+        finally:
+            for array_file, size in files.values():
+                # Extends file with zeros where trailing pings were skipped
+                array_file.truncate(size)
+                array_file.close()
+
+        metadata['raw']['numLostPings'] = self.num_lost_pings
+        self.progress = 1.0
+        return True
+
+    def dump_processed(self, metadata):
+        """
+        Writes recent along-track groups of live generation of processed ring buffers. Processed ring buffers are
+        small; they are written under a single hold of their lock, so that all groups belong to one generation.
+        :param metadata: Metadata dictionary, to which processed ring buffer metadata is added.
+        :return: False if cancelled; otherwise, True.
+        """
+        if self.cancelled.is_set():
+            return False
+
+        with self.ring_buffer_processed.get_lock():
+            buffers = {}
+            for index, buffer in enumerate(self.ring_buffer_processed.vertical_slice_buffers):
+                buffers['processed_vertical_{}'.format(index)] = buffer
+            for index, buffer in enumerate(self.ring_buffer_processed.horizontal_slice_buffers):
+                buffers['processed_horizontal_{}'.format(index)] = buffer
+            buffers['processed_timestamp'] = self.ring_buffer_processed.timestamp_buffer_avg
+            buffers['processed_lat_lon'] = self.ring_buffer_processed.lat_lon_buffer_avg
+
+            timestamps = self.ring_buffer_processed.view_buffer_elements(
+                self.ring_buffer_processed.timestamp_buffer_avg)
+            if timestamps is None:  # Empty
+                timestamps = np.empty(0)
+            first_element = self.select_recent(timestamps)
+            self.num_groups = len(timestamps) - first_element
+
+            for name, buffer in buffers.items():
+                array_file, size = self.open_array(name, buffer, self.num_groups, metadata)
+                with array_file:
+                    if self.num_groups > 0:
+                        self.ring_buffer_processed.view_buffer_elements(buffer)[first_element:].tofile(array_file)
+
+            metadata['processed'] = {'numGroups': self.num_groups,
+                                     'generation': self.ring_buffer_processed.generation,
+                                     'alongTrackAvg_ping': self.settings['processing_settings']['alongTrackAvg_ping'],
+                                     'numVerticalSlices': len(self.ring_buffer_processed.vertical_slice_buffers),
+                                     'numHorizontalSlices': len(self.ring_buffer_processed.horizontal_slice_buffers)}
+        return True
+
+    def write_metadata(self, metadata):
+        """
+        Writes metadata, completing dump. Metadata is written to a temporary file that is then renamed, so that
+        metadata.json exists only when dump is complete.
+        :param metadata: Metadata dictionary.
+        """
+        path = os.path.join(self.directory, self.METADATA_FILE_NAME)
+        with open(path + ".tmp", 'w') as metadata_file:
+            json.dump(metadata, metadata_file, indent=4)
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, directory):
+        """
+        Memory-maps a dump (read-only), for example, to view it.
+        :param directory: Directory of dump.
+        :return: Metadata dictionary and dictionary of arrays by name (see 'files' of metadata). Arrays of ring
+        buffers are memory-mapped numpy arrays (elements x ...), oldest first. 'raw_row_offsets' is added: row offset
+        of each ping at dumped level (see SharedRingBufferRaw.get_row_offsets), by which its rows are shifted down
+        when read.
+        """
+        with open(os.path.join(directory, cls.METADATA_FILE_NAME), 'r') as metadata_file:
+            metadata = json.load(metadata_file)
+        if metadata['formatVersion'] != cls.FORMAT_VERSION:
+            raise ValueError("Unsupported ring buffer dump format version: {}.".format(metadata['formatVersion']))
+
+        arrays = {name: np.load(os.path.join(directory, file_name), mmap_mode='r')
+                  for name, file_name in metadata['files'].items()}
+        level = metadata['raw']['level']
+        arrays['raw_row_offsets'] = metadata['raw']['heaveRows'][level] - \
+            arrays['raw_heave_rows'][:, level].astype(np.int64)
+        return metadata, arrays
@@ -0,0 +1,63 @@
+# Lynette Davis
+# ldavis@ccom.unh.edu
+# Center for Coastal and Ocean Mapping
+# University of New Hampshire
+# October 2026
+
+# Description: Named, reusable scratch arrays. Each array is allocated once and grown (geometrically) only when a
+# larger array is requested, so that temporaries of per-ping processing do not reach the allocator once sizes have
+# settled (after warm-up).
+
+import numpy as np
+
+
+class ScratchArrays:
+
+    def __init__(self):
+        self.arrays = {}
+
+    def get(self, key, shape, dtype):
+        """
+        Gets scratch array of given shape and dtype. Contents are undefined; array is valid until next request
+        with same key.
+        :param key: Name of scratch array.
+        :param shape: Shape (integer or tuple) of array.
+        :param dtype: Numpy dtype of array.
+        :return: Numpy array (view of scratch storage).
+        """
+        size = int(np.prod(shape))
+        scratch = self.arrays.get(key)
+        if scratch is None or scratch.dtype != dtype or scratch.size < size:
+            old_size = 0 if scratch is None or scratch.dtype != dtype else scratch.size
+            scratch = np.empty(max(size, 2 * old_size), dtype=dtype)
+            self.arrays[key] = scratch
+        return scratch[:size].reshape(shape)
+
+    def zeros(self, key, shape, dtype):
+        """
+        Gets scratch array of given shape and dtype, filled with zeros.
+        :param key: Name of scratch array.
+        :param shape: Shape (integer or tuple) of array.
+        :param dtype: Numpy dtype of array.
+        :return: Numpy array (view of scratch storage).
+        """
+        scratch = self.get(key, shape, dtype)
+        scratch.fill(0)
+        return scratch
+
+    def copy(self, key, array):
+        """
+        Copies array into scratch array (in place of np.copy).
+        :param key: Name of scratch array.
+        :param array: Numpy array to copy.
+        :return: Numpy array (view of scratch storage) holding copy of array.
+        """
+        scratch = self.get(key, array.shape, array.dtype)
+        np.copyto(scratch, array)
+        return scratch
+
+    def nbytes(self):
+        """
+        :return: Size (bytes) of all scratch arrays.
+        """
+        return sum(scratch.nbytes for scratch in self.arrays.values())
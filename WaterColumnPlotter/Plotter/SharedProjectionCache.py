@@ -0,0 +1,413 @@
+# Lynette Davis
+# ldavis@ccom.unh.edu
+# Center for Coastal and Ocean Mapping
+# University of New Hampshire
+# October 2026
+
+# Description: Per-ping cumulative projection cache in shared memory ('projectionCache' in advanced settings). For each
+# ping in the raw ring buffer, amplitudes and counts are stored as prefix sums along the across-track axis (for each
+# depth row) and along the depth axis (for each across-track column), at every BLOCK_SIZE-th column (or row) boundary
+# only. The sum over a vertical slice window [start, end) of a row is then the difference of the prefix sums at the
+# first and last block boundaries within the window, plus the fewer than BLOCK_SIZE grid cells at each end of the
+# window outside these boundaries (read from the raw ring buffer), and likewise for horizontal slice windows, so that
+# the processed ring buffer can be recalculated for new slice settings in O(pings x grid cells x BLOCK_SIZE) rather
+# than by summing every grid cell of every ping (see ProcessedBufferWorker), and so that each of any number of slices
+# (see SliceRegistry) costs O(grid cells x BLOCK_SIZE) per ping once the prefix sums of the ping are computed.
+# Cache entries are written by Plotter as pings are added to the raw ring buffer, and are protected by the raw ring
+# buffer lock. Entries are kept in slots (see SharedRingBufferRaw.get_slot_indices) that do not move when the raw ring
+# buffer is compacted. Entries are only valid for the bin size level with which they were computed. Entries hold sums
+# of pings as binned; rows of each ping are offset for max heave when entries are read (see
+# SharedRingBufferRaw.get_row_offsets), so that entries remain valid when max heave is changed.
+# Amplitude prefix sums are accumulated in float64 and stored as float32 (or, with int32 precision, as exact int32
+# sums); counts are stored as uint32, so that sums of counts never wrap around. With 500 grid cells, cache takes about
+# 0.5 MB per ping (a third of the raw grids of a ping); it is not created when it does not fit in available shared
+# memory (see check_available_shmem).
+
+import logging
+from multiprocessing import shared_memory
+from numba import jit, prange
+import numpy as np
+import os
+from WaterColumnPlotter.Plotter.KernelThreads import KernelThreads
+
+logger = logging.getLogger(__name__)
+
+
+class SharedProjectionCache:
+
+    # Cache state: [0] = number of most recent pings with valid entries; [1] = bin size level of entries
+    NUM_VALID = 0
+    LEVEL = 1
+
+    # Number of grid cells between stored prefix sums
+    BLOCK_SIZE = 8
+
+    def __init__(self, settings, create_shmem=False):
+
+        self.settings = settings
+
+        self.MAX_NUM_GRID_CELLS = settings['buffer_settings']['maxGridCells']
+        self.SIZE_BUFFER = settings['buffer_settings']['maxBufferSize_ping']
+        self.create_shmem = create_shmem
+
+        # Prefix sums are stored with dtype amplitude_dtype; they are accumulated and differenced with dtype
+        # difference_dtype (int32 sums wrap around, but differences of wrapped prefix sums are exact)
+        if self.settings['advanced_settings']['precision'] == "int32":
+            amplitude_dtype = self.difference_dtype = np.int32
+        else:
+            amplitude_dtype = np.float32
+            self.difference_dtype = np.float64
+        # Vertical: prefix sums along across-track axis (one row of NUM_BOUNDARIES entries per depth row); horizontal:
+        # prefix sums along depth axis (NUM_BOUNDARIES rows, one entry per across-track column). Entry b is the sum of
+        # grid cells before cell b * BLOCK_SIZE.
+        self.NUM_BOUNDARIES = self.MAX_NUM_GRID_CELLS // self.BLOCK_SIZE + 1
+        self.vertical_amplitude_dtype = np.dtype((amplitude_dtype, (self.MAX_NUM_GRID_CELLS, self.NUM_BOUNDARIES)))
+        self.vertical_count_dtype = np.dtype((np.uint32, (self.MAX_NUM_GRID_CELLS, self.NUM_BOUNDARIES)))
+        self.horizontal_amplitude_dtype = np.dtype((amplitude_dtype, (self.NUM_BOUNDARIES, self.MAX_NUM_GRID_CELLS)))
+        self.horizontal_count_dtype = np.dtype((np.uint32, (self.NUM_BOUNDARIES, self.MAX_NUM_GRID_CELLS)))
+        self.state_dtype = np.dtype(np.int64)
+
+        self.shmem_vertical_amplitude_cache = None
+        self.shmem_vertical_count_cache = None
+        self.shmem_horizontal_amplitude_cache = None
+        self.shmem_horizontal_count_cache = None
+        self.shmem_state = None
+
+        if self.create_shmem:
+            self.check_available_shmem()
+        self._initialize_shmem()
+
+        self.vertical_amplitude_cache = None
+        self.vertical_count_cache = None
+        self.horizontal_amplitude_cache = None
+        self.horizontal_count_cache = None
+        self.state = None
+
+        self._initialize_buffers()
+
+        if self.create_shmem:
+            self.state[:] = [0, 0]
+            logger.info("Projection cache: {:.1f} MB per ping; {:.1f} MB in total."
+                        .format(self.get_nbytes() / self.SIZE_BUFFER / 1e6, self.get_nbytes() / 1e6))
+
+    def get_nbytes(self):
+        """
+        :return: Size (bytes) of shared memory used by cache.
+        """
+        return self.SIZE_BUFFER * (self.vertical_amplitude_dtype.itemsize + self.vertical_count_dtype.itemsize +
+                                   self.horizontal_amplitude_dtype.itemsize + self.horizontal_count_dtype.itemsize)
+
+    def check_available_shmem(self):
+        """
+        Checks that cache fits in shared memory available for new blocks, where it can be determined (/dev/shm on
+        Linux), so that a cache that is too large is refused before any shared memory is created.
+        :raise MemoryError: If cache does not fit in available shared memory.
+        """
+        try:
+            stats = os.statvfs("/dev/shm")
+        except (AttributeError, OSError):  # Not available on this system
+            return
+        available = stats.f_bavail * stats.f_frsize
+        if self.get_nbytes() > available:
+            raise MemoryError("Projection cache requires {:.1f} MB of shared memory; {:.1f} MB available."
+                              .format(self.get_nbytes() / 1e6, available / 1e6))
+
+    def _initialize_shmem(self):
+        """
+        Initialize shared memory where cache is to be stored.
+        """
+        self.shmem_vertical_amplitude_cache = shared_memory.SharedMemory(
+            name="shmem_vertical_amplitude_cache", create=self.create_shmem,
+            size=self.SIZE_BUFFER * self.vertical_amplitude_dtype.itemsize)
+        self.shmem_vertical_count_cache = shared_memory.SharedMemory(
+            name="shmem_vertical_count_cache", create=self.create_shmem,
+            size=self.SIZE_BUFFER * self.vertical_count_dtype.itemsize)
+        self.shmem_horizontal_amplitude_cache = shared_memory.SharedMemory(
+            name="shmem_horizontal_amplitude_cache", create=self.create_shmem,
+            size=self.SIZE_BUFFER * self.horizontal_amplitude_dtype.itemsize)
+        self.shmem_horizontal_count_cache = shared_memory.SharedMemory(
+            name="shmem_horizontal_count_cache", create=self.create_shmem,
+            size=self.SIZE_BUFFER * self.horizontal_count_dtype.itemsize)
+        self.shmem_state = shared_memory.SharedMemory(name="shmem_projection_cache_state", create=self.create_shmem,
+                                                      size=2 * self.state_dtype.itemsize)
+
+    def _initialize_buffers(self):
+        """
+        Initialize cache at locations of shared memory.
+        """
+        self.vertical_amplitude_cache = np.ndarray(shape=self.SIZE_BUFFER, dtype=self.vertical_amplitude_dtype,
+                                                   buffer=self.shmem_vertical_amplitude_cache.buf)
+        self.vertical_count_cache = np.ndarray(shape=self.SIZE_BUFFER, dtype=self.vertical_count_dtype,
+                                               buffer=self.shmem_vertical_count_cache.buf)
+        self.horizontal_amplitude_cache = np.ndarray(shape=self.SIZE_BUFFER, dtype=self.horizontal_amplitude_dtype,
+                                                     buffer=self.shmem_horizontal_amplitude_cache.buf)
+        self.horizontal_count_cache = np.ndarray(shape=self.SIZE_BUFFER, dtype=self.horizontal_count_dtype,
+                                                 buffer=self.shmem_horizontal_count_cache.buf)
+        self.state = np.ndarray(shape=2, dtype=self.state_dtype, buffer=self.shmem_state.buf)
+
+    def get_num_valid(self, level, num_elements):
+        """
+        Number of most recent pings of raw ring buffer with valid cache entries. (Raw ring buffer lock must be held.)
+        :param level: Bin size level of raw ring buffers.
+        :param num_elements: Number of pings in raw ring buffer.
+        :return: Number of most recent pings with valid entries.
+        """
+        if self.state[self.LEVEL] != level:
+            return 0
+        return int(min(self.state[self.NUM_VALID], num_elements))
+
+    def invalidate(self, level):
+        """
+        Marks all entries invalid; subsequent entries are computed at given bin size level.
+        (Raw ring buffer lock must be held.)
+        """
+        self.state[:] = [0, level]
+
+    def put(self, slot, amplitudes, counts):
+        """
+        Computes prefix sums of a single ping into cache slot. (Raw ring buffer lock must be held.)
+        :param slot: Slot of ping (see SharedRingBufferRaw.get_slot_indices).
+        :param amplitudes: Numpy matrix of binned amplitude sums of ping (depth rows x across-track columns).
+        :param counts: Numpy matrix of binned counts of ping.
+        """
+        with KernelThreads.launch():
+            self.prefix_sums(amplitudes, counts, self.difference_dtype(0), self.BLOCK_SIZE,
+                             self.vertical_amplitude_cache[slot], self.vertical_count_cache[slot],
+                             self.horizontal_amplitude_cache[slot], self.horizontal_count_cache[slot])
+
+    @staticmethod
+    @jit(nopython=True, nogil=True, parallel=True)
+    def prefix_sums(amplitudes, counts, zero, block_size, vertical_amplitudes, vertical_counts, horizontal_amplitudes,
+                    horizontal_counts):
+        """
+        Prefix sums of a single ping, at every block_size-th boundary, along across-track axis (per depth row, in
+        parallel over rows) and along depth axis (per across-track column, in parallel over blocks of columns; see
+        KernelThreads). Amplitudes are accumulated with type of zero.
+        """
+        num_rows, num_columns = amplitudes.shape
+        for row in prange(num_rows):
+            row_amplitude = zero
+            row_count = 0
+            vertical_amplitudes[row, 0] = 0
+            vertical_counts[row, 0] = 0
+            for column in range(num_columns):
+                row_amplitude += amplitudes[row, column]
+                row_count += counts[row, column]
+                if (column + 1) % block_size == 0:
+                    vertical_amplitudes[row, (column + 1) // block_size] = row_amplitude
+                    vertical_counts[row, (column + 1) // block_size] = row_count
+
+        # Blocks of columns, so that each thread reads rows of ping contiguously
+        column_block_size = 64
+        for block in prange((num_columns + column_block_size - 1) // column_block_size):
+            start = block * column_block_size
+            stop = min(start + column_block_size, num_columns)
+            column_amplitudes = np.full(stop - start, zero)
+            column_counts = np.zeros(stop - start, dtype=np.uint32)
+            horizontal_amplitudes[0, start:stop] = 0
+            horizontal_counts[0, start:stop] = 0
+            for row in range(num_rows):
+                for column in range(start, stop):
+                    column_amplitudes[column - start] += amplitudes[row, column]
+                    column_counts[column - start] += counts[row, column]
+                if (row + 1) % block_size == 0:
+                    horizontal_amplitudes[(row + 1) // block_size, start:stop] = column_amplitudes
+                    horizontal_counts[(row + 1) // block_size, start:stop] = column_counts
+
+    def append(self, slot, amplitudes, counts, level):
+        """
+        Adds entry of the ping most recently added to raw ring buffer. (Raw ring buffer lock must be held.)
+        :param slot: Slot of ping (see SharedRingBufferRaw.get_slot_indices).
+        :param amplitudes: Numpy matrix of binned amplitude sums of ping.
+        :param counts: Numpy matrix of binned counts of ping.
+        :param level: Bin size level of raw ring buffers.
+        """
+        if self.state[self.LEVEL] != level:
+            self.invalidate(level)
+        self.put(slot, amplitudes, counts)
+        self.state[self.NUM_VALID] = min(self.state[self.NUM_VALID] + 1, self.SIZE_BUFFER)
+
+    def update(self, slots, amplitude_pings, count_pings, level, max_entries=None):
+        """
+        Ensures that pings of raw ring buffer have valid entries; missing entries are computed from raw ring buffer
+        (O(grid cells) per missing ping), newest first. (Raw ring buffer lock must be held.)
+        :param slots: Slots of pings of raw ring buffer, oldest first (see SharedRingBufferRaw.get_slot_indices).
+        :param amplitude_pings: Numpy array of amplitude matrices of pings of raw ring buffer, oldest first.
+        :param count_pings: Numpy array of count matrices of pings of raw ring buffer, oldest first.
+        :param level: Bin size level of raw ring buffers.
+        :param max_entries: Optional maximum number of entries to compute (so that lock on raw ring buffer can be
+        released between calls; see ProcessedBufferWorker).
+        :return: True if every ping of raw ring buffer has a valid entry; otherwise, False.
+        """
+        num_elements = len(slots)
+        num_valid = self.get_num_valid(level, num_elements)
+        num_missing = num_elements - num_valid
+        if max_entries is not None:
+            num_missing = min(num_missing, max_entries)
+        if num_missing > 0:
+            logger.info("Projection cache: computing {} missing entries.".format(num_missing))
+            if num_valid == 0:
+                self.invalidate(level)
+            for ping in range(num_elements - num_valid - 1, num_elements - num_valid - num_missing - 1, -1):
+                self.put(slots[ping], amplitude_pings[ping], count_pings[ping])
+            self.state[self.NUM_VALID] = num_valid + num_missing
+        return num_valid + num_missing >= num_elements
+
+    @staticmethod
+    def resolve_windows(windows, length):
+        """
+        Resolves slice windows as Python slicing would (negative indices count from end; empty if end <= start).
+        :param windows: Sequence of (start, end) indices of slice windows.
+        :param length: Length of axis that is sliced.
+        :return: Numpy arrays of start and end indices, 0 <= start <= end <= length.
+        """
+        resolved = np.array([slice(start, end).indices(length)[:2] for start, end in windows], dtype=np.int64)
+        resolved = resolved.reshape(-1, 2)
+        return resolved[:, 0], np.maximum(resolved[:, 0], resolved[:, 1])
+
+    def split_windows(self, starts, ends):
+        """
+        Splits windows [start, end) into a head [start, head_end), whole blocks between stored prefix sums
+        first_boundary and last_boundary (indices of entries; see prefix_sums), and a tail [tail_start, end). Head and
+        tail hold fewer than BLOCK_SIZE grid cells each; a window within a single block is its head alone.
+        :param starts: Numpy array (int64) of start indices of windows.
+        :param ends: Numpy array (int64) of end indices of windows (end >= start).
+        :return: Numpy arrays of first_boundary, last_boundary, head_end and tail_start of windows.
+        """
+        first_boundary = -(-starts // self.BLOCK_SIZE)
+        last_boundary = np.maximum(ends // self.BLOCK_SIZE, first_boundary)
+        head_end = np.minimum(first_boundary * self.BLOCK_SIZE, ends)
+        tail_start = np.maximum(last_boundary * self.BLOCK_SIZE, head_end)
+        return first_boundary, last_boundary, head_end, tail_start
+
+    def vertical_sums(self, slots, windows, amplitude_pings, count_pings, row_offsets=None):
+        """
+        Sums of vertical slice windows of each ping: two lookups, and fewer than 2 * BLOCK_SIZE grid cells, per depth
+        row, per window, per ping, regardless of width of window. (Raw ring buffer lock must be held.)
+        :param slots: Slots of pings.
+        :param windows: Sequence of (start, end) indices (across-track columns) of vertical slices (see SliceRegistry).
+        :param amplitude_pings: Numpy array of amplitude matrices of pings (as in raw ring buffer), in order of slots.
+        :param count_pings: Numpy array of count matrices of pings.
+        :param row_offsets: Optional row offset of each ping (see SharedRingBufferRaw.get_row_offsets); depth row r of
+        sums is row r - offset of ping as binned (rows outside grid sum to zero).
+        :return: Numpy arrays (pings x slices x depth rows) of amplitude sums and count sums.
+        """
+        starts, ends = self.resolve_windows(windows, self.MAX_NUM_GRID_CELLS)
+        first_boundary, last_boundary, head_end, tail_start = self.split_windows(starts, ends)
+        slots = np.asarray(slots)
+        if row_offsets is None:
+            row_offsets = np.zeros(len(slots), dtype=np.int64)
+
+        # Source row of each depth row of each ping (pings x 1 x depth rows); rows outside grid are masked
+        rows = np.arange(self.MAX_NUM_GRID_CELLS)[np.newaxis, :] - np.asarray(row_offsets)[:, np.newaxis]
+        outside = (rows < 0) | (rows >= self.MAX_NUM_GRID_CELLS)
+        rows = np.clip(rows, 0, self.MAX_NUM_GRID_CELLS - 1)[:, np.newaxis, :]
+        slots = slots[:, np.newaxis, np.newaxis]
+        first_boundary = first_boundary[np.newaxis, :, np.newaxis]
+        last_boundary = last_boundary[np.newaxis, :, np.newaxis]
+        amplitude_sums = np.subtract(self.vertical_amplitude_cache[slots, rows, last_boundary],
+                                     self.vertical_amplitude_cache[slots, rows, first_boundary],
+                                     dtype=self.difference_dtype)
+        count_sums = self.vertical_count_cache[slots, rows, last_boundary] - \
+            self.vertical_count_cache[slots, rows, first_boundary]
+        amplitude_sums[np.broadcast_to(outside[:, np.newaxis, :], amplitude_sums.shape)] = 0
+        count_sums[np.broadcast_to(outside[:, np.newaxis, :], count_sums.shape)] = 0
+
+        with KernelThreads.launch():
+            self.add_vertical_ends(amplitude_pings, count_pings, np.asarray(row_offsets, dtype=np.int64), starts,
+                                   head_end, tail_start, ends, amplitude_sums, count_sums)
+        return amplitude_sums, count_sums
+
+    @staticmethod
+    @jit(nopython=True, nogil=True, parallel=True)
+    def add_vertical_ends(amplitude_pings, count_pings, row_offsets, starts, head_end, tail_start, ends,
+                          amplitude_sums, count_sums):
+        """
+        Adds grid cells of heads and tails of vertical slice windows (see split_windows) of each depth row of each
+        ping (in parallel over pings) to sums of whole blocks of windows.
+        """
+        num_pings, num_rows = amplitude_pings.shape[:2]
+        for ping in prange(num_pings):
+            for window in range(len(starts)):
+                for row in range(num_rows):
+                    source_row = row - row_offsets[ping]
+                    if source_row < 0 or source_row >= num_rows:
+                        continue
+                    for column in range(starts[window], head_end[window]):
+                        amplitude_sums[ping, window, row] += amplitude_pings[ping, source_row, column]
+                        count_sums[ping, window, row] += count_pings[ping, source_row, column]
+                    for column in range(tail_start[window], ends[window]):
+                        amplitude_sums[ping, window, row] += amplitude_pings[ping, source_row, column]
+                        count_sums[ping, window, row] += count_pings[ping, source_row, column]
+
+    def horizontal_sums(self, slots, windows, amplitude_pings, count_pings, row_offsets=None):
+        """
+        Sums of horizontal slice windows of each ping: two lookups, and fewer than 2 * BLOCK_SIZE grid cells, per
+        across-track column, per window, per ping. (Raw ring buffer lock must be held.)
+        :param slots: Slots of pings.
+        :param windows: Sequence of (start, end) indices (depth rows) of horizontal slices (see SliceRegistry).
+        :param amplitude_pings: Numpy array of amplitude matrices of pings (as in raw ring buffer), in order of slots.
+        :param count_pings: Numpy array of count matrices of pings.
+        :param row_offsets: Optional row offset of each ping (see SharedRingBufferRaw.get_row_offsets); windows are
+        shifted up by offset of ping, and clipped to grid.
+        :return: Numpy arrays (pings x slices x across-track columns) of amplitude sums and count sums.
+        """
+        starts, ends = self.resolve_windows(windows, self.MAX_NUM_GRID_CELLS)
+        slots = np.asarray(slots)[:, np.newaxis]
+        # Windows of each ping (pings x slices), in rows of ping as binned
+        if row_offsets is None:
+            row_offsets = np.zeros(len(slots), dtype=np.int64)
+        row_offsets = np.asarray(row_offsets)[:, np.newaxis]
+        starts = np.clip(starts[np.newaxis, :] - row_offsets, 0, self.MAX_NUM_GRID_CELLS)
+        ends = np.clip(ends[np.newaxis, :] - row_offsets, 0, self.MAX_NUM_GRID_CELLS)
+        first_boundary, last_boundary, head_end, tail_start = self.split_windows(starts, ends)
+        amplitude_sums = np.subtract(self.horizontal_amplitude_cache[slots, last_boundary, :],
+                                     self.horizontal_amplitude_cache[slots, first_boundary, :],
+                                     dtype=self.difference_dtype)
+        count_sums = self.horizontal_count_cache[slots, last_boundary, :] - \
+            self.horizontal_count_cache[slots, first_boundary, :]
+
+        with KernelThreads.launch():
+            self.add_horizontal_ends(amplitude_pings, count_pings, starts, head_end, tail_start, ends,
+                                     amplitude_sums, count_sums)
+        return amplitude_sums, count_sums
+
+    @staticmethod
+    @jit(nopython=True, nogil=True, parallel=True)
+    def add_horizontal_ends(amplitude_pings, count_pings, starts, head_end, tail_start, ends, amplitude_sums,
+                            count_sums):
+        """
+        Adds grid cells of heads and tails of horizontal slice windows (see split_windows; windows of each ping) of
+        each across-track column of each ping (in parallel over pings) to sums of whole blocks of windows.
+        """
+        num_pings, num_columns = amplitude_pings.shape[0], amplitude_pings.shape[2]
+        for ping in prange(num_pings):
+            for window in range(starts.shape[1]):
+                for row in range(starts[ping, window], head_end[ping, window]):
+                    for column in range(num_columns):
+                        amplitude_sums[ping, window, column] += amplitude_pings[ping, row, column]
+                        count_sums[ping, window, column] += count_pings[ping, row, column]
+                for row in range(tail_start[ping, window], ends[ping, window]):
+                    for column in range(num_columns):
+                        amplitude_sums[ping, window, column] += amplitude_pings[ping, row, column]
+                        count_sums[ping, window, column] += count_pings[ping, row, column]
+
+    def close_shmem(self):
+        """
+        Closes shared memory used by cache.
+        """
+        self.shmem_vertical_amplitude_cache.close()
+        self.shmem_vertical_count_cache.close()
+        self.shmem_horizontal_amplitude_cache.close()
+        self.shmem_horizontal_count_cache.close()
+        self.shmem_state.close()
+
+    def unlink_shmem(self):
+        """
+        Unlinks shared memory used by cache.
+        """
+        self.shmem_vertical_amplitude_cache.unlink()
+        self.shmem_vertical_count_cache.unlink()
+        self.shmem_horizontal_amplitude_cache.unlink()
+        self.shmem_horizontal_count_cache.unlink()
+        self.shmem_state.unlink()
@@ -7,11 +7,31 @@
 # Adapted from: https://github.com/eric-wieser/numpy_ringbuffer and
 # https://stackoverflow.com/questions/8908998/ring-buffer-with-numpy-ctypes
 
+# Processed ring buffers are double-buffered: two generations of buffers are kept in shared memory. Plotter appends to
+# the live generation, to which vertical_slice_buffer, horizontal_slice_buffer, timestamp_buffer_avg and
+# lat_lon_buffer_avg refer. When settings are changed, the other (back) generation is rebuilt in the background (see
+# ProcessedBufferWorker) while live ingest continues; generations are then swapped by flipping the generation index
+# held in shared memory. Readers must hold the lock (see get_lock) while resolving and viewing buffers.
+#
+# Each vertical and horizontal slice (see SliceRegistry) has its own ring buffer; vertical_slice_buffer and
+# horizontal_slice_buffer refer to those of the primary slices, vertical_slice_buffers and horizontal_slice_buffers to
+# those of all slices. All ring buffers share a counter, as each element holds the averages of one along-track group.
+# Data to be appended hold vertical and horizontal slices of each element as numpy arrays of shape
+# (elements x slices x grid cells).
+
 from multiprocessing import shared_memory
 import numpy as np
+from WaterColumnPlotter.Plotter.SliceRegistry import SliceRegistry
 
 
 class SharedRingBufferProcessed:
+
+    NUM_GENERATIONS = 2
+    # State (in shared memory): [0] = index of live generation; [1] = total number of elements appended to live
+    # generations (never reset; see num_appended)
+    GENERATION = 0
+    NUM_APPENDED = 1
+
     def __init__(self, settings, counter, full_flag, create_shmem=False):
 
         self.settings = settings
@@ -21,63 +41,153 @@ class SharedRingBufferProcessed:
         self.SIZE_BUFFER = settings['buffer_settings']['maxBufferSize_ping'] // self.ALONG_TRACK_PINGS
         self.FULL_SIZE_BUFFER = self.SIZE_BUFFER * 2
 
+        slice_registry = SliceRegistry(settings)
+        self.NUM_VERTICAL_SLICES = slice_registry.num_vertical_slices
+        self.NUM_HORIZONTAL_SLICES = slice_registry.num_horizontal_slices
+
         self.counter = counter  # multiprocessing.Value; all processed buffers protected with this lock
         self.full_flag = full_flag  # multiprocessing.Value
         self.create_shmem = create_shmem
 
         self.slice_dtype = np.dtype((np.float32, self.MAX_NUM_GRID_CELLS))
         self.timestamp_dtype = np.dtype(np.float64)
-        self.lat_lon_dtype = np.dtype((np.float32, 2))
+        self.lat_lon_dtype = np.dtype((np.float64, 2))
 
-        self.shmem_vertical_slice_buffer = None
-        self.shmem_horizontal_slice_buffer = None
-        self.shmem_timestamp_buffer_avg = None
-        self.shmem_lat_lon_buffer_avg = None
+        # By generation, then by slice:
+        self.shmem_vertical_slice_buffers = []
+        self.shmem_horizontal_slice_buffers = []
+        self.shmem_timestamp_buffers_avg = []
+        self.shmem_lat_lon_buffers_avg = []
+        self.shmem_state = None
 
         self._initialize_shmem()
 
-        self.vertical_slice_buffer = None
-        self.horizontal_slice_buffer = None
-        self.timestamp_buffer_avg = None
-        self.lat_lon_buffer_avg = None
+        # By generation, then by slice:
+        self.generation_vertical_slice_buffers = []
+        self.generation_horizontal_slice_buffers = []
+        self.generation_timestamp_buffers_avg = []
+        self.generation_lat_lon_buffers_avg = []
+        self.state = None
 
         self._initialize_buffers()
 
+        if self.create_shmem:
+            self.state[:] = [0, 0]
+
+        # Counter and full flag of back generation; local to the process (and thread) that rebuilds it
+        self.back_counter = 0
+        self.back_full_flag = False
+
+    @property
+    def generation(self):
+        return int(self.state[self.GENERATION])
+
+    @property
+    def num_appended(self):
+        """
+        Total number of elements appended (by append_all) to live generations since shared memory was created.
+        """
+        return int(self.state[self.NUM_APPENDED])
+
+    @property
+    def vertical_slice_buffer(self):
+        return self.generation_vertical_slice_buffers[self.generation][0]
+
+    @property
+    def horizontal_slice_buffer(self):
+        return self.generation_horizontal_slice_buffers[self.generation][0]
+
+    @property
+    def vertical_slice_buffers(self):
+        return self.generation_vertical_slice_buffers[self.generation]
+
+    @property
+    def horizontal_slice_buffers(self):
+        return self.generation_horizontal_slice_buffers[self.generation]
+
+    @property
+    def timestamp_buffer_avg(self):
+        return self.generation_timestamp_buffers_avg[self.generation]
+
+    @property
+    def lat_lon_buffer_avg(self):
+        return self.generation_lat_lon_buffers_avg[self.generation]
+
+    def _generation_buffers(self, generation):
+        """
+        :return: List of all ring buffers of generation: vertical slices, horizontal slices, timestamps and
+        latitudes / longitudes (in order of _split_data).
+        """
+        return (self.generation_vertical_slice_buffers[generation] +
+                self.generation_horizontal_slice_buffers[generation] +
+                [self.generation_timestamp_buffers_avg[generation], self.generation_lat_lon_buffers_avg[generation]])
+
+    def _split_data(self, vertical_data, horizontal_data, timestamp_data, lat_lon_data):
+        """
+        Splits data to be appended by ring buffer (in order of _generation_buffers); trims data to buffer length.
+        :param vertical_data: Vertical slices of elements (elements x vertical slices x grid cells).
+        :param horizontal_data: Horizontal slices of elements (elements x horizontal slices x grid cells).
+        :param timestamp_data: Timestamps of elements.
+        :param lat_lon_data: Latitudes and longitudes of elements.
+        :return: List of data of each ring buffer.
+        """
+        vertical_data = np.asarray(vertical_data)[-self.SIZE_BUFFER:]
+        horizontal_data = np.asarray(horizontal_data)[-self.SIZE_BUFFER:]
+        timestamp_data = timestamp_data[-self.SIZE_BUFFER:]
+        lat_lon_data = lat_lon_data[-self.SIZE_BUFFER:]
+
+        assert len(vertical_data) == len(horizontal_data) == len(timestamp_data) == len(lat_lon_data)
+        assert vertical_data.shape[1:2] == (self.NUM_VERTICAL_SLICES,) and \
+               horizontal_data.shape[1:2] == (self.NUM_HORIZONTAL_SLICES,)
+
+        return ([vertical_data[:, index] for index in range(self.NUM_VERTICAL_SLICES)] +
+                [horizontal_data[:, index] for index in range(self.NUM_HORIZONTAL_SLICES)] +
+                [timestamp_data, lat_lon_data])
+
     def _initialize_shmem(self):
         """
         Initialize shared memory where ring buffers are to be stored.
         """
         # Create shared memory in the backend: note create=False
-        self.shmem_vertical_slice_buffer = shared_memory.SharedMemory(name="shmem_vertical_slice_buffer",
-                                                                      create=self.create_shmem,
-                                                                      size=(self.SIZE_BUFFER * 2 *
-                                                                           self.slice_dtype.itemsize))
-        self.shmem_horizontal_slice_buffer = shared_memory.SharedMemory(name="shmem_horizontal_slice_buffer",
-                                                                        create=self.create_shmem,
-                                                                        size=(self.SIZE_BUFFER * 2 *
-                                                                             self.slice_dtype.itemsize))
-        self.shmem_timestamp_buffer_avg = shared_memory.SharedMemory(name="shmem_timestamp_buffer_avg",
-                                                                     create=self.create_shmem,
-                                                                     size=(self.SIZE_BUFFER * 2 *
-                                                                          self.timestamp_dtype.itemsize))
-        self.shmem_lat_lon_buffer_avg = shared_memory.SharedMemory(name="shmem_lat_lon_buffer_avg",
-                                                                   create=self.create_shmem,
-                                                                   size=(self.SIZE_BUFFER * 2 *
-                                                                        self.lat_lon_dtype.itemsize))
+        for generation in range(self.NUM_GENERATIONS):
+            # Generation 0 and primary slices keep original names
+            suffix = "_generation{}".format(generation) if generation > 0 else ""
+            self.shmem_vertical_slice_buffers.append([shared_memory.SharedMemory(
+                name="shmem_vertical_slice_buffer" + ("_slice{}".format(index) if index > 0 else "") + suffix,
+                create=self.create_shmem, size=self.SIZE_BUFFER * 2 * self.slice_dtype.itemsize)
+                for index in range(self.NUM_VERTICAL_SLICES)])
+            self.shmem_horizontal_slice_buffers.append([shared_memory.SharedMemory(
+                name="shmem_horizontal_slice_buffer" + ("_slice{}".format(index) if index > 0 else "") + suffix,
+                create=self.create_shmem, size=self.SIZE_BUFFER * 2 * self.slice_dtype.itemsize)
+                for index in range(self.NUM_HORIZONTAL_SLICES)])
+            self.shmem_timestamp_buffers_avg.append(shared_memory.SharedMemory(
+                name="shmem_timestamp_buffer_avg" + suffix, create=self.create_shmem,
+                size=self.SIZE_BUFFER * 2 * self.timestamp_dtype.itemsize))
+            self.shmem_lat_lon_buffers_avg.append(shared_memory.SharedMemory(
+                name="shmem_lat_lon_buffer_avg" + suffix, create=self.create_shmem,
+                size=self.SIZE_BUFFER * 2 * self.lat_lon_dtype.itemsize))
+        self.shmem_state = shared_memory.SharedMemory(name="shmem_processed_buffer_state", create=self.create_shmem,
+                                                      size=2 * np.dtype(np.int64).itemsize)
 
     def _initialize_buffers(self):
         """
         Initialize ring buffers at locations of shared memory.
         """
         # Create numpy arrays from the shared memory
-        self.vertical_slice_buffer = np.ndarray(shape=(self.SIZE_BUFFER * 2), dtype=self.slice_dtype,
-                                                buffer=self.shmem_vertical_slice_buffer.buf)
-        self.horizontal_slice_buffer = np.ndarray(shape=(self.SIZE_BUFFER * 2), dtype=self.slice_dtype,
-                                                  buffer=self.shmem_horizontal_slice_buffer.buf)
-        self.timestamp_buffer_avg = np.ndarray(shape=(self.SIZE_BUFFER * 2), dtype=self.timestamp_dtype,
-                                               buffer=self.shmem_timestamp_buffer_avg.buf)
-        self.lat_lon_buffer_avg = np.ndarray(shape=(self.SIZE_BUFFER * 2), dtype=self.lat_lon_dtype,
-                                             buffer=self.shmem_lat_lon_buffer_avg.buf)
+        for generation in range(self.NUM_GENERATIONS):
+            self.generation_vertical_slice_buffers.append([np.ndarray(
+                shape=(self.SIZE_BUFFER * 2), dtype=self.slice_dtype, buffer=shmem.buf)
+                for shmem in self.shmem_vertical_slice_buffers[generation]])
+            self.generation_horizontal_slice_buffers.append([np.ndarray(
+                shape=(self.SIZE_BUFFER * 2), dtype=self.slice_dtype, buffer=shmem.buf)
+                for shmem in self.shmem_horizontal_slice_buffers[generation]])
+            self.generation_timestamp_buffers_avg.append(np.ndarray(
+                shape=(self.SIZE_BUFFER * 2), dtype=self.timestamp_dtype,
+                buffer=self.shmem_timestamp_buffers_avg[generation].buf))
+            self.generation_lat_lon_buffers_avg.append(np.ndarray(
+                shape=(self.SIZE_BUFFER * 2), dtype=self.lat_lon_dtype,
+                buffer=self.shmem_lat_lon_buffers_avg[generation].buf))
+        self.state = np.ndarray(shape=2, dtype=np.int64, buffer=self.shmem_state.buf)
 
     def get_lock(self):
         """
@@ -101,8 +211,10 @@ class SharedRingBufferProcessed:
     def clear_and_append_all(self, vertical_data, horizontal_data, timestamp_data, lat_lon_data):
         """
         Clears all data from ring buffers by setting counter to zero; inserts new data into ring buffers.
-        :param vertical_data: A numpy matrix representing data to be appended to vertical_buffer.
-        :param horizontal_data: A numpy matrix representing data to be appended to horizontal_buffer.
+        :param vertical_data: A numpy array (elements x vertical slices x grid cells) representing data to be appended
+        to vertical slice buffers.
+        :param horizontal_data: A numpy array (elements x horizontal slices x grid cells) representing data to be
+        appended to horizontal slice buffers.
         :param timestamp_data: Data to be appended to timestamp_buffer_avg.
         :param lat_lon_data: Data to be appended to lat_lon_buffer_avg.
         """
@@ -111,9 +223,12 @@ class SharedRingBufferProcessed:
 
     def append_all(self, vertical_data, horizontal_data, timestamp_data, lat_lon_data):
         """
-        Appends data to all ring buffers: vertical_buffer, horizontal_buffer, timestamp_buffer_avg, lat_lon_buffer_avg.
-        :param vertical_data: A numpy matrix representing data to be appended to vertical_buffer.
-        :param horizontal_data: A numpy matrix representing data to be appended to horizontal_buffer.
+        Appends data to all ring buffers: vertical slice buffers, horizontal slice buffers, timestamp_buffer_avg,
+        lat_lon_buffer_avg.
+        :param vertical_data: A numpy array (elements x vertical slices x grid cells) representing data to be appended
+        to vertical slice buffers.
+        :param horizontal_data: A numpy array (elements x horizontal slices x grid cells) representing data to be
+        appended to horizontal slice buffers.
         :param timestamp_data: Data to be appended to timestamp_buffer_avg.
         :param lat_lon_data: Data to be appended to lat_lon_buffer_avg.
         """
@@ -121,27 +236,79 @@ class SharedRingBufferProcessed:
         print("counter value: ", self.counter.value)
         # Ensure data block to add does not exceed total buffer length; if so, trim
         print("append_all, vertical_data.shape before: ", len(vertical_data))
-        vertical_data = vertical_data[-self.SIZE_BUFFER:]
-        print("append_all, vertical_data.shape after: ", len(vertical_data))
-        horizontal_data = horizontal_data[-self.SIZE_BUFFER:]
-        timestamp_data = timestamp_data[-self.SIZE_BUFFER:]
-        lat_lon_data = lat_lon_data[-self.SIZE_BUFFER:]
-
-        assert len(vertical_data) == len(horizontal_data) == len(timestamp_data) == len(lat_lon_data)
-
-        n = len(vertical_data)
+        data = self._split_data(vertical_data, horizontal_data, timestamp_data, lat_lon_data)
+        n = len(data[-1])
+        print("append_all, vertical_data.shape after: ", n)
 
         # Compact buffers if length of data to be added exceeds remaining space in buffer
         with self.counter.get_lock():
             if self.remaining() < n:
                 self.compact_all()
 
-            self.vertical_slice_buffer[self.counter.value + self.SIZE_BUFFER:][:n] = vertical_data
-            self.horizontal_slice_buffer[self.counter.value + self.SIZE_BUFFER:][:n] = horizontal_data
-            self.timestamp_buffer_avg[self.counter.value + self.SIZE_BUFFER:][:n] = timestamp_data
-            self.lat_lon_buffer_avg[self.counter.value + self.SIZE_BUFFER:][:n] = lat_lon_data
+            for buffer, buffer_data in zip(self._generation_buffers(self.generation), data):
+                buffer[self.counter.value + self.SIZE_BUFFER:][:n] = buffer_data
 
             self.counter.value += n
+            self.state[self.NUM_APPENDED] += n
+
+    def clear_back(self):
+        """
+        Empties back generation (the generation that is not live) before it is rebuilt.
+        """
+        self.back_counter = 0
+        self.back_full_flag = False
+
+    def append_to_back(self, vertical_data, horizontal_data, timestamp_data, lat_lon_data):
+        """
+        Appends data to ring buffers of back generation. Back generation is accessed only by the thread that rebuilds
+        it, so lock is not required (but index of live generation must not change while it is held).
+        :param vertical_data: A numpy array (elements x vertical slices x grid cells) representing data to be appended
+        to vertical slice buffers.
+        :param horizontal_data: A numpy array (elements x horizontal slices x grid cells) representing data to be
+        appended to horizontal slice buffers.
+        :param timestamp_data: Data to be appended to timestamp buffer.
+        :param lat_lon_data: Data to be appended to latitude / longitude buffer.
+        """
+        self._append_to_back(self._split_data(vertical_data, horizontal_data, timestamp_data, lat_lon_data))
+
+    def append_recent_to_back(self, num_elements):
+        """
+        Appends most recent elements of live generation to back generation (for example, elements appended by Plotter
+        while back generation was rebuilt; see ProcessedBufferWorker). (Lock must be held.)
+        :param num_elements: Number of most recent elements to append.
+        """
+        if num_elements > 0:
+            self._append_to_back([self.view_recent_pings(buffer, num_elements)
+                                  for buffer in self._generation_buffers(self.generation)])
+
+    def _append_to_back(self, data):
+        """
+        Appends data to ring buffers of back generation.
+        :param data: List of data of each ring buffer (in order of _generation_buffers).
+        """
+        buffers = self._generation_buffers(1 - self.generation)
+        n = len(data[-1])
+
+        # Compact buffers if length of data to be added exceeds remaining space in buffer
+        if self.SIZE_BUFFER - self.back_counter < n:
+            for buffer in buffers:
+                buffer[:self.SIZE_BUFFER] = buffer[self.back_counter:][:self.SIZE_BUFFER]
+            self.back_full_flag = True
+            self.back_counter = 0
+
+        for buffer, buffer_data in zip(buffers, data):
+            buffer[self.back_counter + self.SIZE_BUFFER:][:n] = buffer_data
+        self.back_counter += n
+
+    def swap_generations(self):
+        """
+        Makes back generation live: flips generation index and exchanges counters and full flags of generations.
+        Readers and writers see either generation in full, as long as they hold lock.
+        """
+        with self.counter.get_lock():
+            self.back_counter, self.counter.value = self.counter.value, self.back_counter
+            self.back_full_flag, self.full_flag.value = self.full_flag.value, self.back_full_flag
+            self.state[self.GENERATION] = 1 - self.generation
 
     def remaining(self):
         """
@@ -190,10 +357,8 @@ class SharedRingBufferProcessed:
         """
         self.full_flag.value = True
         with self.counter.get_lock():
-            self.vertical_slice_buffer[:self.SIZE_BUFFER] = self.view(self.vertical_slice_buffer)
-            self.horizontal_slice_buffer[:self.SIZE_BUFFER] = self.view(self.horizontal_slice_buffer)
-            self.timestamp_buffer_avg[:self.SIZE_BUFFER] = self.view(self.timestamp_buffer_avg)
-            self.lat_lon_buffer_avg[:self.SIZE_BUFFER] = self.view(self.lat_lon_buffer_avg)
+            for buffer in self._generation_buffers(self.generation):
+                buffer[:self.SIZE_BUFFER] = self.view(buffer)
 
             self.counter.value = 0
 
@@ -212,16 +377,24 @@ class SharedRingBufferProcessed:
         """
         Closes shared memory used by raw and processed ring buffers.
         """
-        self.shmem_vertical_slice_buffer.close()
-        self.shmem_horizontal_slice_buffer.close()
-        self.shmem_timestamp_buffer_avg.close()
-        self.shmem_lat_lon_buffer_avg.close()
+        for generation in range(self.NUM_GENERATIONS):
+            for shmem in self.shmem_vertical_slice_buffers[generation]:
+                shmem.close()
+            for shmem in self.shmem_horizontal_slice_buffers[generation]:
+                shmem.close()
+            self.shmem_timestamp_buffers_avg[generation].close()
+            self.shmem_lat_lon_buffers_avg[generation].close()
+        self.shmem_state.close()
 
     def unlink_shmem(self):
         """
         Unlinks shared memory used by raw and processed ring buffers.
         """
-        self.shmem_vertical_slice_buffer.unlink()
-        self.shmem_horizontal_slice_buffer.unlink()
-        self.shmem_timestamp_buffer_avg.unlink()
-        self.shmem_lat_lon_buffer_avg.unlink()
+        for generation in range(self.NUM_GENERATIONS):
+            for shmem in self.shmem_vertical_slice_buffers[generation]:
+                shmem.unlink()
+            for shmem in self.shmem_horizontal_slice_buffers[generation]:
+                shmem.unlink()
+            self.shmem_timestamp_buffers_avg[generation].unlink()
+            self.shmem_lat_lon_buffers_avg[generation].unlink()
+        self.shmem_state.unlink()
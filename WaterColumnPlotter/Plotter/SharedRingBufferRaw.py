@@ -7,9 +7,14 @@
 # Adapted from: https://github.com/eric-wieser/numpy_ringbuffer and
 # https://stackoverflow.com/questions/8908998/ring-buffer-with-numpy-ctypes
 
+import logging
 from multiprocessing import shared_memory
-from numba import jit
+from numba import jit, prange
 import numpy as np
+import warnings
+from WaterColumnPlotter.Plotter.KernelThreads import KernelThreads
+
+logger = logging.getLogger(__name__)
 
 
 class SharedRingBufferRaw:
@@ -26,38 +31,196 @@ class SharedRingBufferRaw:
         self.full_flag = full_flag  # multiprocessing.Value
         self.create_shmem = create_shmem
 
-        self.amplitude_dtype = np.dtype((np.float32, (self.MAX_NUM_GRID_CELLS, self.MAX_NUM_GRID_CELLS)))
+        # Amplitude, count and bottom buffers are kept for each bin size level (see KongsbergDGProcess); timestamp and
+        # latitude / longitude buffers are common to all levels. amplitude_buffer, count_buffer and bottom_buffer
+        # refer to buffers of selected level (see select_level).
+        self.NUM_LEVELS = self.settings['advanced_settings']['binSizeLevels']
+        self.level = 0
+
+        # Amplitude sums are stored as float32 (dB or linear intensity); or, when 'precision' (see advanced settings)
+        # is 'int32', as exact integer sums in units of 0.5 dB, scaled by AMPLITUDE_SCALE when read.
+        if self.settings['advanced_settings']['precision'] == "int32":
+            self.AMPLITUDE_SCALE = 0.5
+            self.amplitude_dtype = np.dtype((np.int32, (self.MAX_NUM_GRID_CELLS, self.MAX_NUM_GRID_CELLS)))
+        else:
+            self.AMPLITUDE_SCALE = 1.0
+            self.amplitude_dtype = np.dtype((np.float32, (self.MAX_NUM_GRID_CELLS, self.MAX_NUM_GRID_CELLS)))
         self.count_dtype = np.dtype((np.uint16, (self.MAX_NUM_GRID_CELLS, self.MAX_NUM_GRID_CELLS)))
         self.timestamp_dtype = np.dtype(np.float64)
-        self.lat_lon_dtype = np.dtype((np.float32, 2))
+        self.lat_lon_dtype = np.dtype((np.float64, 2))
+        self.bottom_dtype = np.dtype((np.float32, self.MAX_NUM_GRID_CELLS))
+
+        # Rows at top of grids allotted to max heave, at each bin size level (see heave_rows). Each element records
+        # rows with which its ping was binned; readers offset rows of each ping by difference between current rows
+        # and its own (see get_row_offsets), so that a change of max heave is a single write (see set_heave_rows)
+        # rather than a shift of every buffered grid.
+        self.heave_rows_dtype = np.dtype((np.int32, self.NUM_LEVELS))
 
-        self.shmem_amplitude_buffer = None
-        self.shmem_count_buffer = None
+        self.shmem_amplitude_buffers = []
+        self.shmem_count_buffers = []
         self.shmem_timestamp_buffer = None
         self.shmem_lat_lon_buffer = None
+        self.shmem_bottom_buffers = []
+        self.shmem_heave_rows_buffer = None
+        self.shmem_heave_rows = None
+        self.shmem_num_appended = None
 
         self._initialize_shmem()
 
-        self.amplitude_buffer = None
-        self.count_buffer = None
+        self.level_amplitude_buffers = []
+        self.level_count_buffers = []
         self.timestamp_buffer = None
         self.lat_lon_buffer = None
+        self.level_bottom_buffers = []
+        self.heave_rows_buffer = None
+        # Current rows allotted to max heave at each level (see set_heave_rows)
+        self.heave_rows_state = None
+        # Total number of pings ever appended (never reset; see num_appended)
+        self.num_appended_buffer = None
 
         self._initialize_buffers()
 
+        if self.create_shmem:
+            self.num_appended_buffer[0] = 0
+            self.heave_rows_state[:] = self.heave_rows(self.settings['processing_settings']['maxHeave_m'],
+                                                       self.settings['processing_settings']['binSize_m'],
+                                                       self.NUM_LEVELS)
+            logger.info("Raw ring buffers: {} bin size level(s); {:.1f} MB per level; {:.1f} MB in total."
+                        .format(self.NUM_LEVELS, self.get_level_nbytes() / 1e6, self.get_nbytes() / 1e6))
+
+    @property
+    def amplitude_buffer(self):
+        return self.level_amplitude_buffers[self.level]
+
+    @property
+    def count_buffer(self):
+        return self.level_count_buffers[self.level]
+
+    @property
+    def bottom_buffer(self):
+        return self.level_bottom_buffers[self.level]
+
+    @property
+    def num_appended(self):
+        """
+        Total number of pings appended since shared memory was created; this is not reset when buffers are cleared.
+        Element i of ring buffer (oldest first) is ping number num_appended - get_num_elements_in_buffer() + i.
+        """
+        return int(self.num_appended_buffer[0])
+
+    def get_level_nbytes(self):
+        """
+        Calculates size of shared memory used by amplitude, count and bottom buffers of a single bin size level;
+        this is the cost of each additional level.
+        :return: Size (bytes) of buffers of a single level.
+        """
+        return self.FULL_SIZE_BUFFER * (self.amplitude_dtype.itemsize + self.count_dtype.itemsize +
+                                        self.bottom_dtype.itemsize)
+
+    def get_nbytes(self):
+        """
+        Calculates size of shared memory used by all raw ring buffers.
+        :return: Size (bytes) of all raw ring buffers.
+        """
+        return self.NUM_LEVELS * self.get_level_nbytes() + \
+            self.FULL_SIZE_BUFFER * (self.timestamp_dtype.itemsize + self.lat_lon_dtype.itemsize +
+                                     self.heave_rows_dtype.itemsize)
+
+    @staticmethod
+    def bin_size_level(bin_size, base_bin_size, num_levels):
+        """
+        Finds bin size level (if any) at which pings are binned for given bin size: level k has bin size of
+        base_bin_size * 2 ** k. Bin sizes are compared to two decimal places.
+        :param bin_size: Bin size (m).
+        :param base_bin_size: Bin size (m) of level 0.
+        :param num_levels: Number of levels.
+        :return: Level, or None if no level has given bin size.
+        """
+        for level in range(num_levels):
+            if round(round(base_bin_size, 2) * 2 ** level, 2) == round(bin_size, 2):
+                return level
+        return None
+
+    @staticmethod
+    def heave_rows(max_heave, base_bin_size, num_levels):
+        """
+        Calculates number of rows at top of grids allotted to max heave at each bin size level, as when pings are
+        binned (see KongsbergDGProcess.grid_geometry).
+        :param max_heave: Max heave (m).
+        :param base_bin_size: Bin size (m) of level 0.
+        :param num_levels: Number of levels.
+        :return: Numpy array of number of rows at each level.
+        """
+        return np.array([int(round(max_heave, 2) / round(round(base_bin_size, 2) * 2 ** level, 2))
+                         for level in range(num_levels)], dtype=np.int32)
+
+    def set_heave_rows(self, heave_rows):
+        """
+        Sets rows allotted to max heave at each level, for example, when max heave is changed. Rows of pings binned
+        with other rows are offset when read (see get_row_offsets); buffered grids are not modified.
+        :param heave_rows: Number of rows at each level (see heave_rows).
+        """
+        with self.counter.get_lock():
+            self.heave_rows_state[:] = heave_rows
+
+    def get_heave_rows(self):
+        """
+        :return: Copy of current rows allotted to max heave at each level.
+        """
+        with self.counter.get_lock():
+            return self.heave_rows_state.copy()
+
+    def get_row_offsets(self, start=0, stop=None):
+        """
+        Offsets (at selected level) by which rows of elements are shifted down when read: difference between current
+        rows allotted to max heave and those with which each element was binned. Row r of a grid as read is row
+        r - offset of grid as buffered; rows outside grid are empty.
+        :param start: Index of first element (oldest element is 0).
+        :param stop: Index after last element; default is number of elements in ring buffer.
+        :return: Numpy array (int64) of offset of each element.
+        """
+        with self.counter.get_lock():
+            heave_rows = self.view_buffer_elements(self.heave_rows_buffer)[start:stop, self.level]
+            return self.heave_rows_state[self.level] - heave_rows.astype(np.int64)
+
+    def get_row_offset(self, element):
+        """
+        :param element: Index of element (oldest element is 0).
+        :return: Offset (see get_row_offsets) of element.
+        """
+        with self.counter.get_lock():
+            return int(self.heave_rows_state[self.level]) - int(self.view_element(self.heave_rows_buffer,
+                                                                                  element)[self.level])
+
+    def select_level(self, level):
+        """
+        Selects bin size level to which amplitude_buffer, count_buffer and bottom_buffer refer. Note that
+        selection is local to this object (each process selects level with its own object).
+        :param level: Bin size level.
+        """
+        with self.counter.get_lock():
+            self.level = level
+
     def _initialize_shmem(self):
         """
         Initialize shared memory where ring buffers are to be stored.
         """
         # Create shared memory in the backend: note create=False
-        self.shmem_amplitude_buffer = shared_memory.SharedMemory(name="shmem_amplitude_buffer",
-                                                                 create=self.create_shmem,
-                                                                 size=(self.SIZE_BUFFER * 2 *
-                                                                       self.amplitude_dtype.itemsize))
-        self.shmem_count_buffer = shared_memory.SharedMemory(name="shmem_count_buffer",
-                                                             create=self.create_shmem,
-                                                             size=self.SIZE_BUFFER * 2 *
-                                                                  self.count_dtype.itemsize)
+        for level in range(self.NUM_LEVELS):
+            # Level 0 keeps original names
+            suffix = "_level{}".format(level) if level > 0 else ""
+            self.shmem_amplitude_buffers.append(shared_memory.SharedMemory(name="shmem_amplitude_buffer" + suffix,
+                                                                           create=self.create_shmem,
+                                                                           size=(self.SIZE_BUFFER * 2 *
+                                                                                 self.amplitude_dtype.itemsize)))
+            self.shmem_count_buffers.append(shared_memory.SharedMemory(name="shmem_count_buffer" + suffix,
+                                                                       create=self.create_shmem,
+                                                                       size=self.SIZE_BUFFER * 2 *
+                                                                            self.count_dtype.itemsize))
+            self.shmem_bottom_buffers.append(shared_memory.SharedMemory(name="shmem_bottom_buffer" + suffix,
+                                                                        create=self.create_shmem,
+                                                                        size=self.SIZE_BUFFER * 2 *
+                                                                             self.bottom_dtype.itemsize))
         self.shmem_timestamp_buffer = shared_memory.SharedMemory(name="shmem_timestamp_buffer",
                                                                  create=self.create_shmem,
                                                                  size=self.SIZE_BUFFER * 2 *
@@ -66,20 +229,35 @@ class SharedRingBufferRaw:
                                                                create=self.create_shmem,
                                                                size=self.SIZE_BUFFER * 2 *
                                                                     self.lat_lon_dtype.itemsize)
+        self.shmem_heave_rows_buffer = shared_memory.SharedMemory(name="shmem_heave_rows_buffer",
+                                                                  create=self.create_shmem,
+                                                                  size=self.SIZE_BUFFER * 2 *
+                                                                       self.heave_rows_dtype.itemsize)
+        self.shmem_heave_rows = shared_memory.SharedMemory(name="shmem_raw_heave_rows", create=self.create_shmem,
+                                                           size=self.heave_rows_dtype.itemsize)
+        self.shmem_num_appended = shared_memory.SharedMemory(name="shmem_raw_num_appended", create=self.create_shmem,
+                                                             size=np.dtype(np.int64).itemsize)
 
     def _initialize_buffers(self):
         """
         Initialize ring buffers at locations of shared memory.
         """
         # Create numpy arrays from the shared memory
-        self.amplitude_buffer = np.ndarray(shape=self.SIZE_BUFFER * 2, dtype=self.amplitude_dtype,
-                                           buffer=self.shmem_amplitude_buffer.buf)
-        self.count_buffer = np.ndarray(shape=self.SIZE_BUFFER * 2, dtype=self.count_dtype,
-                                       buffer=self.shmem_count_buffer.buf)
+        for level in range(self.NUM_LEVELS):
+            self.level_amplitude_buffers.append(np.ndarray(shape=self.SIZE_BUFFER * 2, dtype=self.amplitude_dtype,
+                                                           buffer=self.shmem_amplitude_buffers[level].buf))
+            self.level_count_buffers.append(np.ndarray(shape=self.SIZE_BUFFER * 2, dtype=self.count_dtype,
+                                                       buffer=self.shmem_count_buffers[level].buf))
+            self.level_bottom_buffers.append(np.ndarray(shape=self.SIZE_BUFFER * 2, dtype=self.bottom_dtype,
+                                                        buffer=self.shmem_bottom_buffers[level].buf))
         self.timestamp_buffer = np.ndarray(shape=self.SIZE_BUFFER * 2, dtype=self.timestamp_dtype,
                                            buffer=self.shmem_timestamp_buffer.buf)
         self.lat_lon_buffer = np.ndarray(shape=self.SIZE_BUFFER * 2, dtype=self.lat_lon_dtype,
                                          buffer=self.shmem_lat_lon_buffer.buf)
+        self.heave_rows_buffer = np.ndarray(shape=self.SIZE_BUFFER * 2, dtype=self.heave_rows_dtype,
+                                            buffer=self.shmem_heave_rows_buffer.buf)
+        self.heave_rows_state = np.ndarray(shape=self.NUM_LEVELS, dtype=np.int32, buffer=self.shmem_heave_rows.buf)
+        self.num_appended_buffer = np.ndarray(shape=1, dtype=np.int64, buffer=self.shmem_num_appended.buf)
 
     def get_lock(self):
         """
@@ -96,13 +274,23 @@ class SharedRingBufferRaw:
             self.counter.value = 0
             self.full_flag.value = False
 
-    def append_all(self, amplitude_data, count_data, timestamp_data, lat_lon_data):
+    def append_all(self, amplitude_data, count_data, timestamp_data, lat_lon_data, bottom_data,
+                   level_amplitude_data=None, level_count_data=None, level_bottom_data=None, heave_row_data=None):
         """
-        Appends data to all ring buffers: amplitude_buffer, count_buffer, timestamp_buffer, lat_lon_buffer.
+        Appends data to all ring buffers: amplitude_buffer, count_buffer, timestamp_buffer, lat_lon_buffer,
+        bottom_buffer.
         :param amplitude_data: A numpy matrix representing data to be appended to amplitude_buffer.
         :param count_data: A numpy matrix representing data to be appended to count_buffer.
         :param timestamp_data: Data to be appended to timestamp_buffer.
         :param lat_lon_data: Data to be appended to lat_lon_buffer.
+        :param bottom_data: A numpy array representing data to be appended to bottom_buffer.
+        :param level_amplitude_data: Optional list, for each bin size level above 0, of data to be appended to
+        amplitude buffer of that level; amplitude_data, count_data and bottom_data are then appended to buffers of
+        level 0 (rather than to those of selected level). Buffers of levels for which no data is given are zeroed.
+        :param level_count_data: Optional list of data to be appended to count buffer of each level above 0.
+        :param level_bottom_data: Optional list of data to be appended to bottom buffer of each level above 0.
+        :param heave_row_data: Optional data (elements x levels) of rows allotted to max heave with which each element
+        was binned (see heave_rows); default is current rows.
         """
         # "This is an O(n) operation."
 
@@ -111,22 +299,88 @@ class SharedRingBufferRaw:
         count_data = count_data[-self.SIZE_BUFFER:]
         timestamp_data = timestamp_data[-self.SIZE_BUFFER:]
         lat_lon_data = lat_lon_data[-self.SIZE_BUFFER:]
+        bottom_data = bottom_data[-self.SIZE_BUFFER:]
 
-        assert len(amplitude_data) == len(count_data) == len(timestamp_data) == len(lat_lon_data)
+        assert len(amplitude_data) == len(count_data) == len(timestamp_data) == len(lat_lon_data) == len(bottom_data)
 
         n = len(amplitude_data)
+        if level_amplitude_data is not None:
+            level_amplitude_data = [data[-n:] for data in level_amplitude_data]
+            level_count_data = [data[-n:] for data in level_count_data]
+            level_bottom_data = [data[-n:] for data in level_bottom_data]
+        if heave_row_data is not None:
+            heave_row_data = heave_row_data[-n:]
 
-        # Compact buffers if length of data to be added exceeds remaining space in buffer
         with self.counter.get_lock():
-            if self.remaining() < n:
-                self.compact_all()
+            # Elements are appended up to end of buffers before buffers are compacted (rather than compacting as soon
+            # as length of data to be added exceeds remaining space), so that slots of elements do not change when
+            # several elements are appended at once (see get_slot_indices)
+            start = 0
+            while start < n:
+                if self.remaining() == 0:
+                    self.compact_all()
+                stop = start + min(n - start, self.remaining())
+                self._append_block(start, stop, amplitude_data, count_data, timestamp_data, lat_lon_data, bottom_data,
+                                   level_amplitude_data, level_count_data, level_bottom_data, heave_row_data)
+                start = stop
+
+    def _append_block(self, start, stop, amplitude_data, count_data, timestamp_data, lat_lon_data, bottom_data,
+                      level_amplitude_data, level_count_data, level_bottom_data, heave_row_data):
+        """
+        Called by append_all. Appends elements start to stop of data (see append_all) to ring buffers, which must have
+        room for them. (Lock must be held.)
+        """
+        count = stop - start
+        if level_amplitude_data is None:
+            self.amplitude_buffer[self.counter.value + self.SIZE_BUFFER:][:count] = amplitude_data[start:stop]
+            self.count_buffer[self.counter.value + self.SIZE_BUFFER:][:count] = count_data[start:stop]
+            self.bottom_buffer[self.counter.value + self.SIZE_BUFFER:][:count] = bottom_data[start:stop]
+        else:
+            self.level_amplitude_buffers[0][self.counter.value + self.SIZE_BUFFER:][:count] = amplitude_data[start:stop]
+            self.level_count_buffers[0][self.counter.value + self.SIZE_BUFFER:][:count] = count_data[start:stop]
+            self.level_bottom_buffers[0][self.counter.value + self.SIZE_BUFFER:][:count] = bottom_data[start:stop]
+            for level in range(1, self.NUM_LEVELS):
+                if level - 1 < len(level_amplitude_data):
+                    self.level_amplitude_buffers[level][self.counter.value + self.SIZE_BUFFER:][:count] = \
+                        level_amplitude_data[level - 1][start:stop]
+                    self.level_count_buffers[level][self.counter.value + self.SIZE_BUFFER:][:count] = \
+                        level_count_data[level - 1][start:stop]
+                    self.level_bottom_buffers[level][self.counter.value + self.SIZE_BUFFER:][:count] = \
+                        level_bottom_data[level - 1][start:stop]
+                else:
+                    self.level_amplitude_buffers[level][self.counter.value + self.SIZE_BUFFER:][:count] = 0
+                    self.level_count_buffers[level][self.counter.value + self.SIZE_BUFFER:][:count] = 0
+                    self.level_bottom_buffers[level][self.counter.value + self.SIZE_BUFFER:][:count] = np.nan
+        self.timestamp_buffer[self.counter.value + self.SIZE_BUFFER:][:count] = timestamp_data[start:stop]
+        self.lat_lon_buffer[self.counter.value + self.SIZE_BUFFER:][:count] = lat_lon_data[start:stop]
+        if heave_row_data is None:
+            self.heave_rows_buffer[self.counter.value + self.SIZE_BUFFER:][:count] = self.heave_rows_state
+        else:
+            self.heave_rows_buffer[self.counter.value + self.SIZE_BUFFER:][:count] = heave_row_data[start:stop]
 
-            self.amplitude_buffer[self.counter.value + self.SIZE_BUFFER:][:n] = amplitude_data
-            self.count_buffer[self.counter.value + self.SIZE_BUFFER:][:n] = count_data
-            self.timestamp_buffer[self.counter.value + self.SIZE_BUFFER:][:n] = timestamp_data
-            self.lat_lon_buffer[self.counter.value + self.SIZE_BUFFER:][:n] = lat_lon_data
+        self.counter.value += count
+        self.num_appended_buffer[0] += count
 
-            self.counter.value += n
+    def replace_elements(self, start, level_amplitude_data, level_count_data, level_bottom_data, heave_rows):
+        """
+        Replaces binned data (amplitudes, counts and bottom depths, at every bin size level) of elements already in
+        ring buffers, for example, when pings are re-binned for new settings (see ProcessedBufferWorker); timestamps
+        and latitudes / longitudes are kept.
+        :param start: Index of first element to replace (oldest element is 0).
+        :param level_amplitude_data: Numpy array (elements x levels x grid cells x grid cells) of amplitudes.
+        :param level_count_data: Numpy array (elements x levels x grid cells x grid cells) of counts.
+        :param level_bottom_data: Numpy array (elements x levels x grid cells) of bottom depths.
+        :param heave_rows: Rows allotted to max heave at each level (see heave_rows) with which elements were binned.
+        """
+        n = len(level_amplitude_data)
+        with self.counter.get_lock():
+            for level in range(self.NUM_LEVELS):
+                self.view_buffer_elements(self.level_amplitude_buffers[level])[start:start + n] = \
+                    level_amplitude_data[:, level]
+                self.view_buffer_elements(self.level_count_buffers[level])[start:start + n] = level_count_data[:, level]
+                self.view_buffer_elements(self.level_bottom_buffers[level])[start:start + n] = \
+                    level_bottom_data[:, level]
+            self.view_buffer_elements(self.heave_rows_buffer)[start:start + n] = heave_rows
 
     def remaining(self):
         """
@@ -156,6 +410,16 @@ class SharedRingBufferRaw:
             else:
                 return buffer[self.counter.value:][:self.SIZE_BUFFER][-self.counter.value:]
 
+    def view_element(self, buffer, element):
+        """
+        Returns a given element of a given buffer, as view_buffer_elements(buffer)[element], without slicing whole
+        buffer. This is always an O(1) operation.
+        :param buffer: The buffer from which to return a view.
+        :param element: Index of element (oldest element is 0).
+        """
+        with self.counter.get_lock():
+            return buffer[self.counter.value + self.SIZE_BUFFER - self.get_num_elements_in_buffer() + element]
+
     def view_recent_pings(self, buffer, pings):
         """
         Accesses the most recent specified number of elements from the specified ring buffer.
@@ -176,24 +440,62 @@ class SharedRingBufferRaw:
         with self.counter.get_lock():
             temp_amp = self.view_recent_pings(self.amplitude_buffer, pings)
             temp_cnt = self.view_recent_pings(self.count_buffer, pings)
+            row_offsets = self.get_row_offsets(-len(temp_amp)) if len(temp_amp) > 0 else np.zeros(0, dtype=np.int64)
 
             # "Collapse" arrays by adding every self.num_pings_to_average so that
             # temp_amp = np.sum(temp_amp, axis=0)
             # temp_cnt = np.sum(temp_cnt, axis=0)
-            temp_amp, temp_cnt = self.sum(temp_amp, temp_cnt)
+            with KernelThreads.launch():
+                temp_amp, temp_cnt = self.sum(temp_amp, temp_cnt, row_offsets)
 
             # Ignore divide by zero warnings. Division by zero results in NaN, which is what we want.
             with np.errstate(divide='ignore', invalid='ignore'):
-                temp_avg = temp_amp / temp_cnt
+                temp_avg = temp_amp * self.AMPLITUDE_SCALE / temp_cnt
+
+            return temp_avg
+
+    def view_recent_pings_as_bottom(self, pings):
+        """
+        Averages detected bottom depths of the given number of recent entries to create bottom polyline for pie display.
+        :param pings: Number of recent pings to average.
+        :return: A numpy array of average depth (in bins) of detected bottom in each across-track bin;
+        NaN where bottom was not detected in any of the given entries.
+        """
+        with self.counter.get_lock():
+            temp_bottom = self.view_recent_pings(self.bottom_buffer, pings)
+            if len(temp_bottom) > 0:
+                # Depths (in bins) are offset as rows are (see get_row_offsets)
+                temp_bottom = temp_bottom + self.get_row_offsets(-len(temp_bottom))[:, np.newaxis]
+
+            # Ignore mean of empty slice warnings. All-NaN columns result in NaN, which is what we want.
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", category=RuntimeWarning)
+                temp_avg = np.nanmean(temp_bottom, axis=0)
 
             return temp_avg
 
     @staticmethod
-    @jit(nopython=True)
-    def sum(temp_amp, temp_cnt):
-        temp_amp = np.sum(temp_amp, axis=0)
-        temp_cnt = np.sum(temp_cnt, axis=0)
-        return temp_amp, temp_cnt
+    @jit(nopython=True, nogil=True, parallel=True)
+    def sum(temp_amp, temp_cnt, row_offsets):
+        """
+        Sums pings, in parallel over depth rows (see KernelThreads). Amplitudes are accumulated in float64.
+        :param temp_amp: Numpy array of amplitude matrices of pings.
+        :param temp_cnt: Numpy array of count matrices of pings.
+        :param row_offsets: Numpy array of row offset of each ping (see get_row_offsets).
+        :return: Numpy matrices of sums of amplitudes (float64) and of counts (int64).
+        """
+        num_pings, num_rows, num_columns = temp_amp.shape
+        amplitude_sum = np.zeros((num_rows, num_columns), dtype=np.float64)
+        count_sum = np.zeros((num_rows, num_columns), dtype=np.int64)
+        for row in prange(num_rows):
+            for ping in range(num_pings):
+                source_row = row - row_offsets[ping]
+                if source_row < 0 or source_row >= num_rows:
+                    continue
+                for column in range(num_columns):
+                    amplitude_sum[row, column] += temp_amp[ping, source_row, column]
+                    count_sum[row, column] += temp_cnt[ping, source_row, column]
+        return amplitude_sum, count_sum
 
     def compact_all(self):
         """
@@ -203,10 +505,13 @@ class SharedRingBufferRaw:
         """
         self.full_flag.value = True
         with self.counter.get_lock():
-            self.amplitude_buffer[:self.SIZE_BUFFER] = self.view(self.amplitude_buffer)
-            self.count_buffer[:self.SIZE_BUFFER] = self.view(self.count_buffer)
+            for level in range(self.NUM_LEVELS):
+                self.level_amplitude_buffers[level][:self.SIZE_BUFFER] = self.view(self.level_amplitude_buffers[level])
+                self.level_count_buffers[level][:self.SIZE_BUFFER] = self.view(self.level_count_buffers[level])
+                self.level_bottom_buffers[level][:self.SIZE_BUFFER] = self.view(self.level_bottom_buffers[level])
             self.timestamp_buffer[:self.SIZE_BUFFER] = self.view(self.timestamp_buffer)
             self.lat_lon_buffer[:self.SIZE_BUFFER] = self.view(self.lat_lon_buffer)
+            self.heave_rows_buffer[:self.SIZE_BUFFER] = self.view(self.heave_rows_buffer)
 
             self.counter.value = 0
 
@@ -221,20 +526,56 @@ class SharedRingBufferRaw:
             with self.counter.get_lock():
                 return self.counter.value
 
+    def get_slot_indices(self):
+        """
+        Slot (index modulo SIZE_BUFFER) of each element in ring buffer, oldest first. Buffers are compacted only when
+        counter reaches SIZE_BUFFER (see append_all), so slots of elements do not change when buffers are compacted;
+        per-ping data kept alongside ring buffers can be indexed by slot (see SharedProjectionCache).
+        :return: Numpy array of slots.
+        """
+        with self.counter.get_lock():
+            num_elements = self.get_num_elements_in_buffer()
+            return (self.counter.value - num_elements + np.arange(num_elements)) % self.SIZE_BUFFER
+
+    def get_newest_slot(self):
+        """
+        :return: Slot (see get_slot_indices) of most recently appended element in ring buffer.
+        """
+        with self.counter.get_lock():
+            return (self.counter.value - 1) % self.SIZE_BUFFER
+
+    def get_slot(self, element):
+        """
+        :param element: Index of element in ring buffer (oldest element is 0).
+        :return: Slot (see get_slot_indices) of element; unlike get_slot_indices, without building array of slots.
+        """
+        with self.counter.get_lock():
+            return (self.counter.value - self.get_num_elements_in_buffer() + element) % self.SIZE_BUFFER
+
     def close_shmem(self):
         """
         Closes shared memory used by raw and processed ring buffers.
         """
-        self.shmem_amplitude_buffer.close()
-        self.shmem_count_buffer.close()
+        for level in range(self.NUM_LEVELS):
+            self.shmem_amplitude_buffers[level].close()
+            self.shmem_count_buffers[level].close()
+            self.shmem_bottom_buffers[level].close()
         self.shmem_timestamp_buffer.close()
         self.shmem_lat_lon_buffer.close()
+        self.shmem_heave_rows_buffer.close()
+        self.shmem_heave_rows.close()
+        self.shmem_num_appended.close()
 
     def unlink_shmem(self):
         """
         Unlinks shared memory used by raw and processed ring buffers.
         """
-        self.shmem_amplitude_buffer.unlink()
-        self.shmem_count_buffer.unlink()
+        for level in range(self.NUM_LEVELS):
+            self.shmem_amplitude_buffers[level].unlink()
+            self.shmem_count_buffers[level].unlink()
+            self.shmem_bottom_buffers[level].unlink()
         self.shmem_timestamp_buffer.unlink()
         self.shmem_lat_lon_buffer.unlink()
+        self.shmem_heave_rows_buffer.unlink()
+        self.shmem_heave_rows.unlink()
+        self.shmem_num_appended.unlink()
@@ -0,0 +1,194 @@
+# Lynette Davis
+# ldavis@ccom.unh.edu
+# Center for Coastal and Ocean Mapping
+# University of New Hampshire
+# October 2026
+
+# Description: Compact store of raw samples of pings in shared memory ('sampleStore' in advanced settings). For each
+# ping in the raw ring buffer, a record of beam geometry and raw (int8) samples above the bottom is kept, so that
+# buffered pings can be re-binned when bin size is changed (see ProcessedBufferWorker), rather than discarded. A
+# record is roughly the size of the samples of the #MWC record, a fraction of the size of the binned grids of a ping.
+# Records are packed by the sonar process (see KongsbergDGProcess) and carried with pie records; they are written by
+# Plotter as pings are added to the raw ring buffer, and are protected by the raw ring buffer lock. Records are
+# written one after another into an arena of 'sampleStoreSize_MB' megabytes, wrapping around at its end, and are
+# indexed by slot (see SharedRingBufferRaw.get_slot_indices). When the arena is too small to hold the records of all
+# pings in the raw ring buffer, records of the oldest pings are overwritten (and those pings can no longer be
+# re-binned).
+#
+# Record layout: header (HEADER_DTYPE); beam table (num_beams x BEAM_DTYPE); samples of each beam, concatenated.
+
+import logging
+from multiprocessing import shared_memory
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class SharedSampleStore:
+
+    # Geometry is stored in float64, so that it is exact with any precision policy ('precision' in advanced settings)
+    # and pings are re-binned exactly as they were binned
+    HEADER_DTYPE = np.dtype([('num_beams', np.int32), ('heave', np.float64), ('range_scale', np.float64),
+                             ('tvg_offset_db', np.float64)])
+    # detected_range: range (in samples) of detected bottom; num_samples: number of samples stored
+    BEAM_DTYPE = np.dtype([('sin_beam', np.float64), ('cos_beam_tilt', np.float64), ('detected_range', np.float64),
+                           ('num_samples', np.int32)])
+    # Index of each slot: ping number (see SharedRingBufferRaw.num_appended; -1 if there is no record), position
+    # of record (in bytes written to arena since shared memory was created), and size of record (bytes)
+    ENTRY_DTYPE = np.dtype([('ping', np.int64), ('position', np.int64), ('size', np.int64)])
+
+    def __init__(self, settings, create_shmem=False):
+
+        self.settings = settings
+
+        self.SIZE_BUFFER = settings['buffer_settings']['maxBufferSize_ping']
+        self.SIZE_ARENA = int(settings['advanced_settings']['sampleStoreSize_MB'] * 1e6)
+        self.create_shmem = create_shmem
+
+        self.shmem_arena = None
+        self.shmem_entries = None
+        self.shmem_state = None
+
+        self._initialize_shmem()
+
+        self.arena = None
+        self.entries = None
+        # Number of bytes written to arena since shared memory was created (never reset)
+        self.state = None
+
+        self._initialize_buffers()
+
+        if self.create_shmem:
+            self.entries['ping'] = -1
+            self.state[0] = 0
+            logger.info("Sample store: {:.1f} MB.".format(self.SIZE_ARENA / 1e6))
+
+    @staticmethod
+    def enabled(settings):
+        """
+        Sample store is not available with ray tracing: pings are re-binned with straight-line geometry.
+        :param settings: Settings dictionary.
+        :return: True if sample store is enabled in advanced settings.
+        """
+        return settings['advanced_settings']['sampleStore'] and not settings['advanced_settings']['rayTracing']
+
+    def _initialize_shmem(self):
+        """
+        Initialize shared memory where store is to be kept.
+        """
+        self.shmem_arena = shared_memory.SharedMemory(name="shmem_sample_store", create=self.create_shmem,
+                                                      size=self.SIZE_ARENA)
+        self.shmem_entries = shared_memory.SharedMemory(name="shmem_sample_store_entries", create=self.create_shmem,
+                                                        size=self.SIZE_BUFFER * self.ENTRY_DTYPE.itemsize)
+        self.shmem_state = shared_memory.SharedMemory(name="shmem_sample_store_state", create=self.create_shmem,
+                                                      size=np.dtype(np.int64).itemsize)
+
+    def _initialize_buffers(self):
+        """
+        Initialize store at locations of shared memory.
+        """
+        self.arena = np.ndarray(shape=self.SIZE_ARENA, dtype=np.uint8, buffer=self.shmem_arena.buf)
+        self.entries = np.ndarray(shape=self.SIZE_BUFFER, dtype=self.ENTRY_DTYPE, buffer=self.shmem_entries.buf)
+        self.state = np.ndarray(shape=1, dtype=np.int64, buffer=self.shmem_state.buf)
+
+    @classmethod
+    def pack(cls, heave, range_scale, tvg_offset_db, sin_beam_np, cos_beam_tilt_np, detected_range_np,
+             sample_amplitude, num_samples_np):
+        """
+        Packs beam geometry and raw samples of a ping into a record.
+        :param heave: Heave (m).
+        :param range_scale: Range (m) per sample.
+        :param tvg_offset_db: TVG offset (dB).
+        :param sin_beam_np: Sine of across-track beam angle of each beam.
+        :param cos_beam_tilt_np: Product of cosines of across-track beam angle and along-track tilt of each beam.
+        :param detected_range_np: Range (in samples) of detected bottom of each beam.
+        :param sample_amplitude: List of numpy (int8) arrays of raw amplitudes of each beam.
+        :param num_samples_np: Number of samples of each beam to store (for example, samples above bottom).
+        :return: Numpy (uint8) array of record.
+        """
+        num_beams = len(num_samples_np)
+        beams_offset = cls.HEADER_DTYPE.itemsize
+        samples_offset = beams_offset + num_beams * cls.BEAM_DTYPE.itemsize
+        record = np.empty(samples_offset + int(np.sum(num_samples_np)), dtype=np.uint8)
+
+        header = record[:beams_offset].view(cls.HEADER_DTYPE)
+        header['num_beams'] = num_beams
+        header['heave'] = heave
+        header['range_scale'] = range_scale
+        header['tvg_offset_db'] = tvg_offset_db
+
+        beams = record[beams_offset:samples_offset].view(cls.BEAM_DTYPE)
+        beams['sin_beam'] = sin_beam_np
+        beams['cos_beam_tilt'] = cos_beam_tilt_np
+        beams['detected_range'] = detected_range_np
+        beams['num_samples'] = num_samples_np
+
+        if num_beams > 0:
+            np.concatenate([sample_amplitude[beam][:num_samples_np[beam]] for beam in range(num_beams)],
+                           out=record[samples_offset:].view(np.int8))
+        return record
+
+    @classmethod
+    def unpack(cls, record):
+        """
+        :param record: Numpy (uint8) array of record (see pack).
+        :return: Header (numpy record), beam table (numpy structured array) and concatenated samples (numpy uint8
+        array) of record; views of record.
+        """
+        beams_offset = cls.HEADER_DTYPE.itemsize
+        header = record[:beams_offset].view(cls.HEADER_DTYPE)[0]
+        samples_offset = beams_offset + int(header['num_beams']) * cls.BEAM_DTYPE.itemsize
+        return header, record[beams_offset:samples_offset].view(cls.BEAM_DTYPE), record[samples_offset:]
+
+    def append(self, slot, ping, record):
+        """
+        Writes record of the ping most recently added to raw ring buffer. (Raw ring buffer lock must be held.)
+        :param slot: Slot of ping (see SharedRingBufferRaw.get_slot_indices).
+        :param ping: Ping number (see SharedRingBufferRaw.num_appended).
+        :param record: Numpy (uint8) array of record (see pack), or None if ping has no record.
+        """
+        if record is None or len(record) > self.SIZE_ARENA:
+            if record is not None:
+                logger.warning("Sample store: record of {:.1f} MB exceeds size of store; consider increasing "
+                               "sampleStoreSize_MB.".format(len(record) / 1e6))
+            self.entries[slot] = (-1, 0, 0)
+            return
+
+        position = int(self.state[0])
+        offset = position % self.SIZE_ARENA
+        if offset + len(record) > self.SIZE_ARENA:
+            # Records are contiguous: skip to start of arena
+            position += self.SIZE_ARENA - offset
+            offset = 0
+        self.arena[offset:offset + len(record)] = record
+        self.entries[slot] = (ping, position, len(record))
+        self.state[0] = position + len(record)
+
+    def get(self, slot, ping):
+        """
+        Copies record of a ping. (Raw ring buffer lock must be held.)
+        :param slot: Slot of ping (see SharedRingBufferRaw.get_slot_indices).
+        :param ping: Ping number (see SharedRingBufferRaw.num_appended).
+        :return: Numpy (uint8) array of record, or None if store holds no record of ping (or it has been overwritten).
+        """
+        entry = self.entries[slot]
+        if entry['ping'] != ping or int(self.state[0]) - entry['position'] > self.SIZE_ARENA:
+            return None
+        offset = int(entry['position']) % self.SIZE_ARENA
+        return self.arena[offset:offset + int(entry['size'])].copy()
+
+    def close_shmem(self):
+        """
+        Closes shared memory used by store.
+        """
+        self.shmem_arena.close()
+        self.shmem_entries.close()
+        self.shmem_state.close()
+
+    def unlink_shmem(self):
+        """
+        Unlinks shared memory used by store.
+        """
+        self.shmem_arena.unlink()
+        self.shmem_entries.unlink()
+        self.shmem_state.unlink()
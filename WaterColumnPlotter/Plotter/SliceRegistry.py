@@ -0,0 +1,130 @@
+# Lynette Davis
+# ldavis@ccom.unh.edu
+# Center for Coastal and Ocean Mapping
+# University of New Hampshire
+# October 2026
+
+# Description: Registry of vertical and horizontal slices calculated by Plotter. Slice 0 of each kind is the primary
+# slice, defined by user settings (acrossTrackAvg_m; depth_m and depthAvg_m) and editable at run time. Any number of
+# additional slices may be defined in advanced settings ('additionalVerticalSlices', 'additionalHorizontalSlices');
+# like buffer settings, these are only applied at initialization, as each slice has its own processed ring buffer in
+# shared memory (see SharedRingBufferProcessed). The slice displayed in vertical and horizontal slice windows is
+# selected from their slice selector, which is shown when additional slices are defined.
+#
+# Vertical slices (curtains) are defined by across-track offset of their centre from nadir ('acrossTrack_m'; positive
+# to starboard) and width ('acrossTrackAvg_m'); horizontal slices (layers) by depth ('depth_m') and thickness
+# ('depthAvg_m'). For example:
+#     'additionalVerticalSlices': [{'name': "port", 'acrossTrack_m': -20, 'acrossTrackAvg_m': 5},
+#                                  {'name': "starboard", 'acrossTrack_m': 20, 'acrossTrackAvg_m': 5}],
+#     'additionalHorizontalSlices': [{'name': "10 m", 'depth_m': 10, 'depthAvg_m': 2}]
+#
+# Slices are resolved to windows of grid indices [start, end), clipped to grid: columns for vertical slices, rows for
+# horizontal slices. All slices of a ping are calculated from a single pass over its grid (see SharedProjectionCache).
+
+import logging
+import math
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class SliceRegistry:
+
+    VERTICAL_KEYS = ('acrossTrack_m', 'acrossTrackAvg_m')
+    HORIZONTAL_KEYS = ('depth_m', 'depthAvg_m')
+
+    def __init__(self, settings):
+        """
+        :param settings: Settings dictionary; additional slices are read from advanced settings.
+        """
+        self.vertical_slices = [{'name': "primary", 'acrossTrack_m': 0, 'acrossTrackAvg_m': None}]
+        self.horizontal_slices = [{'name': "primary", 'depth_m': None, 'depthAvg_m': None}]
+
+        advanced_settings = settings['advanced_settings']
+        self._register(self.vertical_slices, advanced_settings.get('additionalVerticalSlices', []),
+                       self.VERTICAL_KEYS, "vertical")
+        self._register(self.horizontal_slices, advanced_settings.get('additionalHorizontalSlices', []),
+                       self.HORIZONTAL_KEYS, "horizontal")
+
+    @staticmethod
+    def _register(slices, definitions, keys, kind):
+        """
+        Adds valid slice definitions to slices; invalid definitions are logged and ignored.
+        :param slices: List of slice definitions to which to add.
+        :param definitions: List of slice definitions (dictionaries) from settings.
+        :param keys: Keys required in each definition.
+        :param kind: Kind of slice ("vertical" or "horizontal"), for logging.
+        """
+        for definition in definitions:
+            try:
+                values = [float(definition[key]) for key in keys]
+            except (KeyError, TypeError, ValueError):
+                logger.warning("Ignoring invalid {} slice definition: {}.".format(kind, definition))
+                continue
+            slice_definition = dict(zip(keys, values))
+            slice_definition['name'] = str(definition.get('name', "{} {}".format(kind, len(slices))))
+            slices.append(slice_definition)
+
+    @property
+    def num_vertical_slices(self):
+        return len(self.vertical_slices)
+
+    @property
+    def num_horizontal_slices(self):
+        return len(self.horizontal_slices)
+
+    @property
+    def vertical_names(self):
+        return [vertical_slice['name'] for vertical_slice in self.vertical_slices]
+
+    @property
+    def horizontal_names(self):
+        return [horizontal_slice['name'] for horizontal_slice in self.horizontal_slices]
+
+    def vertical_windows(self, num_grid_cells, bin_size, across_track_avg):
+        """
+        Resolves vertical slices to windows of across-track columns.
+        :param num_grid_cells: Number of grid cells along each side of pie chart grid (see maxGridCells).
+        :param bin_size: Bin size (m).
+        :param across_track_avg: Width (m) of primary vertical slice.
+        :return: Numpy array (vertical slices x 2) of start (inclusive) and end (exclusive) column indices.
+        """
+        windows = np.empty((self.num_vertical_slices, 2), dtype=np.int64)
+        for index, vertical_slice in enumerate(self.vertical_slices):
+            width = across_track_avg if index == 0 else vertical_slice['acrossTrackAvg_m']
+            # Across-track index is flipped in grid (see KongsbergDGProcess.bin_beam_samples): starboard offsets
+            # decrease column index
+            centre = (num_grid_cells / 2) - (vertical_slice['acrossTrack_m'] / bin_size)
+            windows[index] = [math.floor(centre - ((width / 2) / bin_size)),
+                              math.ceil(centre + ((width / 2) / bin_size))]
+        return self._clip(windows, num_grid_cells)
+
+    def horizontal_windows(self, num_grid_cells, bin_size, max_heave, depth, depth_avg):
+        """
+        Resolves horizontal slices to windows of depth rows.
+        :param num_grid_cells: Number of grid cells along each side of pie chart grid (see maxGridCells).
+        :param bin_size: Bin size (m).
+        :param max_heave: Max heave (m); index of zero depth is found by dividing max heave by bin size.
+        :param depth: Depth (m) of primary horizontal slice.
+        :param depth_avg: Thickness (m) of primary horizontal slice.
+        :return: Numpy array (horizontal slices x 2) of start (inclusive) and end (exclusive) row indices.
+        """
+        windows = np.empty((self.num_horizontal_slices, 2), dtype=np.int64)
+        for index, horizontal_slice in enumerate(self.horizontal_slices):
+            if index == 0:
+                slice_depth, thickness = depth, depth_avg
+            else:
+                slice_depth, thickness = horizontal_slice['depth_m'], horizontal_slice['depthAvg_m']
+            centre = math.ceil(max_heave / bin_size) + math.floor(slice_depth / bin_size)
+            windows[index] = [centre - math.ceil((thickness / 2) / bin_size),
+                              centre + math.ceil((thickness / 2) / bin_size)]
+        return self._clip(windows, num_grid_cells)
+
+    @staticmethod
+    def _clip(windows, num_grid_cells):
+        """
+        Clips windows to grid; windows that lie outside of grid are empty.
+        """
+        np.clip(windows, 0, num_grid_cells, out=windows)
+        windows[:, 1] = np.maximum(windows[:, 1], windows[:, 0])
+        return windows
@@ -5,13 +5,24 @@
 # November 2021
 
 import ctypes
+import logging
 from multiprocessing import Array, Queue, Value
 import numpy as np
 from PyQt5.QtWidgets import QMessageBox
 from WaterColumnPlotter.Kongsberg.KongsbergDGMain import KongsbergDGMain
+from WaterColumnPlotter.Kongsberg.KongsbergSampleRebinner import KongsbergSampleRebinner
+from WaterColumnPlotter.Plotter.KernelThreads import KernelThreads
+from WaterColumnPlotter.Plotter.LatencyHistogram import LatencyHistogram
 from WaterColumnPlotter.Plotter.PlotterMain import PlotterMain
+from WaterColumnPlotter.Plotter.ProcessedBufferWorker import ProcessedBufferWorker
+from WaterColumnPlotter.Plotter.RingBufferDump import RingBufferDump
+from WaterColumnPlotter.Plotter.SharedProjectionCache import SharedProjectionCache
 from WaterColumnPlotter.Plotter.SharedRingBufferProcessed import SharedRingBufferProcessed
 from WaterColumnPlotter.Plotter.SharedRingBufferRaw import SharedRingBufferRaw
+from WaterColumnPlotter.Plotter.SharedSampleStore import SharedSampleStore
+from WaterColumnPlotter.Plotter.SliceRegistry import SliceRegistry
+
+logger = logging.getLogger(__name__)
 
 
 class WaterColumn:
@@ -38,6 +49,8 @@ class WaterColumn:
         self.socket_buffer_multiplier = Value(ctypes.c_uint8,
                                               self.settings['ip_settings']['socketBufferMultiplier'], lock=True)
         self.bin_size = Value(ctypes.c_float, self.settings['processing_settings']['binSize_m'], lock=True)
+        # Bin size of finest bin size level (see KongsbergDGProcess); other levels have multiples of this bin size
+        self.base_bin_size = Value(ctypes.c_float, self.settings['processing_settings']['binSize_m'], lock=True)
         self.across_track_avg = Value(ctypes.c_float,
                                       self.settings['processing_settings']['acrossTrackAvg_m'], lock=True)
         self.depth = Value(ctypes.c_float, self.settings['processing_settings']['depth_m'], lock=True)
@@ -45,6 +58,7 @@ class WaterColumn:
         self.along_track_avg = Value(ctypes.c_uint8,
                                      self.settings['processing_settings']['alongTrackAvg_ping'], lock=True)
         self.max_heave = Value(ctypes.c_float, self.settings['processing_settings']['maxHeave_m'], lock=True)
+        self.msr_masking = Value(ctypes.c_bool, self.settings['processing_settings']['msrMasking'], lock=True)
         self.max_grid_cells = Value(ctypes.c_uint16, self.settings['buffer_settings']['maxGridCells'], lock=True)
         self.max_ping_buffer = Value(ctypes.c_uint16, self.settings['buffer_settings']['maxBufferSize_ping'], lock=True)
 
@@ -59,6 +73,15 @@ class WaterColumn:
         self.full_ping_count = Value(ctypes.c_uint32, 0, lock=True)  # multiprocessing.Value
         # A count to track the number of #MWC records (pings) that could not be reconstructed
         self.discard_ping_count = Value(ctypes.c_uint32, 0, lock=True)  # multiprocessing.Value
+        # Histograms of per-stage processing time of #MWC records (pings)
+        self.latency_counts = Array(ctypes.c_uint64, LatencyHistogram.NUM_STAGES * LatencyHistogram.NUM_BUCKETS,
+                                    lock=True)  # multiprocessing.Array
+        self.latency_histogram = LatencyHistogram(self.latency_counts)
+        # Current quality of service level and number of pings processed at reduced quality
+        self.qos_level = Value(ctypes.c_uint8, 0, lock=True)  # multiprocessing.Value
+        self.qos_degraded_ping_count = Value(ctypes.c_uint32, 0, lock=True)  # multiprocessing.Value
+        # Moving average of time (in seconds) of Plotter to buffer a pie record (see QualityOfServiceController)
+        self.pie_buffer_time = Value(ctypes.c_double, 0.0, lock=True)  # multiprocessing.Value
 
         # self.process_flag = Value(ctypes.c_bool, False, lock=True)  # multiprocessing.Value
         self.sonar_process_flag = Value(ctypes.c_bool, False, lock=True)  # multiprocessing.Value
@@ -73,10 +96,29 @@ class WaterColumn:
         # TODO: Make these multiprocessing.Values?
         self.MAX_NUM_GRID_CELLS = self.settings['buffer_settings']['maxGridCells']
         self.MAX_LENGTH_BUFFER = self.settings['buffer_settings']['maxBufferSize_ping']
+        # When True, buffered amplitudes are linear intensities and must be converted to dB for display
+        # (not available with integer amplitudes; see KongsbergDGProcess)
+        self.LINEAR_AVERAGING = self.settings['advanced_settings']['linearAveraging'] and \
+                                self.settings['advanced_settings']['precision'] != "int32"
         # self.ALONG_TRACK_PINGS = self.settings['processing_settings']['alongTrackAvg_ping']
 
         self.shared_ring_buffer_raw = None
         self.shared_ring_buffer_processed = None
+        self.shared_projection_cache = None  # None if 'projectionCache' is disabled in advanced settings
+        # Records of samples of pings of raw ring buffer (see SharedSampleStore) and object re-binning pings from them
+        # when bin size is changed; None if 'sampleStore' is disabled in advanced settings
+        self.shared_sample_store = None
+        self.sample_rebinner = None
+        # Thread recalculating processed ring buffer in the background when settings are changed (see update_buffers)
+        self.processed_buffer_worker = None
+        # True when pings of raw ring buffer must be re-binned for current settings (see update_buffers)
+        self.rebin_pending = False
+        # Thread writing most recent contents of raw and processed ring buffers to disk (see dump_buffers)
+        self.ring_buffer_dump = None
+        # Vertical and horizontal slices calculated by Plotter; each has its own processed ring buffer
+        self.slice_registry = SliceRegistry(self.settings)
+        # Number of threads of parallel kernels launched by GUI thread (see KernelThreads)
+        KernelThreads.configure(self.settings)
 
         self.sonarMain = None
         self.plotterMain = None
@@ -92,6 +134,17 @@ class WaterColumn:
         self.shared_ring_buffer_processed = SharedRingBufferProcessed(self.settings, self.processed_buffer_count,
                                                                       self.processed_buffer_full_flag,
                                                                       create_shmem=create_shmem)
+        if self.settings['advanced_settings']['projectionCache']:
+            try:
+                self.shared_projection_cache = SharedProjectionCache(self.settings, create_shmem=create_shmem)
+            except MemoryError as error:
+                # Processes are started after ring buffers are initialized; they see that cache is disabled
+                logger.warning("Projection cache disabled: {} Reduce maxBufferSize_ping or maxGridCells to enable it."
+                               .format(error))
+                self.settings['advanced_settings']['projectionCache'] = False
+        if SharedSampleStore.enabled(self.settings) and self.settings["system_settings"]["system"] == "Kongsberg":
+            self.shared_sample_store = SharedSampleStore(self.settings, create_shmem=create_shmem)
+            self.sample_rebinner = KongsbergSampleRebinner(self.settings)
 
     def editIP(self, ip, append=True):
         """
@@ -127,9 +180,11 @@ class WaterColumn:
         if self.settings["system_settings"]["system"] == "Kongsberg":  # Kongsberg system
 
             self.sonarMain = KongsbergDGMain(self.settings, self.ip, self.port, self.protocol,
-                                             self.socket_buffer_multiplier, self.bin_size, self.max_heave,
+                                             self.socket_buffer_multiplier, self.bin_size, self.base_bin_size,
+                                             self.across_track_avg, self.depth, self.depth_avg, self.max_heave, self.msr_masking,
                                              self.max_grid_cells, self.queue_datagram, self.queue_pie_object,
-                                             self.full_ping_count, self.discard_ping_count)
+                                             self.full_ping_count, self.discard_ping_count, self.latency_counts,
+                                             self.qos_level, self.qos_degraded_ping_count, self.pie_buffer_time)
 
             self.sonarMain.play_processes()
 
@@ -145,10 +200,12 @@ class WaterColumn:
         """
         Initiates and runs process managed by self.plotterMain.
         """
-        self.plotterMain = PlotterMain(self.settings, self.bin_size, self.across_track_avg, self.depth, self.depth_avg,
-                                       self.along_track_avg, self.max_heave, self.queue_pie_object,
+        self.plotterMain = PlotterMain(self.settings, self.bin_size, self.base_bin_size, self.across_track_avg,
+                                       self.depth, self.depth_avg, self.along_track_avg, self.max_heave,
+                                       self.queue_pie_object,
                                        self.raw_buffer_count, self.processed_buffer_count,
-                                       self.raw_buffer_full_flag, self.processed_buffer_full_flag)
+                                       self.raw_buffer_full_flag, self.processed_buffer_full_flag,
+                                       self.pie_buffer_time)
 
         self.plotterMain.play_processes()
 
@@ -210,6 +267,66 @@ class WaterColumn:
         """
         return self.shared_ring_buffer_processed.get_num_elements_in_buffer()
 
+    def get_processed_buffer_generation(self):
+        """
+        Returns index of live generation of processed ring buffer in shared memory; this changes each time processed
+        ring buffer has been recalculated for new settings (see ProcessedBufferWorker).
+        :return: Index of live generation of processed ring buffer.
+        """
+        with self.shared_ring_buffer_processed.get_lock():
+            return self.shared_ring_buffer_processed.generation
+
+    def is_recalculating(self):
+        """
+        :return: True if processed ring buffer is being recalculated in the background for new settings.
+        """
+        return self.processed_buffer_worker is not None and self.processed_buffer_worker.is_alive()
+
+    def dump_buffers(self, directory, minutes=None):
+        """
+        Saves most recent contents of raw and processed ring buffers, with metadata, to disk in the background (see
+        RingBufferDump); dump can be memory-mapped back with RingBufferDump.load.
+        :param directory: Directory to which dump is written (created if it does not exist).
+        :param minutes: Number of most recent minutes of pings to write; default is 'dumpMinutes' of advanced settings.
+        :return: Thread writing dump, or None if a dump is already being written.
+        """
+        if self.is_dumping():
+            logger.warning("Ring buffer dump already in progress; ignoring request.")
+            return None
+        if minutes is None:
+            minutes = self.settings['advanced_settings']['dumpMinutes']
+        with self.base_bin_size.get_lock():
+            base_bin_size = self.base_bin_size.value
+        self.ring_buffer_dump = RingBufferDump(self.settings, base_bin_size, self.shared_ring_buffer_raw,
+                                               self.shared_ring_buffer_processed, directory, minutes)
+        self.ring_buffer_dump.start()
+        return self.ring_buffer_dump
+
+    def is_dumping(self):
+        """
+        :return: True if ring buffers are being written to disk (see dump_buffers).
+        """
+        return self.ring_buffer_dump is not None and self.ring_buffer_dump.is_alive()
+
+    def get_dump_status(self):
+        """
+        :return: None if ring buffers have not been written to disk; otherwise, fraction of pings written by most
+        recent dump (see dump_buffers), whether it is still being written, and whether it failed.
+        """
+        if self.ring_buffer_dump is None:
+            return None
+        return (self.ring_buffer_dump.progress, self.ring_buffer_dump.is_alive(),
+                self.ring_buffer_dump.error is not None)
+
+    def get_processing_latency(self, percentile):
+        """
+        Estimates given percentile of processing time of #MWC records (pings), per stage of processing.
+        :param percentile: Percentile (0 - 100).
+        :return: Numpy array of estimated percentile (in milliseconds) of processing time of each stage
+        (see LatencyHistogram.STAGE_NAMES); NaN for stages not yet timed.
+        """
+        return self.latency_histogram.get_percentiles(percentile)
+
     def get_pie(self):
         """
         Calculates average amplitude values for most recent along_track_avg number of pings in raw ring buffer.
@@ -227,35 +344,83 @@ class WaterColumn:
         # pie = self.shared_ring_buffer_raw.view_recent_pings_as_pie(1)
         # Check that temp arrays are not all NaNs (from 'discarded' pings)
         if not np.all(np.isnan(pie)):
-            return self._trim_nans_pie(pie)
+            return self._to_db(self._trim_nans_pie(pie))
         return None  # If temp arrays are all zero
 
-    def get_vertical_slice(self):
+    def get_bottom_polyline(self):
+        """
+        Calculates average depth of detected bottom for most recent along_track_avg number of pings in raw ring buffer.
+        :return: Across-track (x) and depth (y) positions, in bins, of detected bottom in pie display coordinates
+        (sonar at x = 0, sea surface at y = 0) if bottom was detected; otherwise, returns None.
+        """
+        with self.raw_buffer_count.get_lock():
+            bottom = self.shared_ring_buffer_raw.view_recent_pings_as_bottom(
+                self.settings['processing_settings']['alongTrackAvg_ping'])
+
+        if not np.all(np.isnan(bottom)):
+            # Centre of each across-track bin
+            x = np.arange(self.MAX_NUM_GRID_CELLS) + 0.5 - (self.MAX_NUM_GRID_CELLS / 2)
+            y = bottom - (self.settings['processing_settings']['maxHeave_m'] /
+                          self.settings['processing_settings']['binSize_m'])
+            return x, y
+        return None
+
+    def get_vertical_slice_names(self):
+        """
+        :return: Names of vertical slices (see SliceRegistry); index 0 is primary slice.
+        """
+        return self.slice_registry.vertical_names
+
+    def get_horizontal_slice_names(self):
+        """
+        :return: Names of horizontal slices (see SliceRegistry); index 0 is primary slice.
+        """
+        return self.slice_registry.horizontal_names
+
+    def get_vertical_slice(self, slice_index=0):
         """
         Retrieves all valid entries from processed ring buffer's vertical slice buffer.
+        :param slice_index: Index of vertical slice (see SliceRegistry); default is primary slice.
         :return: A numpy matrix of all valid entries from processed ring buffer's vertical slice buffer
         if at least one valid entry exists; otherwise, returns None.
         """
-        temp_slice = self.shared_ring_buffer_processed.view_buffer_elements(
-            self.shared_ring_buffer_processed.vertical_slice_buffer)
+        # Lock ensures that buffer of live generation is viewed (see SharedRingBufferProcessed)
+        with self.shared_ring_buffer_processed.get_lock():
+            temp_slice = self.shared_ring_buffer_processed.view_buffer_elements(
+                self.shared_ring_buffer_processed.vertical_slice_buffers[slice_index])
         # return None  # If temp arrays are all zero
         if not np.all(np.isnan(temp_slice)):
-            return self._trim_nans_vertical(temp_slice)
+            return self._to_db(self._trim_nans_vertical(temp_slice))
         return None
 
-    def get_horizontal_slice(self):
+    def get_horizontal_slice(self, slice_index=0):
         """
         Retrieves all valid entries from processed ring buffer's horizontal slice buffer.
+        :param slice_index: Index of horizontal slice (see SliceRegistry); default is primary slice.
         :return: A numpy matrix of all valid entries from processed ring buffer's horizontal slice buffer
         if at least one valid entry exists; otherwise, returns None.
         """
-        temp_slice = self.shared_ring_buffer_processed.view_buffer_elements(
-            self.shared_ring_buffer_processed.horizontal_slice_buffer)
+        # Lock ensures that buffer of live generation is viewed (see SharedRingBufferProcessed)
+        with self.shared_ring_buffer_processed.get_lock():
+            temp_slice = self.shared_ring_buffer_processed.view_buffer_elements(
+                self.shared_ring_buffer_processed.horizontal_slice_buffers[slice_index])
         # return None  # If temp arrays are all zero
         if not np.all(np.isnan(temp_slice)):
-            return self._trim_nans_horizontal(temp_slice)
+            return self._to_db(self._trim_nans_horizontal(temp_slice))
         return None
 
+    def _to_db(self, values):
+        """
+        Converts averaged amplitudes to dB for display when amplitudes are averaged as linear intensities
+        (see 'linearAveraging' in advanced settings); otherwise, amplitudes are already in dB.
+        :param values: Numpy array of averaged amplitudes (NaN where no data).
+        :return: Numpy array of averaged amplitudes in dB.
+        """
+        if self.LINEAR_AVERAGING:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                return 10 * np.log10(values)
+        return values
+
     def _trim_nans_pie(self, slice):
         """
         Trims excess rows and columns of nans from data before plotting.
@@ -361,53 +526,138 @@ class WaterColumn:
         """
         print("WaterColumn, update_buffers.")
         if self.plotterMain:
+            # Stop background recalculation for previous settings (if any); worker must be stopped before lock on
+            # shared_ring_buffer_raw is acquired, as it takes lock for each chunk of pings
+            self.cancel_processed_buffer_worker()
+
             # Get lock on shared_ring_buffer_raw; this will ensure that no other
             # changes can be made to shared_ring_buffer_raw while we make updates
             # with self.shared_ring_buffer_raw.get_lock():
             with self.shared_ring_buffer_raw.counter.get_lock():
+                previous_slice_settings = self.get_primary_slice_settings()
                 self.plotterMain.plotter.update_local_settings()
+                buffers_cleared = False
                 if self.plotterMain.plotter.bin_size_edited:
-                    # If bin size is edited, clear both raw and processed ring buffers.
-                    self.shared_ring_buffer_raw.clear()  # This methods gets lock
-                    self.shared_ring_buffer_processed.clear()  # This method gets lock
+                    # If bin size is edited to a bin size that is not binned at any bin size level, pings are binned
+                    # from now on at levels based on new bin size. With sample store, pings of raw ring buffers are
+                    # re-binned at new levels (see ProcessedBufferWorker); otherwise, clear both raw and processed ring
+                    # buffers.
+                    with self.base_bin_size.get_lock():
+                        self.base_bin_size.value = self.plotterMain.plotter.bin_size_local
+                    self.plotterMain.plotter.base_bin_size_local = self.plotterMain.plotter.bin_size_local
+                    self.plotterMain.plotter.bin_size_level_local = 0
+                    self.shared_ring_buffer_raw.select_level(0)
+                    self.shared_ring_buffer_raw.set_heave_rows(SharedRingBufferRaw.heave_rows(
+                        self.plotterMain.plotter.max_heave_local, self.plotterMain.plotter.base_bin_size_local,
+                        self.shared_ring_buffer_raw.NUM_LEVELS))
+                    if self.shared_sample_store:
+                        self.rebin_pending = True
+                    else:
+                        self.shared_ring_buffer_raw.clear()  # This methods gets lock
+                        self.shared_ring_buffer_processed.clear()  # This method gets lock
+                        buffers_cleared = True
+                    if self.shared_projection_cache:
+                        self.shared_projection_cache.invalidate(0)
                     self.plotterMain.plotter.bin_size_edited = False
+                    self.plotterMain.plotter.max_heave_edited = False
                 else:
-                    if self.plotterMain.plotter.max_heave_edited:
-                        print("**************************************************MAX HEAVE EDITED")
-                        # Note that we already hold lock on shared_ring_buffer_raw
-                        temp_amplitude_buffer_raw = self.shared_ring_buffer_raw.view_buffer_elements(
-                            self.shared_ring_buffer_raw.amplitude_buffer)
-                        temp_count_buffer_raw = self.shared_ring_buffer_raw.view_buffer_elements(
-                            self.shared_ring_buffer_raw.count_buffer)
-                        self.plotterMain.plotter.shift_heave(temp_amplitude_buffer_raw, temp_count_buffer_raw,
-                                                             self.plotterMain.plotter.outdated_heave,
-                                                             self.plotterMain.plotter.max_heave_local)
-                        self.plotterMain.plotter.max_heave_edited = False
-
-                    # Recalculate processed ring buffers based on update settings / updated raw ring buffers
-                    # Note that this method holds lock on raw buffers for entire calculation and only get lock on
-                    # processed buffer for final phase of adding processed data to processed buffer.
-                    print("prior to recalculate, raw ring buffer len: ", self.shared_ring_buffer_raw.get_num_elements_in_buffer())
-                    print("prior to recalculate, processed ring buffer len: ",
-                          self.shared_ring_buffer_processed.get_num_elements_in_buffer())
-                    self.plotterMain.plotter.recalculate_processed_buffer(self.shared_ring_buffer_raw,
-                                                                          self.shared_ring_buffer_processed)
-                    print("after recalculate, raw ring buffer len: ",
+                    # If bin size is edited to a bin size that is binned at one of bin size levels, raw ring buffers
+                    # of that level already hold history of pings at new bin size; select them.
+                    self.shared_ring_buffer_raw.select_level(self.plotterMain.plotter.bin_size_level_local)
+
+                if self.slices_only() and not self.plotterMain.plotter.bin_size_edited and \
+                        self.get_primary_slice_settings() != previous_slice_settings:
+                    # With slices-only binning, raw ring buffers hold only samples of previous slices: history of
+                    # edited slices would be partial. With sample store, pings of raw ring buffers are re-binned in
+                    # full (see ProcessedBufferWorker); otherwise, clear both raw and processed ring buffers.
+                    if self.shared_sample_store:
+                        self.rebin_pending = True
+                        logger.info("Slices edited with slices-only binning; re-binning pings from sample store.")
+                    else:
+                        self.shared_ring_buffer_raw.clear()  # This method gets lock
+                        self.shared_ring_buffer_processed.clear()  # This method gets lock
+                        buffers_cleared = True
+                        logger.warning("Slices edited with slices-only binning; ring buffers cleared, as raw ring "
+                                       "buffers hold only samples of previous slices.")
+                    if self.shared_projection_cache:
+                        self.shared_projection_cache.invalidate(self.plotterMain.plotter.bin_size_level_local)
+
+                if self.plotterMain.plotter.max_heave_edited:
+                    print("**************************************************MAX HEAVE EDITED")
+                    # Buffered grids are not shifted: each ping of raw ring buffers records rows allotted to max heave
+                    # with which it was binned, and readers offset its rows by difference from rows set here (see
+                    # SharedRingBufferRaw.get_row_offsets). Projection cache holds sums of pings as binned, so it
+                    # remains valid.
+                    self.shared_ring_buffer_raw.set_heave_rows(SharedRingBufferRaw.heave_rows(
+                        self.plotterMain.plotter.max_heave_local, self.plotterMain.plotter.base_bin_size_local,
+                        self.shared_ring_buffer_raw.NUM_LEVELS))
+                    self.plotterMain.plotter.max_heave_edited = False
+
+                if not buffers_cleared:
+                    # Recalculate processed ring buffers based on update settings / updated raw ring buffers.
+                    # Recalculation runs in the background (see ProcessedBufferWorker): back generation of processed
+                    # ring buffers is rebuilt, holding lock on raw buffers for one chunk of pings at a time, and is
+                    # swapped with live generation when complete. Worker is created while lock is held, so that
+                    # Plotter appends no pings between worker's snapshot of buffers and signal below. When pings must
+                    # be re-binned, worker first re-bins them from sample store.
+                    print("prior to recalculate, raw ring buffer len: ",
                           self.shared_ring_buffer_raw.get_num_elements_in_buffer())
-                    print("after recalculate, processed ring buffer len: ",
+                    print("prior to recalculate, processed ring buffer len: ",
                           self.shared_ring_buffer_processed.get_num_elements_in_buffer())
+                    self.processed_buffer_worker = ProcessedBufferWorker(
+                        self.plotterMain.plotter, self.shared_ring_buffer_raw, self.shared_ring_buffer_processed,
+                        self.shared_projection_cache,
+                        sample_store=self.shared_sample_store if self.rebin_pending else None,
+                        sample_rebinner=self.sample_rebinner if self.rebin_pending else None)
+                    self.rebin_pending = False
+                    self.processed_buffer_worker.start()
                 # Signal to subprocesses that settings have changed.
                 self.signalSubprocessSettingsChanged()
                 # Reset IP settings edited flag
                 if self.ip_settings_edited:
                     self.ip_settings_edited = False
 
+    def slices_only(self):
+        """
+        :return: True if only samples of slices are binned ('slicesOnly' in advanced settings; see KongsbergDGProcess).
+        """
+        return self.settings['advanced_settings']['slicesOnly'] and \
+            self.settings['advanced_settings']['binSizeLevels'] == 1
+
+    def get_primary_slice_settings(self):
+        """
+        :return: Settings of Plotter (local copies) defining primary vertical and horizontal slices (see SliceRegistry).
+        """
+        plotter = self.plotterMain.plotter
+        return plotter.across_track_avg_local, plotter.depth_local, plotter.depth_avg_local
+
+    def cancel_processed_buffer_worker(self):
+        """
+        Stops background recalculation of processed ring buffer, if running (see ProcessedBufferWorker).
+        """
+        if self.processed_buffer_worker:
+            self.processed_buffer_worker.cancel()
+            self.processed_buffer_worker.join()
+            # Pings not yet re-binned are re-binned by next worker
+            if self.processed_buffer_worker.rebinning:
+                self.rebin_pending = True
+            self.processed_buffer_worker = None
+
     def closeSharedMemory(self):
         """
         Closes shared memory used by raw and processed ring buffers.
         """
+        self.cancel_processed_buffer_worker()
+        if self.ring_buffer_dump:
+            self.ring_buffer_dump.cancel()
+            self.ring_buffer_dump.join()
         self.shared_ring_buffer_raw.close_shmem()
         self.shared_ring_buffer_processed.close_shmem()
+        if self.shared_projection_cache:
+            self.shared_projection_cache.close_shmem()
+        if self.shared_sample_store:
+            self.shared_sample_store.close_shmem()
+            self.sample_rebinner.close()
 
     def unlinkSharedMemory(self):
         """
@@ -415,3 +665,7 @@ class WaterColumn:
         """
         self.shared_ring_buffer_raw.unlink_shmem()
         self.shared_ring_buffer_processed.unlink_shmem()
+        if self.shared_projection_cache:
+            self.shared_projection_cache.unlink_shmem()
+        if self.shared_sample_store:
+            self.shared_sample_store.unlink_shmem()